@@ -0,0 +1,545 @@
+"""
+Benchmark de extremo a extremo del sistema completo.
+
+Levanta un servidor de video con N cámaras sintéticas, un servidor de testeo
+(con el detector simulado determinista o YOLO real) y M vigilantes sin
+interfaz suscritos a las detecciones. Cada componente corre en su propio
+proceso (o, con --en-proceso, todos como hilos de este proceso) y tras un
+calentamiento mide durante una ventana fija:
+
+- fps sostenidos por cámara: capturados, enviados por video y procesados
+  (llegaron a la inferencia) en testeo
+- latencia de alerta (captura -> vigilante) p50/p95/p99, medida en los
+  vigilantes con la traza que viaja en cada DETECTION
+- frames descartados por etapa: omitidos en el origen (sin demanda / sin
+  crédito), descartados en testeo (antiguos / reemplazados) y
+  notificaciones que no llegaron a los vigilantes
+- CPU (%) y memoria residente (actual y máxima) de cada proceso
+
+Los contadores se leen de los endpoints /metrics de los servidores al
+inicio y al final de la ventana. Los resultados se escriben en JSON
+(benchmarks/resultados/) y pueden compararse con una línea base:
+
+Uso:
+    python3 benchmarks/bench_extremo_a_extremo.py
+    python3 benchmarks/bench_extremo_a_extremo.py --camaras 20 --vigilantes 5 --segundos 30
+    python3 benchmarks/bench_extremo_a_extremo.py --guardar-base
+    python3 benchmarks/bench_extremo_a_extremo.py --comparar benchmarks/resultados/e2e_abc1234.json
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+PROYECTO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROYECTO_ROOT)
+
+from src.cliente_vigilante.suscriptor import GrupoSuscriptores
+from src.common.registro import Registro
+from src.common.trazas import HistogramaLatencia
+from src.common.utils import ConfigLoader, ProcesoUtils
+
+RUTA_RESULTADOS = os.path.join(PROYECTO_ROOT, 'benchmarks', 'resultados')
+RUTA_BASE = os.path.join(RUTA_RESULTADOS, 'extremo_a_extremo_base.json')
+
+# Métrica comparada: (ruta en los resultados, True si más alto es mejor)
+COMPARADAS: List[Tuple[Tuple[str, ...], bool]] = [
+    (('fps', 'procesados', 'media'), True),
+    (('fps', 'enviados', 'media'), True),
+    (('latencia_alerta_ms', 'p50'), False),
+    (('latencia_alerta_ms', 'p95'), False),
+    (('procesos', 'video', 'cpu_pct'), False),
+    (('procesos', 'testeo', 'cpu_pct'), False),
+    (('procesos', 'video', 'rss_max_mb'), False),
+    (('procesos', 'testeo', 'rss_max_mb'), False),
+]
+
+_LINEA_METRICA = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+_ETIQUETA = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# ---------------------------------------------------------------------------
+# Configuración y mediciones
+# ---------------------------------------------------------------------------
+
+def puerto_libre() -> int:
+    """Puerto TCP libre en localhost"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def crear_config(base: Dict, directorio: str, args) -> str:
+    """Escribe la configuración temporal del benchmark y devuelve su ruta"""
+    config = copy.deepcopy(base)
+
+    config['camaras']['lista'] = []
+    config['camaras']['simuladas'] = {
+        'cantidad': args.camaras, 'id_inicial': 1, 'fps': args.fps,
+        'fuente': {'tipo': 'sintetica', 'ancho': args.ancho, 'alto': args.alto}
+    }
+    config['servidor_video'].update({
+        'host': '127.0.0.1', 'puerto': puerto_libre(), 'socket_unix': None,
+        'socket_shm': os.path.join(directorio, 'video_shm.sock'),
+        'metricas_puerto': puerto_libre()
+    })
+    config['servidor_video'].setdefault('clips', {})['directorio'] = os.path.join(directorio, 'clips')
+    config['servidor_testeo'].update({
+        'host': '127.0.0.1', 'puerto': puerto_libre(), 'socket_unix': None,
+        'transporte': args.transporte,
+        'detecciones_path': os.path.join(directorio, 'detecciones'),
+        'log_path': os.path.join(directorio, 'detecciones.json'),
+        'trazas': {'volcado_path': None},
+        'metricas_puerto': puerto_libre()
+    })
+    if args.detector == 'simulado':
+        config['servidor_testeo']['detector'] = {
+            'tipo': 'simulado', 'semilla': args.semilla, 'detecciones_por_frame': 1,
+            'latencia_ms': {'distribucion': args.distribucion, 'media': args.inferencia_ms,
+                            'desviacion': args.inferencia_desv}
+        }
+    else:
+        config['servidor_testeo']['detector'] = {'tipo': 'yolo'}
+    config['cliente_vigilante'].update({
+        'servidor_testeo_host': '127.0.0.1',
+        'servidor_testeo_puerto': config['servidor_testeo']['puerto'],
+        'servidor_testeo_socket_unix': None
+    })
+    config['logging'] = {'nivel': 'WARNING', 'archivo': None}
+
+    ruta = os.path.join(directorio, 'config.json')
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    return ruta
+
+
+def esperar_puerto(puerto: int, timeout: float = 30.0):
+    """Espera a que un servidor acepte conexiones en localhost"""
+    limite = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > limite:
+                raise RuntimeError(f"Nadie escucha en el puerto {puerto}")
+            time.sleep(0.2)
+
+
+def leer_metricas(puerto: int) -> Dict[Tuple[str, Tuple], float]:
+    """
+    Lee /metrics de un servidor.
+
+    Returns:
+        {(nombre, ((etiqueta, valor), ...)): valor}
+    """
+    with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/metrics", timeout=5) as respuesta:
+        texto = respuesta.read().decode('utf-8')
+
+    metricas = {}
+    for linea in texto.splitlines():
+        coincidencia = _LINEA_METRICA.match(linea)
+        if not linea.startswith('#') and coincidencia:
+            nombre, etiquetas, valor = coincidencia.groups()
+            clave = tuple(sorted(_ETIQUETA.findall(etiquetas or '')))
+            metricas[(nombre, clave)] = float(valor)
+    return metricas
+
+
+def sumar_por(metricas: Dict, nombre: str, etiqueta: str) -> Dict[str, float]:
+    """Suma las series de una métrica agrupadas por el valor de una etiqueta"""
+    totales = {}
+    for (serie, etiquetas), valor in metricas.items():
+        if serie == nombre:
+            clave = dict(etiquetas).get(etiqueta, '')
+            totales[clave] = totales.get(clave, 0.0) + valor
+    return totales
+
+
+def diferencia(inicio: Dict, fin: Dict, nombre: str, etiqueta: str) -> Dict[str, float]:
+    """Incremento de un contador en la ventana, agrupado por etiqueta"""
+    antes = sumar_por(inicio, nombre, etiqueta)
+    return {clave: valor - antes.get(clave, 0.0)
+            for clave, valor in sumar_por(fin, nombre, etiqueta).items()}
+
+
+def resumir(valores: List[float]) -> Dict[str, float]:
+    """Mínimo, media y máximo de una lista"""
+    if not valores:
+        return {'min': 0.0, 'media': 0.0, 'max': 0.0}
+    return {'min': round(min(valores), 2), 'media': round(statistics.mean(valores), 2),
+            'max': round(max(valores), 2)}
+
+
+# ---------------------------------------------------------------------------
+# Componentes (cada uno en su proceso o como hilos con --en-proceso)
+# ---------------------------------------------------------------------------
+
+def ejecutar_video(config_path: str, detener: threading.Event):
+    """Servidor de video hasta que se pida detener"""
+    from src.servidor_video.servidor_video import ServidorVideo
+
+    servidor = ServidorVideo(config_path)
+    servidor.iniciar_capturas()
+    servidor.iniciar_servidor()
+    detener.wait()
+    servidor.detener()
+
+
+def ejecutar_testeo(config_path: str, detener: threading.Event):
+    """Servidor de testeo hasta que se pida detener"""
+    from src.servidor_testeo.servidor_testeo import ServidorTesteo
+
+    servidor = ServidorTesteo(config_path)
+    hilo = threading.Thread(target=servidor.ejecutar, daemon=True)
+    hilo.start()
+    detener.wait()
+    servidor.detener()
+    hilo.join(timeout=5)
+
+
+def ejecutar_vigilantes(config_path: str, detener: threading.Event, cantidad: int,
+                        desde: float, hasta: float) -> Dict:
+    """
+    Vigilantes sin interfaz (suscriptores asyncio): cada uno mide la latencia de las
+    alertas recibidas dentro de la ventana [desde, hasta] (epoch).
+    """
+    config_cliente = ConfigLoader.cargar_config(config_path)['cliente_vigilante']
+    histograma = HistogramaLatencia()
+    recibidas = [0] * cantidad
+
+    def al_recibir(indice: int):
+        def registrar(deteccion, traza):
+            if traza is not None and desde <= time.time() <= hasta:
+                histograma.agregar(traza.edad_ms())
+                recibidas[indice] += 1
+        return registrar
+
+    grupo = GrupoSuscriptores(cantidad, config_cliente['servidor_testeo_host'],
+                              config_cliente['servidor_testeo_puerto'], reconectar_s=0.5)
+    for indice, suscriptor in enumerate(grupo.suscriptores):
+        suscriptor.al_recibir = al_recibir(indice)
+
+    async def principal():
+        # El Event de asyncio no se puede esperar desde otro hilo: se consulta
+        detener_async = asyncio.Event()
+        tarea = asyncio.ensure_future(grupo.ejecutar(detener_async))
+        while not detener.is_set():
+            await asyncio.sleep(0.1)
+        detener_async.set()
+        await tarea
+
+    asyncio.run(principal())
+    return {'latencia_alerta_ms': histograma.resumen(), 'recibidas': recibidas}
+
+
+def ejecutar_rol(args):
+    """Punto de entrada de un componente lanzado como subproceso"""
+    config = ConfigLoader.cargar_config(args.config)
+    Registro.configurar(config, args.rol)
+
+    detener = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: detener.set())
+    signal.signal(signal.SIGINT, lambda *_: detener.set())
+
+    if args.rol == 'video':
+        ejecutar_video(args.config, detener)
+    elif args.rol == 'testeo':
+        ejecutar_testeo(args.config, detener)
+    else:
+        resultado = ejecutar_vigilantes(args.config, detener, args.vigilantes, args.desde, args.hasta)
+        with open(args.salida_rol, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f)
+
+
+# ---------------------------------------------------------------------------
+# Orquestación
+# ---------------------------------------------------------------------------
+
+def lanzar(rol: str, config_path: str, args, *extra: str) -> subprocess.Popen:
+    """Lanza un componente como subproceso"""
+    comando = [sys.executable, os.path.abspath(__file__), '--rol', rol, '--config', config_path, *extra]
+    return subprocess.Popen(comando, cwd=PROYECTO_ROOT)
+
+
+def ejecutar_benchmark(args) -> Dict:
+    """Ejecuta el sistema completo y devuelve los resultados medidos"""
+    base = ConfigLoader.cargar_config(os.path.join(PROYECTO_ROOT, 'config', 'config.json'))
+    directorio = tempfile.mkdtemp(prefix='pc4_e2e_')
+    config_path = crear_config(base, directorio, args)
+    config = ConfigLoader.cargar_config(config_path)
+
+    inicio = time.time() + args.calentamiento
+    fin = inicio + args.segundos
+    salida_vigilantes = os.path.join(directorio, 'vigilantes.json')
+
+    detener = threading.Event()
+    procesos: Dict[str, int] = {}
+    hijos: List[subprocess.Popen] = []
+
+    if args.en_proceso:
+        Registro.configurar(config, 'bench')
+        resultado_vigilantes = {}
+        hilos = [
+            threading.Thread(target=ejecutar_video, args=(config_path, detener)),
+            threading.Thread(target=ejecutar_testeo, args=(config_path, detener)),
+            threading.Thread(target=lambda: resultado_vigilantes.update(
+                ejecutar_vigilantes(config_path, detener, args.vigilantes, inicio, fin)))
+        ]
+        hilos[0].start()
+        # El servidor de testeo se conecta al de video al arrancar
+        esperar_puerto(config['servidor_video']['puerto'])
+        hilos[1].start()
+        hilos[2].start()
+        procesos['bench'] = os.getpid()
+    else:
+        hijos.append(lanzar('video', config_path, args))
+        esperar_puerto(config['servidor_video']['puerto'])
+        hijos.append(lanzar('testeo', config_path, args))
+        hijos.append(lanzar('vigilantes', config_path, args, '--vigilantes', str(args.vigilantes),
+                            '--desde', str(inicio), '--hasta', str(fin),
+                            '--salida-rol', salida_vigilantes))
+        procesos = {'video': hijos[0].pid, 'testeo': hijos[1].pid, 'vigilantes': hijos[2].pid}
+
+    puerto_video = config['servidor_video']['metricas_puerto']
+    puerto_testeo = config['servidor_testeo']['metricas_puerto']
+
+    try:
+        time.sleep(max(0.0, inicio - time.time()))
+        video_inicio, testeo_inicio = leer_metricas(puerto_video), leer_metricas(puerto_testeo)
+        uso_inicio = {nombre: ProcesoUtils.uso(pid) for nombre, pid in procesos.items()}
+        t0 = time.monotonic()
+
+        time.sleep(max(0.0, fin - time.time()))
+        video_fin, testeo_fin = leer_metricas(puerto_video), leer_metricas(puerto_testeo)
+        uso_fin = {nombre: ProcesoUtils.uso(pid) for nombre, pid in procesos.items()}
+        ventana = time.monotonic() - t0
+
+    finally:
+        detener.set()
+        for hijo in hijos:
+            hijo.send_signal(signal.SIGTERM)
+        for hijo in hijos:
+            try:
+                hijo.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                hijo.kill()
+        if args.en_proceso:
+            for hilo in hilos:
+                hilo.join(timeout=15)
+
+    if not args.en_proceso:
+        resultado_vigilantes = {}
+        if os.path.exists(salida_vigilantes):
+            with open(salida_vigilantes, 'r', encoding='utf-8') as f:
+                resultado_vigilantes = json.load(f)
+
+    # fps por cámara en la ventana
+    capturados = diferencia(video_inicio, video_fin, 'pc4_video_frames_capturados_total', 'camara')
+    enviados = diferencia(video_inicio, video_fin, 'pc4_video_frames_enviados_total', 'camara')
+    recibidos = diferencia(testeo_inicio, testeo_fin, 'pc4_testeo_frames_recibidos_total', 'camara')
+    procesados = diferencia(testeo_inicio, testeo_fin, 'pc4_testeo_frames_procesados_total', 'camara')
+    camaras = sorted(capturados, key=lambda c: int(c) if c.isdigit() else 0)
+    por_camara = {
+        camara: {
+            'capturados': round(capturados.get(camara, 0) / ventana, 2),
+            'enviados': round(enviados.get(camara, 0) / ventana, 2),
+            'recibidos': round(recibidos.get(camara, 0) / ventana, 2),
+            'procesados': round(procesados.get(camara, 0) / ventana, 2)
+        }
+        for camara in camaras
+    }
+
+    # Descartes por etapa en la ventana
+    omitidos = diferencia(video_inicio, video_fin, 'pc4_video_frames_omitidos_total', 'motivo')
+    descartados = diferencia(testeo_inicio, testeo_fin, 'pc4_testeo_frames_descartados_total', 'motivo')
+    detecciones = sum(diferencia(testeo_inicio, testeo_fin, 'pc4_testeo_detecciones_total', 'camara').values())
+    alertas = sum(resultado_vigilantes.get('recibidas', []))
+    descartes = {f"video_{motivo}": int(valor) for motivo, valor in omitidos.items()}
+    descartes.update({f"testeo_{motivo}": int(valor) for motivo, valor in descartados.items()})
+    descartes['alertas_no_recibidas'] = max(0, int(detecciones) * args.vigilantes - alertas)
+
+    uso = {}
+    for nombre in procesos:
+        if uso_inicio.get(nombre) and uso_fin.get(nombre):
+            uso[nombre] = {
+                'cpu_pct': round(100 * (uso_fin[nombre]['cpu_s'] - uso_inicio[nombre]['cpu_s']) / ventana, 1),
+                'rss_mb': round(uso_fin[nombre]['rss_mb'], 1),
+                'rss_max_mb': round(uso_fin[nombre]['rss_max_mb'], 1)
+            }
+
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit_actual(),
+        'parametros': {
+            'camaras': args.camaras, 'fps': args.fps, 'resolucion': f"{args.ancho}x{args.alto}",
+            'vigilantes': args.vigilantes, 'detector': args.detector,
+            'inferencia_ms': args.inferencia_ms, 'inferencia_desv': args.inferencia_desv,
+            'distribucion': args.distribucion, 'semilla': args.semilla, 'transporte': args.transporte,
+            'segundos': args.segundos, 'en_proceso': args.en_proceso
+        },
+        'ventana_s': round(ventana, 2),
+        'fps': {
+            etapa: resumir([valores[etapa] for valores in por_camara.values()])
+            for etapa in ('capturados', 'enviados', 'recibidos', 'procesados')
+        },
+        'latencia_alerta_ms': resultado_vigilantes.get('latencia_alerta_ms', HistogramaLatencia().resumen()),
+        'alertas': {'detecciones': int(detecciones), 'recibidas_por_vigilante':
+                    resultado_vigilantes.get('recibidas', [])},
+        'descartes': descartes,
+        'procesos': uso,
+        'por_camara': por_camara
+    }
+
+
+def commit_actual() -> Optional[str]:
+    """Commit de git del árbol medido (si está disponible)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROYECTO_ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def obtener(resultados: Dict, ruta: Tuple[str, ...]) -> Optional[float]:
+    """Valor anidado de los resultados (None si falta)"""
+    valor = resultados
+    for clave in ruta:
+        if not isinstance(valor, dict) or clave not in valor:
+            return None
+        valor = valor[clave]
+    return valor
+
+
+def comparar(resultados: Dict, anterior: Dict, tolerancia: float) -> List[str]:
+    """
+    Compara las métricas principales con una ejecución anterior.
+
+    Returns:
+        Lista de regresiones (vacía si todo está bien)
+    """
+    regresiones = []
+    for ruta, mas_es_mejor in COMPARADAS:
+        actual, previo = obtener(resultados, ruta), obtener(anterior, ruta)
+        if actual is None or not previo:
+            continue
+
+        cambio = (actual - previo) / previo
+        print(f"  {'.'.join(ruta):<32} {previo:>10.1f} -> {actual:>10.1f} ({100 * cambio:+.1f}%)")
+        if (cambio < -tolerancia) if mas_es_mejor else (cambio > tolerancia):
+            regresiones.append(f"{'.'.join(ruta)}: {previo:.1f} -> {actual:.1f}")
+    return regresiones
+
+
+def imprimir(resultados: Dict):
+    """Resumen legible de los resultados"""
+    p = resultados['parametros']
+    print(f"\n{p['camaras']} cámaras {p['resolucion']} a {p['fps']} fps, {p['vigilantes']} vigilantes, "
+          f"detector {p['detector']}, ventana {resultados['ventana_s']} s")
+
+    print(f"\n{'fps por cámara':<20}{'min':>10}{'media':>10}{'max':>10}")
+    for etapa, valores in resultados['fps'].items():
+        print(f"  {etapa:<18}{valores['min']:>10.1f}{valores['media']:>10.1f}{valores['max']:>10.1f}")
+
+    latencia = resultados['latencia_alerta_ms']
+    print(f"\nLatencia de alerta (n={latencia['n']}): p50 {latencia['p50']:.1f} ms | "
+          f"p95 {latencia['p95']:.1f} ms | p99 {latencia['p99']:.1f} ms | max {latencia['max']:.1f} ms")
+
+    print("\nDescartes en la ventana:")
+    for etapa, cantidad in resultados['descartes'].items():
+        print(f"  {etapa:<28}{cantidad:>8}")
+
+    print(f"\n{'proceso':<14}{'CPU %':>10}{'RSS MB':>10}{'RSS máx':>10}")
+    for nombre, uso in resultados['procesos'].items():
+        print(f"  {nombre:<12}{uso['cpu_pct']:>10.1f}{uso['rss_mb']:>10.1f}{uso['rss_max_mb']:>10.1f}")
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Benchmark de extremo a extremo del sistema")
+    parser.add_argument('--camaras', type=int, default=4)
+    parser.add_argument('--fps', type=float, default=15)
+    parser.add_argument('--ancho', type=int, default=1280)
+    parser.add_argument('--alto', type=int, default=720)
+    parser.add_argument('--vigilantes', type=int, default=2)
+    parser.add_argument('--detector', choices=['simulado', 'yolo'], default='simulado')
+    parser.add_argument('--inferencia-ms', type=float, default=20,
+                        help="Latencia media de la inferencia del detector simulado")
+    parser.add_argument('--inferencia-desv', type=float, default=0,
+                        help="Desviación de la latencia del detector simulado")
+    parser.add_argument('--distribucion', choices=['fija', 'uniforme', 'normal', 'lognormal'],
+                        default='fija')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--transporte', choices=['tcp', 'auto'], default='tcp')
+    parser.add_argument('--segundos', type=float, default=20, help="Duración de la ventana medida")
+    parser.add_argument('--calentamiento', type=float, default=5)
+    parser.add_argument('--en-proceso', action='store_true',
+                        help="Todos los componentes como hilos de este proceso")
+    parser.add_argument('--salida', help="Archivo JSON de resultados (por defecto benchmarks/resultados/)")
+    parser.add_argument('--comparar', help="Resultados anteriores con los que comparar")
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help="Regresión relativa permitida al comparar")
+    parser.add_argument('--guardar-base', action='store_true',
+                        help="Guarda los resultados como nueva línea base")
+
+    # Uso interno: componente lanzado como subproceso
+    parser.add_argument('--rol', choices=['video', 'testeo', 'vigilantes'], help=argparse.SUPPRESS)
+    parser.add_argument('--config', help=argparse.SUPPRESS)
+    parser.add_argument('--desde', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--hasta', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--salida-rol', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.rol:
+        ejecutar_rol(args)
+        return
+
+    print("=" * 60)
+    print("BENCHMARK DE EXTREMO A EXTREMO")
+    print("=" * 60)
+
+    resultados = ejecutar_benchmark(args)
+    imprimir(resultados)
+
+    os.makedirs(RUTA_RESULTADOS, exist_ok=True)
+    salida = args.salida or os.path.join(
+        RUTA_RESULTADOS, f"e2e_{resultados['commit'] or 'local'}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+    if args.guardar_base:
+        with open(RUTA_BASE, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en {RUTA_BASE}")
+
+    referencia = args.comparar or (RUTA_BASE if os.path.exists(RUTA_BASE) and not args.guardar_base else None)
+    if referencia:
+        with open(referencia, 'r', encoding='utf-8') as f:
+            anterior = json.load(f)
+        print(f"\nComparación con {referencia} (commit {anterior.get('commit')}):")
+        regresiones = comparar(resultados, anterior, args.tolerancia)
+        if regresiones:
+            print("\nREGRESIONES:")
+            for regresion in regresiones:
+                print(f"  - {regresion}")
+            sys.exit(1)
+        print("\nOK: sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Benchmark de tiempo de arranque (importación) de los puntos de entrada.
+
+Para cada punto de entrada ejecuta un intérprete nuevo con `python -X importtime`,
+suma el tiempo acumulado de importación y verifica que no se carguen módulos
+pesados que ese camino no necesita (cv2, torch, ultralytics...).
+
+Falla (código de salida 1) si:
+- Un punto de entrada importa un módulo prohibido
+- El tiempo supera el presupuesto absoluto del punto de entrada
+- El tiempo supera la línea base versionada (benchmarks/importacion_base.json)
+  más la tolerancia; se regenera con --guardar-base al aceptar un cambio
+
+La línea base guarda también lo que tarda una importación de referencia de la
+biblioteca estándar en la misma máquina; al comparar, los tiempos de la base se
+escalan por la referencia medida ahora, así la base sirve en máquinas más
+lentas o más rápidas que la que la generó. Los presupuestos absolutos están
+pensados para una máquina en la que la referencia tarda REFERENCIA_PRESUPUESTOS_MS
+y se amplían en proporción en máquinas más lentas (nunca se achican). Las
+repeticiones se intercalan entre todos los puntos de entrada y la referencia,
+para que una racha de carga de la máquina afecte a todos por igual.
+
+Uso:
+    python3 benchmarks/bench_importacion.py
+    python3 benchmarks/bench_importacion.py --guardar-base
+    python3 benchmarks/bench_importacion.py --repeticiones 10 --tolerancia 0.3
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+PROYECTO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RUTA_BASE = os.path.join(PROYECTO_ROOT, 'benchmarks', 'importacion_base.json')
+
+# Módulos que ningún punto de entrada debe cargar al importarse
+PESADOS = {'cv2', 'torch', 'ultralytics', 'torchvision'}
+
+# Además, los caminos de protocolo y cliente no deben cargar numpy ni Pillow
+LIVIANOS = PESADOS | {'numpy', 'PIL'}
+
+# Importación de referencia (solo biblioteca estándar) para escalar la línea base
+REFERENCIA = 'import asyncio, email.parser, http.client, json, logging'
+
+# Tiempo de la referencia en la máquina para la que se fijaron los presupuestos
+REFERENCIA_PRESUPUESTOS_MS = 60.0
+
+# nombre: (sentencia a importar, módulos prohibidos, presupuesto en ms)
+PUNTOS_ENTRADA: Dict[str, Tuple[str, Set[str], float]] = {
+    'protocolo': ('import src.common.protocolo', LIVIANOS, 60.0),
+    'common': ('import src.common', LIVIANOS, 80.0),
+    'test_cliente_simple': ('import test_cliente_simple', LIVIANOS, 60.0),
+    'cliente_vigilante': ('import src.cliente_vigilante.cliente_vigilante', LIVIANOS, 250.0),
+    'servidor_video': ('import src.servidor_video.servidor_video', PESADOS, 120.0),
+    'servidor_testeo': ('import src.servidor_testeo.servidor_testeo', PESADOS, 120.0),
+    'servidor_entrenamiento': ('import src.servidor_entrenamiento.servidor_entrenamiento', PESADOS, 120.0),
+}
+
+
+def medir_importacion(sentencia: str, excluir: Set[str] = frozenset()) -> Tuple[float, Set[str]]:
+    """
+    Ejecuta una importación en un intérprete limpio con -X importtime.
+
+    Args:
+        sentencia: Código Python a ejecutar (normalmente un import)
+        excluir: Módulos de primer nivel que no se suman (arranque del intérprete)
+
+    Returns:
+        (tiempo acumulado en ms de los módulos de primer nivel, módulos importados)
+    """
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', sentencia],
+        cwd=PROYECTO_ROOT,
+        capture_output=True,
+        text=True
+    )
+
+    if resultado.returncode != 0:
+        raise RuntimeError(f"Falló '{sentencia}':\n{resultado.stderr[-2000:]}")
+
+    total_us = 0
+    modulos = set()
+
+    for linea in resultado.stderr.splitlines():
+        # Formato: "import time:   self [us] | cumulative | imported package"
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+
+        partes = linea[len('import time:'):].split('|')
+        if len(partes) != 3:
+            continue
+
+        acumulado = int(partes[1].strip())
+        nombre_crudo = partes[2].rstrip()
+        nombre = nombre_crudo.strip()
+        modulos.add(nombre.split('.')[0])
+
+        # Solo los módulos sin sangría adicional son de primer nivel
+        if len(nombre_crudo) - len(nombre_crudo.lstrip()) == 1 and nombre not in excluir:
+            total_us += acumulado
+
+    return total_us / 1000.0, modulos
+
+
+def ejecutar_benchmark(repeticiones: int) -> Tuple[Dict[str, Dict], float]:
+    """
+    Mide todos los puntos de entrada.
+
+    Args:
+        repeticiones: Número de mediciones por punto de entrada (se toma el mínimo)
+
+    Returns:
+        ({punto_entrada: {ms, prohibidos, presupuesto_ms}}, ms de la referencia)
+    """
+    # Lo que el intérprete importa al arrancar no es atribuible al punto de entrada
+    _, arranque = medir_importacion('pass')
+
+    # Una ronda mide la referencia y cada punto de entrada una vez
+    tiempos = {nombre: [] for nombre in PUNTOS_ENTRADA}
+    tiempos_referencia = []
+    modulos = {}
+    for _ in range(repeticiones):
+        tiempos_referencia.append(medir_importacion(REFERENCIA, arranque)[0])
+        for nombre, (sentencia, _, _) in PUNTOS_ENTRADA.items():
+            ms, modulos[nombre] = medir_importacion(sentencia, arranque)
+            tiempos[nombre].append(ms)
+
+    resultados = {}
+    for nombre, (_, prohibidos, presupuesto) in PUNTOS_ENTRADA.items():
+        resultados[nombre] = {
+            'ms': round(min(tiempos[nombre]), 2),
+            'prohibidos': sorted(modulos[nombre] & prohibidos),
+            'presupuesto_ms': presupuesto
+        }
+
+    return resultados, min(tiempos_referencia)
+
+
+def evaluar(resultados: Dict[str, Dict], base: Dict[str, float],
+            tolerancia: float, escala: float = 1.0) -> List[str]:
+    """
+    Compara los resultados con presupuestos y línea base.
+
+    Args:
+        resultados: Resultados de ejecutar_benchmark
+        base: Línea base {punto_entrada: ms}, ya escalada a esta máquina
+        tolerancia: Regresión relativa permitida sobre la línea base
+        escala: Referencia medida / REFERENCIA_PRESUPUESTOS_MS (>1 en una
+                máquina más lenta); amplía los presupuestos absolutos
+
+    Returns:
+        Lista de fallos (vacía si todo está bien)
+    """
+    fallos = []
+
+    for nombre, r in resultados.items():
+        if r['prohibidos']:
+            fallos.append(f"{nombre}: importa módulos pesados {r['prohibidos']}")
+
+        presupuesto = r['presupuesto_ms'] * max(1.0, escala)
+        if r['ms'] > presupuesto:
+            fallos.append(f"{nombre}: {r['ms']:.1f} ms supera el presupuesto de {presupuesto:.0f} ms")
+
+        # Margen absoluto de 5 ms para no fallar por ruido en entradas muy rápidas
+        if nombre in base and r['ms'] > base[nombre] * (1 + tolerancia) + 5.0:
+            fallos.append(f"{nombre}: {r['ms']:.1f} ms vs línea base {base[nombre]:.1f} ms")
+
+    return fallos
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Benchmark de arranque por punto de entrada")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help="Regresión relativa permitida sobre la línea base")
+    parser.add_argument('--guardar-base', action='store_true',
+                        help="Guarda los tiempos medidos como nueva línea base")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("BENCHMARK DE ARRANQUE (-X importtime)")
+    print("=" * 60)
+
+    resultados, referencia = ejecutar_benchmark(args.repeticiones)
+
+    base = {}
+    if args.guardar_base:
+        pass  # La base nueva reemplaza a la anterior: solo se controlan los presupuestos
+    elif os.path.exists(RUTA_BASE):
+        with open(RUTA_BASE, 'r', encoding='utf-8') as f:
+            guardada = json.load(f)
+        escala = referencia / guardada['referencia_ms']
+        base = {nombre: ms * escala for nombre, ms in guardada['puntos_entrada'].items()}
+        print(f"  {'(referencia)':<24} {referencia:>8.1f} ms (base {guardada['referencia_ms']:.1f} ms, "
+              f"escala {escala:.2f})")
+    else:
+        print(f"Sin línea base en {RUTA_BASE}: generarla con --guardar-base")
+        sys.exit(1)
+
+    for nombre, r in resultados.items():
+        comparacion = f" (base {base[nombre]:.1f} ms)" if nombre in base else ""
+        print(f"  {nombre:<24} {r['ms']:>8.1f} ms{comparacion}")
+
+    if args.guardar_base:
+        with open(RUTA_BASE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'referencia': REFERENCIA,
+                'referencia_ms': round(referencia, 2),
+                'puntos_entrada': {n: r['ms'] for n, r in resultados.items()}
+            }, f, indent=2)
+        print(f"\nLínea base guardada en {RUTA_BASE}")
+
+    fallos = evaluar(resultados, base, args.tolerancia, referencia / REFERENCIA_PRESUPUESTOS_MS)
+
+    if fallos:
+        print("\nREGRESIONES:")
+        for fallo in fallos:
+            print(f"  - {fallo}")
+        sys.exit(1)
+
+    print("\nOK: sin regresiones de arranque")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Benchmark del transporte de frames: TCP (JPEG + base64 + JSON) vs memoria compartida.
+
+Para cada transporte envía N frames de forma secuencial (un frame en vuelo) y
+mide, por frame, la latencia desde que el productor toma el frame hasta que el
+consumidor tiene el ndarray BGR listo, y el tiempo de CPU del proceso.
+
+- TCP: frame_a_base64 -> crear_frame -> serializar -> loopback TCP ->
+       recibir_mensaje -> base64_a_frame
+- SHM: AnilloFrames.escribir -> aviso FRAME_SHM por socket Unix ->
+       recibir_mensaje -> AnilloFrames.leer
+
+Uso:
+    python3 benchmarks/bench_memoria_compartida.py
+    python3 benchmarks/bench_memoria_compartida.py --frames 500 --ancho 1280 --alto 720
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import cv2
+
+from src.common.protocolo import Protocolo, MensajeFactory
+from src.common.utils import ImageUtils
+from src.common.memoria_compartida import AnilloFrames
+
+# Frames iniciales que no se miden (page faults del anillo, cachés de cv2)
+CALENTAMIENTO = 20
+
+
+def generar_frames(cantidad: int, ancho: int, alto: int) -> List[np.ndarray]:
+    """Genera frames sintéticos con algo de estructura (comprimen como video real)"""
+    base = np.zeros((alto, ancho, 3), dtype=np.uint8)
+    base[:, :, 0] = np.linspace(0, 255, ancho, dtype=np.uint8)[None, :]
+    base[:, :, 1] = np.linspace(0, 255, alto, dtype=np.uint8)[:, None]
+
+    frames = []
+    for i in range(cantidad):
+        frame = base.copy()
+        x = (i * 7) % max(1, ancho - 80)
+        cv2.rectangle(frame, (x, alto // 3), (x + 80, alto // 3 + 80), (0, 0, 255), -1)
+        cv2.circle(frame, (ancho // 2, (i * 5) % alto), 30, (255, 255, 255), -1)
+        frames.append(frame)
+    return frames
+
+
+def resumir(latencias: List[float], cpu: float, cantidad: int) -> Dict[str, float]:
+    """Resume latencias (s) y CPU (s) en milisegundos por frame"""
+    ordenadas = sorted(latencias[CALENTAMIENTO:])
+    return {
+        'latencia_media_ms': statistics.mean(ordenadas) * 1000,
+        'latencia_p50_ms': ordenadas[len(ordenadas) // 2] * 1000,
+        'latencia_p95_ms': ordenadas[int(len(ordenadas) * 0.95) - 1] * 1000,
+        'cpu_por_frame_ms': cpu / (cantidad - CALENTAMIENTO) * 1000
+    }
+
+
+def medir_tcp(frames: List[np.ndarray], calidad: int) -> Dict[str, float]:
+    """Transporte actual: JPEG + base64 + JSON sobre TCP loopback"""
+    servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    servidor.bind(('127.0.0.1', 0))
+    servidor.listen(1)
+
+    productor = socket.create_connection(servidor.getsockname())
+    consumidor, _ = servidor.accept()
+
+    latencias = []
+    cpu_inicio = time.process_time()
+
+    for i, frame in enumerate(frames):
+        if i == CALENTAMIENTO:
+            cpu_inicio = time.process_time()
+        inicio = time.perf_counter()
+
+        frame_base64 = ImageUtils.frame_a_base64(frame, calidad)
+        mensaje = MensajeFactory.crear_frame(1, frame_base64, '', time.time())
+        productor.sendall(Protocolo.serializar(mensaje))
+
+        recibido = Protocolo.recibir_mensaje(consumidor)
+        resultado = ImageUtils.base64_a_frame(recibido['datos']['frame_data'])
+
+        latencias.append(time.perf_counter() - inicio)
+        assert resultado is not None
+
+    cpu = time.process_time() - cpu_inicio
+
+    for s in (productor, consumidor, servidor):
+        s.close()
+
+    return resumir(latencias, cpu, len(frames))
+
+
+def medir_shm(frames: List[np.ndarray]) -> Dict[str, float]:
+    """Transporte local: anillo de memoria compartida + aviso por socket Unix"""
+    ruta = os.path.join(tempfile.mkdtemp(), 'bench_shm.sock')
+
+    servidor = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    servidor.bind(ruta)
+    servidor.listen(1)
+
+    productor = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    productor.connect(ruta)
+    consumidor, _ = servidor.accept()
+
+    anillo = AnilloFrames.crear(16, frames[0].nbytes)
+    lector = AnilloFrames.abrir(anillo.nombre)
+
+    latencias = []
+    cpu_inicio = time.process_time()
+
+    for i, frame in enumerate(frames):
+        if i == CALENTAMIENTO:
+            cpu_inicio = time.process_time()
+        inicio = time.perf_counter()
+
+        slot, seq = anillo.escribir(1, frame, time.time())
+        aviso = MensajeFactory.crear_frame_shm(1, slot, seq, '', time.time())
+        productor.sendall(Protocolo.serializar(aviso))
+
+        recibido = Protocolo.recibir_mensaje(consumidor)
+        resultado = lector.leer(recibido['datos']['slot'], recibido['datos']['seq'])
+
+        latencias.append(time.perf_counter() - inicio)
+        assert resultado is not None
+
+    cpu = time.process_time() - cpu_inicio
+
+    lector.cerrar()
+    anillo.cerrar()
+    for s in (productor, consumidor, servidor):
+        s.close()
+    os.unlink(ruta)
+
+    return resumir(latencias, cpu, len(frames))
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Benchmark TCP vs memoria compartida")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--ancho', type=int, default=640)
+    parser.add_argument('--alto', type=int, default=480)
+    parser.add_argument('--calidad', type=int, default=90)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"TRANSPORTE DE FRAMES: {args.frames} frames {args.ancho}x{args.alto}")
+    print("=" * 60)
+
+    frames = generar_frames(args.frames + CALENTAMIENTO, args.ancho, args.alto)
+
+    tcp = medir_tcp(frames, args.calidad)
+    shm = medir_shm(frames)
+
+    print(f"\n{'':<22}{'TCP':>12}{'SHM':>12}")
+    for clave in tcp:
+        print(f"{clave:<22}{tcp[clave]:>12.3f}{shm[clave]:>12.3f}")
+
+    print(f"\nLatencia ahorrada por frame: {tcp['latencia_media_ms'] - shm['latencia_media_ms']:.2f} ms")
+    print(f"CPU ahorrada por frame:      {tcp['cpu_por_frame_ms'] - shm['cpu_por_frame_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
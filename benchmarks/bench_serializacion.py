@@ -0,0 +1,201 @@
+"""
+Benchmark de serialización de mensajes que no son frames: JSON vs compacta.
+
+Compara, para mezclas típicas de mensajes, los bytes en el cable y el tiempo
+de serializar + deserializar cada mensaje con:
+- json:    Protocolo.crear_mensaje (timestamp ISO) + JSON
+- struct:  formato compacto, datos genéricos en JSON compacto y detecciones
+           con esquema fijo (solo biblioteca estándar)
+- msgpack: formato compacto, datos genéricos en msgpack (si está instalado)
+
+Mezclas:
+- vigilante: historial GET_DETECTIONS, notificaciones DETECTION, ACK, PING/PONG
+- control:   avisos FRAME_SHM, FRAME_CREDIT, RATE_CONTROL y TESTEO_STATUS
+             entre el servidor de video y el de testeo
+
+Con --compresion mide además el historial GET_DETECTIONS enviado en
+streaming (Protocolo.enviar_stream) con cada algoritmo de compresión
+disponible: bytes en el cable, tiempo y tamaño del mayor fragmento en memoria.
+
+Uso:
+    python3 benchmarks/bench_serializacion.py
+    python3 benchmarks/bench_serializacion.py --repeticiones 50 --limite 500
+    python3 benchmarks/bench_serializacion.py --compresion --limite 5000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.common.protocolo import Protocolo, TipoMensaje, MensajeFactory
+from src.common.codificacion import CodificacionCompacta
+from src.common.compresion import Compresion
+
+Mensaje = Tuple[str, Dict]
+
+
+def generar_registros(cantidad: int) -> List[Dict]:
+    """Registros de detección con la forma de logs/detecciones.json"""
+    clases = ['persona', 'carro', 'perro', 'bicicleta']
+    inicio = datetime(2024, 5, 10, 14, 0, 0)
+    registros = []
+    for i in range(cantidad):
+        instante = inicio + timedelta(seconds=3 * i, microseconds=1234 * i)
+        registros.append({
+            'id': 50 * i,
+            'camera_id': 1 + i % 3,
+            'objeto': clases[i % len(clases)],
+            'confianza': 0.5 + (i % 50) / 128,  # Valores exactos en float32 como los del modelo
+            'bbox': [12 + i % 100, 40, 310 + i % 50, 460],
+            'imagen_path': f"detecciones/camara_{1 + i % 3}/deteccion_{instante:%Y%m%d_%H%M%S}_{i:03d}.jpg",
+            'timestamp': instante.isoformat(),
+            'fecha': instante.strftime("%Y-%m-%d"),
+            'hora': instante.strftime("%H:%M:%S")
+        })
+    return registros
+
+
+def mezcla_vigilante(limite: int) -> List[Mensaje]:
+    """Sesión típica de un cliente vigilante"""
+    registros = generar_registros(limite)
+    mensajes = [(TipoMensaje.ACK, {'detecciones': registros, 'total': len(registros)})]
+    mensajes += [(TipoMensaje.DETECTION, registro) for registro in registros[:20]]
+    mensajes += [(TipoMensaje.ACK, {'status': 'ok'})] * 5
+    mensajes += [(TipoMensaje.PING, {}), (TipoMensaje.PONG, {})] * 5
+    return mensajes
+
+
+def mezcla_control() -> List[Mensaje]:
+    """Diez segundos de control entre video y testeo (3 cámaras a 10 fps)"""
+    mensajes = []
+    for i in range(300):
+        camera_id = 1 + i % 3
+        aviso = MensajeFactory.crear_frame_shm(camera_id, i % 16, i + 1,
+                                               datetime.now().isoformat(), time.time())
+        mensajes.append((TipoMensaje.FRAME_SHM, aviso['datos']))
+        mensajes.append((TipoMensaje.FRAME_CREDIT, {'camaras': {str(camera_id): 1}, 'reiniciar': []}))
+
+    mensajes += [(TipoMensaje.RATE_CONTROL, {
+        'camaras': {str(c): {'fps': 7.5, 'escala': 0.75} for c in (1, 2, 3)}
+    })] * 5
+
+    estadisticas = {'recibidos': 3012, 'procesados': 2950, 'reemplazados': 40,
+                    'descartados_antiguos': 22, 'antiguos_recepcion': 20,
+                    'antiguos_inferencia': 2, 'fps_logrado': 9.8, 'retardo_cola_ms': 12.5,
+                    'retardo_cola_max_ms': 88.1, 'prioridad': 1.0, 'fps_min_analisis': 0}
+    mensajes += [(TipoMensaje.TESTEO_STATUS, {
+        'camaras': {str(c): estadisticas for c in (1, 2, 3)}, 'pendientes': 1
+    })] * 5
+    return mensajes
+
+
+def medir(mensajes: List[Mensaje], codificacion: str, repeticiones: int) -> Dict[str, float]:
+    """Bytes y tiempo por mensaje de serializar + deserializar una mezcla"""
+    total_bytes = 0
+    inicio = time.perf_counter()
+
+    for _ in range(repeticiones):
+        total_bytes = 0
+        for tipo, datos in mensajes:
+            if codificacion == 'json':
+                crudo = Protocolo.serializar(Protocolo.crear_mensaje(tipo, datos))
+                json.loads(crudo[Protocolo.HEADER_SIZE:].decode(Protocolo.ENCODING))
+            else:
+                crudo = CodificacionCompacta.serializar(tipo, datos, codificacion)
+                CodificacionCompacta.deserializar(crudo[Protocolo.HEADER_SIZE:])
+            total_bytes += len(crudo)
+
+    duracion = time.perf_counter() - inicio
+    return {
+        'bytes_totales': total_bytes,
+        'bytes_por_mensaje': total_bytes / len(mensajes),
+        'us_por_mensaje': duracion / (repeticiones * len(mensajes)) * 1e6
+    }
+
+
+def medir_historial(registros: List[Dict], codificacion: str, compresion, repeticiones: int) -> Dict[str, float]:
+    """Bytes, tiempo y mayor fragmento de un historial enviado en streaming"""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        fragmentos = list(CodificacionCompacta.serializar_stream(
+            TipoMensaje.ACK, {'total': len(registros)}, 'detecciones', registros,
+            codificacion, compresion, Protocolo.LOTE_STREAM, Protocolo.FRAGMENTO_STREAM))
+        cuerpos = iter([f[Protocolo.HEADER_SIZE:] for f in fragmentos])
+        CodificacionCompacta.deserializar(next(cuerpos), lambda: next(cuerpos))
+    duracion = time.perf_counter() - inicio
+
+    return {
+        'kb': sum(len(f) for f in fragmentos) / 1024,
+        'ms': duracion / repeticiones * 1000,
+        'fragmentos': len(fragmentos),
+        'max_kb': max(len(f) for f in fragmentos) / 1024
+    }
+
+
+def comparar_compresion(limite: int, codificaciones: List[str], repeticiones: int):
+    """Imprime la tabla del historial en streaming por codificación y compresión"""
+    registros = generar_registros(limite)
+    legado = len(Protocolo.serializar(Protocolo.crear_mensaje(
+        TipoMensaje.ACK, {'detecciones': registros, 'total': len(registros)})))
+
+    print("\n" + "=" * 60)
+    print(f"HISTORIAL EN STREAMING: {limite} registros (JSON legado: {legado / 1024:.1f} KB)")
+    print("=" * 60)
+    print(f"{'codificación':<14}{'compresión':<12}{'KB':>10}{'ms':>10}{'fragm.':>8}{'max KB':>9}{'ahorro':>9}")
+
+    for codificacion in codificaciones:
+        for compresion in [None] + Compresion.disponibles():
+            if codificacion == 'json' and compresion is None:
+                continue  # Sin sesión negociada no hay streaming
+            r = medir_historial(registros, codificacion, compresion, repeticiones)
+            ahorro = 1 - r['kb'] * 1024 / legado
+            print(f"{codificacion:<14}{compresion or '-':<12}{r['kb']:>10.1f}{r['ms']:>10.1f}"
+                  f"{r['fragmentos']:>8}{r['max_kb']:>9.1f}{ahorro:>9.0%}")
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Benchmark de serialización JSON vs compacta")
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--limite', type=int, default=100, help="Registros del historial GET_DETECTIONS")
+    parser.add_argument('--compresion', action='store_true',
+                        help="Medir también el historial en streaming con compresión")
+    args = parser.parse_args()
+
+    codificaciones = ['json'] + [c for c in CodificacionCompacta.disponibles() if c != 'json']
+    if 'msgpack' not in codificaciones:
+        print("msgpack no está instalado: se mide solo json y struct")
+
+    mezclas = {
+        'vigilante': mezcla_vigilante(args.limite),
+        'control': mezcla_control()
+    }
+
+    for nombre, mensajes in mezclas.items():
+        print("\n" + "=" * 60)
+        print(f"MEZCLA {nombre.upper()}: {len(mensajes)} mensajes x {args.repeticiones}")
+        print("=" * 60)
+
+        resultados = {c: medir(mensajes, c, args.repeticiones) for c in codificaciones}
+
+        print(f"{'':<20}" + "".join(f"{c:>12}" for c in codificaciones))
+        for clave in resultados['json']:
+            print(f"{clave:<20}" + "".join(f"{resultados[c][clave]:>12.1f}" for c in codificaciones))
+
+        for c in codificaciones[1:]:
+            ahorro = 1 - resultados[c]['bytes_totales'] / resultados['json']['bytes_totales']
+            velocidad = resultados['json']['us_por_mensaje'] / resultados[c]['us_por_mensaje']
+            print(f"{c}: {ahorro:.0%} menos bytes, {velocidad:.2f}x velocidad respecto a json")
+
+    if args.compresion:
+        comparar_compresion(args.limite, codificaciones, args.repeticiones)
+
+
+if __name__ == "__main__":
+    main()
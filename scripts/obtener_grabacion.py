@@ -0,0 +1,98 @@
+"""
+Obtiene de la grabación continua del servidor de video un frame o un clip.
+
+Envía GET_RECORDING con la cámara y el instante (epoch o fecha local ISO) y
+guarda la respuesta: un JPEG con el frame más cercano o, con --segundos, un
+MJPEG con los frames del rango (ffplay -f mjpeg clip.mjpeg).
+
+Uso:
+    python3 scripts/obtener_grabacion.py --camara 1 --instante 2025-01-01T12:00:00
+    python3 scripts/obtener_grabacion.py --camara 1 --instante 1735732800 --segundos 20
+"""
+
+import argparse
+import base64
+import os
+import sys
+import time
+from datetime import datetime
+
+# Agregar ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.common.protocolo import MensajeFactory, Protocolo, TipoMensaje
+from src.common.transporte import Transporte
+from src.common.utils import ConfigLoader
+
+
+def parsear_instante(texto: str) -> float:
+    """Epoch en segundos o fecha ISO en hora local"""
+    try:
+        return float(texto)
+    except ValueError:
+        return datetime.fromisoformat(texto).timestamp()
+
+
+def solicitar(sock, datos: dict) -> dict:
+    """Envía GET_RECORDING y espera la respuesta"""
+    Protocolo.enviar_mensaje(sock, TipoMensaje.GET_RECORDING, datos)
+    while True:
+        mensaje = Protocolo.recibir_mensaje(sock)
+        if mensaje is None:
+            raise ConnectionError("El servidor cerró la conexión")
+        if mensaje.get('tipo') == TipoMensaje.RECORDING:
+            return mensaje['datos']
+        if mensaje.get('tipo') == TipoMensaje.ERROR:
+            raise RuntimeError(mensaje['datos'].get('error'))
+
+
+def main():
+    """Función principal"""
+    config = ConfigLoader.cargar_config(os.path.join(os.path.dirname(__file__), '../config/config.json'))
+
+    parser = argparse.ArgumentParser(description="Frame o clip de la grabación continua")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=config.get('servidor_video', {}).get('puerto', 5000))
+    parser.add_argument('--camara', type=int, required=True)
+    parser.add_argument('--instante', required=True, help="Epoch o fecha local ISO (2025-01-01T12:00:00)")
+    parser.add_argument('--segundos', type=float, help="Duración del clip a partir del instante")
+    parser.add_argument('--salida', help="Archivo de salida (.jpg o .mjpeg)")
+    args = parser.parse_args()
+
+    instante = parsear_instante(args.instante)
+    if args.segundos:
+        datos = {'camera_id': args.camara, 'desde': instante, 'hasta': instante + args.segundos}
+    else:
+        datos = {'camera_id': args.camara, 'instante': instante}
+
+    sock = Transporte.conectar(args.host, args.puerto, timeout=30,
+                               opciones=Transporte.opciones(config))
+    try:
+        # Créditos vacíos: este cliente no quiere recibir los frames en vivo
+        sock.sendall(Protocolo.serializar(MensajeFactory.crear_frame_credit({})))
+        inicio = time.perf_counter()
+        respuesta = solicitar(sock, datos)
+        duracion = time.perf_counter() - inicio
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        sock.close()
+
+    contenido = base64.b64decode(respuesta['datos'])
+    extension = 'jpg' if respuesta['formato'] == 'jpeg' else 'mjpeg'
+    salida = args.salida or f"grabacion_camara{args.camara}_{int(instante)}.{extension}"
+    with open(salida, 'wb') as f:
+        f.write(contenido)
+
+    if respuesta['formato'] == 'jpeg':
+        desfase = respuesta['timestamp'] - instante
+        print(f"Frame de {datetime.fromtimestamp(respuesta['timestamp'])} ({desfase:+.3f} s) -> {salida}")
+    else:
+        print(f"{respuesta['frames']} frames de {datetime.fromtimestamp(respuesta['desde'])} "
+              f"a {datetime.fromtimestamp(respuesta['hasta'])} -> {salida}")
+    print(f"{len(contenido) / 1024:.0f} KB en {duracion * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
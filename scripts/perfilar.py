@@ -0,0 +1,87 @@
+"""
+Perfila en caliente un servidor (video, testeo o entrenamiento).
+
+Envía PROFILE para iniciar una captura por muestreo de N segundos, espera a
+que termine y muestra las funciones donde más tiempo se pasó. El archivo de
+pilas colapsadas queda en logs/ del servidor y puede abrirse con
+speedscope o flamegraph.pl:
+
+    flamegraph.pl logs/perfil_testeo_20250101_120000.txt > perfil.svg
+
+Uso:
+    python3 scripts/perfilar.py --puerto 5002 --segundos 20
+    python3 scripts/perfilar.py --host 192.168.1.10 --puerto 5000 --intervalo 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Agregar ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.common.protocolo import Protocolo, TipoMensaje
+from src.common.transporte import Transporte
+from src.common.utils import ConfigLoader
+
+
+def solicitar(sock, datos: dict) -> dict:
+    """Envía PROFILE y espera la respuesta"""
+    Protocolo.enviar_mensaje(sock, TipoMensaje.PROFILE, datos)
+    while True:
+        mensaje = Protocolo.recibir_mensaje(sock)
+        if mensaje is None:
+            raise ConnectionError("El servidor cerró la conexión")
+        if mensaje.get('tipo') == TipoMensaje.PROFILE:
+            return mensaje['datos']
+        if mensaje.get('tipo') == TipoMensaje.ERROR:
+            raise RuntimeError(mensaje['datos'].get('error'))
+        # Otros mensajes (FRAME, DETECTION) se ignoran
+
+
+def main():
+    """Función principal"""
+    config = ConfigLoader.cargar_config(os.path.join(os.path.dirname(__file__), '../config/config.json'))
+
+    parser = argparse.ArgumentParser(description="Perfilado por muestreo de un servidor")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, required=True,
+                        help="Puerto del servidor (video 5000, entrenamiento 5001, testeo 5002)")
+    parser.add_argument('--segundos', type=float, default=10.0)
+    parser.add_argument('--intervalo', type=float, help="Milisegundos entre muestras")
+    parser.add_argument('--top', type=int, default=20, help="Funciones a mostrar")
+    args = parser.parse_args()
+
+    sock = Transporte.conectar(args.host, args.puerto, timeout=10,
+                               opciones=Transporte.opciones(config))
+    try:
+        datos = {'accion': 'iniciar', 'segundos': args.segundos}
+        if args.intervalo:
+            datos['intervalo_ms'] = args.intervalo
+        estado = solicitar(sock, datos)
+        print(f"Perfilando {args.segundos:.0f} s (cada {estado['intervalo_ms']} ms)...")
+
+        try:
+            time.sleep(args.segundos)
+        except KeyboardInterrupt:
+            pass
+
+        # 'detener' espera a que el archivo esté escrito
+        solicitar(sock, {'accion': 'detener'})
+        estado = solicitar(sock, {'accion': 'estado', 'top': args.top})
+
+        print("\n" + "=" * 70)
+        print(f"PERFIL - {estado['muestras']} muestras, intervalo final {estado['intervalo_ms']} ms, "
+              f"sobrecarga {100 * estado['sobrecarga']:.2f}%")
+        print("=" * 70)
+        for funcion in estado.get('frecuentes', []):
+            print(f"{funcion['porcentaje']:6.1f}%  {funcion['muestras']:7d}  {funcion['funcion']}")
+        print(f"\nPilas colapsadas en el servidor: {estado['archivo']}")
+
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Pide a un servidor que vuelva a leer config.json y aplique los cambios.
+
+Envía CONFIG_RELOAD y muestra los cambios aplicados (cámaras agregadas,
+quitadas o reiniciadas, umbrales, colas). Sin este script los servidores
+también recargan solos al detectar que el archivo cambió (sección "recarga").
+
+Uso:
+    python3 scripts/recargar_config.py --servidor video
+    python3 scripts/recargar_config.py --servidor testeo --host 192.168.1.10
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Agregar ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.common.protocolo import Protocolo, TipoMensaje
+from src.common.transporte import Transporte
+from src.common.utils import ConfigLoader
+
+
+def solicitar(sock) -> dict:
+    """Envía CONFIG_RELOAD y espera la respuesta"""
+    Protocolo.enviar_mensaje(sock, TipoMensaje.CONFIG_RELOAD, {})
+    while True:
+        mensaje = Protocolo.recibir_mensaje(sock)
+        if mensaje is None:
+            raise ConnectionError("El servidor cerró la conexión")
+        if mensaje.get('tipo') == TipoMensaje.ACK and 'cambios' in mensaje['datos']:
+            return mensaje['datos']['cambios']
+        if mensaje.get('tipo') == TipoMensaje.ERROR:
+            raise RuntimeError(mensaje['datos'].get('error'))
+        # Otros mensajes (FRAME, DETECTION) se ignoran
+
+
+def main():
+    """Función principal"""
+    config = ConfigLoader.cargar_config(os.path.join(os.path.dirname(__file__), '../config/config.json'))
+
+    parser = argparse.ArgumentParser(description="Recarga en caliente de la configuración")
+    parser.add_argument('--servidor', choices=('video', 'testeo'), required=True)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, help="Por defecto, el de config.json")
+    args = parser.parse_args()
+
+    puerto = args.puerto or config[f'servidor_{args.servidor}']['puerto']
+    sock = Transporte.conectar(args.host, puerto, timeout=10, opciones=Transporte.opciones(config))
+    try:
+        cambios = solicitar(sock)
+    except (ConnectionError, RuntimeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        sock.close()
+
+    if cambios:
+        print(json.dumps(cambios, indent=2, ensure_ascii=False))
+    else:
+        print("Configuración recargada: sin cambios")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ Script para probar conexión a cámaras RTSP.
 
 Este script lee la configuración de cámaras del archivo config.json
 e intenta conectarse a cada una para verificar que funcionan correctamente.
+Las cámaras con fuente de archivo o sintética se prueban leyendo un frame.
 """
 
 import cv2
@@ -14,6 +15,7 @@ from pathlib import Path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from src.common.utils import ConfigLoader
+from src.servidor_video.fuentes import FuenteVideo
 
 
 def test_camera(camera_config: dict) -> bool:
@@ -28,6 +30,10 @@ def test_camera(camera_config: dict) -> bool:
     """
     camera_id = camera_config['id']
     camera_name = camera_config['nombre']
+
+    if camera_config.get('fuente', {}).get('tipo', 'rtsp') != 'rtsp':
+        return test_fuente(camera_config)
+
     rtsp_url = camera_config['rtsp_url']
 
     print(f"\n{'='*60}")
@@ -95,6 +101,44 @@ def test_camera(camera_config: dict) -> bool:
         return False
 
 
+def test_fuente(camera_config: dict) -> bool:
+    """
+    Prueba una cámara con fuente de archivo o sintética.
+
+    Args:
+        camera_config: Configuración de la cámara
+
+    Returns:
+        True si se pudo leer un frame
+    """
+    print(f"\n{'='*60}")
+    print(f"Probando Cámara {camera_config['id']}: {camera_config['nombre']}")
+    print(f"{'='*60}")
+
+    try:
+        fuente = FuenteVideo.crear(camera_config)
+        print(f"Fuente: {fuente.describir()}")
+
+        if not fuente.abrir():
+            print("❌ No se pudo abrir la fuente")
+            return False
+
+        ret, frame = fuente.leer()
+        fuente.cerrar()
+
+        if not ret or frame is None:
+            print("❌ No se pudo leer frame de la fuente")
+            return False
+
+        print("✅ Fuente funcionando correctamente")
+        print(f"  - Resolución: {frame.shape[1]}x{frame.shape[0]}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return False
+
+
 def test_webcam(camera_id: int = 0) -> bool:
     """
     Prueba la webcam local.
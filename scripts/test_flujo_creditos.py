@@ -0,0 +1,293 @@
+"""
+Prueba de extremo a extremo del control de flujo por créditos.
+
+Levanta un servidor de video real (captura desde un video sintético generado
+con OpenCV) y un servidor de testeo real cuyo detector es deliberadamente
+lento. Ejecuta dos fases, sin y con créditos, y compara:
+- frames recibidos por testeo vs. frames que llegaron a la inferencia
+- frames descartados en testeo (trabajo de red y decodificación desperdiciado)
+- edad del frame al llegar a la inferencia
+- frames omitidos en el origen por el servidor de video
+
+Falla (código de salida 1, o el test de pytest) si con créditos llegan o se
+descartan frames de más, si el detector procesa menos que sin créditos o si
+la edad máxima supera ventana - 1 inferencias.
+
+Uso:
+    python3 scripts/test_flujo_creditos.py
+    python3 -m pytest scripts/test_flujo_creditos.py
+    python3 scripts/test_flujo_creditos.py --segundos 10 --inferencia-ms 150 --transporte auto
+"""
+
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+# Agregar ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import cv2
+import numpy as np
+
+from src.common.flujo import CreditosConsumidor, CreditosProductor
+from src.common.utils import ConfigLoader
+from src.servidor_video.servidor_video import ServidorVideo
+from src.servidor_testeo.planificador import PlanificadorFrames
+from src.servidor_testeo.servidor_testeo import ServidorTesteo
+
+
+class DetectorLento:
+    """Detector que solo consume tiempo: simula una inferencia costosa"""
+
+    def __init__(self, duracion_s: float):
+        self.duracion_s = duracion_s
+        self.modelo_cargado = True
+
+    def cargar_modelo(self) -> bool:
+        return True
+
+    def detectar(self, frame):
+        time.sleep(self.duracion_s)
+        return []
+
+
+def generar_video(ruta: str, segundos: float, fps: int = 30, ancho: int = 320, alto: int = 240):
+    """Genera un video MJPEG sintético con un objeto en movimiento"""
+    escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*'MJPG'), fps, (ancho, alto))
+    for i in range(int(segundos * fps)):
+        frame = np.full((alto, ancho, 3), 40, dtype=np.uint8)
+        x = (i * 4) % (ancho - 40)
+        cv2.rectangle(frame, (x, alto // 2 - 20), (x + 40, alto // 2 + 20), (0, 200, 255), -1)
+        escritor.write(frame)
+    escritor.release()
+
+
+def crear_config(base: dict, directorio: str, video: str, transporte: str,
+                 flujo: bool, ventana: int = 2) -> str:
+    """Escribe una configuración temporal para la prueba"""
+    config = copy.deepcopy(base)
+
+    config['camaras']['lista'] = [{
+        'id': 1, 'nombre': 'Sintetica', 'rtsp_url': video, 'enabled': True, 'fps': 30
+    }]
+
+    sufijo = 'con' if flujo else 'sin'
+    config['servidor_video'].update({
+        'host': '127.0.0.1', 'puerto': 0, 'socket_unix': None,
+        'socket_shm': os.path.join(directorio, f'shm_{sufijo}.sock'),
+        'resize_width': 320, 'resize_height': 240
+    })
+    config['servidor_testeo'].update({
+        'host': '127.0.0.1', 'puerto': 0, 'socket_unix': None,
+        'transporte': transporte,
+        'log_path': os.path.join(directorio, 'detecciones.json'),
+        'control_tasa': {'habilitado': False},
+        'control_flujo': {'habilitado': flujo, 'ventana': ventana, 'reintento_s': 5}
+    })
+
+    ruta = os.path.join(directorio, f'config_{sufijo}.json')
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    return ruta
+
+
+def ejecutar_fase(config_path: str, segundos: float, inferencia_s: float) -> dict:
+    """Ejecuta video + testeo durante unos segundos y devuelve las métricas"""
+    video = ServidorVideo(config_path)
+    video.iniciar_capturas()
+    video.iniciar_servidor()
+
+    testeo = ServidorTesteo(config_path)
+    testeo.detector = DetectorLento(inferencia_s)
+    testeo.video_puerto = video.sockets_servidor[0].getsockname()[1]
+
+    # Edad de cada frame al llegar a la inferencia
+    edades = []
+    marcar_procesado = testeo.planificador.marcar_procesado
+
+    def registrar(item):
+        edades.append(testeo.planificador.edad(item))
+        marcar_procesado(item)
+
+    testeo.planificador.marcar_procesado = registrar
+
+    testeo.running = True
+    testeo.iniciar_procesadores()
+    if not testeo.conectar_servidor_video():
+        raise RuntimeError("testeo no pudo conectarse al servidor de video")
+
+    testeo.iniciar_control_flujo()
+    threading.Thread(target=testeo.recibir_frames, daemon=True).start()
+
+    time.sleep(segundos)
+
+    stats = testeo.planificador.obtener_estadisticas().get(1, {})
+    resultado = {
+        'transporte': 'shm' if testeo.anillo else 'tcp',
+        'recibidos': stats.get('recibidos', 0),
+        'procesados': stats.get('procesados', 0),
+        'descartados': stats.get('reemplazados', 0) + stats.get('descartados_antiguos', 0),
+        'omitidos_origen': video.creditos.obtener_omitidos().get(1, 0)
+                           + sum(c.frames_omitidos for c in video.capturas),
+        'edad_media_ms': statistics.mean(edades) * 1000 if edades else 0.0,
+        'edad_max_ms': max(edades) * 1000 if edades else 0.0
+    }
+
+    testeo.detener()
+    video.detener()
+    time.sleep(0.5)
+    return resultado
+
+
+def comparar(segundos: float, inferencia_ms: float, transporte: str = 'tcp',
+             ventana: int = 2) -> Tuple[Dict[str, dict], List[str]]:
+    """
+    Ejecuta las dos fases (sin y con créditos) y verifica el control de flujo.
+
+    Returns:
+        ({'sin créditos': métricas, 'con créditos': métricas}, errores)
+    """
+    base = ConfigLoader.cargar_config(os.path.join(os.path.dirname(__file__), '../config/config.json'))
+    directorio = tempfile.mkdtemp(prefix='pc4_flujo_')
+
+    video = os.path.join(directorio, 'sintetico.avi')
+    generar_video(video, segundos + 5)
+
+    resultados = {}
+    for flujo in (False, True):
+        config_path = crear_config(base, directorio, video, transporte, flujo, ventana)
+        resultados['con créditos' if flujo else 'sin créditos'] = \
+            ejecutar_fase(config_path, segundos, inferencia_ms / 1000.0)
+
+    sin, con = resultados['sin créditos'], resultados['con créditos']
+
+    # Con créditos, cada frame recibido debe llegar a la inferencia (salvo los
+    # que estaban en vuelo al terminar) y el resto se omite en el origen
+    en_vuelo = ventana + 1
+    errores = []
+    if con['procesados'] == 0:
+        errores.append("con créditos no se procesó ningún frame")
+    if con['recibidos'] - con['procesados'] > en_vuelo:
+        errores.append(f"con créditos llegaron {con['recibidos'] - con['procesados']} frames que no se procesaron")
+    if con['descartados'] > en_vuelo:
+        errores.append(f"con créditos se descartaron {con['descartados']} frames en testeo")
+    if con['omitidos_origen'] == 0:
+        errores.append("el servidor de video no omitió frames en el origen")
+
+    # Los créditos no deben frenar al detector: con ventana 1 espera la ida y
+    # vuelta de cada frame (con 200 ms de inferencia procesa ~12% menos, con
+    # 30 ms la mitad); con 2 siempre tiene el siguiente frame ya recibido
+    if con['procesados'] < 0.9 * sin['procesados']:
+        errores.append(f"con créditos se procesaron {con['procesados']} frames en lugar de {sin['procesados']}")
+
+    # Si la cámara produce más rápido que la inferencia, el frame espera en
+    # testeo a lo sumo ventana - 1 inferencias (más red y decodificación)
+    edad_limite_ms = (ventana - 1) * inferencia_ms + 100
+    if con['edad_max_ms'] > edad_limite_ms:
+        errores.append(f"con créditos la edad máxima fue {con['edad_max_ms']:.0f} ms "
+                       f"(límite {edad_limite_ms:.0f} ms)")
+
+    return resultados, errores
+
+
+def test_control_de_flujo():
+    """Punto de entrada para pytest (python3 -m pytest scripts/test_flujo_creditos.py)"""
+    _, errores = comparar(segundos=5, inferencia_ms=200)
+    assert not errores, errores
+
+
+def test_reinicio_con_frames_en_vuelo():
+    """
+    Un reinicio de ventana con frames todavía en el pipeline no debe dejar al
+    productor con más de `ventana` frames en vuelo cuando esos frames salen.
+    """
+    camera_id, ventana = 1, 2
+    cliente = 'testeo'
+    productor = CreditosProductor()
+    consumidor = CreditosConsumidor([camera_id], ventana=ventana)
+    planificador = PlanificadorFrames(max_edad_ms=60000, max_por_camara=ventana,
+                                      creditos=consumidor)
+
+    def devolver_creditos():
+        creditos, reiniciar = consumidor.esperar(timeout=0)
+        if creditos or reiniciar:
+            productor.otorgar(cliente, {'camaras': creditos, 'reiniciar': reiniciar})
+
+    def enviar_frame():
+        assert productor.consumir(cliente, camera_id)
+        planificador.agregar({'camera_id': camera_id, 'capture_ts': time.time()})
+
+    def creditos_productor() -> int:
+        return productor.creditos[cliente].get(camera_id, 0)
+
+    creditos, reiniciar = consumidor.inicial()
+    productor.otorgar(cliente, {'camaras': creditos, 'reiniciar': reiniciar})
+
+    # El detector toma un frame y el otro queda en cola: toda la ventana en el pipeline
+    enviar_frame()
+    viejos = [planificador.obtener(timeout=0)]
+    enviar_frame()
+    assert not productor.consumir(cliente, camera_id)
+
+    # La cámara se reconecta: el productor recibe la ventana completa
+    consumidor.reanudar(camera_id)
+    devolver_creditos()
+
+    # Los frames previos al reinicio salen del pipeline sin devolver crédito
+    viejos.append(planificador.obtener(timeout=0))
+    for item in viejos:
+        planificador.finalizar(item)
+    devolver_creditos()
+    assert creditos_productor() == ventana, f"el productor tiene {creditos_productor()} créditos con ventana {ventana}"
+
+    # Los frames posteriores al reinicio sí devuelven su crédito
+    enviar_frame()
+    planificador.finalizar(planificador.obtener(timeout=0))
+    devolver_creditos()
+    assert creditos_productor() == ventana, f"el productor tiene {creditos_productor()} créditos con ventana {ventana}"
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Prueba del control de flujo por créditos")
+    parser.add_argument('--segundos', type=float, default=8)
+    parser.add_argument('--inferencia-ms', type=float, default=200)
+    parser.add_argument('--transporte', choices=['tcp', 'auto'], default='tcp')
+    parser.add_argument('--ventana', type=int, default=2, help="Créditos por cámara")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"CONTROL DE FLUJO: consumidor de {args.inferencia_ms:.0f} ms/frame, cámara a 30 fps, "
+          f"ventana {args.ventana}")
+    print("=" * 60)
+
+    resultados, errores = comparar(args.segundos, args.inferencia_ms, args.transporte, args.ventana)
+    sin, con = resultados['sin créditos'], resultados['con créditos']
+
+    print(f"\n{'':<20}{'sin créditos':>15}{'con créditos':>15}")
+    for clave in sin:
+        valor_sin, valor_con = sin[clave], con[clave]
+        if isinstance(valor_sin, float):
+            print(f"{clave:<20}{valor_sin:>15.1f}{valor_con:>15.1f}")
+        else:
+            print(f"{clave:<20}{valor_sin:>15}{valor_con:>15}")
+
+    print()
+    if errores:
+        for error in errores:
+            print(f"❌ {error}")
+        sys.exit(1)
+
+    print(f"✓ Con créditos testeo recibió {con['recibidos']} frames en lugar de {sin['recibidos']}; "
+          f"{con['omitidos_origen']} se omitieron en el origen")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Muestra en vivo las latencias por etapa del servidor de testeo.
+
+Consulta periódicamente TESTEO_STATUS y muestra, por cámara, los percentiles
+p50/p95/p99 de cada etapa del pipeline (desde la captura en el servidor de
+video hasta la notificación de la alerta). 'total' es la edad del frame al
+terminar la inferencia y 'alerta' la edad de la detección al notificarla.
+
+Uso:
+    python3 scripts/ver_latencias.py
+    python3 scripts/ver_latencias.py --host 192.168.1.10 --periodo 5
+    python3 scripts/ver_latencias.py --una-vez --volcar logs/latencias.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Agregar ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.common.protocolo import Protocolo, TipoMensaje
+from src.common.transporte import Transporte
+from src.common.trazas import RegistroTrazas
+from src.common.utils import ConfigLoader
+
+
+def consultar(sock) -> dict:
+    """Pide TESTEO_STATUS y devuelve el resumen de latencias"""
+    Protocolo.enviar_mensaje(sock, TipoMensaje.TESTEO_STATUS, {})
+    while True:
+        mensaje = Protocolo.recibir_mensaje(sock)
+        if mensaje is None:
+            raise ConnectionError("El servidor de testeo cerró la conexión")
+        if mensaje.get('tipo') == TipoMensaje.TESTEO_STATUS:
+            return mensaje['datos'].get('latencias', {})
+        # Otras notificaciones (DETECTION) se ignoran
+
+
+def main():
+    """Función principal"""
+    config = ConfigLoader.cargar_config(os.path.join(os.path.dirname(__file__), '../config/config.json'))
+    config_cliente = config.get('cliente_vigilante', {})
+
+    parser = argparse.ArgumentParser(description="Latencias por etapa del servidor de testeo")
+    parser.add_argument('--host', default=config_cliente.get('servidor_testeo_host', '127.0.0.1'))
+    parser.add_argument('--puerto', type=int, default=config_cliente.get('servidor_testeo_puerto', 5002))
+    parser.add_argument('--periodo', type=float, default=2.0, help="Segundos entre consultas")
+    parser.add_argument('--una-vez', action='store_true', help="Consultar una vez y salir")
+    parser.add_argument('--volcar', help="Guardar el último resumen en este archivo JSON")
+    args = parser.parse_args()
+
+    sock = Transporte.conectar(args.host, args.puerto, timeout=10,
+                               opciones=Transporte.opciones(config))
+    latencias = {}
+    try:
+        while True:
+            latencias = consultar(sock)
+            print("\n" + "=" * 70)
+            print(f"LATENCIAS POR ETAPA - {time.strftime('%H:%M:%S')}")
+            print("=" * 70)
+            print(RegistroTrazas.formatear(latencias) if latencias else "Sin frames procesados todavía")
+
+            if args.una_vez:
+                break
+            time.sleep(args.periodo)
+
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        if args.volcar and latencias:
+            with open(args.volcar, 'w', encoding='utf-8') as f:
+                json.dump({'camaras': latencias}, f, indent=2, ensure_ascii=False)
+            print(f"\nResumen guardado en {args.volcar}")
+
+
+if __name__ == "__main__":
+    main()
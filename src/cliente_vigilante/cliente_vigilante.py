@@ -7,11 +7,18 @@ las detecciones de objetos realizadas por las cámaras.
 Características:
 - Interfaz gráfica con Tkinter
 - Actualización en tiempo real
-- Visualización de imágenes de detecciones
+- Visualización de imágenes de detecciones (miniatura pedida al servidor si
+  la imagen no está en este equipo)
 - Historial de detecciones
+
+Si el servidor acepta una conexión multiplexada, las solicitudes llevan un id
+y las respuestas se asocian a su solicitud: el historial, las miniaturas y
+las detecciones en vivo llegan por canales distintos de la misma conexión.
 """
 
-import socket
+import base64
+import io
+import itertools
 import threading
 import time
 import sys
@@ -25,16 +32,23 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
 
 from src.common.protocolo import Protocolo, TipoMensaje
 from src.common.utils import ConfigLoader
+from src.common.transporte import Transporte
+from src.common.trazas import Traza, RegistroTrazas
+from src.common.registro import Registro
+
+log = Registro.obtener('cliente')
+log_receptor = Registro.obtener('cliente.receptor')
+log_gui = Registro.obtener('cliente.gui')
 
 try:
     import tkinter as tk
     from tkinter import ttk, scrolledtext
-    from PIL import Image, ImageTk
 except ImportError as e:
-    print(f"ERROR: Falta dependencia: {e}")
-    print("Instalar con: pip install pillow")
+    log.error("Falta dependencia: %s", e)
     tk = None
 
+# Pillow se importa al mostrar la primera imagen (ver _mostrar_imagen)
+
 
 class ClienteVigilante:
     """Cliente vigilante con interfaz gráfica"""
@@ -64,8 +78,7 @@ class ClienteVigilante:
 
         # Validar configuración
         if "(COLOCAR_AQUI" in self.servidor_host:
-            print("ADVERTENCIA: Host del servidor de testeo no configurado")
-            print("  Usando localhost por defecto")
+            log.warning("Host del servidor de testeo no configurado, usando localhost por defecto")
             self.servidor_host = "127.0.0.1"
 
         # Socket
@@ -77,6 +90,18 @@ class ClienteVigilante:
         self.detecciones = []
         self.detecciones_lock = threading.RLock()
 
+        # Solicitudes en curso por id (conexión multiplexada): {id: contexto}
+        self._ids_solicitud = itertools.count(1)
+        self.solicitudes = {}
+        self.solicitudes_lock = threading.Lock()
+        self.imagen_seleccionada = None
+
+        # Latencia de las alertas hasta que se muestran: trazas recibidas con
+        # cada detección, pendientes de la próxima actualización de la tabla
+        self.trazas = RegistroTrazas()
+        self.trazas_pendientes = []  # [(camera_id, Traza)]
+        self.trazas_path = self.config.get('trazas_path')
+
         # Interfaz gráfica
         self.root = None
         self.tabla_detecciones = None
@@ -92,67 +117,168 @@ class ClienteVigilante:
             True si se conectó exitosamente
         """
         try:
-            print(f"Conectando a {self.servidor_host}:{self.servidor_puerto}...")
-
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(10)
-            self.socket.connect((self.servidor_host, self.servidor_puerto))
-            self.socket.settimeout(None)  # Desactivar timeout para mantener conexión viva
+            log.info("Conectando a %s:%s...", self.servidor_host, self.servidor_puerto)
+
+            # Socket Unix si el servidor es local y lo expone, si no TCP.
+            # Se desactiva el timeout tras conectar para mantener la conexión viva
+            self.socket = Transporte.conectar(
+                self.servidor_host,
+                self.servidor_puerto,
+                self.config.get('servidor_testeo_socket_unix'),
+                timeout=10,
+                opciones=Transporte.opciones(self.config_general)
+            )
 
-            print("Conexión exitosa")
+            log.info("Conexión exitosa")
             self.conectado = True
 
+            # Proponer codificación compacta y multiplexado; hasta la
+            # respuesta se usa JSON y las respuestas se reconocen por su tipo
+            Protocolo.enviar_hello(self.socket, multiplexado=True)
+
             # Solicitar historial de detecciones
-            Protocolo.enviar_mensaje(self.socket, TipoMensaje.GET_DETECTIONS, {
-                'limite': self.max_registros
-            })
-            print("[Cliente] Solicitud de historial enviada", flush=True)
+            self._solicitar(TipoMensaje.GET_DETECTIONS, {'limite': self.max_registros}, 'historial')
+            log.debug("Solicitud de historial enviada")
 
             # Suscribirse a actualizaciones
-            Protocolo.enviar_mensaje(self.socket, TipoMensaje.SUBSCRIBE_UPDATES, {})
+            self._solicitar(TipoMensaje.SUBSCRIBE_UPDATES, {}, 'suscripcion')
 
             return True
 
         except Exception as e:
-            print(f"ERROR conectando al servidor: {e}")
+            log.error("Error conectando al servidor: %s", e)
             return False
 
+    def _solicitar(self, tipo: str, datos: Dict, contexto: str, **extra) -> bool:
+        """
+        Envía una solicitud al servidor y recuerda qué se pidió.
+
+        Sin conexión multiplexada (todavía sin respuesta HELLO, o servidor que
+        no la soporta) se envía sin id y la respuesta se reconoce por su tipo.
+
+        Args:
+            tipo: Tipo de mensaje
+            datos: Datos de la solicitud
+            contexto: Qué se solicitó ('historial', 'miniatura', ...)
+            **extra: Datos para procesar la respuesta
+
+        Returns:
+            True si se envió
+        """
+        if not Protocolo.multiplexado(self.socket):
+            return Protocolo.enviar_mensaje(self.socket, tipo, datos)
+
+        id_solicitud = next(self._ids_solicitud)
+        with self.solicitudes_lock:
+            self.solicitudes[id_solicitud] = dict(extra, contexto=contexto)
+
+        if Protocolo.enviar_mensaje(self.socket, tipo, datos, id_solicitud=id_solicitud):
+            return True
+
+        with self.solicitudes_lock:
+            self.solicitudes.pop(id_solicitud, None)
+        return False
+
+    def _solicitud_respondida(self, mensaje: Dict) -> Optional[Dict]:
+        """Contexto de la solicitud a la que responde un mensaje (None si no es respuesta)"""
+        id_solicitud = mensaje.get('id')
+        if not id_solicitud:
+            return None
+        with self.solicitudes_lock:
+            return self.solicitudes.pop(id_solicitud, None)
+
     def recibir_actualizaciones(self):
         """Recibe actualizaciones del servidor en tiempo real"""
-        print("[Receptor] Iniciando recepción de actualizaciones...")
+        log_receptor.info("Iniciando recepción de actualizaciones...")
 
         while self.running and self.conectado:
             try:
                 mensaje = Protocolo.recibir_mensaje(self.socket)
 
                 if not mensaje:
-                    print("[Receptor] Servidor desconectado")
+                    log_receptor.warning("Servidor desconectado")
                     self.conectado = False
                     break
 
                 tipo = mensaje.get('tipo')
                 datos = mensaje.get('datos', {})
-                print(f"[Cliente] Mensaje recibido: {tipo}", flush=True)
+                log_receptor.debug("Mensaje recibido: %s", tipo)
+
+                # Respuesta correlacionada por id (conexión multiplexada)
+                solicitud = self._solicitud_respondida(mensaje)
+                if solicitud:
+                    self._procesar_respuesta(solicitud, tipo, datos)
 
-                if tipo == TipoMensaje.DETECTION:
-                    # Nueva detección
+                elif tipo == TipoMensaje.DETECTION:
+                    # Nueva detección (la traza de latencia no se guarda con ella)
+                    traza = datos.pop('traza', None)
                     self._agregar_deteccion(datos)
+                    if traza:
+                        with self.detecciones_lock:
+                            self.trazas_pendientes.append(
+                                (datos.get('camera_id'), Traza.desde_dict(traza)))
+
+                elif tipo == TipoMensaje.HELLO:
+                    codificacion = Protocolo.aceptar_hello(self.socket, datos)
+                    log_receptor.info("Codificación negociada: %s, compresión: %s, multiplexado: %s",
+                                      codificacion, Protocolo.compresion(self.socket) or 'ninguna',
+                                      'sí' if Protocolo.multiplexado(self.socket) else 'no')
 
                 elif tipo == TipoMensaje.ACK:
-                    # Respuesta a GET_DETECTIONS
+                    # Respuesta a GET_DETECTIONS sin id (servidor sin multiplexado)
                     if 'detecciones' in datos:
-                        detecciones = datos['detecciones']
-                        print(f"[Receptor] Recibidas {len(detecciones)} detecciones históricas")
+                        self._aplicar_historial(datos['detecciones'])
 
-                        for deteccion in detecciones:
-                            self._agregar_deteccion(deteccion)
+                elif tipo == TipoMensaje.THUMBNAIL:
+                    self._recibir_miniatura(datos)
 
             except Exception as e:
                 if self.running:
-                    print(f"[Receptor] Error: {e}")
+                    log_receptor.exception("Error: %s", e)
                     time.sleep(1)
 
-        print("[Receptor] Detenido")
+        log_receptor.info("Detenido")
+
+    def _procesar_respuesta(self, solicitud: Dict, tipo: str, datos: Dict):
+        """Procesa la respuesta a una solicitud según lo que se pidió"""
+        contexto = solicitud['contexto']
+
+        if tipo == TipoMensaje.ERROR:
+            log_receptor.warning("Error en solicitud '%s': %s", contexto, datos.get('error'))
+            if contexto == 'miniatura' and self.root:
+                self.root.after(0, self._mostrar_texto_imagen,
+                                f"Imagen no disponible:\n{solicitud.get('imagen_path')}",
+                                solicitud.get('imagen_path'))
+
+        elif contexto == 'historial':
+            self._aplicar_historial(datos.get('detecciones', []))
+
+        elif contexto == 'miniatura':
+            self._recibir_miniatura(datos)
+
+    @staticmethod
+    def _clave_deteccion(deteccion: Dict) -> tuple:
+        """Identifica una detección (el id se repite entre objetos del mismo frame)"""
+        return (deteccion.get('id'), deteccion.get('camera_id'),
+                deteccion.get('objeto'), deteccion.get('timestamp'))
+
+    def _aplicar_historial(self, detecciones: List[Dict]):
+        """
+        Combina el historial recibido con las detecciones ya mostradas.
+
+        Las detecciones en vivo que llegaron mientras se pedía el historial no
+        se duplican ni quedan desordenadas: se une todo, sin repetidos, y se
+        ordena por timestamp.
+        """
+        log_receptor.info("Recibidas %d detecciones históricas", len(detecciones))
+
+        with self.detecciones_lock:
+            combinadas = {self._clave_deteccion(d): d for d in self.detecciones}
+            for deteccion in detecciones:
+                combinadas[self._clave_deteccion(deteccion)] = deteccion
+
+            ordenadas = sorted(combinadas.values(), key=lambda d: d.get('timestamp') or '')
+            self.detecciones = ordenadas[-self.max_registros:]
 
     def _agregar_deteccion(self, deteccion: Dict):
         """Agrega una detección a la lista"""
@@ -330,9 +456,8 @@ class ClienteVigilante:
         """Solicita actualización manual de detecciones"""
         if self.conectado:
             try:
-                Protocolo.enviar_mensaje(self.socket, TipoMensaje.GET_DETECTIONS, {
-                    'limite': self.max_registros
-                })
+                self._solicitar(TipoMensaje.GET_DETECTIONS, {'limite': self.max_registros},
+                                'historial')
             except:
                 pass
 
@@ -380,13 +505,26 @@ class ClienteVigilante:
     def _mostrar_imagen(self, imagen_path: str):
         """Muestra una imagen de detección"""
         try:
+            from PIL import Image, ImageTk
+        except ImportError as e:
+            self.imagen_label.config(
+                image='',
+                text=f"Falta dependencia: {e}\nInstalar con: pip install pillow"
+            )
+            return
+
+        try:
+            self.imagen_seleccionada = imagen_path
             abs_path = os.path.abspath(imagen_path)
-            print(f"[GUI] Intentando cargar imagen: {abs_path}")
+            log_gui.debug("Intentando cargar imagen: %s", abs_path)
             if not os.path.exists(imagen_path):
-                self.imagen_label.config(
-                    image='',
-                    text=f"Imagen no encontrada:\n{imagen_path}"
-                )
+                # La imagen está en el servidor: pedir una miniatura
+                if self.conectado and self._solicitar(
+                        TipoMensaje.GET_THUMBNAIL, {'imagen_path': imagen_path, 'max_lado': 400},
+                        'miniatura', imagen_path=imagen_path):
+                    self._mostrar_texto_imagen("Cargando imagen...", imagen_path)
+                else:
+                    self._mostrar_texto_imagen(f"Imagen no encontrada:\n{imagen_path}", imagen_path)
                 return
 
             # Cargar y redimensionar imagen
@@ -415,10 +553,38 @@ class ClienteVigilante:
                 text=f"Error cargando imagen:\n{str(e)}"
             )
 
+    def _mostrar_texto_imagen(self, texto: str, imagen_path: Optional[str]):
+        """Muestra un texto en lugar de la imagen si sigue seleccionada esa detección"""
+        if imagen_path == self.imagen_seleccionada:
+            self.imagen_label.config(image='', text=texto)
+
+    def _recibir_miniatura(self, datos: Dict):
+        """Muestra una miniatura recibida del servidor (desde el hilo receptor)"""
+        if self.root and datos.get('imagen_path') == self.imagen_seleccionada:
+            self.root.after(0, self._mostrar_miniatura, datos)
+
+    def _mostrar_miniatura(self, datos: Dict):
+        """Muestra una miniatura en la interfaz (hilo de Tkinter)"""
+        if datos.get('imagen_path') != self.imagen_seleccionada:
+            return
+
+        try:
+            from PIL import Image, ImageTk
+
+            imagen = Image.open(io.BytesIO(base64.b64decode(datos['imagen'])))
+            photo = ImageTk.PhotoImage(imagen)
+            self.imagen_label.config(image=photo, text='')
+            self.imagen_label.image = photo
+
+        except Exception as e:
+            self.imagen_label.config(
+                image='',
+                text=f"Error cargando imagen:\n{str(e)}"
+            )
+
     def actualizar_interfaz(self):
         """Actualiza la interfaz con nuevas detecciones"""
         try:
-            # print("[GUI] Actualizando interfaz...", flush=True) # Debug
             with self.detecciones_lock:
                 # Obtener IDs actuales en la tabla
                 items_actuales = set()
@@ -426,8 +592,6 @@ class ClienteVigilante:
                     valores = self.tabla_detecciones.item(item, 'values')
                     if valores:
                         items_actuales.add(int(valores[0]))
-                
-                # print(f"[GUI] Items en tabla: {len(items_actuales)} | Items en memoria: {len(self.detecciones)}", flush=True)
 
                 # Agregar nuevas detecciones
                 nuevos = 0
@@ -445,7 +609,7 @@ class ClienteVigilante:
                         )
 
                         self.tabla_detecciones.insert('', 0, values=valores)
-                        print(f"[GUI] Insertada fila ID: {det_id}", flush=True)
+                        log_gui.debug("Insertada fila ID: %s", det_id)
                         nuevos += 1
                         
                         # Auto-seleccionar la primera detección si no hay selección
@@ -456,9 +620,19 @@ class ClienteVigilante:
                             # Disparar evento manualmente
                             self._on_seleccionar_deteccion(None)
 
+                # Las alertas recibidas desde la última actualización ya se muestran
+                pendientes, self.trazas_pendientes = self.trazas_pendientes, []
+                for camera_id, traza in pendientes:
+                    traza.marcar('visualizacion')
+                    self.trazas.registrar(camera_id, traza, total='alerta')
+
                 # Actualizar estadísticas
                 total_detecciones = len(self.detecciones)
-                self.stats_label.config(text=f"Detecciones: {total_detecciones}")
+                texto = f"Detecciones: {total_detecciones}"
+                latencias = self._latencia_alertas()
+                if latencias:
+                    texto += f" | Alerta p50/p95: {latencias[0]:.0f}/{latencias[1]:.0f} ms"
+                self.stats_label.config(text=texto)
 
                 # Actualizar status
                 if self.conectado:
@@ -471,19 +645,24 @@ class ClienteVigilante:
                 self.root.after(1000, self.actualizar_interfaz)
 
         except Exception as e:
-            print(f"Error actualizando interfaz: {e}")
+            log_gui.exception("Error actualizando interfaz: %s", e)
+
+    def _latencia_alertas(self) -> Optional[tuple]:
+        """(p50, p95) en ms desde la captura hasta mostrar la alerta, peor cámara"""
+        resumen = self.trazas.resumen()
+        if not resumen:
+            return None
+        return max(((stats['alerta']['p50'], stats['alerta']['p95'])
+                    for stats in resumen.values() if 'alerta' in stats), default=None)
 
     def ejecutar(self):
         """Ejecuta el cliente vigilante"""
         try:
-            print("=" * 60)
-            print("CLIENTE VIGILANTE")
-            print("=" * 60)
+            log.info("CLIENTE VIGILANTE")
 
             # Conectar al servidor
             if not self.conectar_servidor():
-                print("\nERROR: No se pudo conectar al servidor")
-                print("  Asegúrate de que el servidor de testeo esté ejecutándose")
+                log.error("No se pudo conectar al servidor (¿está ejecutándose el servidor de testeo?)")
                 return
 
             self.running = True
@@ -502,15 +681,13 @@ class ClienteVigilante:
             self.root.mainloop()
 
         except Exception as e:
-            print(f"Error: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Error: %s", e)
         finally:
             self.detener()
 
     def detener(self):
         """Detiene el cliente"""
-        print("\n[Cliente] Deteniendo cliente...")
+        log.info("Deteniendo cliente...")
         self.running = False
         self.conectado = False
 
@@ -520,18 +697,22 @@ class ClienteVigilante:
             except:
                 pass
 
-        print("[Cliente] Cliente detenido")
+        if self.trazas_path and self.trazas.resumen():
+            self.trazas.volcar(self.trazas_path)
+            log.info("Latencias de alertas guardadas en %s", self.trazas_path)
+
+        log.info("Cliente detenido")
 
 
 def main():
     """Función principal"""
+    Registro.configurar(ConfigLoader.cargar_config("config/config.json"), 'cliente')
+
     try:
         cliente = ClienteVigilante()
         cliente.ejecutar()
     except Exception as e:
-        print(f"Error fatal: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error fatal: %s", e)
 
 
 if __name__ == "__main__":
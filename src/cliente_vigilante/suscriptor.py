@@ -0,0 +1,372 @@
+"""
+Suscriptor de detecciones sin interfaz, sobre asyncio.
+
+Cada suscripción es una conexión al servidor de testeo (HELLO opcional +
+SUBSCRIBE_UPDATES) leída con asyncio, de modo que un solo proceso sostiene
+cientos de suscripciones concurrentes. Por suscripción se registra:
+
+- latencia de alerta: desde la captura del frame hasta la recepción (con la
+  traza que viaja en cada DETECTION)
+- latencia de entrega: desde que testeo notificó hasta la recepción
+- huecos: tiempo entre detecciones consecutivas y el mayor silencio
+
+Sirve como generador de carga del reparto (fan-out) de testeo y como CLI
+para seguir las detecciones en vivo con filtros:
+
+    python3 -m src.cliente_vigilante.suscriptor --camara 1 --clase persona --confianza 0.7
+    python3 -m src.cliente_vigilante.suscriptor --suscriptores 300 --segundos 60
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import struct
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Agregar ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.common.codificacion import MAX_MENSAJE, CodificacionCompacta, Reensamblador
+from src.common.compresion import Compresion
+from src.common.protocolo import Protocolo, TipoMensaje
+from src.common.registro import Registro
+from src.common.trazas import HistogramaLatencia, Traza
+from src.common.utils import ConfigLoader
+
+log = Registro.obtener('cliente.suscriptor')
+
+
+class FiltroDetecciones:
+    """Filtra detecciones por cámara, clase y confianza mínima"""
+
+    def __init__(self, camaras: Optional[Iterable[int]] = None,
+                 clases: Optional[Iterable[str]] = None, confianza_min: float = 0.0):
+        self.camaras = set(camaras) if camaras else None
+        self.clases = set(clases) if clases else None
+        self.confianza_min = confianza_min
+
+    def acepta(self, deteccion: Dict[str, Any]) -> bool:
+        """True si la detección pasa el filtro"""
+        if self.camaras is not None and deteccion.get('camera_id') not in self.camaras:
+            return False
+        if self.clases is not None and deteccion.get('objeto') not in self.clases:
+            return False
+        return deteccion.get('confianza', 0.0) >= self.confianza_min
+
+
+class EstadisticasSuscripcion:
+    """Contadores y latencias de una suscripción"""
+
+    def __init__(self):
+        self.recibidas = 0      # Detecciones recibidas (antes del filtro)
+        self.aceptadas = 0      # Detecciones que pasaron el filtro
+        self.reconexiones = 0
+        self.alerta = HistogramaLatencia()   # Captura -> recepción
+        self.entrega = HistogramaLatencia()  # Notificación en testeo -> recepción
+        self.huecos = HistogramaLatencia()   # Entre detecciones consecutivas
+        self.ultimo = None                   # time.monotonic() de la última detección
+
+    def registrar(self, traza: Optional[Traza]):
+        """Registra la recepción de una detección"""
+        ahora = time.monotonic()
+        self.recibidas += 1
+        if self.ultimo is not None:
+            self.huecos.agregar((ahora - self.ultimo) * 1000.0)
+        self.ultimo = ahora
+
+        if traza is not None:
+            notificacion = next((ms for etapa, ms in traza.etapas if etapa == 'notificacion'), None)
+            recepcion = traza.marcar('recepcion')
+            self.alerta.agregar(recepcion)
+            if notificacion is not None:
+                self.entrega.agregar(recepcion - notificacion)
+
+    def resumen(self) -> Dict[str, Any]:
+        """Resumen serializable"""
+        return {
+            'recibidas': self.recibidas,
+            'aceptadas': self.aceptadas,
+            'reconexiones': self.reconexiones,
+            'alerta_ms': self.alerta.resumen(),
+            'entrega_ms': self.entrega.resumen(),
+            'hueco_ms': self.huecos.resumen()
+        }
+
+
+class Suscriptor:
+    """Una suscripción a las detecciones del servidor de testeo"""
+
+    def __init__(self, host: str, puerto: int, socket_unix: Optional[str] = None,
+                 filtro: Optional[FiltroDetecciones] = None, negociar: bool = True,
+                 al_recibir: Optional[Callable[[Dict[str, Any], Optional[Traza]], None]] = None,
+                 reconectar_s: Optional[float] = None):
+        """
+        Args:
+            host: Host del servidor de testeo
+            puerto: Puerto del servidor de testeo
+            socket_unix: Socket Unix local (si se indica, se usa en lugar de TCP)
+            filtro: Filtro de las detecciones entregadas a al_recibir
+            negociar: Enviar HELLO (codificación compacta y compresión); sin
+                      él se usa JSON como el cliente Java
+            al_recibir: Callback por cada detección aceptada (detección, traza)
+            reconectar_s: Reintentar la conexión tras este tiempo (None = no)
+        """
+        self.host = host
+        self.puerto = puerto
+        self.socket_unix = socket_unix
+        self.filtro = filtro or FiltroDetecciones()
+        self.negociar = negociar
+        self.al_recibir = al_recibir
+        self.reconectar_s = reconectar_s
+        self.estadisticas = EstadisticasSuscripcion()
+        self.conectado = False
+
+    async def ejecutar(self, detener: asyncio.Event):
+        """Mantiene la suscripción hasta que se pida detener"""
+        while not detener.is_set():
+            try:
+                await self._suscribir(detener)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                log.debug("Suscripción interrumpida: %s", e)
+            self.conectado = False
+
+            if self.reconectar_s is None or detener.is_set():
+                return
+            self.estadisticas.reconexiones += 1
+            try:
+                await asyncio.wait_for(detener.wait(), self.reconectar_s)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _suscribir(self, detener: asyncio.Event):
+        """Una conexión: suscribirse y leer hasta que se cierre"""
+        if self.socket_unix:
+            lector, escritor = await asyncio.open_unix_connection(self.socket_unix)
+        else:
+            lector, escritor = await asyncio.open_connection(self.host, self.puerto)
+
+        try:
+            if self.negociar:
+                escritor.write(Protocolo.serializar(Protocolo.crear_mensaje(TipoMensaje.HELLO, {
+                    'version': Protocolo.VERSION,
+                    'codificaciones': CodificacionCompacta.disponibles(),
+                    'compresiones': Compresion.disponibles(),
+                    'multiplexado': False
+                })))
+            escritor.write(Protocolo.serializar(
+                Protocolo.crear_mensaje(TipoMensaje.SUBSCRIBE_UPDATES, {})))
+            await escritor.drain()
+            self.conectado = True
+
+            reensamblador = Reensamblador()
+            lectura = asyncio.ensure_future(self._leer(lector, reensamblador))
+            espera = asyncio.ensure_future(detener.wait())
+            while True:
+                hechas, _ = await asyncio.wait({lectura, espera}, return_when=asyncio.FIRST_COMPLETED)
+                if espera in hechas:
+                    lectura.cancel()
+                    return
+
+                mensaje = lectura.result()
+                if mensaje is None:
+                    espera.cancel()
+                    return
+                self._procesar(mensaje)
+                lectura = asyncio.ensure_future(self._leer(lector, reensamblador))
+
+        finally:
+            escritor.close()
+
+    @staticmethod
+    async def _leer(lector: asyncio.StreamReader, reensamblador: Reensamblador) -> Optional[Dict]:
+        """Lee un mensaje completo ([4B tamaño][cuerpo], JSON o compacto)"""
+        while True:
+            try:
+                encabezado = await lector.readexactly(Protocolo.HEADER_SIZE)
+            except asyncio.IncompleteReadError:
+                return None
+
+            tamano = struct.unpack('>I', encabezado)[0]
+            if tamano > MAX_MENSAJE:
+                raise ValueError(f"Mensaje de {tamano} bytes")
+            cuerpo = await lector.readexactly(tamano)
+
+            if not CodificacionCompacta.es_compacto(cuerpo):
+                return json.loads(cuerpo.decode(Protocolo.ENCODING))
+
+            mensaje = reensamblador.agregar(cuerpo)
+            if mensaje is not None:
+                return mensaje
+
+    def _procesar(self, mensaje: Dict[str, Any]):
+        """Procesa un mensaje recibido"""
+        if mensaje.get('tipo') != TipoMensaje.DETECTION:
+            return  # HELLO, ACK de la suscripción
+
+        deteccion = mensaje.get('datos', {})
+        datos_traza = deteccion.pop('traza', None)
+        traza = Traza.desde_dict(datos_traza) if datos_traza else None
+        self.estadisticas.registrar(traza)
+
+        if self.filtro.acepta(deteccion):
+            self.estadisticas.aceptadas += 1
+            if self.al_recibir:
+                self.al_recibir(deteccion, traza)
+
+
+class GrupoSuscriptores:
+    """Muchas suscripciones concurrentes (generador de carga del reparto de testeo)"""
+
+    def __init__(self, cantidad: int, host: str, puerto: int, rampa_s: float = 0.0, **opciones):
+        """
+        Args:
+            cantidad: Número de suscripciones
+            host: Host del servidor de testeo
+            puerto: Puerto del servidor de testeo
+            rampa_s: Tiempo en el que se reparten las conexiones iniciales
+            **opciones: Opciones de cada Suscriptor
+        """
+        self.rampa_s = rampa_s
+        self.suscriptores = [Suscriptor(host, puerto, **opciones) for _ in range(cantidad)]
+
+    async def ejecutar(self, detener: asyncio.Event):
+        """Ejecuta todas las suscripciones hasta que se pida detener"""
+        async def iniciar(indice: int, suscriptor: Suscriptor):
+            if self.rampa_s:
+                await asyncio.sleep(self.rampa_s * indice / len(self.suscriptores))
+            await suscriptor.ejecutar(detener)
+
+        await asyncio.gather(*(iniciar(i, s) for i, s in enumerate(self.suscriptores)))
+
+    def conectados(self) -> int:
+        """Suscripciones conectadas en este momento"""
+        return sum(1 for s in self.suscriptores if s.conectado)
+
+    def resumen(self) -> Dict[str, Any]:
+        """
+        Estadísticas agregadas de todas las suscripciones.
+
+        'faltantes' compara cada suscripción con la que más detecciones
+        recibió: con un reparto sin pérdidas es 0.
+        """
+        alerta, entrega, huecos = HistogramaLatencia(), HistogramaLatencia(), HistogramaLatencia()
+        for suscriptor in self.suscriptores:
+            estadisticas = suscriptor.estadisticas
+            for total, parcial in ((alerta, estadisticas.alerta), (entrega, estadisticas.entrega),
+                                   (huecos, estadisticas.huecos)):
+                GrupoSuscriptores._acumular(total, parcial)
+
+        recibidas = [s.estadisticas.recibidas for s in self.suscriptores]
+        maximo = max(recibidas, default=0)
+        return {
+            'suscriptores': len(self.suscriptores),
+            'conectados': self.conectados(),
+            'recibidas': sum(recibidas),
+            'recibidas_min': min(recibidas, default=0),
+            'recibidas_max': maximo,
+            'faltantes': sum(maximo - r for r in recibidas),
+            'reconexiones': sum(s.estadisticas.reconexiones for s in self.suscriptores),
+            'alerta_ms': alerta.resumen(),
+            'entrega_ms': entrega.resumen(),
+            'hueco_ms': huecos.resumen()
+        }
+
+    @staticmethod
+    def _acumular(total: HistogramaLatencia, parcial: HistogramaLatencia):
+        """Suma un histograma a otro (mismas cubetas)"""
+        if not parcial.cantidad:
+            return
+        for indice, cuenta in enumerate(parcial.cubetas):
+            total.cubetas[indice] += cuenta
+        total.cantidad += parcial.cantidad
+        total.suma += parcial.suma
+        total.minimo = min(total.minimo, parcial.minimo)
+        total.maximo = max(total.maximo, parcial.maximo)
+
+
+def formatear_deteccion(deteccion: Dict[str, Any], traza: Optional[Traza]) -> str:
+    """Línea legible de una detección"""
+    latencia = f" | {traza.edad_ms():.0f} ms" if traza else ""
+    return (f"{time.strftime('%H:%M:%S')} cámara {deteccion.get('camera_id')} "
+            f"{deteccion.get('objeto')} ({deteccion.get('confianza', 0):.2f}) "
+            f"{deteccion.get('bbox')} {deteccion.get('imagen_path', '')}{latencia}")
+
+
+async def _principal(args, config_cliente: Dict[str, Any]):
+    """Tail de detecciones o generador de carga según los argumentos"""
+    detener = asyncio.Event()
+    filtro = FiltroDetecciones(args.camara, args.clase, args.confianza)
+
+    def mostrar(deteccion, traza):
+        if args.json:
+            print(json.dumps(dict(deteccion, latencia_ms=traza.edad_ms() if traza else None),
+                             ensure_ascii=False), flush=True)
+        else:
+            print(formatear_deteccion(deteccion, traza), flush=True)
+
+    grupo = GrupoSuscriptores(
+        args.suscriptores, args.host, args.puerto, rampa_s=args.rampa,
+        socket_unix=config_cliente.get('servidor_testeo_socket_unix'), filtro=filtro,
+        negociar=not args.sin_hello, al_recibir=mostrar if args.suscriptores == 1 else None,
+        reconectar_s=2.0)
+
+    async def informar():
+        inicio = time.monotonic()
+        while not detener.is_set():
+            try:
+                await asyncio.wait_for(detener.wait(), args.periodo)
+            except asyncio.TimeoutError:
+                pass
+            if args.suscriptores > 1:
+                resumen = grupo.resumen()
+                print(f"[{time.monotonic() - inicio:6.1f} s] conectados {resumen['conectados']}/"
+                      f"{resumen['suscriptores']} | recibidas {resumen['recibidas']} "
+                      f"(faltantes {resumen['faltantes']}) | alerta p50 {resumen['alerta_ms']['p50']:.1f} "
+                      f"p99 {resumen['alerta_ms']['p99']:.1f} ms | entrega p99 "
+                      f"{resumen['entrega_ms']['p99']:.1f} ms", flush=True)
+            if args.segundos and time.monotonic() - inicio >= args.segundos:
+                detener.set()
+
+    tarea_grupo = asyncio.ensure_future(grupo.ejecutar(detener))
+    try:
+        await asyncio.gather(tarea_grupo, informar())
+    finally:
+        detener.set()
+
+    if args.suscriptores > 1 or args.resumen:
+        print(json.dumps(grupo.resumen(), indent=2, ensure_ascii=False))
+
+
+def main():
+    """Función principal"""
+    config = ConfigLoader.cargar_config(os.path.join(os.path.dirname(__file__), '../../config/config.json'))
+    config_cliente = config.get('cliente_vigilante', {})
+
+    parser = argparse.ArgumentParser(description="Suscriptor de detecciones sin interfaz")
+    parser.add_argument('--host', default=config_cliente.get('servidor_testeo_host', '127.0.0.1'))
+    parser.add_argument('--puerto', type=int, default=config_cliente.get('servidor_testeo_puerto', 5002))
+    parser.add_argument('--camara', type=int, action='append', help="Solo esta cámara (repetible)")
+    parser.add_argument('--clase', action='append', help="Solo esta clase (repetible)")
+    parser.add_argument('--confianza', type=float, default=0.0, help="Confianza mínima")
+    parser.add_argument('--json', action='store_true', help="Una línea JSON por detección")
+    parser.add_argument('--suscriptores', type=int, default=1,
+                        help="Suscripciones concurrentes (>1: generador de carga)")
+    parser.add_argument('--rampa', type=float, default=0.0, help="Segundos para abrir todas las conexiones")
+    parser.add_argument('--segundos', type=float, default=0, help="Duración (0 = hasta Ctrl+C)")
+    parser.add_argument('--periodo', type=float, default=5.0, help="Segundos entre resúmenes")
+    parser.add_argument('--resumen', action='store_true', help="Mostrar estadísticas al terminar")
+    parser.add_argument('--sin-hello', action='store_true', help="No negociar (JSON legado)")
+    args = parser.parse_args()
+
+    Registro.configurar(dict(config, logging=dict(config.get('logging', {}), archivo=None)), 'suscriptor')
+    try:
+        asyncio.run(_principal(args, config_cliente))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,55 @@
 """
 Módulo común con utilidades y protocolo de comunicación.
+
+Los nombres se importan de su submódulo al usarse por primera vez: importar
+src.common.protocolo no carga memoria compartida, métricas, perfilador ni el
+resto de subsistemas que ese camino no usa.
 """
 
-from .protocolo import Protocolo, TipoMensaje, MensajeFactory
-from .utils import (
-    ConfigLoader,
-    ImageUtils,
-    LogManager,
-    PathUtils,
-    ThreadSafeCounter
-)
-
-__all__ = [
-    'Protocolo',
-    'TipoMensaje',
-    'MensajeFactory',
-    'ConfigLoader',
-    'ImageUtils',
-    'LogManager',
-    'PathUtils',
-    'ThreadSafeCounter'
-]
+import importlib
+
+# nombre exportado -> submódulo que lo define
+_EXPORTADOS = {
+    'Protocolo': 'protocolo',
+    'TipoMensaje': 'protocolo',
+    'MensajeFactory': 'protocolo',
+    'Canal': 'protocolo',
+    'AnilloFrames': 'memoria_compartida',
+    'Transporte': 'transporte',
+    'HostUtils': 'transporte',
+    'CreditosProductor': 'flujo',
+    'CreditosConsumidor': 'flujo',
+    'CodificacionCompacta': 'codificacion',
+    'Compresion': 'compresion',
+    'Multiplexor': 'multiplexor',
+    'Traza': 'trazas',
+    'RegistroTrazas': 'trazas',
+    'HistogramaLatencia': 'trazas',
+    'RegistroMetricas': 'metricas',
+    'ServidorMetricas': 'metricas',
+    'Registro': 'registro',
+    'Perfilador': 'perfilador',
+    'RecargaConfig': 'recarga',
+    'ConfigLoader': 'utils',
+    'ImageUtils': 'utils',
+    'LogManager': 'utils',
+    'PathUtils': 'utils',
+    'Dependencias': 'utils',
+    'ThreadSafeCounter': 'utils',
+}
+
+__all__ = list(_EXPORTADOS)
+
+
+def __getattr__(nombre: str):
+    """Importa el submódulo que define `nombre` al primer acceso"""
+    modulo = _EXPORTADOS.get(nombre)
+    if modulo is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+    valor = getattr(importlib.import_module(f'.{modulo}', __name__), nombre)
+    globals()[nombre] = valor
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
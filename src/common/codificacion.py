@@ -0,0 +1,649 @@
+"""
+Codificación binaria compacta para mensajes de control y detecciones.
+
+El formato legado ([4B tamaño][JSON]) sigue siendo el predeterminado. Un
+extremo que envía HELLO puede negociar una codificación compacta; a partir de
+ahí el otro extremo le envía los mensajes que no son frames con este formato:
+
+    [4B tamaño][marca u8][flags u8][canal u8][id u32]?[payload]
+    payload: [tipo u8][ts_ms i64][formato u8][datos]
+
+- marca: 0xB2. Un cuerpo JSON siempre empieza con '{' (0x7B), así que el
+  receptor distingue ambos formatos por el primer byte sin estado alguno.
+- flags:
+    bits 0-1 = compresión del payload (0 ninguna, 1 zlib, 2 zstd, 3 lz4)
+    bit 2    = el payload es un cuerpo JSON legado (codificación 'json'
+               con compresión negociada)
+    bit 3    = fragmento: el payload continúa en el siguiente mensaje
+               de la misma etiqueta
+    bit 4    = etiquetado: canal e id de solicitud siguen a los flags
+- tipo: índice en TIPOS (append-only); 0xFF seguido del nombre si no está.
+- ts_ms: instante del mensaje en milisegundos epoch (reemplaza la cadena ISO).
+- formato de los datos:
+    0 = JSON compacto, 1 = msgpack,
+    2 = un registro de detección con esquema fijo (DETECTION),
+    3 = lista 'detecciones' con esquema fijo + resto de claves en JSON/msgpack,
+    4 = como 3 pero en lotes (respuestas enviadas en streaming)
+
+Una respuesta grande puede enviarse en streaming: el payload se genera y
+comprime por lotes y se reparte en varios mensajes con el bit de fragmento,
+así el emisor nunca arma la respuesta completa en memoria.
+
+En una conexión multiplexada (negociada en HELLO) los mensajes llevan la
+etiqueta (canal, id de solicitud) fuera del payload comprimido: las
+respuestas se correlacionan con su solicitud por el id, y los fragmentos de
+distintas etiquetas pueden intercalarse en el cable (ver Reensamblador).
+
+Esquema fijo de una detección: id, camera_id, objeto, confianza, bbox,
+imagen_path, timestamp, fecha y hora viajan sin nombres de clave; timestamp
+como microsegundos y fecha + hora como segundos desde 1970-01-01 en la misma
+hora local (naive) del registro, sin conversión de zona horaria, y objeto y
+la carpeta de imagen_path como índices a una tabla de cadenas del mensaje. Las
+claves adicionales viajan en JSON. Un registro que no se puede representar
+sin pérdida viaja completo en JSON.
+
+Codificaciones negociables (HELLO): 'msgpack' (requiere msgpack instalado),
+'struct' (solo biblioteca estándar) y 'json' (legado).
+"""
+
+import json
+import struct
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from src.common.utils import Dependencias
+from src.common.compresion import Compresion
+
+MARCA = 0xB2
+
+# Tamaño máximo de un mensaje (en el cable o reensamblado y descomprimido):
+# uno mayor indica un flujo corrupto o una bomba de compresión
+MAX_MENSAJE = 64 * 1024 * 1024
+
+# Códigos de tipo en el cable: solo se agregan al final, nunca se reordenan
+TIPOS = (
+    "FRAME", "VIDEO_STATUS", "RATE_CONTROL", "SHM_INIT", "FRAME_SHM", "FRAME_CREDIT",
+    "TRAIN_REQUEST", "TRAIN_PROGRESS", "TRAIN_COMPLETE", "MODEL_READY",
+    "DETECTION", "TESTEO_STATUS", "LOAD_MODEL",
+    "GET_DETECTIONS", "SUBSCRIBE_UPDATES",
+    "ACK", "ERROR", "PING", "PONG", "HELLO",
+    "GET_THUMBNAIL", "THUMBNAIL",
+    "PROFILE", "CLIP_EVENT", "GET_RECORDING", "RECORDING",
+    "CONFIG_RELOAD"
+)
+_CODIGOS = {tipo: codigo for codigo, tipo in enumerate(TIPOS)}
+TIPO_LIBRE = 0xFF
+
+# Formatos de los datos
+DATOS_JSON = 0
+DATOS_MSGPACK = 1
+DATOS_DETECCION = 2
+DATOS_DETECCIONES = 3
+DATOS_DETECCIONES_LOTES = 4
+
+# Flags de la envoltura
+FLAG_COMPRESION = 0x03
+FLAG_JSON = 0x04
+FLAG_FRAGMENTO = 0x08
+FLAG_ETIQUETA = 0x10
+
+ENVOLTURA = struct.Struct('>BB')   # marca, flags
+ETIQUETA = struct.Struct('>BI')    # canal, id de solicitud
+CABECERA = struct.Struct('>BqB')   # tipo, ts_ms, formato
+_F32 = struct.Struct('>f')
+_U16 = struct.Struct('>H')
+_U32 = struct.Struct('>I')
+_TAMANO = struct.Struct('>I')
+
+
+class EsquemaDeteccion:
+    """Esquema fijo (struct) para registros de detección"""
+
+    CLAVES = ('id', 'camera_id', 'objeto', 'confianza', 'bbox',
+              'imagen_path', 'timestamp', 'fecha', 'hora')
+
+    # id, camera_id, objeto (índice), confianza, bbox x4, timestamp (us),
+    # fecha+hora (s), carpeta (índice)
+    REGISTRO = struct.Struct('>IHHf4iqqH')
+
+    REGISTRO_FIJO = 0
+    REGISTRO_JSON = 1
+    _FIJO = bytes([REGISTRO_FIJO])
+    _JSON = bytes([REGISTRO_JSON])
+
+    # Origen de los instantes del registro (hora local naive, como en el log)
+    EPOCA = datetime(1970, 1, 1)
+    _US = timedelta(microseconds=1)
+
+    @staticmethod
+    def _empaquetable(registro: Dict[str, Any]) -> Optional[Tuple]:
+        """
+        Convierte los campos estándar de un registro a valores del esquema.
+
+        Returns:
+            (id, camera_id, objeto, confianza, bbox, imagen_path, ts_us, registro_s)
+            o None si el registro no se puede representar sin pérdida
+        """
+        try:
+            id_, camera_id = registro['id'], registro['camera_id']
+            objeto, confianza = registro['objeto'], registro['confianza']
+            bbox, imagen_path = registro['bbox'], registro['imagen_path']
+            timestamp = registro['timestamp']
+            fecha, hora = registro['fecha'], registro['hora']
+        except KeyError:
+            return None
+
+        # Los rangos de id, camera_id y bbox los valida struct al empaquetar
+        if not (type(id_) is int and type(camera_id) is int
+                and type(objeto) is str and type(imagen_path) is str
+                and type(confianza) is float
+                and type(bbox) is list and len(bbox) == 4):
+            return None
+
+        # confianza viaja como float32: el modelo ya la produce en float32
+        if _F32.unpack(_F32.pack(confianza))[0] != confianza:
+            return None
+
+        try:
+            ts = datetime.fromisoformat(timestamp)
+            registro_dt = datetime.fromisoformat(f"{fecha}T{hora}")
+        except (TypeError, ValueError):
+            return None
+
+        # Solo formatos que se reconstruyen idénticos (naive, con segundos)
+        if (ts.tzinfo is not None or ts.isoformat() != timestamp
+                or registro_dt.isoformat() != f"{fecha}T{hora}"):
+            return None
+
+        ts_us = (ts - EsquemaDeteccion.EPOCA) // EsquemaDeteccion._US
+        registro_s = (registro_dt - EsquemaDeteccion.EPOCA) // timedelta(seconds=1)
+
+        return id_, camera_id, objeto, confianza, bbox, imagen_path, ts_us, registro_s
+
+    @staticmethod
+    def codificar_lista(registros: List[Dict[str, Any]]) -> bytes:
+        """
+        Codifica una lista de registros de detección.
+
+        Formato: [tabla de cadenas][u32 cantidad][registro...]
+        """
+        tabla = {}
+        cuerpos = []
+
+        def indice(cadena: str) -> int:
+            if cadena not in tabla:
+                tabla[cadena] = len(tabla)
+            return tabla[cadena]
+
+        for registro in registros:
+            valores = EsquemaDeteccion._empaquetable(registro) if isinstance(registro, dict) else None
+
+            if valores is not None and len(tabla) < 0xFFFF - 1:
+                id_, camera_id, objeto, confianza, bbox, imagen_path, ts_us, registro_s = valores
+                carpeta, separador, archivo = imagen_path.rpartition('/')
+                archivo = archivo.encode('utf-8')
+
+                extras = {k: v for k, v in registro.items() if k not in EsquemaDeteccion.CLAVES}
+                extras = json.dumps(extras, separators=(',', ':')).encode('utf-8') if extras else b''
+
+                try:
+                    cuerpos.append(b''.join((
+                        EsquemaDeteccion._FIJO,
+                        EsquemaDeteccion.REGISTRO.pack(id_, camera_id, indice(objeto), confianza, *bbox,
+                                                       ts_us, registro_s, indice(carpeta + separador)),
+                        _U16.pack(len(archivo)), archivo,
+                        _U32.pack(len(extras)), extras
+                    )))
+                    continue
+                except struct.error:
+                    pass  # Fuera de rango para el esquema: viaja en JSON
+
+            crudo = json.dumps(registro, separators=(',', ':')).encode('utf-8')
+            cuerpos.append(EsquemaDeteccion._JSON + _U32.pack(len(crudo)) + crudo)
+
+        partes = [_U16.pack(len(tabla))]
+        for cadena in tabla:
+            codificada = cadena.encode('utf-8')
+            partes.append(_U16.pack(len(codificada)))
+            partes.append(codificada)
+        partes.append(_U32.pack(len(cuerpos)))
+        partes.extend(cuerpos)
+        return b''.join(partes)
+
+    @staticmethod
+    def decodificar_lista(datos: memoryview, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Decodifica una lista de registros.
+
+        Returns:
+            (registros, offset siguiente)
+        """
+        (num_cadenas,) = _U16.unpack_from(datos, offset)
+        offset += _U16.size
+        tabla = []
+        for _ in range(num_cadenas):
+            (largo,) = _U16.unpack_from(datos, offset)
+            offset += _U16.size
+            tabla.append(bytes(datos[offset:offset + largo]).decode('utf-8'))
+            offset += largo
+
+        (cantidad,) = _U32.unpack_from(datos, offset)
+        offset += _U32.size
+
+        registros = []
+        for _ in range(cantidad):
+            clase = datos[offset]
+            offset += 1
+
+            if clase == EsquemaDeteccion.REGISTRO_JSON:
+                (largo,) = _U32.unpack_from(datos, offset)
+                offset += _U32.size
+                registros.append(json.loads(bytes(datos[offset:offset + largo])))
+                offset += largo
+                continue
+
+            (id_, camera_id, objeto, confianza, x1, y1, x2, y2,
+             ts_us, registro_s, carpeta) = EsquemaDeteccion.REGISTRO.unpack_from(datos, offset)
+            offset += EsquemaDeteccion.REGISTRO.size
+
+            (largo,) = _U16.unpack_from(datos, offset)
+            offset += _U16.size
+            archivo = bytes(datos[offset:offset + largo]).decode('utf-8')
+            offset += largo
+
+            (largo,) = _U32.unpack_from(datos, offset)
+            offset += _U32.size
+            extras = json.loads(bytes(datos[offset:offset + largo])) if largo else {}
+            offset += largo
+
+            epoca = EsquemaDeteccion.EPOCA
+            registrado = (epoca + timedelta(seconds=registro_s)).isoformat()
+            registro = {
+                'id': id_,
+                'camera_id': camera_id,
+                'objeto': tabla[objeto],
+                'confianza': confianza,
+                'bbox': [x1, y1, x2, y2],
+                'imagen_path': tabla[carpeta] + archivo,
+                'timestamp': (epoca + timedelta(microseconds=ts_us)).isoformat(),
+                'fecha': registrado[:10],
+                'hora': registrado[11:19]
+            }
+            registro.update(extras)
+            registros.append(registro)
+
+        return registros, offset
+
+
+class CodificacionCompacta:
+    """Serialización y deserialización del formato compacto"""
+
+    @staticmethod
+    def disponibles() -> List[str]:
+        """Codificaciones que este proceso puede usar, de mayor a menor preferencia"""
+        if Dependencias.cargar_msgpack():
+            return ['msgpack', 'struct', 'json']
+        return ['struct', 'json']
+
+    @staticmethod
+    def _datos_genericos(datos: Any, codificacion: str) -> Tuple[int, bytes]:
+        """Codifica datos sin esquema fijo con msgpack o JSON compacto"""
+        if codificacion == 'msgpack':
+            msgpack = Dependencias.cargar_msgpack()
+            if msgpack:
+                return DATOS_MSGPACK, msgpack.packb(datos, use_bin_type=True)
+        return DATOS_JSON, json.dumps(datos, separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def _cabecera(tipo: str, ts_ms: int, formato: int) -> bytes:
+        """Cabecera del payload; el nombre de un tipo libre va a continuación"""
+        codigo = _CODIGOS.get(tipo, TIPO_LIBRE)
+        cabecera = CABECERA.pack(codigo, ts_ms, formato)
+        if codigo == TIPO_LIBRE:
+            nombre = tipo.encode('utf-8')
+            cabecera += bytes([len(nombre)]) + nombre
+        return cabecera
+
+    @staticmethod
+    def _payload(tipo: str, datos: Dict[str, Any], codificacion: str,
+                 ts_ms: int) -> Tuple[int, bytes]:
+        """
+        Genera el payload sin comprimir.
+
+        Returns:
+            (flags, payload)
+        """
+        if codificacion == 'json':
+            mensaje = {
+                'tipo': tipo,
+                'timestamp': datetime.fromtimestamp(ts_ms / 1000).isoformat(),
+                'datos': datos
+            }
+            return FLAG_JSON, json.dumps(mensaje).encode('utf-8')
+
+        if tipo == "DETECTION":
+            # Un registro no representable viaja en JSON dentro de la lista
+            formato, cuerpo = DATOS_DETECCION, EsquemaDeteccion.codificar_lista([datos])
+
+        elif isinstance(datos.get('detecciones'), list):
+            resto = {k: v for k, v in datos.items() if k != 'detecciones'}
+            formato_resto, resto = CodificacionCompacta._datos_genericos(resto, codificacion)
+            formato = DATOS_DETECCIONES
+            cuerpo = (EsquemaDeteccion.codificar_lista(datos['detecciones'])
+                      + bytes([formato_resto]) + resto)
+
+        else:
+            formato, cuerpo = CodificacionCompacta._datos_genericos(datos, codificacion)
+
+        return 0, CodificacionCompacta._cabecera(tipo, ts_ms, formato) + cuerpo
+
+    @staticmethod
+    def _enmarcar(flags: int, payload: bytes,
+                  etiqueta: Optional[Tuple[int, int]] = None) -> bytes:
+        """Agrega header de tamaño, envoltura y etiqueta (canal, id) si la hay"""
+        if etiqueta is None:
+            envoltura = ENVOLTURA.pack(MARCA, flags)
+        else:
+            envoltura = ENVOLTURA.pack(MARCA, flags | FLAG_ETIQUETA) + ETIQUETA.pack(*etiqueta)
+        return _TAMANO.pack(len(envoltura) + len(payload)) + envoltura + payload
+
+    @staticmethod
+    def serializar(tipo: str, datos: Dict[str, Any], codificacion: str,
+                   ts_ms: Optional[int] = None, compresion: Optional[str] = None,
+                   umbral: int = 1024, etiqueta: Optional[Tuple[int, int]] = None) -> bytes:
+        """
+        Serializa un mensaje en formato compacto (con header de tamaño).
+
+        Args:
+            tipo: Tipo de mensaje
+            datos: Datos del mensaje
+            codificacion: 'msgpack', 'struct' o 'json'
+            ts_ms: Instante del mensaje en ms epoch (None = ahora)
+            compresion: Algoritmo negociado (None = sin compresión)
+            umbral: Tamaño mínimo del payload para comprimirlo
+            etiqueta: (canal, id de solicitud) en conexiones multiplexadas
+
+        Returns:
+            Bytes listos para enviar. Con codificación 'json', sin comprimir y
+            sin etiqueta el resultado es exactamente el formato legado.
+        """
+        if ts_ms is None:
+            ts_ms = int(time.time() * 1000)
+
+        flags, payload = CodificacionCompacta._payload(tipo, datos, codificacion, ts_ms)
+
+        # Los frames (JPEG) no se comprimen: ya están comprimidos
+        if compresion and tipo != "FRAME" and len(payload) > umbral:
+            comprimido = Compresion.comprimir(compresion, payload)
+            if len(comprimido) < len(payload):
+                payload = comprimido
+                flags |= Compresion.CODIGOS[compresion]
+
+        if flags == FLAG_JSON and etiqueta is None:
+            return _TAMANO.pack(len(payload)) + payload
+
+        return CodificacionCompacta._enmarcar(flags, payload, etiqueta)
+
+    @staticmethod
+    def serializar_stream(tipo: str, datos: Dict[str, Any], clave: str,
+                          registros: Iterable[Dict[str, Any]], codificacion: str,
+                          compresion: Optional[str] = None, lote: int = 200,
+                          tamano_fragmento: int = 64 * 1024,
+                          ts_ms: Optional[int] = None,
+                          etiqueta: Optional[Tuple[int, int]] = None) -> Iterator[bytes]:
+        """
+        Serializa una respuesta con una lista grande generándola por lotes.
+
+        Cada lote se codifica y comprime a medida que se produce, y la salida
+        se reparte en mensajes de tamano_fragmento bytes con el bit de
+        fragmento; el receptor (recibir_mensaje) los une en un solo mensaje.
+
+        Args:
+            tipo: Tipo de mensaje
+            datos: Resto de los datos (sin la lista)
+            clave: Clave de la lista en los datos (p. ej. 'detecciones')
+            registros: Elementos de la lista
+            codificacion: Codificación negociada
+            compresion: Algoritmo negociado (None = sin compresión)
+            lote: Registros por lote
+            tamano_fragmento: Bytes máximos de payload por mensaje
+            ts_ms: Instante del mensaje en ms epoch (None = ahora)
+            etiqueta: (canal, id de solicitud) en conexiones multiplexadas
+
+        Yields:
+            Mensajes listos para enviar, en orden
+        """
+        if ts_ms is None:
+            ts_ms = int(time.time() * 1000)
+
+        flags = Compresion.CODIGOS[compresion] if compresion else 0
+        if codificacion == 'json':
+            flags |= FLAG_JSON
+        compresor = Compresion.compresor(compresion) if compresion else None
+
+        pendiente = bytearray()
+        for pieza in CodificacionCompacta._piezas_stream(tipo, datos, clave, registros,
+                                                         codificacion, lote, ts_ms):
+            pendiente += compresor.comprimir(pieza) if compresor else pieza
+            while len(pendiente) >= tamano_fragmento:
+                yield CodificacionCompacta._enmarcar(flags | FLAG_FRAGMENTO,
+                                                     bytes(pendiente[:tamano_fragmento]),
+                                                     etiqueta)
+                del pendiente[:tamano_fragmento]
+
+        if compresor:
+            pendiente += compresor.terminar()
+        yield CodificacionCompacta._enmarcar(flags, bytes(pendiente), etiqueta)
+
+    @staticmethod
+    def _piezas_stream(tipo: str, datos: Dict[str, Any], clave: str,
+                       registros: Iterable[Dict[str, Any]], codificacion: str,
+                       lote: int, ts_ms: int) -> Iterator[bytes]:
+        """Genera el payload sin comprimir de una respuesta en streaming, por partes"""
+        def lotes():
+            actual = []
+            for registro in registros:
+                actual.append(registro)
+                if len(actual) >= lote:
+                    yield actual
+                    actual = []
+            if actual:
+                yield actual
+
+        if codificacion == 'json':
+            # {"tipo":..,"timestamp":..,"datos":{<resto>,"<clave>":[...]}}
+            mensaje = {
+                'tipo': tipo,
+                'timestamp': datetime.fromtimestamp(ts_ms / 1000).isoformat(),
+                'datos': datos
+            }
+            prefijo = json.dumps(mensaje)[:-2]  # Sin '}}'
+            separador = ', ' if datos else ''
+            yield f"{prefijo}{separador}{json.dumps(clave)}: [".encode('utf-8')
+
+            primero = True
+            for grupo in lotes():
+                texto = ', '.join(json.dumps(r) for r in grupo)
+                yield (texto if primero else ', ' + texto).encode('utf-8')
+                primero = False
+            yield b']}}'
+            return
+
+        yield CodificacionCompacta._cabecera(tipo, ts_ms, DATOS_DETECCIONES_LOTES)
+        for grupo in lotes():
+            yield b'\x01' + EsquemaDeteccion.codificar_lista(grupo)
+
+        formato_resto, resto = CodificacionCompacta._datos_genericos(datos, codificacion)
+        yield b'\x00' + json.dumps(clave).encode('utf-8') + b'\n' + bytes([formato_resto]) + resto
+
+    @staticmethod
+    def es_compacto(cuerpo: bytes) -> bool:
+        """Indica si el cuerpo de un mensaje usa el formato compacto"""
+        return len(cuerpo) > 0 and cuerpo[0] == MARCA
+
+    @staticmethod
+    def deserializar(cuerpo: bytes,
+                     leer_siguiente: Optional[Callable[[], Optional[bytes]]] = None) -> Dict[str, Any]:
+        """
+        Deserializa el cuerpo (sin header de tamaño) de un mensaje compacto.
+
+        Args:
+            cuerpo: Cuerpo del mensaje (o del primer fragmento)
+            leer_siguiente: Lee el cuerpo del siguiente mensaje del socket;
+                            necesario si el mensaje viene fragmentado
+
+        Returns:
+            Mensaje con el mismo formato que el JSON legado
+            ({'tipo', 'timestamp' ISO, 'datos'}, más 'canal' e 'id' si venía
+            etiquetado)
+        """
+        reensamblador = Reensamblador()
+        mensaje = reensamblador.agregar(cuerpo)
+        while mensaje is None:
+            siguiente = leer_siguiente() if leer_siguiente else None
+            if siguiente is None or not CodificacionCompacta.es_compacto(siguiente):
+                raise ConnectionError("Mensaje fragmentado incompleto")
+            mensaje = reensamblador.agregar(siguiente)
+        return mensaje
+
+    @staticmethod
+    def _separar(cuerpo: bytes) -> Tuple[int, Optional[Tuple[int, int]], bytes]:
+        """
+        Separa la envoltura del payload.
+
+        Returns:
+            (flags, etiqueta o None, payload)
+        """
+        _, flags = ENVOLTURA.unpack_from(cuerpo, 0)
+        if flags & FLAG_ETIQUETA:
+            etiqueta = ETIQUETA.unpack_from(cuerpo, ENVOLTURA.size)
+            return flags, etiqueta, cuerpo[ENVOLTURA.size + ETIQUETA.size:]
+        return flags, None, cuerpo[ENVOLTURA.size:]
+
+    @staticmethod
+    def _decodificar(flags: int, payload: bytes,
+                     etiqueta: Optional[Tuple[int, int]]) -> Dict[str, Any]:
+        """Decodifica un payload completo y descomprimido"""
+        if flags & FLAG_JSON:
+            mensaje = json.loads(payload)
+        else:
+            mensaje = CodificacionCompacta._decodificar_payload(payload)
+
+        if etiqueta is not None:
+            mensaje['canal'], mensaje['id'] = etiqueta
+        return mensaje
+
+    @staticmethod
+    def _decodificar_payload(payload: bytes) -> Dict[str, Any]:
+        """Decodifica un payload compacto ya descomprimido"""
+        vista = memoryview(payload)
+        codigo, ts_ms, formato = CABECERA.unpack_from(vista, 0)
+        offset = CABECERA.size
+
+        if codigo == TIPO_LIBRE:
+            largo = vista[offset]
+            tipo = bytes(vista[offset + 1:offset + 1 + largo]).decode('utf-8')
+            offset += 1 + largo
+        else:
+            tipo = TIPOS[codigo]
+
+        if formato == DATOS_DETECCION:
+            registros, _ = EsquemaDeteccion.decodificar_lista(vista, offset)
+            datos = registros[0]
+
+        elif formato == DATOS_DETECCIONES:
+            registros, offset = EsquemaDeteccion.decodificar_lista(vista, offset)
+            datos = CodificacionCompacta._decodificar_genericos(vista[offset], vista[offset + 1:])
+            datos['detecciones'] = registros
+
+        elif formato == DATOS_DETECCIONES_LOTES:
+            registros = []
+            while vista[offset] == 1:
+                lote, offset = EsquemaDeteccion.decodificar_lista(vista, offset + 1)
+                registros.extend(lote)
+
+            fin_clave = payload.index(b'\n', offset + 1)
+            clave = json.loads(bytes(vista[offset + 1:fin_clave]))
+            datos = CodificacionCompacta._decodificar_genericos(vista[fin_clave + 1],
+                                                                vista[fin_clave + 2:])
+            datos[clave] = registros
+
+        else:
+            datos = CodificacionCompacta._decodificar_genericos(formato, vista[offset:])
+
+        return {
+            'tipo': tipo,
+            'timestamp': datetime.fromtimestamp(ts_ms / 1000).isoformat(),
+            'datos': datos
+        }
+
+    @staticmethod
+    def _decodificar_genericos(formato: int, cuerpo: memoryview) -> Any:
+        """Decodifica datos sin esquema fijo"""
+        if formato == DATOS_MSGPACK:
+            msgpack = Dependencias.cargar_msgpack()
+            if not msgpack:
+                raise ValueError("Mensaje msgpack recibido pero msgpack no está instalado")
+            return msgpack.unpackb(cuerpo, raw=False, strict_map_key=False)
+        return json.loads(bytes(cuerpo))
+
+
+class Reensamblador:
+    """
+    Une los fragmentos de mensajes compactos de un socket.
+
+    Los fragmentos se agrupan por etiqueta (canal, id): en una conexión
+    multiplexada los de distintas respuestas llegan intercalados. Los
+    mensajes sin etiqueta usan una única entrada, porque sus fragmentos
+    siempre llegan seguidos.
+    """
+
+    def __init__(self, max_bytes: int = MAX_MENSAJE):
+        """
+        Args:
+            max_bytes: Tamaño máximo de un mensaje reensamblado y descomprimido
+        """
+        self.max_bytes = max_bytes
+        # {etiqueta: [flags del primer fragmento, descompresor, partes, bytes]}
+        self._pendientes = {}
+
+    def agregar(self, cuerpo: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Procesa el cuerpo de un mensaje compacto.
+
+        Returns:
+            Mensaje completo, o None si faltan fragmentos
+
+        Raises:
+            ValueError: El mensaje supera max_bytes (se descarta lo acumulado)
+        """
+        flags, etiqueta, payload = CodificacionCompacta._separar(cuerpo)
+        estado = self._pendientes.pop(etiqueta, None)
+
+        if estado is None:
+            codigo = flags & FLAG_COMPRESION
+            if not codigo and not flags & FLAG_FRAGMENTO:
+                return CodificacionCompacta._decodificar(flags, payload, etiqueta)
+            estado = [flags, Compresion.descompresor(codigo) if codigo else None, [], 0]
+
+        inicial, descompresor, partes, total = estado
+        restantes = self.max_bytes - total
+        parte = descompresor.descomprimir(payload, restantes) if descompresor else payload
+        if not flags & FLAG_FRAGMENTO and descompresor:
+            parte += descompresor.terminar()
+        total += len(parte)
+        if total > self.max_bytes:
+            raise ValueError(f"Mensaje de más de {self.max_bytes} bytes")
+        partes.append(parte)
+
+        if flags & FLAG_FRAGMENTO:
+            estado[3] = total
+            self._pendientes[etiqueta] = estado
+            return None
+
+        return CodificacionCompacta._decodificar(inicial, b''.join(partes), etiqueta)
+
+    def pendientes(self) -> int:
+        """Cantidad de mensajes a medio recibir"""
+        return len(self._pendientes)
@@ -0,0 +1,148 @@
+"""
+Compresión opcional de mensajes del protocolo.
+
+Se negocia en HELLO junto con la codificación: el cliente propone los
+algoritmos que tiene instalados y el servidor elige el primero que también
+tiene. zlib (biblioteca estándar) está siempre disponible; zstd (paquete
+zstandard) y lz4 (paquete lz4) se usan si están instalados.
+
+Solo se comprimen mensajes por encima de un umbral de tamaño y nunca frames
+(el JPEG ya está comprimido). Los compresores son incrementales para que una
+respuesta grande pueda comprimirse y enviarse por fragmentos sin armarla
+entera en memoria.
+"""
+
+import zlib
+from typing import List, Optional
+
+from src.common.utils import Dependencias
+
+
+class Compresion:
+    """Algoritmos de compresión y sus códigos en el header del mensaje"""
+
+    NINGUNA = 0
+    CODIGOS = {'zlib': 1, 'zstd': 2, 'lz4': 3}
+    NOMBRES = {codigo: nombre for nombre, codigo in CODIGOS.items()}
+
+    # Preferencia al negociar: zstd comprime más y más rápido que zlib
+    PREFERENCIA = ('zstd', 'lz4', 'zlib')
+
+    MODULOS = {'zstd': 'zstandard', 'lz4': 'lz4.frame'}
+
+    NIVEL_ZLIB = 6
+
+    @staticmethod
+    def disponibles() -> List[str]:
+        """Algoritmos instalados, de mayor a menor preferencia"""
+        return [nombre for nombre in Compresion.PREFERENCIA
+                if nombre == 'zlib' or Dependencias.cargar_opcional(Compresion.MODULOS[nombre])]
+
+    @staticmethod
+    def elegir(propuestas: List[str]) -> Optional[str]:
+        """
+        Elige el primer algoritmo propuesto que este proceso soporta.
+
+        Returns:
+            Nombre del algoritmo o None si no hay ninguno en común
+        """
+        disponibles = Compresion.disponibles()
+        for nombre in propuestas:
+            if nombre in disponibles:
+                return nombre
+        return None
+
+    @staticmethod
+    def compresor(nombre: str) -> 'Compresor':
+        """Crea un compresor incremental del algoritmo indicado"""
+        return Compresor(nombre)
+
+    @staticmethod
+    def descompresor(codigo: int) -> 'Descompresor':
+        """Crea un descompresor incremental a partir del código del header"""
+        if codigo not in Compresion.NOMBRES:
+            raise ValueError(f"Código de compresión desconocido: {codigo}")
+        return Descompresor(Compresion.NOMBRES[codigo])
+
+    @staticmethod
+    def comprimir(nombre: str, datos: bytes) -> bytes:
+        """Comprime un bloque completo"""
+        compresor = Compresor(nombre)
+        return compresor.comprimir(datos) + compresor.terminar()
+
+
+class Compresor:
+    """Compresor incremental con la misma interfaz para zlib, zstd y lz4"""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.codigo = Compresion.CODIGOS[nombre]
+        self._inicio = b''
+
+        if nombre == 'zlib':
+            self._objeto = zlib.compressobj(Compresion.NIVEL_ZLIB)
+        elif nombre == 'zstd':
+            self._objeto = Dependencias.cargar_opcional('zstandard').ZstdCompressor().compressobj()
+        else:
+            self._objeto = Dependencias.cargar_opcional('lz4.frame').LZ4FrameCompressor()
+            self._inicio = self._objeto.begin()
+
+    def comprimir(self, datos: bytes) -> bytes:
+        """Agrega datos; devuelve lo que el compresor ya pudo emitir (puede ser vacío)"""
+        salida = self._inicio + self._objeto.compress(datos)
+        self._inicio = b''
+        return salida
+
+    def terminar(self) -> bytes:
+        """Cierra el flujo y devuelve los bytes pendientes"""
+        salida = self._inicio + self._objeto.flush()
+        self._inicio = b''
+        return salida
+
+
+class Descompresor:
+    """Descompresor incremental con la misma interfaz para zlib, zstd y lz4"""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+
+        if nombre == 'zlib':
+            self._objeto = zlib.decompressobj()
+        elif nombre == 'zstd':
+            modulo = Dependencias.cargar_opcional('zstandard')
+            if not modulo:
+                raise ValueError("Mensaje zstd recibido pero zstandard no está instalado")
+            self._objeto = modulo.ZstdDecompressor().decompressobj()
+        else:
+            modulo = Dependencias.cargar_opcional('lz4.frame')
+            if not modulo:
+                raise ValueError("Mensaje lz4 recibido pero lz4 no está instalado")
+            self._objeto = modulo.LZ4FrameDecompressor()
+
+    def descomprimir(self, datos: bytes, max_bytes: int = -1) -> bytes:
+        """
+        Descomprime un fragmento.
+
+        Args:
+            datos: Fragmento comprimido
+            max_bytes: Salida máxima (-1 = sin límite); zlib y lz4 dejan de
+                       descomprimir al pasarla, zstd se controla después
+
+        Raises:
+            ValueError: La salida supera max_bytes
+        """
+        if not datos:
+            return b''
+        if max_bytes < 0 or self.nombre == 'zstd':
+            salida = self._objeto.decompress(datos)
+        else:
+            salida = self._objeto.decompress(datos, max_bytes + 1)
+        if 0 <= max_bytes < len(salida):
+            raise ValueError(f"Mensaje descomprimido de más de {max_bytes} bytes")
+        return salida
+
+    def terminar(self) -> bytes:
+        """Devuelve los bytes pendientes al final del flujo"""
+        if self.nombre == 'zlib':
+            return self._objeto.flush()
+        return b''
@@ -0,0 +1,267 @@
+"""
+Control de flujo por créditos entre el servidor de video y sus consumidores.
+
+El consumidor otorga N créditos de frames por cámara (mensaje FRAME_CREDIT) y
+el productor solo envía un frame de esa cámara mientras el cliente tenga
+créditos; sin créditos, el frame se omite en el origen, antes de codificarlo
+o de copiarlo al anillo. Cada frame que sale del pipeline del consumidor
+(procesado, vencido o reemplazado) devuelve su crédito, de modo que nunca hay
+más de N frames en vuelo por cámara.
+
+Ventana (servidor_testeo.control_flujo.ventana, 2 por defecto): con N = 1 el
+detector queda ocioso una ida y vuelta por frame (devolver el crédito,
+esperar el próximo frame de la cámara, recibirlo); con N = 2 siempre tiene
+el siguiente ya recibido y procesa tanto como sin créditos. El costo es la
+edad: si la cámara produce más rápido que la inferencia, un frame espera en
+testeo hasta N - 1 inferencias. Ventanas mayores solo agregan espera (ver
+scripts/test_flujo_creditos.py --ventana).
+
+Mensaje FRAME_CREDIT:
+    {'camaras': {'<camera_id>': n, ...}, 'reiniciar': [camera_id, ...]}
+    Los créditos se suman a los existentes, salvo para las cámaras listadas en
+    'reiniciar', cuyo valor pasa a ser exactamente n.
+
+Compatibilidad: un cliente que nunca envía FRAME_CREDIT (cliente Java,
+versiones anteriores) recibe todos los frames, como antes.
+"""
+
+import threading
+import time
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+
+class CreditosProductor:
+    """Créditos disponibles por cliente y cámara (lado servidor de video)"""
+
+    def __init__(self):
+        self.creditos = {}  # {cliente: {camera_id: int}}; ausente = sin control
+        self.omitidos = {}  # {camera_id: frames omitidos por falta de créditos}
+        self.lock = threading.Lock()
+
+    def otorgar(self, cliente: Any, datos: Dict[str, Any]):
+        """
+        Aplica un mensaje FRAME_CREDIT de un cliente.
+
+        Args:
+            cliente: Socket (u otra clave) del cliente
+            datos: Datos del mensaje FRAME_CREDIT
+        """
+        reiniciar = {int(cid) for cid in datos.get('reiniciar', [])}
+
+        with self.lock:
+            tabla = self.creditos.setdefault(cliente, {})
+            for camera_id, cantidad in datos.get('camaras', {}).items():
+                camera_id = int(camera_id)
+                base = 0 if camera_id in reiniciar else tabla.get(camera_id, 0)
+                tabla[camera_id] = max(0, base + int(cantidad))
+
+    def consumir(self, cliente: Any, camera_id: int) -> bool:
+        """
+        Toma un crédito para enviar un frame a un cliente.
+
+        Returns:
+            True si el frame debe enviarse (hay crédito o el cliente no usa
+            control de flujo), False si se omite
+        """
+        with self.lock:
+            tabla = self.creditos.get(cliente)
+            if tabla is None:
+                return True
+
+            if tabla.get(camera_id, 0) > 0:
+                tabla[camera_id] -= 1
+                return True
+
+            self.omitidos[camera_id] = self.omitidos.get(camera_id, 0) + 1
+            return False
+
+    def devolver(self, cliente: Any, camera_id: int):
+        """Devuelve un crédito tomado para un frame que finalmente no se envió"""
+        with self.lock:
+            tabla = self.creditos.get(cliente)
+            if tabla is not None:
+                tabla[camera_id] = tabla.get(camera_id, 0) + 1
+
+    def hay_demanda(self, camera_id: int, clientes: Iterable[Any]) -> bool:
+        """
+        Indica si algún cliente aceptaría ahora un frame de la cámara.
+
+        Permite omitir el frame en la captura, antes de redimensionarlo.
+        """
+        with self.lock:
+            for cliente in clientes:
+                tabla = self.creditos.get(cliente)
+                if tabla is None or tabla.get(camera_id, 0) > 0:
+                    return True
+            return False
+
+    def eliminar(self, cliente: Any):
+        """Olvida los créditos de un cliente desconectado"""
+        with self.lock:
+            self.creditos.pop(cliente, None)
+
+    def obtener_omitidos(self) -> Dict[int, int]:
+        """Frames omitidos por cámara desde el inicio"""
+        with self.lock:
+            return dict(self.omitidos)
+
+
+class CreditosConsumidor:
+    """Ventana de créditos por cámara (lado servidor de testeo)"""
+
+    def __init__(self, camaras: List[int], ventana: int = 2, reintento_s: float = 5.0):
+        """
+        Inicializa la ventana de créditos.
+
+        Args:
+            camaras: IDs de las cámaras a las que se otorgan créditos
+            ventana: Frames en vuelo máximos por cámara
+            reintento_s: Segundos sin recibir frames de una cámara tras los
+                         cuales se reinicia su ventana (recupera créditos perdidos)
+        """
+        self.ventana = max(1, ventana)
+        self.reintento_s = reintento_s
+
+        self.en_vuelo = {cid: 0 for cid in camaras}  # Créditos que tiene el productor + frames en el pipeline
+        self.pendientes = {}                         # {camera_id: créditos liberados sin enviar}
+        self.reiniciar = set()
+        self.ultimo_frame = {}                       # {camera_id: monotonic del último frame recibido}
+        self.epocas = {}                             # {camera_id: reinicios de ventana enviados}
+
+        self.condicion = threading.Condition()
+
+    def inicial(self) -> Tuple[Dict[int, int], List[int]]:
+        """
+        Ventana completa para todas las cámaras (al conectar).
+
+        Returns:
+            (créditos, cámaras a reiniciar) para crear el mensaje FRAME_CREDIT
+        """
+        ahora = time.monotonic()
+        with self.condicion:
+            self.pendientes.clear()
+            self.reiniciar.clear()
+            for camera_id in self.en_vuelo:
+                self.en_vuelo[camera_id] = self.ventana
+                self.ultimo_frame[camera_id] = ahora
+                self.epocas[camera_id] = self.epocas.get(camera_id, 0) + 1
+            return {cid: self.ventana for cid in self.en_vuelo}, list(self.en_vuelo)
+
+    def actualizar(self, camaras: List[int], ventana: int):
+        """
+        Aplica una configuración recargada sin cortar la conexión.
+
+        Las cámaras nuevas reciben la ventana completa en el próximo
+        FRAME_CREDIT, las quitadas dejan de recibir créditos y, si cambia el
+        tamaño de la ventana, se reinicia la de todas.
+
+        Args:
+            camaras: IDs de las cámaras configuradas
+            ventana: Frames en vuelo máximos por cámara
+        """
+        ahora = time.monotonic()
+        with self.condicion:
+            for camera_id in [cid for cid in self.en_vuelo if cid not in camaras]:
+                del self.en_vuelo[camera_id]
+                self.pendientes.pop(camera_id, None)
+                self.ultimo_frame.pop(camera_id, None)
+                self.epocas.pop(camera_id, None)
+                self.reiniciar.discard(camera_id)
+
+            ventana = max(1, ventana)
+            nuevas = [cid for cid in camaras if cid not in self.en_vuelo]
+            reiniciar = list(self.en_vuelo) + nuevas if ventana != self.ventana else nuevas
+            self.ventana = ventana
+            for camera_id in reiniciar:
+                self.en_vuelo[camera_id] = 0
+                self.ultimo_frame[camera_id] = ahora
+                self.reiniciar.add(camera_id)
+            if reiniciar:
+                self.condicion.notify()
+
+    def reanudar(self, camera_id: int):
+        """
+        Reinicia ya la ventana de una cámara que vuelve a estar activa, sin
+        esperar reintento_s (sus créditos pudieron perderse en la caída).
+        """
+        with self.condicion:
+            if camera_id not in self.en_vuelo:
+                return
+            self.reiniciar.add(camera_id)
+            self.ultimo_frame[camera_id] = time.monotonic()
+            self.condicion.notify()
+
+    def recibido(self, camera_id: int) -> int:
+        """
+        Registra la llegada de un frame de la cámara.
+
+        Returns:
+            Época de la ventana de la cámara, a pasar a liberar() con el frame
+        """
+        with self.condicion:
+            self.ultimo_frame[camera_id] = time.monotonic()
+            return self.epocas.get(camera_id, 0)
+
+    def liberar(self, camera_id: int, cantidad: int = 1, epoca: Optional[int] = None):
+        """
+        Devuelve créditos de frames que salieron del pipeline.
+
+        Los frames recibidos antes de un reinicio de la ventana no devuelven
+        crédito: el reinicio ya le dio al productor la ventana completa, y
+        sumarles su crédito dejaría más de `ventana` frames en vuelo.
+
+        Args:
+            camera_id: ID de la cámara
+            cantidad: Número de frames liberados
+            epoca: Época devuelta por recibido() al llegar los frames
+        """
+        if cantidad <= 0:
+            return
+
+        with self.condicion:
+            if camera_id not in self.en_vuelo:
+                return
+            if epoca is not None and epoca != self.epocas.get(camera_id, 0):
+                return
+            self.en_vuelo[camera_id] = max(0, self.en_vuelo[camera_id] - cantidad)
+            self.pendientes[camera_id] = self.pendientes.get(camera_id, 0) + cantidad
+            self.condicion.notify()
+
+    def _revisar_silencios(self, ahora: float):
+        """Reinicia la ventana de las cámaras sin frames durante reintento_s"""
+        for camera_id in self.en_vuelo:
+            if ahora - self.ultimo_frame.get(camera_id, ahora) > self.reintento_s:
+                self.reiniciar.add(camera_id)
+                self.ultimo_frame[camera_id] = ahora
+
+    def esperar(self, timeout: Optional[float] = None) -> Tuple[Dict[int, int], List[int]]:
+        """
+        Espera créditos a devolver al productor.
+
+        Args:
+            timeout: Segundos máximos de espera
+
+        Returns:
+            (créditos, cámaras a reiniciar); ambos vacíos si no hubo cambios
+        """
+        with self.condicion:
+            if not self.pendientes:
+                self.condicion.wait(timeout)
+
+            self._revisar_silencios(time.monotonic())
+
+            creditos = {}
+            for camera_id, cantidad in self.pendientes.items():
+                if camera_id not in self.reiniciar:
+                    creditos[camera_id] = cantidad
+                    self.en_vuelo[camera_id] += cantidad
+
+            reiniciar = list(self.reiniciar)
+            for camera_id in reiniciar:
+                creditos[camera_id] = self.ventana
+                self.en_vuelo[camera_id] = self.ventana
+                self.epocas[camera_id] = self.epocas.get(camera_id, 0) + 1
+
+            self.pendientes.clear()
+            self.reiniciar.clear()
+            return creditos, reiniciar
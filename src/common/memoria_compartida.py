@@ -0,0 +1,218 @@
+"""
+Transporte de frames por memoria compartida entre procesos del mismo host.
+
+Cuando el servidor de video y el de testeo corren en la misma máquina, cada
+frame BGR se copia en un anillo de slots de `multiprocessing.shared_memory`
+y por el canal de control (socket Unix) solo viaja un mensaje corto con el
+slot y su número de secuencia. Se evita JPEG, base64, JSON del frame y la pila
+TCP.
+
+Formato del segmento:
+    [cabecera global][slot 0][slot 1]...[slot N-1]
+    cabecera global: magic (u32), num_slots (u32), slot_bytes (u32)
+    slot: seq (u64), camera_id (u32), alto (u32), ancho (u32), canales (u32),
+          capture_ts (f64), nbytes (u32), [datos BGR]
+
+La secuencia funciona como seqlock: el productor la pone en 0 mientras escribe
+y al terminar publica el valor nuevo. El lector valida que la secuencia sea la
+anunciada antes y después de copiar; si no coincide, el slot fue reutilizado y
+el frame se considera reemplazado.
+"""
+
+import struct
+import threading
+from multiprocessing import shared_memory
+from typing import Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Serializa la apertura sin registro (parchea temporalmente el resource_tracker)
+_registro_lock = threading.Lock()
+
+
+class AnilloFrames:
+    """Anillo de frames BGR sin comprimir en memoria compartida"""
+
+    MAGIC = 0x50433446  # "PC4F"
+    CABECERA = struct.Struct('<III')
+    CABECERA_SLOT = struct.Struct('<QIIIIdI')
+
+    def __init__(self, shm: shared_memory.SharedMemory, num_slots: int,
+                 slot_bytes: int, propietario: bool):
+        """
+        Usar AnilloFrames.crear() o AnilloFrames.abrir().
+
+        Args:
+            shm: Segmento de memoria compartida
+            num_slots: Número de slots del anillo
+            slot_bytes: Capacidad de datos de cada slot
+            propietario: True si este proceso creó el segmento (y debe liberarlo)
+        """
+        self.shm = shm
+        self.nombre = shm.name
+        self.num_slots = num_slots
+        self.slot_bytes = slot_bytes
+        self.propietario = propietario
+
+        self.siguiente_slot = 0
+        self.siguiente_seq = 1
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _tamano_slot(slot_bytes: int) -> int:
+        return AnilloFrames.CABECERA_SLOT.size + slot_bytes
+
+    def _offset(self, slot: int) -> int:
+        return self.CABECERA.size + slot * self._tamano_slot(self.slot_bytes)
+
+    @staticmethod
+    def crear(num_slots: int, slot_bytes: int, nombre: Optional[str] = None) -> 'AnilloFrames':
+        """
+        Crea un anillo nuevo (lado productor).
+
+        Args:
+            num_slots: Número de slots
+            slot_bytes: Bytes máximos por frame (ancho * alto * canales)
+            nombre: Nombre del segmento (None = generado por el sistema)
+
+        Returns:
+            Anillo creado
+        """
+        tamano = AnilloFrames.CABECERA.size + num_slots * AnilloFrames._tamano_slot(slot_bytes)
+        shm = shared_memory.SharedMemory(name=nombre, create=True, size=tamano)
+        AnilloFrames.CABECERA.pack_into(shm.buf, 0, AnilloFrames.MAGIC, num_slots, slot_bytes)
+        return AnilloFrames(shm, num_slots, slot_bytes, propietario=True)
+
+    @staticmethod
+    def abrir(nombre: str) -> 'AnilloFrames':
+        """
+        Se conecta a un anillo existente (lado consumidor).
+
+        Args:
+            nombre: Nombre del segmento anunciado por el productor
+
+        Returns:
+            Anillo abierto
+        """
+        shm = AnilloFrames._abrir_sin_registro(nombre)
+
+        magic, num_slots, slot_bytes = AnilloFrames.CABECERA.unpack_from(shm.buf, 0)
+        if magic != AnilloFrames.MAGIC:
+            shm.close()
+            raise ValueError(f"Segmento {nombre} no es un anillo de frames")
+
+        return AnilloFrames(shm, num_slots, slot_bytes, propietario=False)
+
+    @staticmethod
+    def _abrir_sin_registro(nombre: str) -> shared_memory.SharedMemory:
+        """
+        Abre un segmento sin registrarlo en el resource_tracker.
+
+        El consumidor no es dueño del segmento: si se registrara, el tracker
+        de su proceso lo eliminaría (o avisaría de una fuga) al terminar.
+        """
+        try:
+            return shared_memory.SharedMemory(name=nombre, track=False)  # Python 3.13+
+        except TypeError:
+            pass
+
+        from multiprocessing import resource_tracker
+
+        with _registro_lock:
+            registrar = resource_tracker.register
+            resource_tracker.register = lambda *args, **kwargs: None
+            try:
+                return shared_memory.SharedMemory(name=nombre)
+            finally:
+                resource_tracker.register = registrar
+
+    def escribir(self, camera_id: int, frame: 'np.ndarray',
+                 capture_ts: float) -> Optional[Tuple[int, int]]:
+        """
+        Copia un frame al siguiente slot del anillo.
+
+        Args:
+            camera_id: ID de la cámara
+            frame: Frame BGR (uint8, alto x ancho x canales)
+            capture_ts: Instante de captura (epoch, segundos)
+
+        Returns:
+            (slot, seq) a anunciar por el canal de control, o None si el frame
+            no cabe en un slot
+        """
+        import numpy as np
+
+        nbytes = frame.nbytes
+        if nbytes > self.slot_bytes:
+            return None
+
+        alto, ancho = frame.shape[:2]
+        canales = frame.shape[2] if frame.ndim == 3 else 1
+
+        with self.lock:
+            if self.shm.buf is None:
+                return None  # Anillo cerrado (cliente desconectado)
+
+            slot = self.siguiente_slot
+            seq = self.siguiente_seq
+            self.siguiente_slot = (slot + 1) % self.num_slots
+            self.siguiente_seq += 1
+
+            offset = self._offset(slot)
+            datos = offset + self.CABECERA_SLOT.size
+
+            # seq = 0 marca el slot como "en escritura"
+            self.CABECERA_SLOT.pack_into(self.shm.buf, offset, 0, camera_id, alto, ancho,
+                                         canales, capture_ts, nbytes)
+            destino = np.frombuffer(self.shm.buf, dtype=np.uint8, count=nbytes, offset=datos)
+            destino[:] = frame.reshape(-1)
+            del destino  # Sin vistas vivas del segmento: cerrar() puede liberarlo
+            struct.pack_into('<Q', self.shm.buf, offset, seq)
+
+        return slot, seq
+
+    def leer(self, slot: int, seq: int) -> Optional[Tuple['np.ndarray', Dict[str, Any]]]:
+        """
+        Copia el frame de un slot si todavía tiene la secuencia anunciada.
+
+        Args:
+            slot: Slot anunciado
+            seq: Secuencia anunciada
+
+        Returns:
+            (frame, metadatos) o None si el slot ya fue reutilizado
+        """
+        import numpy as np
+
+        offset = self._offset(slot)
+        datos = offset + self.CABECERA_SLOT.size
+
+        seq_leida, camera_id, alto, ancho, canales, capture_ts, nbytes = \
+            self.CABECERA_SLOT.unpack_from(self.shm.buf, offset)
+        if seq_leida != seq:
+            return None
+
+        forma = (alto, ancho, canales) if canales > 1 else (alto, ancho)
+        frame = np.frombuffer(self.shm.buf, dtype=np.uint8, count=nbytes,
+                              offset=datos).reshape(forma).copy()
+
+        # Validar que el productor no haya sobrescrito el slot durante la copia
+        if struct.unpack_from('<Q', self.shm.buf, offset)[0] != seq:
+            return None
+
+        return frame, {'camera_id': camera_id, 'capture_ts': capture_ts}
+
+    def cerrar(self):
+        """
+        Cierra el segmento y, si este proceso lo creó, lo elimina. Espera a
+        que termine una escritura en curso; las siguientes devuelven None.
+        """
+        with self.lock:
+            try:
+                self.shm.close()
+                if self.propietario:
+                    self.shm.unlink()
+            except (FileNotFoundError, BufferError):
+                pass
+
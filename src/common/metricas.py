@@ -0,0 +1,394 @@
+"""
+Métricas de los servidores en formato de texto de Prometheus.
+
+Cada servidor tiene un RegistroMetricas con contadores, medidores (gauges) e
+histogramas de cubetas fijas, y lo expone por HTTP en su puerto de métricas
+(GET /metrics) con un servidor mínimo sobre sockets puros, sin frameworks:
+
+    curl http://127.0.0.1:9100/metrics
+
+Actualizar una métrica en el camino caliente es barato: la serie de cada
+combinación de etiquetas se busca en un diccionario sin lock (solo se toma
+al crearla) y cada métrica tiene su propio lock, sin lock global.
+
+Los contadores que los servidores ya llevan (frames capturados, descartes
+del planificador, ...) se exponen con una función que se evalúa al consultar
+las métricas, sin tocar el código que los incrementa.
+"""
+
+import bisect
+import math
+import socket
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.common.registro import Registro
+from src.common.transporte import Transporte
+
+log = Registro.obtener('metricas')
+
+# Cubetas (s) para duraciones de etapas del pipeline
+CUBETAS_LATENCIA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _formatear_valor(valor: float) -> str:
+    """Número en el formato de Prometheus"""
+    if isinstance(valor, bool):
+        return '1' if valor else '0'
+    if isinstance(valor, int):
+        return str(valor)
+    if math.isinf(valor):
+        return '+Inf' if valor > 0 else '-Inf'
+    if math.isnan(valor):
+        return 'NaN'
+    return repr(float(valor))
+
+
+def _escapar(valor: Any) -> str:
+    """Escapa el valor de una etiqueta"""
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres: Sequence[str], valores: Sequence[Any]) -> str:
+    """{a="x",b="y"} o cadena vacía si no hay etiquetas"""
+    if not nombres:
+        return ''
+    pares = ','.join(f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores))
+    return '{' + pares + '}'
+
+
+class Metrica:
+    """Base de las métricas: nombre, ayuda, etiquetas y series por valores"""
+
+    TIPO = 'untyped'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 funcion: Optional[Callable[[], Any]] = None):
+        """
+        Args:
+            nombre: Nombre de la métrica (p. ej. pc4_video_frames_enviados_total)
+            ayuda: Descripción (línea HELP)
+            etiquetas: Nombres de las etiquetas
+            funcion: Si se indica, el valor se obtiene llamándola al exponer.
+                     Devuelve un número o {valores de etiquetas: número}
+                     (un valor suelto o una tupla si hay varias etiquetas)
+        """
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.funcion = funcion
+        self._series = {}  # {tupla de valores (str): serie}
+        self._lock = threading.Lock()
+
+    def etiquetar(self, *valores):
+        """
+        Serie de una combinación de valores de etiquetas (se crea la primera vez).
+
+        Conviene guardar la serie si se actualiza en un bucle.
+        """
+        clave = tuple(str(v) for v in valores)
+        serie = self._series.get(clave)
+        if serie is None:
+            if len(clave) != len(self.etiquetas):
+                raise ValueError(f"{self.nombre}: se esperaban etiquetas {self.etiquetas}")
+            with self._lock:
+                serie = self._series.setdefault(clave, self._nueva_serie())
+        return serie
+
+    def _nueva_serie(self):
+        """Valor inicial de una serie"""
+        return _Valor(self._lock)
+
+    def _muestras_funcion(self) -> Iterable[Tuple[Tuple[str, ...], float]]:
+        """Muestras obtenidas de la función de la métrica"""
+        try:
+            resultado = self.funcion()
+        except Exception as e:
+            log.warning("Error obteniendo %s: %s", self.nombre, e)
+            return []
+
+        if not isinstance(resultado, dict):
+            return [((), resultado)]
+        return [(clave if isinstance(clave, tuple) else (clave,), valor)
+                for clave, valor in resultado.items()]
+
+    def exponer(self) -> List[str]:
+        """Líneas de texto de la métrica (HELP, TYPE y muestras)"""
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.TIPO}"]
+        if self.funcion:
+            for valores, valor in self._muestras_funcion():
+                lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} "
+                              f"{_formatear_valor(valor)}")
+            return lineas
+
+        with self._lock:
+            series = list(self._series.items())
+        for valores, serie in series:
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} "
+                          f"{_formatear_valor(serie.valor)}")
+        return lineas
+
+
+class _Valor:
+    """Valor de una serie de contador o medidor"""
+
+    __slots__ = ('valor', '_lock')
+
+    def __init__(self, lock: threading.Lock):
+        self.valor = 0
+        self._lock = lock
+
+    def inc(self, cantidad: float = 1):
+        """Suma una cantidad"""
+        with self._lock:
+            self.valor += cantidad
+
+    def dec(self, cantidad: float = 1):
+        """Resta una cantidad (solo medidores)"""
+        with self._lock:
+            self.valor -= cantidad
+
+    def fijar(self, valor: float):
+        """Fija el valor (solo medidores)"""
+        self.valor = valor
+
+
+class Contador(Metrica):
+    """Contador monótono (p. ej. frames enviados)"""
+
+    TIPO = 'counter'
+
+    def inc(self, cantidad: float = 1):
+        """Incrementa la serie sin etiquetas"""
+        self.etiquetar().inc(cantidad)
+
+
+class Medidor(Metrica):
+    """Valor que sube y baja (p. ej. profundidad de una cola)"""
+
+    TIPO = 'gauge'
+
+    def fijar(self, valor: float):
+        """Fija el valor de la serie sin etiquetas"""
+        self.etiquetar().fijar(valor)
+
+    def inc(self, cantidad: float = 1):
+        """Suma a la serie sin etiquetas"""
+        self.etiquetar().inc(cantidad)
+
+    def dec(self, cantidad: float = 1):
+        """Resta a la serie sin etiquetas"""
+        self.etiquetar().dec(cantidad)
+
+
+class _SerieHistograma:
+    """Cubetas, suma y cantidad de una serie de histograma"""
+
+    __slots__ = ('limites', 'cubetas', 'suma', 'cantidad', '_lock')
+
+    def __init__(self, limites: Tuple[float, ...], lock: threading.Lock):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)  # La última: mayores al último límite
+        self.suma = 0.0
+        self.cantidad = 0
+        self._lock = lock
+
+    def observar(self, valor: float):
+        """Agrega una observación"""
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            self.cubetas[indice] += 1
+            self.suma += valor
+            self.cantidad += 1
+
+
+class Histograma(Metrica):
+    """Histograma de cubetas fijas (p. ej. duración de la inferencia en s)"""
+
+    TIPO = 'histogram'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 cubetas: Sequence[float] = CUBETAS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(sorted(cubetas))
+
+    def _nueva_serie(self):
+        return _SerieHistograma(self.limites, self._lock)
+
+    def observar(self, valor: float):
+        """Agrega una observación a la serie sin etiquetas"""
+        self.etiquetar().observar(valor)
+
+    def exponer(self) -> List[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.TIPO}"]
+        with self._lock:
+            series = [(valores, list(s.cubetas), s.suma, s.cantidad)
+                      for valores, s in self._series.items()]
+
+        nombres_le = self.etiquetas + ('le',)
+        for valores, cubetas, suma, cantidad in series:
+            acumulado = 0
+            for limite, cuenta in zip(self.limites + (math.inf,), cubetas):
+                acumulado += cuenta
+                etiquetas = _etiquetas(nombres_le, valores + (_formatear_valor(float(limite)),))
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            etiquetas = _etiquetas(self.etiquetas, valores)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_formatear_valor(suma)}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {cantidad}")
+        return lineas
+
+
+class RegistroMetricas:
+    """Métricas de un proceso; pedir una métrica ya creada devuelve la misma"""
+
+    def __init__(self):
+        self._metricas = {}  # {nombre: Metrica}, en orden de creación
+        self._lock = threading.Lock()
+
+    def _obtener(self, clase, nombre: str, *args, **kwargs) -> Metrica:
+        """Devuelve la métrica registrada con ese nombre o la crea"""
+        with self._lock:
+            metrica = self._metricas.get(nombre)
+            if metrica is None:
+                metrica = clase(nombre, *args, **kwargs)
+                self._metricas[nombre] = metrica
+            elif not isinstance(metrica, clase):
+                raise ValueError(f"La métrica {nombre} ya existe como {metrica.TIPO}")
+            return metrica
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 funcion: Optional[Callable[[], Any]] = None) -> Contador:
+        """Contador (ver Metrica para funcion)"""
+        return self._obtener(Contador, nombre, ayuda, etiquetas, funcion)
+
+    def medidor(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                funcion: Optional[Callable[[], Any]] = None) -> Medidor:
+        """Medidor (ver Metrica para funcion)"""
+        return self._obtener(Medidor, nombre, ayuda, etiquetas, funcion)
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                   cubetas: Sequence[float] = CUBETAS_LATENCIA) -> Histograma:
+        """Histograma de cubetas fijas"""
+        return self._obtener(Histograma, nombre, ayuda, etiquetas, cubetas)
+
+    def exponer(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus (0.0.4)"""
+        with self._lock:
+            metricas = list(self._metricas.values())
+
+        lineas = []
+        for metrica in metricas:
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+class ServidorMetricas:
+    """Servidor HTTP mínimo que responde GET /metrics con un registro"""
+
+    TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+    MAX_SOLICITUD = 8192
+
+    def __init__(self, registro: RegistroMetricas, host: str, puerto: int):
+        """
+        Args:
+            registro: Métricas a exponer
+            host: Interfaz de escucha
+            puerto: Puerto HTTP de métricas
+        """
+        self.registro = registro
+        self.host = host
+        self.puerto = puerto
+        self.socket = None
+        self.running = False
+
+    def iniciar(self) -> bool:
+        """
+        Abre el puerto y atiende consultas en un hilo.
+
+        Returns:
+            True si quedó escuchando (un puerto ocupado no detiene al servidor)
+        """
+        try:
+            self.socket = Transporte.escuchar({'host': self.host, 'puerto': self.puerto}, 5)[0]
+        except OSError as e:
+            log.warning("No se pudo abrir el puerto %s: %s", self.puerto, e)
+            return False
+
+        self.running = True
+        threading.Thread(target=self._aceptar, daemon=True).start()
+        log.info("Expuestas en http://%s:%s/metrics", self.host, self.puerto)
+        return True
+
+    def _aceptar(self):
+        """Atiende las consultas de a una (son cortas)"""
+        while self.running:
+            try:
+                cliente, _ = self.socket.accept()
+            except OSError:
+                break
+
+            try:
+                cliente.settimeout(5)
+                self._atender(cliente)
+            except OSError:
+                pass
+            finally:
+                cliente.close()
+
+    def _atender(self, cliente: socket.socket):
+        """Lee la solicitud HTTP y responde"""
+        solicitud = b''
+        while b'\r\n\r\n' not in solicitud and len(solicitud) < self.MAX_SOLICITUD:
+            datos = cliente.recv(1024)
+            if not datos:
+                break
+            solicitud += datos
+
+        partes = solicitud.split(b'\r\n', 1)[0].split()
+        if len(partes) < 2:
+            self._responder(cliente, "400 Bad Request", b"solicitud invalida\n")
+            return
+
+        metodo, ruta = partes[0], partes[1].split(b'?', 1)[0]
+        if metodo not in (b'GET', b'HEAD'):
+            self._responder(cliente, "405 Method Not Allowed", b"solo GET\n")
+        elif ruta not in (b'/metrics', b'/'):
+            self._responder(cliente, "404 Not Found", b"use /metrics\n")
+        else:
+            cuerpo = self.registro.exponer().encode('utf-8')
+            self._responder(cliente, "200 OK", cuerpo, incluir_cuerpo=(metodo == b'GET'))
+
+    def _responder(self, cliente: socket.socket, estado: str, cuerpo: bytes,
+                   incluir_cuerpo: bool = True):
+        """Envía una respuesta HTTP/1.0 y cierra"""
+        cabecera = (f"HTTP/1.0 {estado}\r\n"
+                    f"Content-Type: {self.TIPO_CONTENIDO}\r\n"
+                    f"Content-Length: {len(cuerpo)}\r\n"
+                    f"Connection: close\r\n\r\n").encode('ascii')
+        cliente.sendall(cabecera + (cuerpo if incluir_cuerpo else b''))
+
+    def detener(self):
+        """Cierra el puerto de métricas"""
+        self.running = False
+        if self.socket:
+            try:
+                # accept() no se interrumpe con close() en Linux
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.socket.close()
+
+    @staticmethod
+    def desde_config(registro: RegistroMetricas,
+                     config_servidor: Dict[str, Any]) -> Optional['ServidorMetricas']:
+        """
+        Crea el servidor de métricas de una sección de servidor de config.json.
+
+        Returns:
+            None si la sección no tiene metricas_puerto
+        """
+        puerto = config_servidor.get('metricas_puerto')
+        if puerto is None:
+            return None
+        return ServidorMetricas(registro, config_servidor.get('host', '0.0.0.0'), puerto)
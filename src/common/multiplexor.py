@@ -0,0 +1,195 @@
+"""
+Envío multiplexado por una única conexión con un cliente.
+
+Con una sola conexión, una respuesta grande (historial, miniatura) bloquea
+las notificaciones en vivo hasta terminar de enviarse. El multiplexor tiene
+una cola por canal y un hilo emisor que envía de a un fragmento:
+- Los canales interactivos (control, detecciones, métricas) se atienden
+  primero; sus mensajes son pequeños.
+- Los canales de volumen (historial, miniaturas) se reparten por turnos, un
+  fragmento cada vez, así una miniatura no espera a que termine el historial.
+
+Los fragmentos de un envío se generan al momento de enviarlos (ver
+CodificacionCompacta.serializar_stream), de modo que una respuesta encolada
+no ocupa memoria hasta su turno. Cada envío lleva la etiqueta (canal, id de
+solicitud) para que el cliente correlacione la respuesta y una los fragmentos.
+
+Con clientes que negociaron multiplexado en HELLO se usa etiquetado. Con
+los demás (JSON legado, o sin multiplexado) se usa sin etiquetas: una sola
+cola en orden y mensajes enteros, así una respuesta grande a un cliente
+lento se envía desde su hilo emisor sin frenar a quien notifica a los demás.
+Una vez creado, los envíos a ese socket deben pasar por él; cada fragmento
+se envía con el lock de envío del socket (Protocolo.lock_envio).
+
+Si la generación de un envío falla después de enviar parte de sus
+fragmentos, se corta la conexión: el cliente no puede completar ese mensaje
+y, sin etiquetas, uniría a él los fragmentos del siguiente.
+"""
+
+import socket
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from src.common.codificacion import CodificacionCompacta
+from src.common.protocolo import Protocolo, Canal
+from src.common.registro import Registro
+
+log = Registro.obtener('multiplexor')
+
+
+class Multiplexor:
+    """Colas por canal y un hilo emisor para un socket multiplexado"""
+
+    def __init__(self, sock: socket.socket, max_pendientes: int = 256, etiquetado: bool = True):
+        """
+        Args:
+            sock: Socket del cliente
+            max_pendientes: Envíos máximos en espera por canal
+            etiquetado: True si el cliente negoció multiplexado; False envía
+                        los mensajes sin etiqueta y en orden por una sola cola
+        """
+        self.sock = sock
+        self.max_pendientes = max_pendientes
+        self.etiquetado = etiquetado
+
+        self._colas = {canal: deque() for canal in Canal.INTERACTIVOS + Canal.VOLUMEN}
+        self._turno = 0
+        self._condicion = threading.Condition()
+        self._activo = True
+        self.descartados = 0
+
+        self._hilo = threading.Thread(target=self._enviar, daemon=True)
+        self._hilo.start()
+
+    @property
+    def activo(self) -> bool:
+        """False si se cerró o falló el envío"""
+        return self._activo
+
+    def encolar(self, canal: int, fragmentos: Iterable[bytes]) -> bool:
+        """
+        Encola un envío ya serializado (uno o más fragmentos) en un canal.
+
+        Returns:
+            False si el multiplexor está cerrado o el canal está lleno
+        """
+        if not self.etiquetado:
+            canal = Canal.CONTROL  # Sin etiquetas los fragmentos no pueden intercalarse
+
+        with self._condicion:
+            if not self._activo:
+                return False
+
+            cola = self._colas[canal]
+            if len(cola) >= self.max_pendientes:
+                self.descartados += 1
+                return False
+
+            cola.append(iter(fragmentos))
+            self._condicion.notify()
+            return True
+
+    def enviar(self, canal: int, tipo: str, datos: Dict[str, Any],
+               id_solicitud: int = 0) -> bool:
+        """Encola un mensaje en un canal"""
+        if not self.etiquetado:
+            mensaje = Protocolo.serializar_para(self.sock, Protocolo.crear_mensaje(tipo, datos))
+            return self.encolar(canal, (mensaje,))
+
+        sesion = Protocolo.sesion(self.sock)
+        mensaje = CodificacionCompacta.serializar(
+            tipo, datos, sesion['codificacion'],
+            compresion=sesion['compresion'], umbral=sesion['umbral'],
+            etiqueta=(canal, id_solicitud))
+        return self.encolar(canal, (mensaje,))
+
+    def enviar_stream(self, canal: int, tipo: str, datos: Dict[str, Any], clave: str,
+                      registros: Iterable[Dict[str, Any]], id_solicitud: int = 0) -> bool:
+        """Encola una respuesta con una lista grande; se serializa por lotes al enviarla"""
+        if not self.etiquetado:
+            return self.encolar(canal, Protocolo.fragmentos_stream(self.sock, tipo, datos, clave, registros))
+
+        sesion = Protocolo.sesion(self.sock)
+        fragmentos = CodificacionCompacta.serializar_stream(
+            tipo, datos, clave, registros, sesion['codificacion'], sesion['compresion'],
+            Protocolo.LOTE_STREAM, Protocolo.FRAGMENTO_MULTIPLEX,
+            etiqueta=(canal, id_solicitud))
+        return self.encolar(canal, fragmentos)
+
+    def cerrar(self):
+        """Detiene el hilo emisor y descarta lo pendiente (no cierra el socket)"""
+        with self._condicion:
+            self._activo = False
+            for cola in self._colas.values():
+                cola.clear()
+            self._condicion.notify_all()
+
+    def _siguiente_canal(self) -> Optional[int]:
+        """Canal del próximo fragmento (se llama con la condición tomada)"""
+        for canal in Canal.INTERACTIVOS:
+            if self._colas[canal]:
+                return canal
+
+        total = len(Canal.VOLUMEN)
+        for i in range(total):
+            canal = Canal.VOLUMEN[(self._turno + i) % total]
+            if self._colas[canal]:
+                self._turno = (self._turno + i + 1) % total
+                return canal
+        return None
+
+    def _enviar(self):
+        """Hilo emisor: envía un fragmento por vez del canal que corresponda"""
+        iniciados = set()  # Envíos con algún fragmento ya en el socket
+        while True:
+            with self._condicion:
+                canal = self._siguiente_canal()
+                while self._activo and canal is None:
+                    self._condicion.wait()
+                    canal = self._siguiente_canal()
+                if not self._activo:
+                    return
+                cola = self._colas[canal]
+                fragmentos: Iterator[bytes] = cola[0]
+
+            # Generar y enviar fuera del lock para no bloquear a quien encola
+            try:
+                fragmento = next(fragmentos)
+            except StopIteration:
+                fragmento = None
+            except Exception as e:
+                log.exception("Error serializando envío del canal %d: %s", canal, e)
+                if fragmentos in iniciados:
+                    # El cliente quedaría esperando el resto del mensaje (y,
+                    # sin etiquetas, uniría a él el siguiente): se corta la
+                    # conexión para que la descarte y vuelva a conectarse
+                    self._cortar()
+                    return
+                fragmento = None
+
+            if fragmento is None:
+                iniciados.discard(fragmentos)
+                with self._condicion:
+                    if cola and cola[0] is fragmentos:
+                        cola.popleft()
+                continue
+
+            iniciados.add(fragmentos)
+
+            try:
+                with Protocolo.lock_envio(self.sock):
+                    self.sock.sendall(fragmento)
+            except OSError as e:
+                if self._activo:
+                    log.warning("Error enviando: %s", e)
+                self.cerrar()
+                return
+
+    def _cortar(self):
+        """Cierra la conexión en ambos sentidos; el hilo receptor del socket la da por terminada"""
+        self.cerrar()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
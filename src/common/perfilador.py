@@ -0,0 +1,248 @@
+"""
+Perfilador por muestreo integrado en los servidores.
+
+Se activa en caliente con el mensaje PROFILE, sin reiniciar ni adjuntar
+herramientas externas:
+
+    {"accion": "iniciar", "segundos": 30}    inicia (o reinicia) una captura
+    {"accion": "detener"}                    la termina antes y escribe el archivo
+    {"accion": "estado"}                     estado y funciones más frecuentes
+
+Un hilo toma cada `intervalo_ms` la pila de todos los hilos del proceso
+(sys._current_frames) y cuenta cuántas veces aparece cada pila. Al terminar
+escribe en logs/ un archivo de pilas colapsadas (una línea "hilo;f1;f2;...
+cuenta"), el formato que esperan flamegraph.pl y speedscope, para ver si el
+tiempo se va en decodificar, en predict, en JSON o esperando locks.
+
+La sobrecarga está acotada: si tomar las muestras ocupa más de una fracción
+del tiempo (sobrecarga_max) el intervalo se duplica.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from src.common.registro import Registro
+
+log = Registro.obtener('perfilador')
+
+
+class Perfilador:
+    """Muestreo periódico de las pilas de todos los hilos del proceso"""
+
+    INTERVALO_MS = 10
+    MAX_SEGUNDOS = 300
+    MAX_PROFUNDIDAD = 64
+    SOBRECARGA_MAX = 0.02   # Fracción del tiempo dedicada a muestrear
+    INTERVALO_MAX_MS = 500
+
+    def __init__(self, proceso: str, config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            proceso: Nombre del proceso (para el nombre del archivo)
+            config: Sección 'perfilador' de config.json
+        """
+        config = config or {}
+        self.proceso = proceso
+        self.directorio = config.get('directorio', 'logs')
+        self.intervalo_ms = config.get('intervalo_ms', self.INTERVALO_MS)
+        self.max_segundos = config.get('max_segundos', self.MAX_SEGUNDOS)
+        self.sobrecarga_max = config.get('sobrecarga_max', self.SOBRECARGA_MAX)
+
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pilas = Counter()   # {pila colapsada: muestras}
+        self._muestras = 0
+        self._costo_s = 0.0       # Tiempo dedicado a muestrear
+        self._inicio = 0.0
+        self._intervalo_s = 0.0
+        self._archivo = None      # Último archivo escrito
+
+    def activo(self) -> bool:
+        """True si hay una captura en curso"""
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def manejar(self, datos: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Atiende un mensaje PROFILE.
+
+        Returns:
+            Datos de la respuesta (estado de la captura)
+
+        Raises:
+            ValueError: Si la acción es desconocida o un parámetro no es numérico
+        """
+        accion = datos.get('accion', 'iniciar')
+        if accion == 'iniciar':
+            intervalo_ms = datos.get('intervalo_ms')
+            return self.iniciar(self._numero(datos, 'segundos', 30),
+                                None if intervalo_ms is None else self._numero(datos, 'intervalo_ms', 0))
+        if accion == 'detener':
+            self.detener()
+            return self.estado()
+        if accion == 'estado':
+            return self.estado(int(self._numero(datos, 'top', 15)))
+        raise ValueError(f"Acción de perfilado desconocida: {accion}")
+
+    @staticmethod
+    def _numero(datos: Dict[str, Any], clave: str, defecto: float) -> float:
+        """
+        Lee un parámetro numérico finito del mensaje.
+
+        Raises:
+            ValueError: Si el valor no es un número (null, lista, texto, bool, NaN...)
+        """
+        valor = datos.get(clave, defecto)
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or not math.isfinite(valor):
+            raise ValueError(f"Parámetro de perfilado inválido: {clave}={valor!r}")
+        return float(valor)
+
+    def iniciar(self, segundos: float, intervalo_ms: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Inicia una captura de `segundos` (acotados a max_segundos). Si ya hay
+        una en curso se termina y se escribe antes de empezar la nueva.
+        """
+        self.detener()
+
+        segundos = max(0.1, min(segundos, self.max_segundos))
+        with self._lock:
+            self._pilas = Counter()
+            self._muestras = 0
+            self._costo_s = 0.0
+            self._intervalo_s = max(1.0, float(intervalo_ms or self.intervalo_ms)) / 1000.0
+            self._inicio = time.monotonic()
+            self._archivo = None
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._muestrear, args=(segundos,),
+                                          name='perfilador', daemon=True)
+            self._hilo.start()
+
+        log.info("Perfilado iniciado por %.1f s (cada %.0f ms)", segundos, self._intervalo_s * 1000)
+        return self.estado()
+
+    def detener(self) -> Optional[str]:
+        """
+        Termina la captura en curso (si la hay) y escribe el archivo.
+
+        Returns:
+            Ruta del archivo escrito o None
+        """
+        hilo = self._hilo
+        if hilo is None:
+            return None
+
+        self._detener.set()
+        if hilo is not threading.current_thread():
+            hilo.join()
+        return self._archivo
+
+    def _muestrear(self, segundos: float):
+        """Hilo de muestreo"""
+        propio = threading.get_ident()
+        fin = time.monotonic() + segundos
+
+        while not self._detener.is_set() and time.monotonic() < fin:
+            inicio = time.perf_counter()
+            self._tomar_muestra(propio)
+            costo = time.perf_counter() - inicio
+
+            with self._lock:
+                self._muestras += 1
+                self._costo_s += costo
+                # Acotar la sobrecarga: si muestrear ocupa demasiado, espaciar
+                if costo > self._intervalo_s * self.sobrecarga_max:
+                    self._intervalo_s = min(self._intervalo_s * 2, self.INTERVALO_MAX_MS / 1000.0)
+                intervalo = self._intervalo_s
+
+            self._detener.wait(max(0.0, intervalo - costo))
+
+        self._archivo = self._escribir()
+        self._hilo = None
+
+    def _tomar_muestra(self, propio: int):
+        """Agrega la pila actual de cada hilo (excepto el del perfilador)"""
+        nombres = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+        pilas = []
+        for ident, frame in sys._current_frames().items():
+            if ident == propio:
+                continue
+
+            funciones = []
+            while frame is not None and len(funciones) < self.MAX_PROFUNDIDAD:
+                codigo = frame.f_code
+                funciones.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}"
+                                 f":{codigo.co_firstlineno})")
+                frame = frame.f_back
+            funciones.append(nombres.get(ident, f"hilo-{ident}").replace(';', ','))
+            funciones.reverse()
+            pilas.append(';'.join(funciones))
+
+        with self._lock:
+            self._pilas.update(pilas)
+
+    def _escribir(self) -> Optional[str]:
+        """Escribe las pilas colapsadas de la captura"""
+        with self._lock:
+            pilas = sorted(self._pilas.items())
+        if not pilas:
+            return None
+
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            ruta = os.path.join(self.directorio, f"perfil_{self.proceso}_"
+                                                 f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+            with open(ruta, 'w', encoding='utf-8') as f:
+                for pila, cuenta in pilas:
+                    f.write(f"{pila} {cuenta}\n")
+
+            log.info("Perfil escrito en %s (%d muestras, sobrecarga %.2f%%)",
+                     ruta, self._muestras, 100 * self._sobrecarga())
+            return ruta
+
+        except OSError as e:
+            log.error("No se pudo escribir el perfil: %s", e)
+            return None
+
+    def _sobrecarga(self) -> float:
+        """Fracción del tiempo de la captura dedicada a muestrear"""
+        duracion = time.monotonic() - self._inicio
+        return self._costo_s / duracion if duracion > 0 else 0.0
+
+    def funciones_frecuentes(self, top: int = 15) -> List[Dict[str, Any]]:
+        """
+        Funciones donde más muestras estaban ejecutando (tiempo propio).
+
+        Returns:
+            [{'funcion', 'muestras', 'porcentaje'}] de mayor a menor
+        """
+        with self._lock:
+            pilas = list(self._pilas.items())
+            total = sum(cuenta for _, cuenta in pilas)
+
+        propias = Counter()
+        for pila, cuenta in pilas:
+            propias[pila.rsplit(';', 1)[-1]] += cuenta
+
+        return [{'funcion': funcion, 'muestras': cuenta,
+                 'porcentaje': round(100.0 * cuenta / total, 1)}
+                for funcion, cuenta in propias.most_common(top)] if total else []
+
+    def estado(self, top: int = 0) -> Dict[str, Any]:
+        """Estado de la captura actual o de la última"""
+        with self._lock:
+            datos = {
+                'activo': self.activo(),
+                'muestras': self._muestras,
+                'intervalo_ms': round(self._intervalo_s * 1000, 1),
+                'sobrecarga': round(self._sobrecarga(), 4) if self._inicio else 0.0,
+                'archivo': self._archivo
+            }
+        if top:
+            datos['frecuentes'] = self.funciones_frecuentes(top)
+        return datos
@@ -3,20 +3,45 @@ Protocolo de comunicación para el sistema distribuido.
 Define los tipos de mensajes y formato de comunicación entre servidores y clientes.
 
 IMPORTANTE: Usa sockets puros (TCP) sin frameworks de comunicación.
+
+Formato legado: [4 bytes tamaño big-endian][JSON UTF-8]. Un cliente puede
+negociar con HELLO una codificación compacta (ver common/codificacion.py) y
+compresión de los mensajes grandes (ver common/compresion.py); los extremos
+que no envían HELLO (cliente Java, servidor C++) siguen en JSON sin comprimir.
+
+Un cliente vigilante puede negociar además una conexión multiplexada: cada
+mensaje lleva un canal y un id de solicitud, las respuestas repiten el id de
+la solicitud y los envíos grandes se reparten en fragmentos que se intercalan
+con los de otros canales (ver common/multiplexor.py).
 """
 
 import json
 import socket
 import struct
-from typing import Dict, Any, Optional
+import threading
+import weakref
+from typing import Dict, Any, Iterable, Iterator, List, Optional
 from datetime import datetime
 
+from src.common.codificacion import MAX_MENSAJE, CodificacionCompacta, Reensamblador
+from src.common.compresion import Compresion
+from src.common.registro import Registro
+
+log = Registro.obtener('protocolo')
+
 
 class TipoMensaje:
     """Tipos de mensajes del protocolo"""
     # Servidor de Video
     FRAME = "FRAME"
     VIDEO_STATUS = "VIDEO_STATUS"
+    RATE_CONTROL = "RATE_CONTROL"  # testeo -> video: fps/escala por cámara
+    SHM_INIT = "SHM_INIT"          # video -> testeo: anillo de memoria compartida
+    FRAME_SHM = "FRAME_SHM"        # video -> testeo: frame publicado en un slot
+    FRAME_CREDIT = "FRAME_CREDIT"  # testeo -> video: créditos de frames por cámara
+    CLIP_EVENT = "CLIP_EVENT"      # testeo -> video: grabar un clip alrededor de una detección
+    GET_RECORDING = "GET_RECORDING"  # cliente -> video: frame o clip grabado por instante
+    RECORDING = "RECORDING"
 
     # Servidor de Entrenamiento
     TRAIN_REQUEST = "TRAIN_REQUEST"
@@ -32,12 +57,30 @@ class TipoMensaje:
     # Cliente Vigilante
     GET_DETECTIONS = "GET_DETECTIONS"
     SUBSCRIBE_UPDATES = "SUBSCRIBE_UPDATES"
+    GET_THUMBNAIL = "GET_THUMBNAIL"  # Miniatura de la imagen de una detección
+    THUMBNAIL = "THUMBNAIL"
 
     # Generales
     ACK = "ACK"
     ERROR = "ERROR"
     PING = "PING"
     PONG = "PONG"
+    HELLO = "HELLO"  # Negociación de versión y codificación
+    PROFILE = "PROFILE"  # Perfilado por muestreo (iniciar/detener/estado)
+    CONFIG_RELOAD = "CONFIG_RELOAD"  # Releer config.json y aplicar los cambios en caliente
+
+
+class Canal:
+    """Canales de una conexión multiplexada"""
+    CONTROL = 0      # Respuestas cortas (ACK, ERROR) y solicitudes del cliente
+    DETECCIONES = 1  # Notificaciones en vivo
+    METRICAS = 2     # TESTEO_STATUS
+    HISTORIAL = 3    # Páginas de GET_DETECTIONS
+    MINIATURAS = 4   # Imágenes de detecciones
+
+    # Los interactivos se atienden antes; los de volumen se reparten por turnos
+    INTERACTIVOS = (CONTROL, DETECCIONES, METRICAS)
+    VOLUMEN = (HISTORIAL, MINIATURAS)
 
 
 class Protocolo:
@@ -45,6 +88,22 @@ class Protocolo:
 
     HEADER_SIZE = 4  # 4 bytes para tamaño del mensaje
     ENCODING = 'utf-8'
+    VERSION = 2      # 1 = solo JSON; 2 = codificación compacta negociable
+    UMBRAL_COMPRESION = 1024    # Bytes mínimos para comprimir un mensaje
+    LOTE_STREAM = 200           # Registros por lote en respuestas en streaming
+    FRAGMENTO_STREAM = 64 * 1024
+    FRAGMENTO_MULTIPLEX = 16 * 1024  # Menor: acota la espera de los demás canales
+
+    # Sesión negociada por socket: {'codificacion', 'compresion', 'umbral',
+    # 'multiplexado'} (ausente = JSON legado sin comprimir)
+    _sesiones = weakref.WeakKeyDictionary()
+
+    # Fragmentos a medio recibir por socket
+    _reensambladores = weakref.WeakKeyDictionary()
+
+    # Lock de envío por socket (ver lock_envio)
+    _locks_envio = weakref.WeakKeyDictionary()
+    _locks_lock = threading.Lock()
 
     @staticmethod
     def crear_mensaje(tipo: str, datos: Dict[str, Any]) -> Dict[str, Any]:
@@ -66,16 +125,25 @@ class Protocolo:
         return mensaje
 
     @staticmethod
-    def serializar(mensaje: Dict[str, Any]) -> bytes:
+    def serializar(mensaje: Dict[str, Any], codificacion: str = 'json',
+                   compresion: Optional[str] = None, umbral: int = UMBRAL_COMPRESION) -> bytes:
         """
         Serializa un mensaje a bytes para enviar por socket.
 
         Args:
             mensaje: Diccionario con el mensaje
+            codificacion: 'json' (legado) o una codificación compacta negociada
+            compresion: Algoritmo de compresión negociado (None = sin compresión)
+            umbral: Tamaño mínimo para comprimir
 
         Returns:
             Bytes del mensaje con header de tamaño
         """
+        if codificacion != 'json' or compresion:
+            ts_ms = int(datetime.fromisoformat(mensaje['timestamp']).timestamp() * 1000)
+            return CodificacionCompacta.serializar(mensaje['tipo'], mensaje['datos'],
+                                                   codificacion, ts_ms, compresion, umbral)
+
         # Convertir mensaje a JSON y luego a bytes
         mensaje_json = json.dumps(mensaje)
         mensaje_bytes = mensaje_json.encode(Protocolo.ENCODING)
@@ -88,7 +156,17 @@ class Protocolo:
         return header + mensaje_bytes
 
     @staticmethod
-    def enviar_mensaje(sock: socket.socket, tipo: str, datos: Dict[str, Any]) -> bool:
+    def serializar_para(sock: socket.socket, mensaje: Dict[str, Any]) -> bytes:
+        """Serializa un mensaje con la sesión negociada con el extremo de un socket"""
+        sesion = Protocolo._sesiones.get(sock)
+        if sesion is None:
+            return Protocolo.serializar(mensaje)
+        return Protocolo.serializar(mensaje, sesion['codificacion'],
+                                    sesion['compresion'], sesion['umbral'])
+
+    @staticmethod
+    def enviar_mensaje(sock: socket.socket, tipo: str, datos: Dict[str, Any],
+                       id_solicitud: Optional[int] = None, canal: int = Canal.CONTROL) -> bool:
         """
         Crea, serializa y envía un mensaje por socket.
 
@@ -96,19 +174,85 @@ class Protocolo:
             sock: Socket conectado
             tipo: Tipo de mensaje
             datos: Datos del mensaje
+            id_solicitud: Id para correlacionar la respuesta; solo viaja si la
+                          conexión es multiplexada
+            canal: Canal del mensaje en una conexión multiplexada
 
         Returns:
             True si se envió correctamente, False si hubo error
         """
         try:
-            mensaje = Protocolo.crear_mensaje(tipo, datos)
-            mensaje_bytes = Protocolo.serializar(mensaje)
+            sesion = Protocolo._sesiones.get(sock)
+            if sesion is None:
+                mensaje_bytes = Protocolo.serializar(Protocolo.crear_mensaje(tipo, datos))
+            else:
+                # Sin pasar por la cadena ISO: el timestamp viaja en ms epoch
+                etiqueta = None
+                if id_solicitud is not None and sesion['multiplexado']:
+                    etiqueta = (canal, id_solicitud)
+                mensaje_bytes = CodificacionCompacta.serializar(
+                    tipo, datos, sesion['codificacion'],
+                    compresion=sesion['compresion'], umbral=sesion['umbral'],
+                    etiqueta=etiqueta)
             sock.sendall(mensaje_bytes)
             return True
         except Exception as e:
-            print(f"Error enviando mensaje: {e}")
+            log.warning("Error enviando mensaje: %s", e)
             return False
 
+    @staticmethod
+    def enviar_stream(sock: socket.socket, tipo: str, datos: Dict[str, Any], clave: str,
+                      registros: Iterable[Dict[str, Any]], lote: int = LOTE_STREAM) -> bool:
+        """
+        Envía una respuesta con una lista grande (p. ej. un historial).
+
+        Si el extremo negoció codificación compacta o compresión, la lista se
+        codifica y comprime por lotes y se envía en fragmentos, sin armar la
+        respuesta completa en memoria. Si no (clientes legados), se envía como
+        un único mensaje JSON con la lista en datos[clave].
+
+        El llamador debe tener el lock de envío del socket (lock_envio)
+        durante toda la llamada para que otro hilo no intercale mensajes
+        entre fragmentos.
+
+        Args:
+            sock: Socket conectado
+            tipo: Tipo de mensaje
+            datos: Resto de los datos de la respuesta
+            clave: Clave de la lista en los datos
+            registros: Elementos de la lista
+            lote: Registros por lote
+
+        Returns:
+            True si se envió correctamente, False si hubo error
+        """
+        try:
+            for fragmento in Protocolo.fragmentos_stream(sock, tipo, datos, clave, registros, lote):
+                sock.sendall(fragmento)
+            return True
+        except Exception as e:
+            log.warning("Error enviando mensaje: %s", e)
+            return False
+
+    @staticmethod
+    def fragmentos_stream(sock: socket.socket, tipo: str, datos: Dict[str, Any], clave: str,
+                          registros: Iterable[Dict[str, Any]],
+                          lote: int = LOTE_STREAM) -> Iterator[bytes]:
+        """
+        Genera los fragmentos de enviar_stream sin enviarlos (para encolarlos
+        en un Multiplexor). Nada se serializa hasta pedir el primer fragmento.
+        """
+        sesion = Protocolo._sesiones.get(sock)
+        if sesion is None:
+            completos = dict(datos)
+            completos[clave] = list(registros)
+            yield Protocolo.serializar(Protocolo.crear_mensaje(tipo, completos))
+            return
+
+        yield from CodificacionCompacta.serializar_stream(
+            tipo, datos, clave, registros, sesion['codificacion'],
+            sesion['compresion'], lote, Protocolo.FRAGMENTO_STREAM)
+
     @staticmethod
     def recibir_mensaje(sock: socket.socket) -> Optional[Dict[str, Any]]:
         """
@@ -121,18 +265,22 @@ class Protocolo:
             Diccionario con el mensaje o None si hubo error
         """
         try:
-            # Leer header (4 bytes con el tamaño)
-            header_bytes = Protocolo._recibir_exacto(sock, Protocolo.HEADER_SIZE)
-            if not header_bytes:
-                return None
-
-            # Extraer tamaño del mensaje
-            tamaño = struct.unpack('>I', header_bytes)[0]
-
-            # Leer mensaje completo
-            mensaje_bytes = Protocolo._recibir_exacto(sock, tamaño)
-            if not mensaje_bytes:
-                return None
+            while True:
+                mensaje_bytes = Protocolo._recibir_cuerpo(sock)
+                if not mensaje_bytes:
+                    return None
+
+                # Formato compacto negociado (el JSON siempre empieza con '{');
+                # si es un fragmento se sigue leyendo hasta completar un mensaje
+                if not CodificacionCompacta.es_compacto(mensaje_bytes):
+                    break
+
+                reensamblador = Protocolo._reensambladores.get(sock)
+                if reensamblador is None:
+                    reensamblador = Protocolo._reensambladores[sock] = Reensamblador()
+                mensaje = reensamblador.agregar(mensaje_bytes)
+                if mensaje is not None:
+                    return mensaje
 
             # Deserializar JSON
             mensaje_json = mensaje_bytes.decode(Protocolo.ENCODING)
@@ -141,9 +289,30 @@ class Protocolo:
             return mensaje
 
         except Exception as e:
-            print(f"Error recibiendo mensaje: {e}")
+            log.warning("Error recibiendo mensaje: %s", e)
             return None
 
+    @staticmethod
+    def _recibir_cuerpo(sock: socket.socket) -> Optional[bytes]:
+        """
+        Recibe el cuerpo de un mensaje (sin el header de tamaño).
+
+        Returns:
+            Bytes del cuerpo o None si se cerró la conexión
+        """
+        # Leer header (4 bytes con el tamaño)
+        header_bytes = Protocolo._recibir_exacto(sock, Protocolo.HEADER_SIZE)
+        if not header_bytes:
+            return None
+
+        # Extraer tamaño del mensaje
+        tamaño = struct.unpack('>I', header_bytes)[0]
+        if tamaño > MAX_MENSAJE:
+            raise ValueError(f"Mensaje de {tamaño} bytes")
+
+        # Leer mensaje completo
+        return Protocolo._recibir_exacto(sock, tamaño)
+
     @staticmethod
     def _recibir_exacto(sock: socket.socket, n_bytes: int) -> Optional[bytes]:
         """
@@ -164,6 +333,149 @@ class Protocolo:
             datos.extend(paquete)
         return bytes(datos)
 
+    @staticmethod
+    def lock_envio(sock: socket.socket) -> threading.Lock:
+        """
+        Lock que serializa los envíos a un socket.
+
+        Los servidores envían a un mismo cliente desde varios hilos (difusión,
+        respuestas, notificaciones). Cada envío toma el lock de su socket y no
+        un lock global de clientes, así un cliente lento solo demora sus
+        propios mensajes.
+        """
+        lock = Protocolo._locks_envio.get(sock)
+        if lock is None:
+            with Protocolo._locks_lock:
+                lock = Protocolo._locks_envio.setdefault(sock, threading.Lock())
+        return lock
+
+    @staticmethod
+    def sesion(sock: socket.socket) -> Optional[Dict[str, Any]]:
+        """Sesión negociada con el extremo de un socket (None = JSON legado)"""
+        return Protocolo._sesiones.get(sock)
+
+    @staticmethod
+    def codificacion(sock: socket.socket) -> str:
+        """Codificación negociada con el extremo de un socket ('json' si no hubo HELLO)"""
+        sesion = Protocolo._sesiones.get(sock)
+        return sesion['codificacion'] if sesion else 'json'
+
+    @staticmethod
+    def compresion(sock: socket.socket) -> Optional[str]:
+        """Compresión negociada con el extremo de un socket (None si no hay)"""
+        sesion = Protocolo._sesiones.get(sock)
+        return sesion['compresion'] if sesion else None
+
+    @staticmethod
+    def multiplexado(sock: socket.socket) -> bool:
+        """Indica si la conexión con el extremo de un socket es multiplexada"""
+        sesion = Protocolo._sesiones.get(sock)
+        return bool(sesion and sesion['multiplexado'])
+
+    @staticmethod
+    def establecer_codificacion(sock: socket.socket, codificacion: str,
+                                compresion: Optional[str] = None,
+                                umbral: int = UMBRAL_COMPRESION,
+                                multiplexado: bool = False):
+        """Registra la codificación, compresión y multiplexado de un socket"""
+        if codificacion == 'json' and not compresion and not multiplexado:
+            Protocolo._sesiones.pop(sock, None)
+        else:
+            Protocolo._sesiones[sock] = {
+                'codificacion': codificacion,
+                'compresion': compresion,
+                'umbral': umbral,
+                'multiplexado': multiplexado
+            }
+
+    @staticmethod
+    def enviar_hello(sock: socket.socket, codificaciones: Optional[List[str]] = None,
+                     compresiones: Optional[List[str]] = None,
+                     multiplexado: bool = False) -> bool:
+        """
+        Propone al otro extremo las codificaciones y compresiones soportadas
+        (lado cliente).
+
+        La respuesta HELLO se procesa con aceptar_hello(); hasta entonces (o si
+        el servidor no la entiende) se sigue usando JSON sin comprimir.
+
+        Args:
+            sock: Socket conectado
+            codificaciones: Codificaciones a proponer (None = todas las disponibles)
+            compresiones: Compresiones a proponer (None = todas las disponibles,
+                          [] = no comprimir)
+            multiplexado: Pedir una conexión multiplexada
+        """
+        return Protocolo.enviar_mensaje(sock, TipoMensaje.HELLO, {
+            'version': Protocolo.VERSION,
+            'codificaciones': codificaciones or CodificacionCompacta.disponibles(),
+            'compresiones': Compresion.disponibles() if compresiones is None else compresiones,
+            'multiplexado': multiplexado
+        })
+
+    @staticmethod
+    def responder_hello(sock: socket.socket, datos: Dict[str, Any],
+                        compresion: Optional[Dict[str, Any]] = None,
+                        multiplexado: bool = False) -> str:
+        """
+        Elige la codificación para un cliente que envió HELLO (lado servidor).
+
+        Se toma la primera propuesta por el cliente que este proceso soporta. La
+        respuesta se envía en JSON y después se registra la elegida.
+
+        Args:
+            sock: Socket del cliente
+            datos: Datos del HELLO recibido
+            compresion: Configuración red.compresion ({'habilitada', 'umbral_bytes'});
+                        None = no comprimir
+            multiplexado: Si este servidor acepta conexiones multiplexadas
+
+        Returns:
+            Codificación elegida
+        """
+        disponibles = CodificacionCompacta.disponibles()
+        elegida = 'json'
+        compresion_elegida = None
+        if datos.get('version', 1) >= 2:
+            for codificacion in datos.get('codificaciones', []):
+                if codificacion in disponibles:
+                    elegida = codificacion
+                    break
+            if compresion and compresion.get('habilitada', True):
+                compresion_elegida = Compresion.elegir(datos.get('compresiones', []))
+        multiplexado = multiplexado and bool(datos.get('multiplexado'))
+
+        umbral = (compresion or {}).get('umbral_bytes', Protocolo.UMBRAL_COMPRESION)
+
+        Protocolo.enviar_mensaje(sock, TipoMensaje.HELLO, {
+            'version': Protocolo.VERSION,
+            'codificacion': elegida,
+            'compresion': compresion_elegida,
+            'umbral_bytes': umbral,
+            'multiplexado': multiplexado
+        })
+        Protocolo.establecer_codificacion(sock, elegida, compresion_elegida, umbral, multiplexado)
+        return elegida
+
+    @staticmethod
+    def aceptar_hello(sock: socket.socket, datos: Dict[str, Any]) -> str:
+        """
+        Aplica la respuesta HELLO del servidor (lado cliente).
+
+        Returns:
+            Codificación elegida por el servidor
+        """
+        elegida = datos.get('codificacion', 'json')
+        if elegida not in CodificacionCompacta.disponibles():
+            elegida = 'json'
+        compresion = datos.get('compresion')
+        if compresion not in Compresion.disponibles():
+            compresion = None
+        Protocolo.establecer_codificacion(sock, elegida, compresion,
+                                          datos.get('umbral_bytes', Protocolo.UMBRAL_COMPRESION),
+                                          bool(datos.get('multiplexado')))
+        return elegida
+
     @staticmethod
     def enviar_ack(sock: socket.socket, mensaje_id: Optional[str] = None) -> bool:
         """Envía un mensaje de ACK"""
@@ -183,12 +495,61 @@ class MensajeFactory:
     """Factory para crear mensajes específicos del protocolo"""
 
     @staticmethod
-    def crear_frame(camera_id: int, frame_base64: str, timestamp: str) -> Dict[str, Any]:
-        """Crea mensaje con frame de video"""
-        return Protocolo.crear_mensaje(TipoMensaje.FRAME, {
+    def crear_frame(camera_id: int, frame_base64: str, timestamp: str,
+                    capture_ts: Optional[float] = None,
+                    traza: Optional[Dict[str, Any]] = None,
+                    letterbox: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Crea mensaje con frame de video.
+
+        capture_ts es el instante de captura (epoch en segundos); el servidor de
+        testeo lo usa para descartar frames vencidos antes de decodificarlos.
+        traza es el contexto de latencia del frame (ver common/trazas.py).
+        letterbox son la escala y el relleno de un frame ya preparado para el
+        modelo (ver ImageUtils.letterbox).
+        """
+        datos = {
             "camera_id": camera_id,
             "frame_data": frame_base64,
             "timestamp": timestamp
+        }
+        if capture_ts is not None:
+            datos["capture_ts"] = capture_ts
+        if traza is not None:
+            datos["traza"] = traza
+        if letterbox is not None:
+            datos["letterbox"] = letterbox
+        return Protocolo.crear_mensaje(TipoMensaje.FRAME, datos)
+
+    @staticmethod
+    def crear_frame_shm(camera_id: int, slot: int, seq: int, timestamp: str,
+                        capture_ts: float, traza: Optional[Dict[str, Any]] = None,
+                        letterbox: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Crea mensaje que anuncia un frame publicado en el anillo de memoria compartida"""
+        datos = {
+            "camera_id": camera_id,
+            "slot": slot,
+            "seq": seq,
+            "timestamp": timestamp,
+            "capture_ts": capture_ts
+        }
+        if traza is not None:
+            datos["traza"] = traza
+        if letterbox is not None:
+            datos["letterbox"] = letterbox
+        return Protocolo.crear_mensaje(TipoMensaje.FRAME_SHM, datos)
+
+    @staticmethod
+    def crear_frame_credit(creditos: Dict[int, int], reiniciar: Optional[list] = None) -> Dict[str, Any]:
+        """
+        Crea mensaje que otorga créditos de frames por cámara.
+
+        Los créditos se suman a los que ya tiene el cliente, salvo en las
+        cámaras de 'reiniciar', donde reemplazan al valor anterior.
+        """
+        return Protocolo.crear_mensaje(TipoMensaje.FRAME_CREDIT, {
+            "camaras": {str(cid): n for cid, n in creditos.items()},
+            "reiniciar": list(reiniciar or [])
         })
 
     @staticmethod
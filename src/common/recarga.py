@@ -0,0 +1,112 @@
+"""
+Recarga en caliente de config.json.
+
+Cada servidor vigila su archivo de configuración y, cuando cambia, lo vuelve
+a leer y entrega la configuración completa a su función de aplicación, que
+compara con la vigente y aplica lo que puede cambiar sin reiniciar (cámaras,
+umbrales, tamaños de cola). También se recarga a pedido con el mensaje
+CONFIG_RELOAD, cuya respuesta (ACK) lista los cambios aplicados.
+
+En config.json:
+
+    "recarga": {"habilitado": true, "periodo_s": 2}
+
+Un archivo a medio escribir o con JSON inválido no se aplica: la
+configuración vigente sigue en uso hasta la próxima modificación válida.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.common.registro import Registro
+from src.common.utils import ConfigLoader
+
+log = Registro.obtener('recarga')
+
+
+class RecargaConfig(threading.Thread):
+    """Vigila el archivo de configuración y aplica sus cambios sin reiniciar"""
+
+    PERIODO_S = 2.0
+
+    def __init__(self, ruta: str, aplicar: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            ruta: Ruta del archivo de configuración
+            aplicar: Recibe la configuración nueva y devuelve los cambios
+                     aplicados ({} si no hubo); puede lanzar ValueError
+            config: Sección 'recarga' de config.json
+        """
+        super().__init__(daemon=True)
+        config = config or {}
+        self.ruta = ruta
+        self.aplicar = aplicar
+        self.habilitado = config.get('habilitado', True)
+        self.periodo_s = config.get('periodo_s', self.PERIODO_S)
+
+        self.recargas = 0
+        self.fallidas = 0
+        self._lock = threading.Lock()  # Una recarga a la vez (archivo y mensajes)
+        self._detener = threading.Event()
+        self._firma = self._firma_archivo()
+
+    def _firma_archivo(self) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, tamaño) del archivo, o None si no existe"""
+        try:
+            estado = os.stat(self.ruta)
+        except OSError:
+            return None
+        return estado.st_mtime_ns, estado.st_size
+
+    def iniciar(self):
+        """Inicia la vigilancia del archivo si está habilitada"""
+        if self.habilitado:
+            self.start()
+            log.info("Vigilando %s cada %.1f s", self.ruta, self.periodo_s)
+
+    def run(self):
+        """Compara la firma del archivo en cada período y recarga si cambió"""
+        while not self._detener.wait(self.periodo_s):
+            firma = self._firma_archivo()
+            if firma is None or firma == self._firma:
+                continue
+            self._firma = firma
+            try:
+                self.recargar()
+            except ValueError as e:
+                log.warning("%s", e)
+            except Exception as e:
+                log.exception("Error aplicando la configuración: %s", e)
+
+    def recargar(self) -> Dict[str, Any]:
+        """
+        Lee el archivo y aplica la configuración nueva.
+
+        Returns:
+            Cambios aplicados ({} si la configuración no cambió nada)
+
+        Raises:
+            ValueError: Archivo ilegible o configuración rechazada
+        """
+        with self._lock:
+            nueva = ConfigLoader.cargar_config(self.ruta)
+            if not nueva:
+                self.fallidas += 1
+                raise ValueError(f"Configuración no recargada: {self.ruta} no es un JSON válido")
+
+            try:
+                cambios = self.aplicar(nueva)
+            except Exception:
+                self.fallidas += 1
+                raise
+
+            self.recargas += 1
+            if cambios:
+                log.info("Configuración recargada: %s", cambios)
+            return cambios
+
+    def detener(self):
+        """Detiene la vigilancia"""
+        self._detener.set()
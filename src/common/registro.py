@@ -0,0 +1,267 @@
+"""
+Registro (logging) estructurado y no bloqueante para todos los componentes.
+
+Los hilos del pipeline no escriben en la consola: cada mensaje se encola
+(QueueHandler) y un único hilo (QueueListener) lo escribe en la consola y,
+opcionalmente, en un archivo. Si la salida se atasca (terminal lenta, pipe
+lleno) la cola se llena y los mensajes nuevos se descartan y cuentan, en
+lugar de frenar la captura o la inferencia.
+
+Además:
+- Mensajes repetidos desde una misma línea de código se limitan a unos
+  pocos por periodo; al reanudarse se informa cuántos se suprimieron.
+- La consola usa texto legible y el archivo una línea JSON por mensaje
+  (o JSON también en consola con "formato": "json").
+- El nivel se configura por componente en config.json:
+
+    "logging": {
+        "nivel": "INFO",
+        "formato": "texto",
+        "archivo": "logs/{proceso}.log",
+        "niveles": {"testeo.vigilantes": "DEBUG"}
+    }
+
+Cada módulo obtiene su logger con Registro.obtener('testeo.procesador') y
+cada punto de entrada llama a Registro.configurar(config, 'testeo').
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+
+RAIZ = 'pc4'
+
+# Atributos propios de LogRecord; el resto son campos extra del mensaje
+_CAMPOS_RECORD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'componente', 'suprimidos'
+}
+
+
+def _componente(record: logging.LogRecord) -> str:
+    """Nombre del logger sin el prefijo común"""
+    return record.name[len(RAIZ) + 1:] if record.name.startswith(RAIZ + '.') else record.name
+
+
+def _extras(record: logging.LogRecord) -> Dict[str, Any]:
+    """Campos pasados con extra={...}"""
+    return {k: v for k, v in record.__dict__.items() if k not in _CAMPOS_RECORD}
+
+
+class FormatoTexto(logging.Formatter):
+    """hh:mm:ss.mmm NIVEL componente: mensaje clave=valor ..."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        instante = time.strftime('%H:%M:%S', time.localtime(record.created))
+        linea = (f"{instante}.{int(record.msecs):03d} {record.levelname:<7} "
+                 f"{_componente(record)}: {record.getMessage()}")
+
+        extras = _extras(record)
+        if extras:
+            linea += " " + " ".join(f"{k}={v}" for k, v in extras.items())
+        if getattr(record, 'suprimidos', 0):
+            linea += f" (+{record.suprimidos} repetidos suprimidos)"
+        if record.exc_text:
+            linea += "\n" + record.exc_text
+        return linea
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por mensaje con los campos extra al primer nivel"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entrada = {
+            'ts': round(record.created, 3),
+            'nivel': record.levelname,
+            'componente': _componente(record),
+            'hilo': record.threadName,
+            'msg': record.getMessage()
+        }
+        entrada.update(_extras(record))
+        if getattr(record, 'suprimidos', 0):
+            entrada['suprimidos'] = record.suprimidos
+        if record.exc_text:
+            entrada['excepcion'] = record.exc_text
+        return json.dumps(entrada, ensure_ascii=False, default=str)
+
+
+class FiltroRepeticiones(logging.Filter):
+    """
+    Deja pasar como máximo `maximo` mensajes por periodo desde cada línea de
+    código (y nivel). El primero que pasa tras una supresión lleva la
+    cantidad suprimida en record.suprimidos.
+    """
+
+    def __init__(self, maximo: int = 5, periodo_s: float = 10.0):
+        super().__init__()
+        self.maximo = maximo
+        self.periodo_s = periodo_s
+        self._ventanas = {}  # {(logger, archivo, línea, nivel): [inicio, cuenta, suprimidos]}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.maximo <= 0:
+            return True
+
+        clave = (record.name, record.pathname, record.lineno, record.levelno)
+        ahora = time.monotonic()
+        with self._lock:
+            ventana = self._ventanas.get(clave)
+            if ventana is None or ahora - ventana[0] >= self.periodo_s:
+                suprimidos = ventana[2] if ventana else 0
+                self._ventanas[clave] = [ahora, 1, 0]
+                if suprimidos:
+                    record.suprimidos = suprimidos
+                return True
+
+            ventana[1] += 1
+            if ventana[1] <= self.maximo:
+                return True
+            ventana[2] += 1
+            return False
+
+
+class ManejadorCola(QueueHandler):
+    """QueueHandler que nunca bloquea: con la cola llena descarta y cuenta"""
+
+    def __init__(self, cola: queue.Queue):
+        super().__init__(cola)
+        self.descartados = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Se resuelve el mensaje (los argumentos pueden cambiar después) pero
+        # el formato final lo aplica cada salida en el hilo del listener
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+class Registro:
+    """Configuración del logging del proceso y acceso a los loggers"""
+
+    NIVEL = 'INFO'
+    FORMATO = 'texto'
+    TAMANO_COLA = 10000
+    MAX_BYTES = 10 * 1024 * 1024
+    RESPALDOS = 3
+    MAX_REPETICIONES = 5
+    PERIODO_REPETICIONES_S = 10.0
+
+    _listener: Optional[QueueListener] = None
+    _manejador: Optional[ManejadorCola] = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def obtener(componente: str) -> logging.Logger:
+        """
+        Logger de un componente (p. ej. 'video.captura').
+
+        Antes de configurar() los mensajes INFO o superiores se escriben
+        directamente en la consola.
+        """
+        return logging.getLogger(f"{RAIZ}.{componente}")
+
+    @staticmethod
+    def configurar(config: Optional[Dict[str, Any]] = None, proceso: str = RAIZ):
+        """
+        Configura el logging del proceso. Puede llamarse de nuevo para
+        aplicar otra configuración.
+
+        Args:
+            config: Configuración completa (se usa la sección 'logging')
+            proceso: Nombre del proceso (para el nombre del archivo)
+        """
+        opciones = (config or {}).get('logging', {})
+
+        consola = logging.StreamHandler(sys.stdout)
+        formato = opciones.get('formato', Registro.FORMATO)
+        consola.setFormatter(FormatoJSON() if formato == 'json' else FormatoTexto())
+        salidas = [consola]
+
+        archivo = opciones.get('archivo')
+        if archivo:
+            archivo = archivo.format(proceso=proceso)
+            directorio = os.path.dirname(archivo)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            en_archivo = RotatingFileHandler(
+                archivo, maxBytes=opciones.get('max_bytes', Registro.MAX_BYTES),
+                backupCount=opciones.get('respaldos', Registro.RESPALDOS), encoding='utf-8')
+            en_archivo.setFormatter(FormatoJSON())
+            salidas.append(en_archivo)
+
+        repeticiones = opciones.get('repeticiones', {})
+        manejador = ManejadorCola(queue.Queue(opciones.get('cola', Registro.TAMANO_COLA)))
+        manejador.addFilter(FiltroRepeticiones(
+            repeticiones.get('max', Registro.MAX_REPETICIONES),
+            repeticiones.get('periodo_s', Registro.PERIODO_REPETICIONES_S)))
+        listener = QueueListener(manejador.queue, *salidas, respect_handler_level=False)
+
+        with Registro._lock:
+            Registro._detener()
+
+            raiz = logging.getLogger(RAIZ)
+            raiz.handlers = [manejador]
+            raiz.propagate = False
+            raiz.setLevel(opciones.get('nivel', Registro.NIVEL).upper())
+
+            # Niveles por componente; los no configurados heredan el general
+            for nombre in list(logging.root.manager.loggerDict):
+                if nombre.startswith(RAIZ + '.'):
+                    logging.getLogger(nombre).setLevel(logging.NOTSET)
+            for componente, nivel in opciones.get('niveles', {}).items():
+                Registro.obtener(componente).setLevel(str(nivel).upper())
+
+            Registro._manejador = manejador
+            Registro._listener = listener
+            listener.start()
+
+    @staticmethod
+    def descartados() -> int:
+        """Mensajes descartados por cola llena desde configurar()"""
+        return Registro._manejador.descartados if Registro._manejador else 0
+
+    @staticmethod
+    def _detener():
+        """Vacía la cola y detiene el listener (se llama con el lock tomado)"""
+        listener = Registro._listener
+        if listener:
+            listener.stop()
+            for salida in listener.handlers:
+                salida.close()
+            Registro._listener = None
+        if Registro._manejador and Registro._manejador.descartados:
+            print(f"[Registro] {Registro._manejador.descartados} mensajes descartados por cola llena",
+                  file=sys.stderr)
+
+    @staticmethod
+    def detener():
+        """Escribe los mensajes pendientes y detiene el hilo de escritura"""
+        with Registro._lock:
+            Registro._detener()
+
+
+# Sin configurar: INFO y superiores directo a la consola
+_inicial = logging.StreamHandler(sys.stdout)
+_inicial.setFormatter(FormatoTexto())
+logging.getLogger(RAIZ).addHandler(_inicial)
+logging.getLogger(RAIZ).setLevel(logging.INFO)
+logging.getLogger(RAIZ).propagate = False
+
+atexit.register(Registro.detener)
@@ -0,0 +1,194 @@
+"""
+Abstracción de transporte para servidores y clientes.
+
+Permite que cada servidor escuche en TCP y/o en un socket Unix (AF_UNIX) según
+la configuración, y que cada cliente se conecte a cualquiera de los dos. Para
+componentes en la misma máquina el socket Unix evita la pila TCP y los
+conflictos de puertos.
+
+Las opciones de socket se aplican en un solo lugar:
+- TCP_NODELAY en sockets TCP (mensajes cortos de control sin esperar a Nagle)
+- SO_SNDBUF / SO_RCVBUF desde servidor_video.buffer_size
+
+Configuración por sección de servidor:
+    "host": "0.0.0.0", "puerto": 5000     -> escucha TCP (puerto null = sin TCP)
+    "socket_unix": "/tmp/pc4_video.sock"  -> escucha también en socket Unix
+"""
+
+import os
+import socket
+from typing import Dict, Any, List, Optional
+
+
+class Transporte:
+    """Creación y configuración uniforme de sockets TCP y Unix"""
+
+    @staticmethod
+    def opciones(config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extrae las opciones de socket de la configuración general.
+
+        Args:
+            config: Configuración completa (config.json)
+
+        Returns:
+            {'buffer_size': int | None, 'tcp_nodelay': bool}
+        """
+        return {
+            'buffer_size': config.get('servidor_video', {}).get('buffer_size'),
+            'tcp_nodelay': config.get('red', {}).get('tcp_nodelay', True)
+        }
+
+    @staticmethod
+    def configurar_socket(sock: socket.socket, opciones: Optional[Dict[str, Any]] = None):
+        """
+        Aplica las opciones comunes a un socket conectado o de escucha.
+
+        Args:
+            sock: Socket a configurar
+            opciones: Resultado de Transporte.opciones()
+        """
+        opciones = opciones or {}
+
+        if sock.family in (socket.AF_INET, socket.AF_INET6) and opciones.get('tcp_nodelay', True):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        buffer_size = opciones.get('buffer_size')
+        if buffer_size:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+
+    @staticmethod
+    def escuchar_unix(ruta: str, backlog: int = 5,
+                      opciones: Optional[Dict[str, Any]] = None) -> socket.socket:
+        """
+        Crea un socket Unix de escucha, eliminando un archivo de socket viejo.
+
+        Args:
+            ruta: Ruta del socket en el sistema de archivos
+            backlog: Conexiones pendientes máximas
+            opciones: Opciones de socket
+
+        Returns:
+            Socket escuchando
+        """
+        if os.path.exists(ruta):
+            os.unlink(ruta)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        Transporte.configurar_socket(sock, opciones)
+        sock.bind(ruta)
+        sock.listen(backlog)
+        return sock
+
+    @staticmethod
+    def escuchar(config_servidor: Dict[str, Any], backlog: int = 5,
+                 opciones: Optional[Dict[str, Any]] = None) -> List[socket.socket]:
+        """
+        Crea los sockets de escucha de un servidor: TCP y/o Unix.
+
+        Args:
+            config_servidor: Sección del servidor con host/puerto/socket_unix
+            backlog: Conexiones pendientes máximas
+            opciones: Opciones de socket
+
+        Returns:
+            Lista de sockets escuchando (al menos uno)
+        """
+        sockets = []
+
+        if config_servidor.get('puerto') is not None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            Transporte.configurar_socket(sock, opciones)
+            sock.bind((config_servidor.get('host', '0.0.0.0'), config_servidor['puerto']))
+            sock.listen(backlog)
+            sockets.append(sock)
+
+        ruta = config_servidor.get('socket_unix')
+        if ruta and hasattr(socket, 'AF_UNIX'):
+            sockets.append(Transporte.escuchar_unix(ruta, backlog, opciones))
+
+        if not sockets:
+            raise ValueError("El servidor no tiene puerto TCP ni socket_unix configurado")
+
+        return sockets
+
+    @staticmethod
+    def describir(sock: socket.socket) -> str:
+        """Dirección legible de un socket de escucha"""
+        if sock.family == getattr(socket, 'AF_UNIX', None):
+            return f"unix:{sock.getsockname()}"
+        host, puerto = sock.getsockname()[:2]
+        return f"tcp:{host}:{puerto}"
+
+    @staticmethod
+    def conectar(host: Optional[str] = None, puerto: Optional[int] = None,
+                 ruta_unix: Optional[str] = None, timeout: Optional[float] = None,
+                 opciones: Optional[Dict[str, Any]] = None) -> socket.socket:
+        """
+        Conecta a un servidor, prefiriendo el socket Unix si está disponible.
+
+        El socket Unix se usa solo si el host es local y la ruta existe; en
+        cualquier otro caso (o si falla) se conecta por TCP.
+
+        Args:
+            host: Host TCP del servidor
+            puerto: Puerto TCP del servidor
+            ruta_unix: Ruta del socket Unix del servidor
+            timeout: Timeout de conexión (None = bloqueante)
+            opciones: Opciones de socket
+
+        Returns:
+            Socket conectado (sin timeout, listo para recibir indefinidamente)
+        """
+        if (ruta_unix and hasattr(socket, 'AF_UNIX') and os.path.exists(ruta_unix)
+                and (host is None or HostUtils.es_host_local(host))):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(timeout)
+                sock.connect(ruta_unix)
+                sock.settimeout(None)
+                Transporte.configurar_socket(sock, opciones)
+                return sock
+            except OSError:
+                sock.close()
+                if puerto is None:
+                    raise
+
+        if host is None or puerto is None:
+            raise ConnectionError("Sin destino TCP ni socket Unix disponible")
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        Transporte.configurar_socket(sock, opciones)
+        sock.settimeout(timeout)
+        sock.connect((host, puerto))
+        sock.settimeout(None)
+        return sock
+
+
+class HostUtils:
+    """Utilidades para decidir si dos extremos comparten host"""
+
+    @staticmethod
+    def es_host_local(host: str) -> bool:
+        """
+        Indica si una dirección corresponde a esta máquina.
+
+        Args:
+            host: Host o IP configurada del otro extremo
+
+        Returns:
+            True si es loopback o una IP propia
+        """
+        if host in ('localhost', '0.0.0.0', '::1', '') or host.startswith('127.'):
+            return True
+
+        try:
+            destino = socket.gethostbyname(host)
+            if destino.startswith('127.'):
+                return True
+            _, _, propias = socket.gethostbyname_ex(socket.gethostname())
+            return destino in propias
+        except OSError:
+            return False
@@ -0,0 +1,270 @@
+"""
+Trazas de latencia por frame de extremo a extremo.
+
+Cada frame lleva una traza desde su captura en el servidor de video hasta que
+la detección se muestra en el cliente vigilante:
+
+    captura -> redimension -> cola_video -> codificacion -> envio   (video)
+    -> recepcion -> encolado -> desencolado -> decodificacion
+    -> inferencia_inicio -> inferencia_fin                    (testeo)
+    -> persistencia -> notificacion                           (testeo, si hay detección)
+    -> visualizacion                                          (cliente)
+
+Cada etapa se guarda en ms desde la captura. Dentro de un proceso los
+instantes se toman con el reloj monotónico (inmunes a ajustes del reloj del
+sistema). Al pasar a otro proceso la traza se ancla con el reloj de pared
+(origen epoch de la captura); si los relojes de los equipos difieren, el
+salto se acota para que la traza nunca retroceda.
+
+En cada proceso las trazas se agregan en histogramas por cámara y etapa
+(duración de la etapa: desde la marca anterior) con percentiles p50/p95/p99,
+consultables en vivo (TESTEO_STATUS) y volcables a un archivo JSON.
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.common.registro import Registro
+
+log = Registro.obtener('trazas')
+
+# Cubetas de 0.05 ms a 120 s, cada una 15% más ancha que la anterior
+_MIN_MS = 0.05
+_MAX_MS = 120000.0
+_FACTOR = 1.15
+_LIMITES_MS = [_MIN_MS * _FACTOR ** i
+               for i in range(int(math.log(_MAX_MS / _MIN_MS, _FACTOR)) + 1)] + [_MAX_MS]
+
+
+class HistogramaLatencia:
+    """
+    Histograma de latencias con cubetas fijas en escala logarítmica.
+
+    Agregar un valor es O(log n) y no guarda las muestras; los percentiles
+    se estiman con un error relativo menor al ancho de una cubeta (~7%).
+    """
+
+    # Límites superiores de las cubetas (compartidos por todos los histogramas)
+    LIMITES = _LIMITES_MS
+
+    def __init__(self):
+        self.cubetas = [0] * (len(self.LIMITES) + 1)  # La última: valores > 120 s
+        self.cantidad = 0
+        self.suma = 0.0
+        self.minimo = math.inf
+        self.maximo = 0.0
+
+    def agregar(self, valor_ms: float):
+        """Agrega una muestra (ms)"""
+        valor_ms = max(0.0, valor_ms)
+        self.cubetas[bisect.bisect_left(self.LIMITES, valor_ms)] += 1
+        self.cantidad += 1
+        self.suma += valor_ms
+        self.minimo = min(self.minimo, valor_ms)
+        self.maximo = max(self.maximo, valor_ms)
+
+    def percentil(self, p: float) -> float:
+        """
+        Estima un percentil.
+
+        Args:
+            p: Percentil entre 0 y 100
+
+        Returns:
+            Valor estimado en ms (0 si no hay muestras)
+        """
+        if not self.cantidad:
+            return 0.0
+
+        objetivo = max(1, math.ceil(self.cantidad * p / 100.0))
+        acumulado = 0
+        for indice, cuenta in enumerate(self.cubetas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                break
+
+        # Media geométrica de los límites de la cubeta, acotada a lo observado
+        superior = self.LIMITES[indice] if indice < len(self.LIMITES) else self.maximo
+        inferior = self.LIMITES[indice - 1] if indice > 0 else 0.0
+        estimado = math.sqrt(inferior * superior) if inferior > 0 else superior
+        return min(max(estimado, self.minimo), self.maximo)
+
+    def resumen(self) -> Dict[str, float]:
+        """Cantidad, media, percentiles y máximo en ms"""
+        return {
+            'n': self.cantidad,
+            'media': round(self.suma / self.cantidad, 3) if self.cantidad else 0.0,
+            'p50': round(self.percentil(50), 3),
+            'p95': round(self.percentil(95), 3),
+            'p99': round(self.percentil(99), 3),
+            'max': round(self.maximo, 3)
+        }
+
+
+class Traza:
+    """Contexto de traza de un frame: etapas en ms desde la captura"""
+
+    __slots__ = ('origen', 'etapas', '_ancla_mono', '_ancla_ms')
+
+    def __init__(self, origen: float, etapas: Optional[List[Tuple[str, float]]] = None):
+        """
+        Args:
+            origen: Instante de captura (epoch, reloj de pared)
+            etapas: Etapas ya registradas [(nombre, ms desde la captura)]
+        """
+        self.origen = origen
+        self.etapas = etapas if etapas is not None else []
+
+        # Ancla: los ms desde la captura a partir de aquí se miden con el
+        # reloj monotónico. Nunca antes de la última etapa registrada.
+        ultima = self.etapas[-1][1] if self.etapas else 0.0
+        self._ancla_ms = max(ultima, (time.time() - origen) * 1000.0)
+        self._ancla_mono = time.monotonic()
+
+    @staticmethod
+    def iniciar(capture_ts: Optional[float] = None) -> 'Traza':
+        """Crea la traza de un frame recién capturado (etapa 'captura')"""
+        traza = Traza(capture_ts if capture_ts is not None else time.time())
+        traza.etapas.append(('captura', 0.0))
+        return traza
+
+    @staticmethod
+    def desde_dict(datos: Optional[Dict[str, Any]],
+                   capture_ts: Optional[float] = None) -> 'Traza':
+        """
+        Reconstruye una traza recibida de otro proceso.
+
+        Si el productor no envió traza (p. ej. el servidor de video C++) se
+        inicia una con el instante de captura, si lo hay.
+        """
+        if not datos:
+            return Traza.iniciar(capture_ts)
+        return Traza(datos['origen'], [(nombre, ms) for nombre, ms in datos['etapas']])
+
+    def a_dict(self) -> Dict[str, Any]:
+        """Forma serializable para enviar en un mensaje"""
+        return {'origen': self.origen, 'etapas': [[nombre, ms] for nombre, ms in self.etapas]}
+
+    def marcar(self, etapa: str) -> float:
+        """
+        Registra el fin de una etapa.
+
+        Returns:
+            ms desde la captura
+        """
+        ms = round(self._ancla_ms + (time.monotonic() - self._ancla_mono) * 1000.0, 3)
+        self.etapas.append((etapa, ms))
+        return ms
+
+    def copiar(self) -> 'Traza':
+        """Copia independiente (p. ej. una por detección de un mismo frame)"""
+        copia = Traza.__new__(Traza)
+        copia.origen = self.origen
+        copia.etapas = list(self.etapas)
+        copia._ancla_ms = self._ancla_ms
+        copia._ancla_mono = self._ancla_mono
+        return copia
+
+    def edad_ms(self) -> float:
+        """ms desde la captura hasta la última etapa"""
+        return self.etapas[-1][1] if self.etapas else 0.0
+
+    def duraciones(self, desde: int = 1) -> List[Tuple[str, float]]:
+        """
+        Duración de cada etapa (desde la marca anterior).
+
+        Args:
+            desde: Índice de la primera etapa a devolver (la 0 no tiene duración)
+        """
+        desde = max(1, desde)
+        return [(self.etapas[i][0], self.etapas[i][1] - self.etapas[i - 1][1])
+                for i in range(desde, len(self.etapas))]
+
+
+class RegistroTrazas:
+    """Histogramas de latencia por cámara y etapa, thread-safe"""
+
+    def __init__(self):
+        self._histogramas = {}  # {camera_id: {etapa: HistogramaLatencia}}
+        self._lock = threading.Lock()
+
+    def _histograma(self, camera_id: int, etapa: str) -> HistogramaLatencia:
+        """Histograma de una cámara y etapa (se llama con el lock tomado)"""
+        por_etapa = self._histogramas.setdefault(camera_id, {})
+        if etapa not in por_etapa:
+            por_etapa[etapa] = HistogramaLatencia()
+        return por_etapa[etapa]
+
+    def registrar(self, camera_id: int, traza: Traza, desde: int = 1, total: str = 'total'):
+        """
+        Agrega las duraciones de las etapas de una traza y su edad total.
+
+        Args:
+            camera_id: ID de la cámara
+            traza: Traza a registrar
+            desde: Índice de la primera etapa a registrar (para no contar dos
+                   veces las etapas ya registradas de una traza copiada)
+            total: Nombre del histograma de la edad al final de la traza
+        """
+        duraciones = traza.duraciones(desde)
+        with self._lock:
+            for etapa, ms in duraciones:
+                self._histograma(camera_id, etapa).agregar(ms)
+            self._histograma(camera_id, total).agregar(traza.edad_ms())
+
+    def percentil(self, camera_id: int, etapa: str, p: float) -> float:
+        """Percentil de una etapa de una cámara (0 si no hay datos)"""
+        with self._lock:
+            histograma = self._histogramas.get(camera_id, {}).get(etapa)
+            return histograma.percentil(p) if histograma else 0.0
+
+    def resumen(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{camera_id (str): {etapa: {'n', 'media', 'p50', 'p95', 'p99', 'max'}}}"""
+        with self._lock:
+            return {
+                str(camera_id): {etapa: h.resumen() for etapa, h in por_etapa.items()}
+                for camera_id, por_etapa in self._histogramas.items()
+            }
+
+    def volcar(self, ruta: str) -> bool:
+        """
+        Escribe el resumen en un archivo JSON.
+
+        Returns:
+            True si se escribió correctamente
+        """
+        try:
+            directorio = os.path.dirname(ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+
+            temporal = f"{ruta}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'generado': datetime.now().isoformat(),
+                    'camaras': self.resumen()
+                }, f, indent=2, ensure_ascii=False)
+            os.replace(temporal, ruta)
+            return True
+
+        except Exception as e:
+            log.error("Error volcando trazas: %s", e)
+            return False
+
+    @staticmethod
+    def formatear(resumen: Dict[str, Dict[str, Dict[str, float]]]) -> str:
+        """Tabla de texto de un resumen (para consola)"""
+        lineas = []
+        for camera_id, por_etapa in sorted(resumen.items()):
+            lineas.append(f"Cámara {camera_id}")
+            lineas.append(f"  {'etapa':<20}{'n':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)")
+            for etapa, stats in por_etapa.items():
+                lineas.append(f"  {etapa:<20}{stats['n']:>8}{stats['p50']:>10.1f}{stats['p95']:>10.1f}"
+                              f"{stats['p99']:>10.1f}{stats['max']:>10.1f}")
+        return "\n".join(lineas)
@@ -5,12 +5,20 @@ Utilidades comunes para el sistema distribuido.
 import json
 import os
 import base64
-import cv2
-import numpy as np
+import importlib
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
 import threading
 
+from src.common.registro import Registro
+
+log = Registro.obtener('utils')
+
+# cv2 y numpy se importan de forma diferida dentro de ImageUtils: el protocolo,
+# la configuración y los clientes no deben pagar su tiempo de importación.
+if TYPE_CHECKING:
+    import numpy as np
+
 
 class ConfigLoader:
     """Carga y gestiona la configuración del sistema"""
@@ -31,17 +39,36 @@ class ConfigLoader:
                 config = json.load(f)
             return config
         except FileNotFoundError:
-            print(f"Error: No se encontró el archivo de configuración en {ruta}")
+            log.error("No se encontró el archivo de configuración en %s", ruta)
             return {}
         except json.JSONDecodeError as e:
-            print(f"Error al parsear JSON: {e}")
+            log.error("Error al parsear JSON de %s: %s", ruta, e)
             return {}
 
     @staticmethod
     def obtener_camaras(config: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Obtiene la lista de cámaras habilitadas"""
+        """
+        Obtiene la lista de cámaras habilitadas.
+
+        Incluye las cámaras virtuales de "camaras.simuladas" (pruebas de
+        capacidad), numeradas desde "id_inicial":
+
+            "simuladas": {"cantidad": 50, "id_inicial": 100, "fps": 15,
+                          "fuente": {"tipo": "sintetica", "ancho": 1280, "alto": 720}}
+        """
         camaras = config.get('camaras', {}).get('lista', [])
-        return [cam for cam in camaras if cam.get('enabled', True)]
+        habilitadas = [cam for cam in camaras if cam.get('enabled', True)]
+
+        simuladas = config.get('camaras', {}).get('simuladas', {})
+        id_inicial = simuladas.get('id_inicial', 1000)
+        for i in range(simuladas.get('cantidad', 0)):
+            habilitadas.append({
+                'id': id_inicial + i,
+                'nombre': f"Simulada {i + 1}",
+                'fps': simuladas.get('fps', 15),
+                'fuente': simuladas.get('fuente', {'tipo': 'sintetica'})
+            })
+        return habilitadas
 
     @staticmethod
     def validar_rtsp_url(url: str) -> bool:
@@ -57,7 +84,7 @@ class ImageUtils:
     """Utilidades para procesamiento de imágenes"""
 
     @staticmethod
-    def frame_a_base64(frame: np.ndarray, quality: int = 90) -> str:
+    def frame_a_base64(frame: 'np.ndarray', quality: int = 90) -> str:
         """
         Convierte un frame de OpenCV a string base64.
 
@@ -68,6 +95,8 @@ class ImageUtils:
         Returns:
             String base64 del frame
         """
+        import cv2
+
         # Codificar frame a JPEG
         _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
         # Convertir a base64
@@ -75,7 +104,7 @@ class ImageUtils:
         return frame_base64
 
     @staticmethod
-    def base64_a_frame(frame_base64: str) -> Optional[np.ndarray]:
+    def base64_a_frame(frame_base64: str) -> Optional['np.ndarray']:
         """
         Convierte string base64 a frame de OpenCV.
 
@@ -85,6 +114,9 @@ class ImageUtils:
         Returns:
             Frame de OpenCV (numpy array) o None si hay error
         """
+        import cv2
+        import numpy as np
+
         try:
             # Decodificar base64
             frame_bytes = base64.b64decode(frame_base64)
@@ -94,17 +126,77 @@ class ImageUtils:
             frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
             return frame
         except Exception as e:
-            print(f"Error decodificando frame: {e}")
+            log.warning("Error decodificando frame: %s", e)
             return None
 
     @staticmethod
-    def redimensionar_frame(frame: np.ndarray, width: int, height: int) -> np.ndarray:
+    def redimensionar_frame(frame: 'np.ndarray', width: int, height: int) -> 'np.ndarray':
         """Redimensiona un frame"""
+        import cv2
         return cv2.resize(frame, (width, height))
 
     @staticmethod
-    def dibujar_deteccion(frame: np.ndarray, bbox: List[int],
-                          clase: str, confianza: float) -> np.ndarray:
+    def letterbox(frame: 'np.ndarray', lado: int, relleno: int = 114) -> Tuple['np.ndarray', Dict[str, Any]]:
+        """
+        Escala un frame sin deformarlo y lo centra en un cuadrado de lado x lado.
+
+        Es el mismo preprocesado que hace YOLO antes de la inferencia: con el
+        frame ya en el imgsz del modelo, la predicción no redimensiona ni
+        rellena de nuevo.
+
+        Args:
+            frame: Frame de OpenCV
+            lado: Lado del cuadrado (imgsz del modelo)
+            relleno: Gris de las bandas de relleno
+
+        Returns:
+            (frame letterbox, {'escala', 'pad_x', 'pad_y', 'ancho', 'alto'}),
+            con ancho/alto del frame original
+        """
+        import cv2
+        import numpy as np
+
+        alto, ancho = frame.shape[:2]
+        escala = min(lado / ancho, lado / alto)
+        nuevo_ancho = max(1, min(lado, round(ancho * escala)))
+        nuevo_alto = max(1, min(lado, round(alto * escala)))
+        pad_x = (lado - nuevo_ancho) // 2
+        pad_y = (lado - nuevo_alto) // 2
+
+        salida = np.full((lado, lado, 3), relleno, dtype=np.uint8)
+        salida[pad_y:pad_y + nuevo_alto, pad_x:pad_x + nuevo_ancho] = \
+            cv2.resize(frame, (nuevo_ancho, nuevo_alto), interpolation=cv2.INTER_LINEAR)
+
+        return salida, {'escala': escala, 'pad_x': pad_x, 'pad_y': pad_y, 'ancho': ancho, 'alto': alto}
+
+    @staticmethod
+    def bbox_desde_letterbox(bbox: List[int], letterbox: Dict[str, Any]) -> List[int]:
+        """
+        Lleva un bbox del frame letterbox a coordenadas del frame original.
+
+        Args:
+            bbox: [x1, y1, x2, y2] sobre el frame letterbox
+            letterbox: Metadatos devueltos por letterbox()
+
+        Returns:
+            [x1, y1, x2, y2] recortado a los bordes del frame original
+        """
+        escala = letterbox['escala']
+        x1, y1, x2, y2 = bbox
+        xs = [min(letterbox['ancho'], max(0, round((x - letterbox['pad_x']) / escala))) for x in (x1, x2)]
+        ys = [min(letterbox['alto'], max(0, round((y - letterbox['pad_y']) / escala))) for y in (y1, y2)]
+        return [xs[0], ys[0], xs[1], ys[1]]
+
+    @staticmethod
+    def recortar_letterbox(frame: 'np.ndarray', letterbox: Dict[str, Any]) -> 'np.ndarray':
+        """Vista del frame letterbox sin las bandas de relleno"""
+        ancho = max(1, round(letterbox['ancho'] * letterbox['escala']))
+        alto = max(1, round(letterbox['alto'] * letterbox['escala']))
+        return frame[letterbox['pad_y']:letterbox['pad_y'] + alto, letterbox['pad_x']:letterbox['pad_x'] + ancho]
+
+    @staticmethod
+    def dibujar_deteccion(frame: 'np.ndarray', bbox: List[int],
+                          clase: str, confianza: float) -> 'np.ndarray':
         """
         Dibuja bounding box y etiqueta en un frame.
 
@@ -117,6 +209,8 @@ class ImageUtils:
         Returns:
             Frame con detección dibujada
         """
+        import cv2
+
         x1, y1, x2, y2 = bbox
 
         # Dibujar rectángulo
@@ -138,14 +232,47 @@ class ImageUtils:
         return frame
 
     @staticmethod
-    def guardar_imagen(frame: np.ndarray, ruta: str) -> bool:
+    def miniatura(ruta: str, max_lado: int, quality: int = 80) -> Optional[Dict[str, Any]]:
+        """
+        Carga una imagen y la reduce para enviarla como miniatura.
+
+        Args:
+            ruta: Ruta de la imagen
+            max_lado: Tamaño máximo del lado mayor (no se agranda)
+            quality: Calidad de compresión JPEG (0-100)
+
+        Returns:
+            {'imagen': JPEG en base64, 'ancho', 'alto'} o None si no se pudo leer
+        """
+        import cv2
+
+        frame = cv2.imread(ruta)
+        if frame is None:
+            return None
+
+        alto, ancho = frame.shape[:2]
+        escala = min(1.0, max_lado / max(alto, ancho))
+        if escala < 1.0:
+            ancho, alto = max(1, int(ancho * escala)), max(1, int(alto * escala))
+            frame = cv2.resize(frame, (ancho, alto), interpolation=cv2.INTER_AREA)
+
+        return {
+            'imagen': ImageUtils.frame_a_base64(frame, quality),
+            'ancho': ancho,
+            'alto': alto
+        }
+
+    @staticmethod
+    def guardar_imagen(frame: 'np.ndarray', ruta: str) -> bool:
         """Guarda un frame en disco"""
+        import cv2
+
         try:
             os.makedirs(os.path.dirname(ruta), exist_ok=True)
             cv2.imwrite(ruta, frame)
             return True
         except Exception as e:
-            print(f"Error guardando imagen: {e}")
+            log.error("Error guardando imagen: %s", e)
             return False
 
 
@@ -185,7 +312,7 @@ class LogManager:
                     json.dump(detecciones, f, indent=2, ensure_ascii=False)
 
             except Exception as e:
-                print(f"Error agregando detección al log: {e}")
+                log.error("Error agregando detección al log: %s", e)
 
     def obtener_detecciones(self, limite: Optional[int] = None) -> List[Dict[str, Any]]:
         """
@@ -207,7 +334,7 @@ class LogManager:
                 return detecciones
 
             except Exception as e:
-                print(f"Error leyendo log: {e}")
+                log.error("Error leyendo log: %s", e)
                 return []
 
     def limpiar_log(self):
@@ -237,6 +364,25 @@ class PathUtils:
         os.makedirs(directorio, exist_ok=True)
         return os.path.join(directorio, f"{timestamp}.jpg")
 
+    @staticmethod
+    def crear_ruta_clip(camera_id: int, evento_ts: float, base_path: str = "clips",
+                        extension: str = "mp4") -> str:
+        """
+        Crea la ruta del clip de un evento (sin crear el directorio: el clip
+        lo escribe el servidor de video, que puede estar en otro equipo).
+
+        Args:
+            camera_id: ID de la cámara
+            evento_ts: Instante de captura del frame del evento (epoch)
+            base_path: Directorio de clips del servidor de video
+            extension: Extensión según el formato del clip
+
+        Returns:
+            Ruta completa con el instante del evento
+        """
+        timestamp = datetime.fromtimestamp(evento_ts).strftime("%Y%m%d_%H%M%S_%f")
+        return os.path.join(base_path, f"camara_{camera_id}", f"{timestamp}.{extension}")
+
     @staticmethod
     def obtener_proyecto_root() -> str:
         """Obtiene la ruta raíz del proyecto"""
@@ -245,6 +391,87 @@ class PathUtils:
         return os.path.dirname(os.path.dirname(current_dir))
 
 
+class Dependencias:
+    """Importación diferida de dependencias pesadas u opcionales (torch/ultralytics, msgpack, ...)"""
+
+    _yolo = None
+    _opcionales = {}  # {módulo: módulo | None si no está instalado}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def cargar_yolo():
+        """
+        Importa la clase YOLO de ultralytics solo cuando se necesita.
+
+        Importar ultralytics arrastra torch y tarda segundos, por lo que
+        ningún módulo lo importa al cargarse: se resuelve aquí la primera vez
+        que un servidor carga o entrena un modelo.
+
+        Returns:
+            Clase YOLO o None si ultralytics no está instalado
+        """
+        with Dependencias._lock:
+            if Dependencias._yolo is None:
+                try:
+                    from ultralytics import YOLO
+                except ImportError as e:
+                    log.error("Falta dependencia: %s (instalar con: pip install ultralytics opencv-python)", e)
+                    return None
+                Dependencias._yolo = YOLO
+            return Dependencias._yolo
+
+    @staticmethod
+    def cargar_opcional(nombre: str):
+        """
+        Importa una dependencia opcional (msgpack, zstandard, lz4.frame).
+
+        Args:
+            nombre: Nombre del módulo a importar
+
+        Returns:
+            Módulo o None si no está instalado
+        """
+        with Dependencias._lock:
+            if nombre not in Dependencias._opcionales:
+                try:
+                    Dependencias._opcionales[nombre] = importlib.import_module(nombre)
+                except ImportError:
+                    Dependencias._opcionales[nombre] = None
+            return Dependencias._opcionales[nombre]
+
+    @staticmethod
+    def cargar_msgpack():
+        """Importa msgpack (opcional) para la codificación binaria compacta"""
+        return Dependencias.cargar_opcional('msgpack')
+
+
+class ProcesoUtils:
+    """Uso de recursos de procesos del sistema"""
+
+    @staticmethod
+    def uso(pid: int) -> Optional[Dict[str, float]]:
+        """
+        CPU acumulada y memoria residente de un proceso (Linux, /proc).
+
+        Returns:
+            {'cpu_s', 'rss_mb', 'rss_max_mb'} o None si no está disponible
+        """
+        try:
+            with open(f"/proc/{pid}/stat", 'r') as f:
+                campos = f.read().rsplit(')', 1)[1].split()
+            with open(f"/proc/{pid}/status", 'r') as f:
+                estado = dict(linea.split(':', 1) for linea in f if ':' in linea)
+        except OSError:
+            return None
+
+        ticks = os.sysconf('SC_CLK_TCK')
+        return {
+            'cpu_s': (int(campos[11]) + int(campos[12])) / ticks,  # utime + stime
+            'rss_mb': int(estado['VmRSS'].split()[0]) / 1024,
+            'rss_max_mb': int(estado['VmHWM'].split()[0]) / 1024
+        }
+
+
 class ThreadSafeCounter:
     """Contador thread-safe para IDs"""
 
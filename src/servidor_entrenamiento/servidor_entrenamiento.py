@@ -23,14 +23,14 @@ from pathlib import Path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
 
 from src.common.protocolo import Protocolo, TipoMensaje
-from src.common.utils import ConfigLoader
+from src.common.utils import ConfigLoader, Dependencias
+from src.common.transporte import Transporte
+from src.common.metricas import RegistroMetricas, ServidorMetricas
+from src.common.registro import Registro
+from src.common.perfilador import Perfilador
 
-try:
-    from ultralytics import YOLO
-except ImportError:
-    print("ERROR: ultralytics no está instalado")
-    print("Instalar con: pip install ultralytics")
-    YOLO = None
+log = Registro.obtener('entrenamiento')
+log_entrenador = Registro.obtener('entrenamiento.entrenador')
 
 
 class EntrenadorYOLO:
@@ -66,31 +66,30 @@ class EntrenadorYOLO:
         Returns:
             True si el entrenamiento fue exitoso
         """
+        YOLO = Dependencias.cargar_yolo()
         if YOLO is None:
-            print("ERROR: YOLO no está disponible")
+            log_entrenador.error("YOLO no está disponible")
             return False
 
         if self.entrenando:
-            print("ERROR: Ya hay un entrenamiento en curso")
+            log_entrenador.error("Ya hay un entrenamiento en curso")
             return False
 
         try:
-            print(f"\n=== Iniciando Entrenamiento YOLO ===")
-            print(f"Dataset: {dataset_path}")
-            print(f"Modelo: {self.modelo_tipo}{self.modelo_size}")
-            print(f"Epochs: {self.epochs}")
-            print(f"Batch size: {self.batch_size}")
-            print(f"Image size: {self.img_size}")
+            log_entrenador.info("Iniciando entrenamiento YOLO", extra={
+                'dataset': dataset_path, 'modelo': f"{self.modelo_tipo}{self.modelo_size}",
+                'epochs': self.epochs, 'batch_size': self.batch_size, 'img_size': self.img_size
+            })
 
             self.entrenando = True
 
             # Cargar modelo pre-entrenado base
             modelo_base = f"{self.modelo_tipo}{self.modelo_size}.pt"
-            print(f"\nCargando modelo base: {modelo_base}")
+            log_entrenador.info("Cargando modelo base: %s", modelo_base)
             self.modelo = YOLO(modelo_base)
 
             # Entrenar modelo
-            print("\nIniciando entrenamiento...\n")
+            log_entrenador.info("Iniciando entrenamiento...")
             resultados = self.modelo.train(
                 data=dataset_path,
                 epochs=self.epochs,
@@ -104,7 +103,7 @@ class EntrenadorYOLO:
             )
 
             # Guardar modelo entrenado
-            print(f"\nGuardando modelo entrenado en: {self.modelo_guardado}")
+            log_entrenador.info("Guardando modelo entrenado en: %s", self.modelo_guardado)
             os.makedirs(os.path.dirname(self.modelo_guardado), exist_ok=True)
 
             # Exportar el mejor modelo
@@ -117,7 +116,7 @@ class EntrenadorYOLO:
                 # Guardar modelo actual
                 self.modelo.save(self.modelo_guardado)
 
-            print(f"Modelo guardado exitosamente")
+            log_entrenador.info("Modelo guardado exitosamente")
 
             # Métricas finales
             metricas = {
@@ -127,17 +126,14 @@ class EntrenadorYOLO:
                 "recall": float(resultados.results_dict.get('metrics/recall(B)', 0))
             } if hasattr(resultados, 'results_dict') else {}
 
-            print(f"\nMétricas finales:")
-            for key, value in metricas.items():
-                print(f"  {key}: {value:.4f}")
+            log_entrenador.info("Métricas finales: %s",
+                                ", ".join(f"{key}={value:.4f}" for key, value in metricas.items()))
 
             self.entrenando = False
             return True
 
         except Exception as e:
-            print(f"ERROR durante el entrenamiento: {e}")
-            import traceback
-            traceback.print_exc()
+            log_entrenador.exception("Error durante el entrenamiento: %s", e)
             self.entrenando = False
             return False
 
@@ -151,22 +147,23 @@ class EntrenadorYOLO:
         Returns:
             True si se cargó correctamente
         """
+        YOLO = Dependencias.cargar_yolo()
         if YOLO is None:
-            print("ERROR: YOLO no está disponible")
+            log_entrenador.error("YOLO no está disponible")
             return False
 
         try:
             if not os.path.exists(modelo_path):
-                print(f"ERROR: No existe el modelo en {modelo_path}")
+                log_entrenador.error("No existe el modelo en %s", modelo_path)
                 return False
 
-            print(f"Cargando modelo desde: {modelo_path}")
+            log_entrenador.info("Cargando modelo desde: %s", modelo_path)
             self.modelo = YOLO(modelo_path)
-            print("Modelo cargado exitosamente")
+            log_entrenador.info("Modelo cargado exitosamente")
             return True
 
         except Exception as e:
-            print(f"ERROR cargando modelo: {e}")
+            log_entrenador.exception("Error cargando modelo: %s", e)
             return False
 
 
@@ -194,40 +191,66 @@ class ServidorEntrenamiento:
         # Entrenador YOLO
         self.entrenador = EntrenadorYOLO(self.config)
 
-        # Socket servidor
-        self.socket_servidor = None
+        # Sockets de escucha (TCP y/o Unix) y opciones comunes de socket
+        self.sockets_servidor = []
+        self.opciones_socket = Transporte.opciones(self.config_general)
         self.running = False
 
         # Clientes conectados
         self.clientes = []
         self.clientes_lock = threading.Lock()
 
+        # Métricas expuestas por HTTP (GET /metrics) si hay metricas_puerto
+        self.metricas = RegistroMetricas()
+        self.servidor_metricas = ServidorMetricas.desde_config(self.metricas, self.config)
+        self.perfilador = Perfilador('entrenamiento', self.config_general.get('perfilador'))
+        self.m_clientes = self.metricas.medidor('pc4_entrenamiento_clientes', "Clientes conectados")
+        self.m_mensajes = self.metricas.contador('pc4_entrenamiento_mensajes_total',
+                                                 "Mensajes recibidos por tipo", ('tipo',))
+        self.m_en_curso = self.metricas.medidor('pc4_entrenamiento_en_curso',
+                                                "Entrenamientos en ejecución")
+        self.m_entrenamientos = self.metricas.contador('pc4_entrenamiento_entrenamientos_total',
+                                                       "Entrenamientos terminados por resultado",
+                                                       ('resultado',))
+        self.m_duracion = self.metricas.histograma('pc4_entrenamiento_duracion_segundos',
+                                                   "Duración de cada entrenamiento",
+                                                   cubetas=(60, 300, 900, 1800, 3600, 7200, 14400, 43200))
+
     def iniciar_servidor(self):
         """Inicia el servidor socket"""
-        print(f"\n=== Servidor de Entrenamiento ===")
-        print(f"Iniciando servidor en {self.host}:{self.puerto}")
+        log.info("Iniciando servidor en %s:%s", self.host, self.puerto)
 
-        # Crear socket TCP
-        self.socket_servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket_servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.socket_servidor.bind((self.host, self.puerto))
-        self.socket_servidor.listen(5)
+        # Crear sockets de escucha (TCP y/o Unix según configuración)
+        self.sockets_servidor = Transporte.escuchar(self.config, 5, self.opciones_socket)
 
-        print(f"Servidor escuchando en puerto {self.puerto}")
-        print("Esperando conexiones...\n")
+        for sock in self.sockets_servidor:
+            log.info("Servidor escuchando en %s", Transporte.describir(sock))
+        log.info("Esperando conexiones...")
 
         self.running = True
 
+        if self.servidor_metricas:
+            self.servidor_metricas.iniciar()
+
         # Intentar cargar modelo existente
         if os.path.exists(self.config['modelo_guardado']):
-            print(f"Modelo existente encontrado: {self.config['modelo_guardado']}")
+            log.info("Modelo existente encontrado: %s", self.config['modelo_guardado'])
             self.entrenador.cargar_modelo(self.config['modelo_guardado'])
 
-        # Aceptar clientes
+        # Sockets adicionales en hilos; el primero se atiende en este hilo
+        for sock in self.sockets_servidor[1:]:
+            threading.Thread(target=self._aceptar_clientes, args=(sock,), daemon=True).start()
+
+        self._aceptar_clientes(self.sockets_servidor[0])
+
+    def _aceptar_clientes(self, socket_servidor: socket.socket):
+        """Acepta clientes en un socket de escucha"""
         while self.running:
             try:
-                cliente_socket, cliente_addr = self.socket_servidor.accept()
-                print(f"[Servidor] Nueva conexión: {cliente_addr}")
+                cliente_socket, cliente_addr = socket_servidor.accept()
+                Transporte.configurar_socket(cliente_socket, self.opciones_socket)
+                cliente_addr = cliente_addr or Transporte.describir(socket_servidor)
+                log.info("Nueva conexión: %s", cliente_addr)
 
                 # Manejar cliente en un hilo separado
                 cliente_thread = threading.Thread(
@@ -239,7 +262,7 @@ class ServidorEntrenamiento:
 
             except Exception as e:
                 if self.running:
-                    print(f"[Servidor] Error aceptando cliente: {e}")
+                    log.error("Error aceptando cliente: %s", e)
 
     def _manejar_cliente(self, cliente_socket: socket.socket, cliente_addr):
         """
@@ -249,7 +272,9 @@ class ServidorEntrenamiento:
             cliente_socket: Socket del cliente
             cliente_addr: Dirección del cliente
         """
-        print(f"[Cliente {cliente_addr}] Conexión establecida")
+        contexto = {'cliente': cliente_addr}
+        log.debug("Conexión establecida", extra=contexto)
+        self.m_clientes.inc()
 
         try:
             while self.running:
@@ -257,13 +282,14 @@ class ServidorEntrenamiento:
                 mensaje = Protocolo.recibir_mensaje(cliente_socket)
 
                 if not mensaje:
-                    print(f"[Cliente {cliente_addr}] Desconectado")
+                    log.debug("Desconectado", extra=contexto)
                     break
 
                 tipo = mensaje.get('tipo')
                 datos = mensaje.get('datos', {})
 
-                print(f"[Cliente {cliente_addr}] Mensaje recibido: {tipo}")
+                log.debug("Mensaje recibido: %s", tipo, extra=contexto)
+                self.m_mensajes.etiquetar(tipo).inc()
 
                 # Procesar según tipo de mensaje
                 if tipo == TipoMensaje.TRAIN_REQUEST:
@@ -284,16 +310,28 @@ class ServidorEntrenamiento:
                 elif tipo == TipoMensaje.PING:
                     Protocolo.enviar_mensaje(cliente_socket, TipoMensaje.PONG, {})
 
+                elif tipo == TipoMensaje.HELLO:
+                    Protocolo.responder_hello(cliente_socket, datos,
+                                              self.config_general.get('red', {}).get('compresion'))
+
+                elif tipo == TipoMensaje.PROFILE:
+                    try:
+                        Protocolo.enviar_mensaje(cliente_socket, TipoMensaje.PROFILE,
+                                                 self.perfilador.manejar(datos))
+                    except ValueError as e:
+                        Protocolo.enviar_error(cliente_socket, str(e))
+
                 else:
-                    print(f"[Cliente {cliente_addr}] Tipo de mensaje desconocido: {tipo}")
+                    log.warning("Tipo de mensaje desconocido: %s", tipo, extra=contexto)
                     Protocolo.enviar_error(cliente_socket, f"Tipo de mensaje desconocido: {tipo}")
 
         except Exception as e:
-            print(f"[Cliente {cliente_addr}] Error: {e}")
+            log.warning("Error: %s", e, extra=contexto)
 
         finally:
+            self.m_clientes.dec()
             cliente_socket.close()
-            print(f"[Cliente {cliente_addr}] Conexión cerrada")
+            log.info("Conexión cerrada", extra=contexto)
 
     def _procesar_train_request(self, cliente_socket: socket.socket, datos: Dict):
         """
@@ -322,12 +360,17 @@ class ServidorEntrenamiento:
 
         # Iniciar entrenamiento en un hilo separado
         def entrenar():
-            print(f"\n[Entrenamiento] Iniciando con dataset: {dataset_path}")
+            log.info("Entrenamiento solicitado con dataset: %s", dataset_path)
 
+            self.m_en_curso.inc()
+            inicio = time.monotonic()
             exitoso = self.entrenador.entrenar(dataset_path)
+            self.m_duracion.observar(time.monotonic() - inicio)
+            self.m_en_curso.dec()
+            self.m_entrenamientos.etiquetar('exito' if exitoso else 'fallo').inc()
 
             if exitoso:
-                print(f"[Entrenamiento] Completado exitosamente")
+                log.info("Entrenamiento completado exitosamente")
 
                 # Notificar al cliente
                 try:
@@ -338,7 +381,7 @@ class ServidorEntrenamiento:
                 except:
                     pass
             else:
-                print(f"[Entrenamiento] Falló")
+                log.error("Entrenamiento falló")
 
                 # Notificar error al cliente
                 try:
@@ -357,13 +400,22 @@ class ServidorEntrenamiento:
 
     def detener(self):
         """Detiene el servidor"""
-        print("\n[Servidor] Deteniendo servidor...")
+        log.info("Deteniendo servidor...")
         self.running = False
 
-        if self.socket_servidor:
-            self.socket_servidor.close()
+        if self.servidor_metricas:
+            self.servidor_metricas.detener()
+
+        self.perfilador.detener()
+
+        for sock in self.sockets_servidor:
+            sock.close()
+
+        ruta_unix = self.config.get('socket_unix')
+        if ruta_unix and os.path.exists(ruta_unix):
+            os.unlink(ruta_unix)
 
-        print("[Servidor] Servidor detenido")
+        log.info("Servidor detenido")
 
     def ejecutar(self):
         """Ejecuta el servidor"""
@@ -371,24 +423,21 @@ class ServidorEntrenamiento:
             self.iniciar_servidor()
 
         except KeyboardInterrupt:
-            print("\n[Servidor] Interrupción detectada")
+            log.info("Interrupción detectada")
         finally:
             self.detener()
 
 
 def main():
     """Función principal"""
-    print("=" * 60)
-    print("SERVIDOR DE ENTRENAMIENTO - Sistema Distribuido")
-    print("=" * 60)
+    Registro.configurar(ConfigLoader.cargar_config("config/config.json"), 'entrenamiento')
+    log.info("SERVIDOR DE ENTRENAMIENTO - Sistema Distribuido")
 
     try:
         servidor = ServidorEntrenamiento()
         servidor.ejecutar()
     except Exception as e:
-        print(f"Error fatal: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error fatal: %s", e)
 
 
 if __name__ == "__main__":
@@ -3,5 +3,9 @@ Servidor de Testeo/Detección con YOLO
 """
 
 from .servidor_testeo import ServidorTesteo, DetectorYOLO, ProcesadorFrames
+from .planificador import PlanificadorFrames
+from .controlador import ControladorTasa
+from .detector_simulado import DetectorSimulado
 
-__all__ = ['ServidorTesteo', 'DetectorYOLO', 'ProcesadorFrames']
+__all__ = ['ServidorTesteo', 'DetectorYOLO', 'ProcesadorFrames', 'PlanificadorFrames',
+           'ControladorTasa', 'DetectorSimulado']
@@ -0,0 +1,204 @@
+"""
+Controlador adaptativo de la tasa de análisis.
+
+Mide el throughput de inferencia y el retardo en cola del planificador y, cuando
+la inferencia no da abasto, pide al servidor de video (mensaje RATE_CONTROL) que
+reduzca los fps enviados por cámara y, agotado eso, la resolución. Cuando vuelve
+a haber holgura restaura primero la resolución y luego los fps, de forma aditiva.
+
+Así el sistema se degrada de forma gradual en lugar de acumular latencia y
+descartar frames en puntos arbitrarios de la cadena.
+"""
+
+import threading
+import time
+from typing import Dict, Callable, List, Optional
+
+from src.common.registro import Registro
+from src.servidor_testeo.planificador import PlanificadorFrames
+
+log = Registro.obtener('testeo.controlador')
+
+
+class ControladorTasa(threading.Thread):
+    """Lazo de realimentación (AIMD) sobre fps y escala por cámara"""
+
+    def __init__(self, planificador: PlanificadorFrames, camaras: List[Dict],
+                 config: Dict, medir_inferencia: Callable[[], List[float]],
+                 enviar_ajustes: Callable[[Dict[int, Dict[str, float]]], bool]):
+        """
+        Inicializa el controlador.
+
+        Args:
+            planificador: Planificador de frames del servidor de testeo
+            camaras: Lista de cámaras (camaras.lista) con 'fps' y 'fps_min_analisis'
+            config: Sección servidor_testeo.control_tasa
+            medir_inferencia: Devuelve el tiempo medio de inferencia (s) de cada procesador
+            enviar_ajustes: Envía {camera_id: {'fps', 'escala'}} al servidor de video
+        """
+        super().__init__(daemon=True)
+        self.planificador = planificador
+        self.medir_inferencia = medir_inferencia
+        self.enviar_ajustes = enviar_ajustes
+
+        # Límites y estado actual por cámara
+        self.fps_maximos = {}
+        self.fps_minimos = {}
+        self.ajustes = {}  # {camera_id: {'fps': float, 'escala': float}}
+        self.lock = threading.Lock()  # evaluar() frente a configurar() y actualizar_camaras()
+        self.configurar(config)
+        self.actualizar_camaras(camaras)
+
+        self.running = False
+        self._anteriores = {}  # Contadores del período anterior
+
+    def configurar(self, config: Dict):
+        """
+        Parámetros del lazo (al iniciar o al recargar la configuración).
+
+        Los ajustes actuales se conservan; fps_minimo se aplica a los límites
+        por cámara en el próximo actualizar_camaras().
+
+        Args:
+            config: Sección servidor_testeo.control_tasa
+        """
+        with self.lock:
+            self.periodo = config.get('periodo_s', 2.0)
+            self.retardo_objetivo = config.get('retardo_objetivo_ms', 200) / 1000.0
+            self.tasa_descarte_max = config.get('tasa_descarte_max', 0.2)
+            self.factor_reduccion = config.get('factor_reduccion', 0.7)
+            self.paso_fps = config.get('paso_fps', 1.0)
+            self.paso_escala = config.get('paso_escala', 0.25)
+            self.escala_minima = config.get('escala_minima', 0.5)
+            self.fps_minimo = config.get('fps_minimo', 1.0)
+
+    def actualizar_camaras(self, camaras: List[Dict]):
+        """
+        Límites de fps por cámara (al iniciar o al recargar la configuración).
+
+        Las cámaras que siguen conservan su ajuste actual, acotado a los
+        límites nuevos; las nuevas empiezan en sus fps máximos.
+        """
+        with self.lock:
+            fps_maximos, fps_minimos, ajustes = {}, {}, {}
+            for camara in camaras:
+                camera_id = camara['id']
+                fps_maximos[camera_id] = float(camara.get('fps', 30))
+                fps_minimos[camera_id] = max(self.fps_minimo, float(camara.get('fps_min_analisis', 0)))
+                ajuste = dict(self.ajustes.get(camera_id, {'fps': fps_maximos[camera_id], 'escala': 1.0}))
+                ajuste['fps'] = min(fps_maximos[camera_id], max(fps_minimos[camera_id], ajuste['fps']))
+                ajustes[camera_id] = ajuste
+            self.fps_maximos, self.fps_minimos, self.ajustes = fps_maximos, fps_minimos, ajustes
+
+    def run(self):
+        """Ejecuta el lazo de control"""
+        log.info("Iniciado")
+        self.running = True
+
+        while self.running:
+            time.sleep(self.periodo)
+
+            try:
+                with self.lock:
+                    cambios = self.evaluar()
+                if cambios:
+                    self.enviar_ajustes(cambios)
+            except Exception as e:
+                log.exception("Error: %s", e)
+
+        log.info("Detenido")
+
+    def capacidad(self) -> Optional[float]:
+        """Frames por segundo que la inferencia puede sostener (None si no se midió)"""
+        tiempos = [t for t in self.medir_inferencia() if t > 0]
+        if not tiempos:
+            return None
+        return sum(1.0 / t for t in tiempos)
+
+    def evaluar(self) -> Dict[int, Dict[str, float]]:
+        """
+        Ejecuta un paso del controlador.
+
+        Returns:
+            Ajustes de las cámaras que cambiaron (vacío si no hay cambios)
+        """
+        estadisticas = self.planificador.obtener_estadisticas()
+        capacidad = self.capacidad()
+
+        # Descartes del período: reemplazados + vencidos respecto a recibidos
+        recibidos = descartados = 0
+        retardo_max = 0.0
+        for camera_id, stats in estadisticas.items():
+            previo = self._anteriores.get(camera_id, {})
+            recibidos += stats['recibidos'] - previo.get('recibidos', 0)
+            descartados += (stats['reemplazados'] + stats['descartados_antiguos']
+                            - previo.get('reemplazados', 0) - previo.get('descartados_antiguos', 0))
+            retardo_max = max(retardo_max, stats['retardo_cola_ms'] / 1000.0)
+            self._anteriores[camera_id] = stats
+
+        tasa_descarte = descartados / recibidos if recibidos else 0.0
+        demanda = sum(a['fps'] for a in self.ajustes.values())
+
+        sobrecarga = (retardo_max > self.retardo_objetivo
+                      or tasa_descarte > self.tasa_descarte_max
+                      or (capacidad is not None and demanda > capacidad * 1.1))
+        holgura = (retardo_max < self.retardo_objetivo / 2
+                   and tasa_descarte < self.tasa_descarte_max / 2
+                   and (capacidad is None or demanda < capacidad * 0.8))
+
+        if sobrecarga:
+            factor = self.factor_reduccion
+            if capacidad is not None and demanda > 0:
+                # Si la capacidad medida lo indica, bajar de una vez hasta ella
+                factor = min(factor, capacidad * 0.9 / demanda)
+            return self._reducir(factor)
+
+        if holgura:
+            return self._aumentar()
+
+        return {}
+
+    def _reducir(self, factor: float) -> Dict[int, Dict[str, float]]:
+        """Reducción multiplicativa de fps; con fps al mínimo, baja la escala"""
+        cambios = {}
+
+        for camera_id, ajuste in self.ajustes.items():
+            minimo = self.fps_minimos[camera_id]
+            nuevo = dict(ajuste)
+
+            if ajuste['fps'] > minimo:
+                nuevo['fps'] = round(max(minimo, ajuste['fps'] * factor), 2)
+            elif ajuste['escala'] > self.escala_minima:
+                nuevo['escala'] = max(self.escala_minima, ajuste['escala'] - self.paso_escala)
+
+            if nuevo != ajuste:
+                self.ajustes[camera_id] = nuevo
+                cambios[camera_id] = nuevo
+
+        if cambios:
+            log.info("Sobrecarga: reduciendo tasa %s", cambios)
+        return cambios
+
+    def _aumentar(self) -> Dict[int, Dict[str, float]]:
+        """Aumento aditivo: primero se recupera la escala, luego los fps"""
+        cambios = {}
+
+        for camera_id, ajuste in self.ajustes.items():
+            nuevo = dict(ajuste)
+
+            if ajuste['escala'] < 1.0:
+                nuevo['escala'] = min(1.0, ajuste['escala'] + self.paso_escala)
+            elif ajuste['fps'] < self.fps_maximos[camera_id]:
+                nuevo['fps'] = min(self.fps_maximos[camera_id], ajuste['fps'] + self.paso_fps)
+
+            if nuevo != ajuste:
+                self.ajustes[camera_id] = nuevo
+                cambios[camera_id] = nuevo
+
+        if cambios:
+            log.info("Holgura: aumentando tasa %s", cambios)
+        return cambios
+
+    def stop(self):
+        """Detiene el controlador"""
+        self.running = False
@@ -0,0 +1,142 @@
+"""
+Detector simulado para medir el pipeline sin el costo ni la variabilidad de YOLO.
+
+Cumple el contrato de DetectorYOLO.detectar(): recibe un frame y devuelve
+[{'clase', 'confianza', 'bbox'}]. Las detecciones y la latencia de cada
+llamada salen de un generador con semilla, de modo que dos ejecuciones con
+la misma configuración producen la misma secuencia (la llamada n siempre
+devuelve lo mismo, sin importar qué hilo procesador la haga).
+
+Se selecciona en la sección servidor_testeo de config.json:
+
+    "detector": {
+        "tipo": "simulado",
+        "semilla": 42,
+        "detecciones_por_frame": [0, 2],
+        "clases": ["persona", "carro", "perro"],
+        "confianza": [0.5, 0.95],
+        "latencia_ms": {"distribucion": "normal", "media": 25, "desviacion": 5},
+        "modo": "espera"
+    }
+
+- detecciones_por_frame: cantidad fija o rango [min, max]
+- latencia_ms.distribucion: fija, uniforme (min/max), normal o lognormal
+  (media/desviacion); siempre acotada a [min, max] si se indican
+- modo: "espera" duerme (como una inferencia en GPU, libera el GIL) y
+  "cpu" ocupa el procesador (como una inferencia en CPU)
+"""
+
+import math
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from src.common.registro import Registro
+
+if TYPE_CHECKING:
+    import numpy as np
+
+log = Registro.obtener('testeo.detector')
+
+DISTRIBUCIONES = ('fija', 'uniforme', 'normal', 'lognormal')
+
+
+class DetectorSimulado:
+    """Detecciones deterministas con latencia simulada"""
+
+    def __init__(self, config: Dict[str, Any]):
+        """
+        Args:
+            config: Sección 'detector' de la configuración del servidor de testeo
+        """
+        self.configurar(config)
+
+        self.modelo_cargado = False
+        self.llamadas = 0
+        self._lock = threading.Lock()
+
+    def configurar(self, config: Dict[str, Any]):
+        """
+        Lee la sección 'detector' (al iniciar o al recargar la configuración;
+        la secuencia sigue desde la llamada actual).
+
+        Raises:
+            ValueError: Distribución de latencia desconocida
+        """
+        latencia = config.get('latencia_ms', {})
+        if latencia.get('distribucion', 'fija') not in DISTRIBUCIONES:
+            raise ValueError(f"Distribución de latencia desconocida: {latencia.get('distribucion')}")
+
+        self.semilla = config.get('semilla', 42)
+        cantidad = config.get('detecciones_por_frame', 1)
+        self.min_detecciones, self.max_detecciones = \
+            (cantidad, cantidad) if isinstance(cantidad, int) else tuple(cantidad)
+        self.clases = config.get('clases', ['persona'])
+        self.confianza = tuple(config.get('confianza', [0.5, 0.95]))
+        self.modo = config.get('modo', 'espera')
+
+        self.distribucion = latencia.get('distribucion', 'fija')
+        self.media_ms = latencia.get('media', 20.0)
+        self.desviacion_ms = latencia.get('desviacion', 0.0)
+        self.min_ms = latencia.get('min', 0.0)
+        self.max_ms = latencia.get('max', math.inf)
+
+    def cargar_modelo(self) -> bool:
+        """No hay modelo que cargar"""
+        log.info("Detector simulado: %s-%s detecciones por frame, latencia %s %.1f ms (semilla %d)",
+                 self.min_detecciones, self.max_detecciones, self.distribucion, self.media_ms, self.semilla)
+        self.modelo_cargado = True
+        return True
+
+    def detectar(self, frame: 'np.ndarray') -> List[Dict]:
+        """
+        Simula una inferencia sobre el frame.
+
+        Returns:
+            Lista de detecciones [{'clase', 'confianza', 'bbox': [x1, y1, x2, y2]}]
+        """
+        with self._lock:
+            numero = self.llamadas
+            self.llamadas += 1
+
+        # Un generador por llamada: la secuencia no depende del orden de los hilos
+        rng = random.Random(self.semilla * 1000003 + numero)
+        self._simular_latencia(self._latencia_ms(rng) / 1000.0)
+
+        alto, ancho = frame.shape[:2]
+        detecciones = []
+        for _ in range(rng.randint(self.min_detecciones, self.max_detecciones)):
+            lado_x = rng.randint(max(1, ancho // 10), max(1, ancho // 3))
+            lado_y = rng.randint(max(1, alto // 10), max(1, alto // 3))
+            x1 = rng.randint(0, ancho - lado_x)
+            y1 = rng.randint(0, alto - lado_y)
+            detecciones.append({
+                'clase': rng.choice(self.clases),
+                'confianza': round(rng.uniform(*self.confianza), 4),
+                'bbox': [x1, y1, x1 + lado_x, y1 + lado_y]
+            })
+        return detecciones
+
+    def _latencia_ms(self, rng: random.Random) -> float:
+        """Muestra la latencia de una inferencia"""
+        if self.distribucion == 'uniforme':
+            valor = rng.uniform(self.min_ms, self.max_ms if math.isfinite(self.max_ms) else 2 * self.media_ms)
+        elif self.distribucion == 'normal':
+            valor = rng.gauss(self.media_ms, self.desviacion_ms)
+        elif self.distribucion == 'lognormal' and self.media_ms > 0:
+            # Parámetros de la normal subyacente para la media y desviación pedidas
+            sigma2 = math.log(1 + (self.desviacion_ms / self.media_ms) ** 2)
+            valor = rng.lognormvariate(math.log(self.media_ms) - sigma2 / 2, math.sqrt(sigma2))
+        else:
+            valor = self.media_ms
+        return min(max(valor, self.min_ms, 0.0), self.max_ms)
+
+    def _simular_latencia(self, segundos: float):
+        """Duerme u ocupa la CPU durante la inferencia simulada"""
+        if self.modo == 'cpu':
+            fin = time.perf_counter() + segundos
+            while time.perf_counter() < fin:
+                pass
+        elif segundos > 0:
+            time.sleep(segundos)
@@ -0,0 +1,346 @@
+"""
+Planificador de frames del servidor de testeo.
+
+Reemplaza la cola FIFO única por colas cortas por cámara con plazo de frescura:
+- Cada frame lleva su timestamp de captura (epoch, segundos)
+- Un frame cuya edad supera el plazo de su cámara se descarta antes de
+  decodificarse y otra vez antes de la inferencia
+- Cuando una cámara acumula frames se procesa el más nuevo y los anteriores
+  se descartan como reemplazados
+
+Reparto entre cámaras (camaras.lista):
+- 'prioridad': peso en el reparto justo ponderado (stride scheduling); una
+  cámara con prioridad 3 recibe el triple de turnos que una con prioridad 1
+- 'fps_min_analisis': las cámaras por debajo de su fps mínimo se atienden
+  antes que el resto, la más rezagada primero
+
+Con control de flujo por créditos, cada frame que sale del planificador
+(vencido, reemplazado o finalizado por un procesador) devuelve su crédito al
+servidor de video a través de CreditosConsumidor.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional, List
+
+from src.common.flujo import CreditosConsumidor
+
+
+class EstadisticasCamara:
+    """Contadores y métricas del planificador para una cámara"""
+
+    VENTANA_FPS = 5.0  # Segundos usados para medir el fps logrado
+
+    def __init__(self):
+        self.recibidos = 0
+        self.procesados = 0
+        self.reemplazados = 0
+        self.antiguos_recepcion = 0
+        self.antiguos_inferencia = 0
+        self.despachados = 0
+
+        # Instantes (monotonic) en que se despachó un frame de la cámara
+        self.despachos = deque()
+
+        # Retardo en cola: desde la recepción hasta el despacho
+        self.retardo_ewma = 0.0
+        self.retardo_max = 0.0
+
+    def registrar_despacho(self, ahora_mono: float, retardo: float):
+        """Registra un frame entregado a un procesador"""
+        self.despachos.append(ahora_mono)
+        self._recortar(ahora_mono)
+
+        self.retardo_ewma = retardo if not self.despachados else 0.9 * self.retardo_ewma + 0.1 * retardo
+        self.despachados += 1
+        self.retardo_max = max(self.retardo_max, retardo)
+
+    def _recortar(self, ahora_mono: float):
+        """Elimina despachos fuera de la ventana"""
+        while self.despachos and ahora_mono - self.despachos[0] > self.VENTANA_FPS:
+            self.despachos.popleft()
+
+    def fps_logrado(self, ahora_mono: float) -> float:
+        """fps de análisis logrado en la ventana reciente"""
+        self._recortar(ahora_mono)
+        return len(self.despachos) / self.VENTANA_FPS
+
+    def a_dict(self, ahora_mono: float) -> Dict[str, Any]:
+        """Convierte los contadores a diccionario"""
+        return {
+            'recibidos': self.recibidos,
+            'procesados': self.procesados,
+            'reemplazados': self.reemplazados,
+            'descartados_antiguos': self.antiguos_recepcion + self.antiguos_inferencia,
+            'antiguos_recepcion': self.antiguos_recepcion,
+            'antiguos_inferencia': self.antiguos_inferencia,
+            'fps_logrado': round(self.fps_logrado(ahora_mono), 2),
+            'retardo_cola_ms': round(self.retardo_ewma * 1000, 1),
+            'retardo_cola_max_ms': round(self.retardo_max * 1000, 1)
+        }
+
+
+class PlanificadorFrames:
+    """Colas por cámara con descarte de frames vencidos y reparto justo ponderado"""
+
+    def __init__(self, max_edad_ms: float = 1000, max_por_camara: int = 2,
+                 camaras: Optional[List[Dict]] = None,
+                 creditos: Optional[CreditosConsumidor] = None):
+        """
+        Inicializa el planificador.
+
+        Args:
+            max_edad_ms: Plazo de frescura por defecto (ms desde la captura)
+            max_por_camara: Frames pendientes máximos por cámara
+            camaras: Lista de cámaras (camaras.lista) con 'max_edad_ms',
+                     'prioridad' y 'fps_min_analisis' opcionales
+            creditos: Ventana de créditos a la que se devuelven los frames
+                      que salen del planificador (None = sin control de flujo)
+        """
+        self.max_edad_s = max_edad_ms / 1000.0
+        self.max_por_camara = max(1, max_por_camara)
+        self.creditos = creditos
+
+        self.colas = {}         # {camera_id: deque([item, ...])}
+        self.plazos = {}        # {camera_id: segundos}
+        self.estadisticas = {}  # {camera_id: EstadisticasCamara}
+
+        # Reparto justo ponderado
+        self.pesos = {}         # {camera_id: prioridad}
+        self.fps_minimos = {}   # {camera_id: fps mínimo de análisis}
+        self.pases = {}         # {camera_id: tiempo virtual acumulado}
+        self.tiempo_virtual = 0.0
+
+        self.condicion = threading.Condition()
+        self._cargar_camaras(camaras or [])
+
+    def _cargar_camaras(self, camaras: List[Dict]):
+        """Plazos, pesos y fps mínimos por cámara"""
+        self.plazos, self.pesos, self.fps_minimos = {}, {}, {}
+        for camara in camaras:
+            camera_id = camara['id']
+            if 'max_edad_ms' in camara:
+                self.plazos[camera_id] = camara['max_edad_ms'] / 1000.0
+            self.pesos[camera_id] = max(0.01, float(camara.get('prioridad', 1)))
+            self.fps_minimos[camera_id] = float(camara.get('fps_min_analisis', 0))
+
+    def configurar(self, max_edad_ms: float, max_por_camara: int, camaras: List[Dict],
+                   activas: Optional[List[int]] = None):
+        """
+        Aplica una configuración recargada sin perder los frames encolados.
+
+        Args:
+            max_edad_ms: Plazo de frescura por defecto
+            max_por_camara: Frames pendientes máximos por cámara
+            camaras: Lista de cámaras (camaras.lista)
+            activas: IDs de las cámaras habilitadas; los frames en cola de las
+                     demás se descartan (None = no descartar)
+        """
+        with self.condicion:
+            self.max_edad_s = max_edad_ms / 1000.0
+            self.max_por_camara = max(1, max_por_camara)
+            self._cargar_camaras(camaras)
+
+            for camera_id, cola in self.colas.items():
+                sobrantes = len(cola) - self.max_por_camara
+                if activas is not None and camera_id not in activas:
+                    sobrantes = len(cola)
+                for _ in range(max(0, sobrantes)):
+                    self._stats(camera_id).reemplazados += 1
+                    self._liberar(cola.popleft())
+
+    def _plazo(self, camera_id: int) -> float:
+        """Plazo de frescura de una cámara en segundos"""
+        return self.plazos.get(camera_id, self.max_edad_s)
+
+    def _stats(self, camera_id: int) -> EstadisticasCamara:
+        """Obtiene (o crea) las estadísticas de una cámara"""
+        if camera_id not in self.estadisticas:
+            self.estadisticas[camera_id] = EstadisticasCamara()
+        return self.estadisticas[camera_id]
+
+    def _liberar(self, item: Dict[str, Any]):
+        """Devuelve el crédito de un frame que salió del planificador"""
+        if self.creditos:
+            self.creditos.liberar(item['camera_id'], epoca=item.get('epoca_credito'))
+
+    def edad(self, item: Dict[str, Any], ahora: Optional[float] = None) -> float:
+        """
+        Calcula la edad de un frame en segundos.
+
+        Si el productor no envió 'capture_ts' (p. ej. el servidor C++) se usa
+        el instante de recepción como mejor aproximación.
+        """
+        ahora = ahora if ahora is not None else time.time()
+        origen = item.get('capture_ts') or item.get('recibido_ts', ahora)
+        return ahora - origen
+
+    def vencido(self, item: Dict[str, Any]) -> bool:
+        """Indica si un frame superó el plazo de frescura de su cámara"""
+        return self.edad(item) > self._plazo(item['camera_id'])
+
+    def agregar(self, item: Dict[str, Any]) -> bool:
+        """
+        Agrega un frame todavía codificado.
+
+        Args:
+            item: {'camera_id', 'timestamp', 'capture_ts', 'recibido_ts'} más
+                  'frame_data' (base64) o 'anillo'/'slot'/'seq' (memoria compartida)
+
+        Returns:
+            True si quedó encolado, False si se descartó por antiguo
+        """
+        camera_id = item['camera_id']
+        item.setdefault('recibido_ts', time.time())
+
+        if self.creditos:
+            item['epoca_credito'] = self.creditos.recibido(camera_id)
+
+        with self.condicion:
+            stats = self._stats(camera_id)
+            stats.recibidos += 1
+
+            if self.vencido(item):
+                stats.antiguos_recepcion += 1
+                self._liberar(item)
+                return False
+
+            cola = self.colas.setdefault(camera_id, deque())
+            if not cola:
+                # Una cámara que vuelve a estar activa no acumula turnos de
+                # cuando estuvo inactiva
+                self.pases[camera_id] = max(self.pases.get(camera_id, 0.0), self.tiempo_virtual)
+
+            cola.append(item)
+            while len(cola) > self.max_por_camara:
+                stats.reemplazados += 1
+                self._liberar(cola.popleft())
+
+            self.condicion.notify()
+            return True
+
+    def _elegir_camara(self, ahora_mono: float) -> Optional[int]:
+        """
+        Elige la próxima cámara a atender entre las que tienen frames.
+
+        Primero las que están por debajo de su fps mínimo (la más rezagada
+        en proporción); si ninguna lo está, la de menor tiempo virtual.
+        """
+        activas = [cid for cid, cola in self.colas.items() if cola]
+        if not activas:
+            return None
+
+        rezagadas = []
+        for cid in activas:
+            minimo = self.fps_minimos.get(cid, 0)
+            if minimo > 0:
+                logrado = self._stats(cid).fps_logrado(ahora_mono)
+                if logrado < minimo:
+                    rezagadas.append((logrado / minimo, cid))
+
+        if rezagadas:
+            return min(rezagadas)[1]
+
+        return min(activas, key=lambda cid: self.pases.get(cid, 0.0))
+
+    def obtener(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el frame más nuevo de la cámara a la que le toca turno.
+
+        Los frames más viejos de esa cámara se descartan como reemplazados y
+        los vencidos se descartan sin devolverse.
+
+        Args:
+            timeout: Segundos máximos de espera
+
+        Returns:
+            Item del frame o None si no hubo frames vigentes a tiempo
+        """
+        limite = time.monotonic() + timeout if timeout is not None else None
+
+        with self.condicion:
+            while True:
+                ahora_mono = time.monotonic()
+                camera_id = self._elegir_camara(ahora_mono)
+
+                while camera_id is not None:
+                    cola = self.colas[camera_id]
+                    stats = self._stats(camera_id)
+
+                    item = cola.pop()
+                    stats.reemplazados += len(cola)
+                    while cola:
+                        self._liberar(cola.popleft())
+
+                    if self.vencido(item):
+                        stats.antiguos_recepcion += 1
+                        self._liberar(item)
+                        camera_id = self._elegir_camara(ahora_mono)
+                        continue
+
+                    # Avanzar el tiempo virtual de la cámara según su peso
+                    self.tiempo_virtual = self.pases.get(camera_id, 0.0)
+                    self.pases[camera_id] = self.tiempo_virtual + 1.0 / self.pesos.get(camera_id, 1.0)
+
+                    stats.registrar_despacho(ahora_mono, time.time() - item['recibido_ts'])
+                    return item
+
+                restante = None
+                if limite is not None:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        return None
+
+                self.condicion.wait(restante)
+
+    def descartar_vencido(self, item: Dict[str, Any]) -> bool:
+        """
+        Vuelve a comprobar el plazo justo antes de la inferencia.
+
+        Returns:
+            True si el frame se descartó por antiguo
+        """
+        if not self.vencido(item):
+            return False
+
+        with self.condicion:
+            self._stats(item['camera_id']).antiguos_inferencia += 1
+        return True
+
+    def marcar_reemplazado(self, item: Dict[str, Any]):
+        """Registra un frame perdido porque su slot de memoria compartida se reutilizó"""
+        with self.condicion:
+            self._stats(item['camera_id']).reemplazados += 1
+
+    def marcar_procesado(self, item: Dict[str, Any]):
+        """Registra que un frame llegó a la inferencia"""
+        with self.condicion:
+            self._stats(item['camera_id']).procesados += 1
+
+    def finalizar(self, item: Dict[str, Any]):
+        """
+        Indica que un procesador terminó con un frame obtenido con obtener(),
+        haya llegado o no a la inferencia. Devuelve su crédito.
+        """
+        self._liberar(item)
+
+    def obtener_estadisticas(self) -> Dict[int, Dict[str, Any]]:
+        """
+        Estadísticas por cámara: descartes por antigüedad, fps logrado,
+        retardo en cola y parámetros de reparto.
+        """
+        ahora_mono = time.monotonic()
+        with self.condicion:
+            resultado = {}
+            for cid, stats in self.estadisticas.items():
+                datos = stats.a_dict(ahora_mono)
+                datos['prioridad'] = self.pesos.get(cid, 1.0)
+                datos['fps_min_analisis'] = self.fps_minimos.get(cid, 0)
+                resultado[cid] = datos
+            return resultado
+
+    def pendientes(self) -> int:
+        """Número total de frames encolados"""
+        with self.condicion:
+            return sum(len(c) for c in self.colas.values())
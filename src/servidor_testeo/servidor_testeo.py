@@ -10,6 +10,7 @@ Características:
 - Guardado automático de detecciones
 - Log de detecciones thread-safe
 - Comunicación via sockets puros
+- Umbrales, colas y cámaras recargados en caliente (ver common/recarga.py)
 """
 
 import socket
@@ -18,23 +19,35 @@ import time
 import sys
 import os
 from datetime import datetime
-from typing import Dict, Optional, List
-import queue
+from typing import Dict, Optional, List, TYPE_CHECKING
 
 # Agregar ruta del proyecto al PYTHONPATH
 sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
 
-from src.common.protocolo import Protocolo, TipoMensaje, MensajeFactory
-from src.common.utils import ConfigLoader, ImageUtils, LogManager, PathUtils
-
-try:
-    from ultralytics import YOLO
-    import cv2
+from src.common.protocolo import Protocolo, TipoMensaje, MensajeFactory, Canal
+from src.common.multiplexor import Multiplexor
+from src.common.utils import ConfigLoader, ImageUtils, LogManager, PathUtils, Dependencias
+from src.common.memoria_compartida import AnilloFrames
+from src.common.transporte import Transporte, HostUtils
+from src.common.flujo import CreditosConsumidor
+from src.common.trazas import Traza, RegistroTrazas
+from src.common.metricas import RegistroMetricas, ServidorMetricas
+from src.common.registro import Registro
+from src.common.perfilador import Perfilador
+from src.common.recarga import RecargaConfig
+from src.servidor_testeo.planificador import PlanificadorFrames
+from src.servidor_testeo.controlador import ControladorTasa
+from src.servidor_testeo.detector_simulado import DetectorSimulado
+
+# ultralytics (y con él torch) se importa recién en DetectorYOLO.cargar_modelo
+if TYPE_CHECKING:
     import numpy as np
-except ImportError as e:
-    print(f"ERROR: Falta dependencia: {e}")
-    print("Instalar con: pip install ultralytics opencv-python")
-    YOLO = None
+
+log = Registro.obtener('testeo')
+log_detector = Registro.obtener('testeo.detector')
+log_procesador = Registro.obtener('testeo.procesador')
+log_receptor = Registro.obtener('testeo.receptor')
+log_vigilantes = Registro.obtener('testeo.vigilantes')
 
 
 class DetectorYOLO:
@@ -51,10 +64,23 @@ class DetectorYOLO:
         self.modelo_path = config['modelo_path']
         self.confidence_threshold = config['confidence_threshold']
         self.iou_threshold = config['iou_threshold']
+        self.imgsz = config.get('imgsz', 640)
 
         self.modelo = None
         self.modelo_cargado = False
 
+    def configurar(self, config: Dict):
+        """
+        Aplica umbrales e imgsz de una configuración recargada (el modelo
+        cargado no cambia).
+
+        Args:
+            config: Configuración del servidor de testeo
+        """
+        self.confidence_threshold = config['confidence_threshold']
+        self.iou_threshold = config['iou_threshold']
+        self.imgsz = config.get('imgsz', 640)
+
     def cargar_modelo(self) -> bool:
         """
         Carga el modelo YOLO entrenado.
@@ -62,47 +88,46 @@ class DetectorYOLO:
         Returns:
             True si se cargó correctamente
         """
+        YOLO = Dependencias.cargar_yolo()
         if YOLO is None:
-            print("ERROR: YOLO no está disponible")
+            log_detector.error("YOLO no está disponible")
             return False
 
         try:
             if not os.path.exists(self.modelo_path):
-                print(f"ADVERTENCIA: Modelo no encontrado en {self.modelo_path}")
-                print("  Opciones:")
-                print("  1. Entrenar un modelo usando el servidor de entrenamiento")
-                print("  2. Usar un modelo pre-entrenado (yolov8n.pt)")
+                log_detector.warning("Modelo no encontrado en %s. Opciones: entrenar un modelo con el "
+                                     "servidor de entrenamiento o usar uno pre-entrenado (yolov8n.pt)",
+                                     self.modelo_path)
 
                 # Intentar cargar modelo pre-entrenado base
-                print("\nIntentando cargar modelo base yolov8n.pt...")
+                log_detector.info("Intentando cargar modelo base yolov8n.pt...")
                 self.modelo = YOLO('yolov8n.pt')
                 self.modelo_cargado = True
-                print("Modelo base cargado (usar solo para pruebas)")
+                log_detector.info("Modelo base cargado (usar solo para pruebas)")
                 return True
 
-            print(f"Cargando modelo desde: {self.modelo_path}")
+            log_detector.info("Cargando modelo desde: %s", self.modelo_path)
             self.modelo = YOLO(self.modelo_path)
             self.modelo_cargado = True
-            print("Modelo cargado exitosamente")
+            log_detector.info("Modelo cargado exitosamente")
 
             # Mostrar clases del modelo
             if hasattr(self.modelo, 'names'):
-                print(f"Clases del modelo: {list(self.modelo.names.values())}")
+                log_detector.info("Clases del modelo: %s", list(self.modelo.names.values()))
 
             return True
 
         except Exception as e:
-            print(f"ERROR cargando modelo: {e}")
-            import traceback
-            traceback.print_exc()
+            log_detector.exception("Error cargando modelo: %s", e)
             return False
 
-    def detectar(self, frame: np.ndarray) -> List[Dict]:
+    def detectar(self, frame: 'np.ndarray') -> List[Dict]:
         """
         Detecta objetos en un frame.
 
         Args:
-            frame: Frame de OpenCV (numpy array)
+            frame: Frame de OpenCV (numpy array); si ya viene en letterbox de
+                   imgsz x imgsz, YOLO no lo redimensiona ni rellena
 
         Returns:
             Lista de detecciones con formato:
@@ -121,6 +146,7 @@ class DetectorYOLO:
                 frame,
                 conf=self.confidence_threshold,
                 iou=self.iou_threshold,
+                imgsz=self.imgsz,
                 verbose=False
             )
 
@@ -148,57 +174,102 @@ class DetectorYOLO:
             return detecciones
 
         except Exception as e:
-            print(f"ERROR en detección: {e}")
+            log_detector.exception("Error en detección: %s", e)
             return []
 
 
 class ProcesadorFrames(threading.Thread):
     """Hilo que procesa frames y detecta objetos"""
 
-    def __init__(self, frame_queue: queue.Queue, detector: DetectorYOLO,
+    def __init__(self, planificador: PlanificadorFrames, detector: DetectorYOLO,
                  log_manager: LogManager, config: Dict,
-                 notificador_callback):
+                 notificador_callback, trazas: Optional[RegistroTrazas] = None,
+                 metricas: Optional[RegistroMetricas] = None, clip_callback=None):
         """
         Inicializa el procesador de frames.
 
         Args:
-            frame_queue: Cola de frames a procesar
+            planificador: Planificador con los frames (aún codificados) a procesar
             detector: Detector YOLO
             log_manager: Gestor de logs
             config: Configuración
             notificador_callback: Callback para notificar detecciones
+            trazas: Registro de latencias por etapa
+            metricas: Registro de métricas del servidor (compartido entre procesadores)
+            clip_callback: Pide al servidor de video el clip de un evento
+                           (camera_id, capture_ts) y devuelve su ruta o None
         """
         super().__init__(daemon=True)
-        self.frame_queue = frame_queue
+        self.planificador = planificador
         self.detector = detector
         self.log_manager = log_manager
         self.config = config
         self.notificador_callback = notificador_callback
+        self.clip_callback = clip_callback
+        self.trazas = trazas if trazas is not None else RegistroTrazas()
+
+        metricas = metricas if metricas is not None else RegistroMetricas()
+        self.m_decodificacion = metricas.histograma(
+            'pc4_testeo_decodificacion_segundos', "Duración de la decodificación del frame", ('camara',))
+        self.m_inferencia = metricas.histograma(
+            'pc4_testeo_inferencia_segundos', "Duración de la inferencia del detector", ('camara',))
+        self.m_almacenamiento = metricas.histograma(
+            'pc4_testeo_almacenamiento_segundos', "Duración del guardado de imagen y registro de una detección",
+            ('camara',))
+        self.m_detecciones = metricas.contador(
+            'pc4_testeo_detecciones_total', "Detecciones guardadas por cámara y objeto", ('camara', 'objeto'))
 
         self.running = False
         self.frames_procesados = 0
         self.frames_con_deteccion = 0  # Contador de frames con detección
         self.last_detection_time = 0   # Tiempo de la última detección guardada
+        self.tiempo_inferencia = 0.0   # Promedio móvil (s) de detectar(), lo usa el controlador
 
     def run(self):
         """Ejecuta el procesamiento de frames"""
-        print("[Procesador] Iniciado")
+        log_procesador.info("Iniciado")
         self.running = True
 
         while self.running:
+            frame_data = None
             try:
-                # Obtener frame de la cola (timeout de 1 segundo)
-                try:
-                    frame_data = self.frame_queue.get(timeout=1)
-                except queue.Empty:
+                # Obtener el frame vigente más nuevo (timeout de 1 segundo)
+                frame_data = self.planificador.obtener(timeout=1)
+                if frame_data is None:
                     continue
 
                 camera_id = frame_data['camera_id']
-                frame = frame_data['frame']
                 timestamp = frame_data['timestamp']
+                traza = frame_data.get('traza') or Traza.desde_dict(None, frame_data.get('capture_ts'))
+                traza.marcar('desencolado')
+
+                # Decodificar recién aquí: los frames vencidos nunca se decodifican
+                inicio = time.perf_counter()
+                frame = self._obtener_frame(frame_data)
+                if frame is None:
+                    continue
+                traza.marcar('decodificacion')
+                self.m_decodificacion.etiquetar(camera_id).observar(time.perf_counter() - inicio)
+
+                # Volver a comprobar el plazo: la decodificación también consume tiempo
+                if self.planificador.descartar_vencido(frame_data):
+                    continue
 
                 # Detectar objetos
+                self.planificador.marcar_procesado(frame_data)
+                traza.marcar('inferencia_inicio')
+                inicio = time.perf_counter()
                 detecciones = self.detector.detectar(frame)
+                duracion = time.perf_counter() - inicio
+                traza.marcar('inferencia_fin')
+                self.m_inferencia.etiquetar(camera_id).observar(duracion)
+                self.tiempo_inferencia = duracion if not self.tiempo_inferencia else \
+                    0.8 * self.tiempo_inferencia + 0.2 * duracion
+
+                # Latencias del frame hasta la inferencia; las etapas de cada
+                # detección (persistencia, notificación) se registran aparte
+                self.trazas.registrar(camera_id, traza)
+                etapas_frame = len(traza.etapas)
 
                 # Solo guardar si hay detecciones Y ha pasado suficiente tiempo
                 current_time = time.time()
@@ -206,17 +277,38 @@ class ProcesadorFrames(threading.Thread):
                     self.last_detection_time = current_time
                     self.frames_con_deteccion += 1
 
+                    # Un clip por evento, compartido por sus detecciones
+                    clip_path = None
+                    if self.clip_callback:
+                        clip_path = self.clip_callback(camera_id, frame_data.get('capture_ts') or traza.origen)
+
+                    # Frame ya preparado por video para el modelo: la imagen
+                    # guardada es sin las bandas de relleno y el bbox del
+                    # registro se lleva a coordenadas del frame original
+                    letterbox = frame_data.get('letterbox')
+                    imagen = ImageUtils.recortar_letterbox(frame, letterbox) if letterbox else frame
+
                     # Procesar cada detección
                     for deteccion in detecciones:
+                        traza_deteccion = traza.copiar()
+
+                        bbox_imagen = deteccion['bbox']
+                        if letterbox:
+                            x1, y1, x2, y2 = bbox_imagen
+                            bbox_imagen = [x1 - letterbox['pad_x'], y1 - letterbox['pad_y'],
+                                           x2 - letterbox['pad_x'], y2 - letterbox['pad_y']]
+                            deteccion['bbox'] = ImageUtils.bbox_desde_letterbox(deteccion['bbox'], letterbox)
+
                         # Dibujar detección en el frame
                         frame_con_bbox = ImageUtils.dibujar_deteccion(
-                            frame.copy(),
-                            deteccion['bbox'],
+                            imagen.copy(),
+                            bbox_imagen,
                             deteccion['clase'],
                             deteccion['confianza']
                         )
 
                         # Guardar imagen
+                        inicio = time.perf_counter()
                         imagen_path = PathUtils.crear_ruta_deteccion(
                             camera_id,
                             self.config['detecciones_path']
@@ -235,15 +327,27 @@ class ProcesadorFrames(threading.Thread):
                                 'fecha': datetime.now().strftime("%Y-%m-%d"),
                                 'hora': datetime.now().strftime("%H:%M:%S")
                             }
+                            if clip_path:
+                                registro['clip_path'] = clip_path
 
                             # Agregar al log
                             self.log_manager.agregar_deteccion(registro)
+                            traza_deteccion.marcar('persistencia')
+                            self.m_almacenamiento.etiquetar(camera_id).observar(time.perf_counter() - inicio)
+                            self.m_detecciones.etiquetar(camera_id, deteccion['clase']).inc()
 
-                            # Notificar al cliente vigilante
+                            # Notificar al cliente vigilante (la traza solo viaja
+                            # en la notificación, no se guarda en el log)
                             if self.notificador_callback:
-                                self.notificador_callback(registro)
+                                traza_deteccion.marcar('notificacion')
+                                self.notificador_callback(dict(registro, traza=traza_deteccion.a_dict()))
+
+                            self.trazas.registrar(camera_id, traza_deteccion,
+                                                  desde=etapas_frame, total='alerta')
 
-                            print(f"[Detección {self.frames_con_deteccion}] Cámara {camera_id}: {deteccion['clase']} ({deteccion['confianza']:.2f}) - GUARDADA")
+                            log_procesador.info("Detección %d guardada: %s (%.2f)", self.frames_con_deteccion,
+                                                deteccion['clase'], deteccion['confianza'],
+                                                extra={'camara': camera_id})
                 elif detecciones:
                     # Solo contar, no guardar
                     pass
@@ -251,13 +355,41 @@ class ProcesadorFrames(threading.Thread):
                 self.frames_procesados += 1
 
                 if self.frames_procesados % 50 == 0:
-                    print(f"[Procesador] Frames procesados: {self.frames_procesados}")
+                    log_procesador.info("Frames procesados: %d", self.frames_procesados)
+                    for cid, stats in self.planificador.obtener_estadisticas().items():
+                        log_procesador.info(
+                            "%.1f fps | cola %.0f ms | descartados por antigüedad %d | reemplazados %d "
+                            "| procesados %d", stats['fps_logrado'], stats['retardo_cola_ms'],
+                            stats['descartados_antiguos'], stats['reemplazados'], stats['procesados'],
+                            extra={'camara': cid})
 
             except Exception as e:
-                print(f"[Procesador] Error: {e}")
+                log_procesador.exception("Error: %s", e)
                 time.sleep(0.1)
 
-        print("[Procesador] Detenido")
+            finally:
+                # El frame salió del pipeline: devolver su crédito
+                if frame_data is not None:
+                    self.planificador.finalizar(frame_data)
+
+        log_procesador.info("Detenido")
+
+    def _obtener_frame(self, frame_data: Dict) -> Optional['np.ndarray']:
+        """
+        Obtiene el frame BGR de un item del planificador.
+
+        Con memoria compartida se copia desde el slot anunciado; si el slot ya
+        fue reutilizado el frame cuenta como reemplazado. Por TCP se decodifica
+        el JPEG en base64.
+        """
+        if 'anillo' in frame_data:
+            leido = frame_data['anillo'].leer(frame_data['slot'], frame_data['seq'])
+            if leido is None:
+                self.planificador.marcar_reemplazado(frame_data)
+                return None
+            return leido[0]
+
+        return ImageUtils.base64_a_frame(frame_data['frame_data'])
 
     def stop(self):
         """Detiene el procesador"""
@@ -267,6 +399,8 @@ class ProcesadorFrames(threading.Thread):
 class ServidorTesteo:
     """Servidor de testeo/detección de objetos"""
 
+    ESPERA_CLIP_S = 1.0  # Espera máxima de la respuesta de video a un CLIP_EVENT
+
     def __init__(self, config_path: str = "config/config.json"):
         """
         Inicializa el servidor de testeo.
@@ -275,6 +409,7 @@ class ServidorTesteo:
             config_path: Ruta al archivo de configuración
         """
         # Cargar configuración
+        self.config_path = config_path
         self.config_general = ConfigLoader.cargar_config(config_path)
         if not self.config_general:
             raise Exception("No se pudo cargar la configuración")
@@ -286,35 +421,137 @@ class ServidorTesteo:
         self.host = self.config['host']
         self.puerto = self.config['puerto']
 
-        # Detector YOLO
-        self.detector = DetectorYOLO(self.config)
+        # Detector: YOLO o simulado (medir el pipeline sin el costo del modelo)
+        config_detector = self.config.get('detector', {})
+        tipo_detector = config_detector.get('tipo', 'yolo')
+        if tipo_detector == 'yolo':
+            self.detector = DetectorYOLO(self.config)
+        elif tipo_detector == 'simulado':
+            self.detector = DetectorSimulado(config_detector)
+        else:
+            raise ValueError(f"Tipo de detector desconocido: {tipo_detector}")
 
         # Log manager
         self.log_manager = LogManager(self.config['log_path'])
 
-        # Cola de frames para procesar
-        self.frame_queue = queue.Queue(maxsize=self.config_general['concurrencia']['queue_size'])
+        # Control de flujo por créditos hacia el servidor de video
+        config_flujo = self.config.get('control_flujo', {})
+        self.creditos = None
+        if config_flujo.get('habilitado', True):
+            self.creditos = CreditosConsumidor(
+                [cam['id'] for cam in ConfigLoader.obtener_camaras(self.config_general)],
+                ventana=config_flujo.get('ventana', self.config.get('frames_por_camara', 2)),
+                reintento_s=config_flujo.get('reintento_s', 5)
+            )
+
+        # Planificador de frames: colas por cámara con plazo de frescura
+        self.planificador = PlanificadorFrames(
+            max_edad_ms=self.config.get('max_edad_frame_ms', 1000),
+            max_por_camara=self.config.get('frames_por_camara', 2),
+            camaras=self.config_general.get('camaras', {}).get('lista', []),
+            creditos=self.creditos
+        )
+
+        # Latencias por etapa de cada frame (trazas de extremo a extremo)
+        self.trazas = RegistroTrazas()
+        config_trazas = self.config.get('trazas', {})
+        self.trazas_path = config_trazas.get('volcado_path')
+        self.trazas_periodo = config_trazas.get('periodo_s', 30)
+
+        # Métricas expuestas por HTTP (GET /metrics) si hay metricas_puerto
+        self.metricas = RegistroMetricas()
+        self.servidor_metricas = ServidorMetricas.desde_config(self.metricas, self.config)
+
+        # Perfilado por muestreo bajo demanda (mensaje PROFILE)
+        self.perfilador = Perfilador('testeo', self.config_general.get('perfilador'))
+
+        # Recarga en caliente de config.json (archivo vigilado o CONFIG_RELOAD)
+        self.recarga = RecargaConfig(config_path, self.aplicar_config, self.config_general.get('recarga'))
 
         # Procesadores de frames (hilos)
         self.procesadores = []
         # self.num_procesadores = self.config_general['concurrencia']['max_hilos_testeo']
         self.num_procesadores = 1 # Reducir a 1 para debug
 
-        # Socket servidor para clientes vigilantes
-        self.socket_servidor = None
+        # Sockets de escucha para clientes vigilantes (TCP y/o Unix)
+        self.sockets_servidor = []
+        self.opciones_socket = Transporte.opciones(self.config_general)
         self.running = False
 
         # Socket cliente para conectar a servidor de video
         self.socket_video = None
+        self.socket_video_lock = threading.Lock()  # Envíos de control hacia video
         self.video_host = self.config_video['host']
         self.video_puerto = self.config_video['puerto']
 
+        # Transporte por memoria compartida si video corre en este host
+        # ('auto' | 'tcp'); self.anillo queda en None si se usa TCP
+        self.transporte = self.config.get('transporte', 'auto')
+        self.video_socket_shm = self.config_video.get('socket_shm')
+        self.anillo = None
+
+        # Frames de análisis ya en letterbox al imgsz del modelo (0 = no)
+        self.letterbox = self.config.get('imgsz', 640) if self.config.get('letterbox', False) else 0
+
         # Clientes vigilantes conectados
         self.clientes_vigilantes = []
         self.clientes_lock = threading.Lock()
+        # Emisor de cada vigilante {socket: Multiplexor}: etiquetado si negoció
+        # multiplexado, si no una cola en orden; ningún envío a un vigilante
+        # se hace desde el hilo que notifica o responde
+        self.multiplexores = {}
+
+        # Controlador adaptativo de tasa (se inicia al conectar con video)
+        self.controlador = None
+
+        # Salud de las cámaras según el último VIDEO_STATUS {camera_id (str): salud}
+        self.estado_video = {}
+
+        # Clips de eventos grabados por el servidor de video: la ruta la
+        # decide video y llega en su respuesta al CLIP_EVENT
+        # {id: [threading.Event, ruta]} de los CLIP_EVENT sin respuesta
+        self.clips_pendientes = {}
+        self.clips_lock = threading.Lock()
+        self.clip_siguiente_id = 0
+
+        self._registrar_metricas()
+
+    def _registrar_metricas(self):
+        """Crea las métricas del servidor; las del planificador se leen al exponer"""
+        m = self.metricas
+        m.medidor('pc4_testeo_cola_frames', "Frames encolados en el planificador",
+                  funcion=self.planificador.pendientes)
+        m.contador('pc4_testeo_frames_descartados_total', "Frames descartados por el planificador",
+                   ('camara', 'motivo'), self._frames_descartados)
+        m.contador('pc4_testeo_frames_procesados_total', "Frames que llegaron a la inferencia",
+                   ('camara',), lambda: self._estadistica_planificador('procesados'))
+        m.medidor('pc4_testeo_fps_logrado', "fps de análisis logrados por cámara",
+                  ('camara',), lambda: self._estadistica_planificador('fps_logrado'))
+        m.medidor('pc4_testeo_retardo_cola_segundos', "Retardo en cola (EWMA) por cámara",
+                  ('camara',), lambda: {cid: ms / 1000.0 for cid, ms in
+                                        self._estadistica_planificador('retardo_cola_ms').items()})
+        m.medidor('pc4_testeo_vigilantes', "Clientes vigilantes conectados",
+                  funcion=lambda: len(self.clientes_vigilantes))
+
+        self.m_frames_recibidos = m.contador('pc4_testeo_frames_recibidos_total',
+                                             "Frames recibidos del servidor de video",
+                                             ('camara', 'transporte'))
+
+    def _estadistica_planificador(self, clave: str) -> Dict:
+        """{camera_id: valor} de una estadística del planificador"""
+        return {cid: stats[clave] for cid, stats in self.planificador.obtener_estadisticas().items()}
+
+    def _frames_descartados(self) -> Dict:
+        """Descartes por cámara y motivo"""
+        descartados = {}
+        for cid, stats in self.planificador.obtener_estadisticas().items():
+            descartados[(cid, 'antiguo_recepcion')] = stats['antiguos_recepcion']
+            descartados[(cid, 'antiguo_inferencia')] = stats['antiguos_inferencia']
+            descartados[(cid, 'reemplazado')] = stats['reemplazados']
+        return descartados
 
     def cargar_modelo(self) -> bool:
-        """Carga el modelo YOLO"""
+        """Carga el modelo del detector"""
         return self.detector.cargar_modelo()
 
     def conectar_servidor_video(self) -> bool:
@@ -327,40 +564,317 @@ class ServidorTesteo:
         try:
             # Validar configuración
             if "(COLOCAR_AQUI" in self.video_host:
-                print("ADVERTENCIA: Host del servidor de video no configurado")
-                print("  Usando localhost por defecto")
+                log.warning("Host del servidor de video no configurado, usando localhost por defecto")
                 self.video_host = "127.0.0.1"
 
-            print(f"\nConectando al servidor de video: {self.video_host}:{self.video_puerto}")
+            if self._conectar_memoria_compartida():
+                # Proponer codificación compacta para los mensajes de control
+                Protocolo.enviar_hello(self.socket_video)
+                self._pedir_letterbox()
+                return True
+
+            log.info("Conectando al servidor de video: %s:%s", self.video_host, self.video_puerto)
 
-            self.socket_video = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket_video.connect((self.video_host, self.video_puerto))
+            # Socket Unix del servidor de video si es local, si no TCP
+            self.socket_video = Transporte.conectar(
+                self.video_host,
+                self.video_puerto,
+                self.config_video.get('socket_unix'),
+                opciones=self.opciones_socket
+            )
 
-            print("Conexión exitosa al servidor de video")
+            log.info("Conexión exitosa al servidor de video (%s)", Transporte.describir(self.socket_video))
+            Protocolo.enviar_hello(self.socket_video)
+            self._pedir_letterbox()
             return True
 
         except Exception as e:
-            print(f"ERROR conectando al servidor de video: {e}")
-            print("  Asegúrate de que el servidor de video esté ejecutándose")
+            log.error("Error conectando al servidor de video: %s "
+                      "(¿está ejecutándose el servidor de video?)", e)
             self.socket_video = None
             return False
 
+    def _pedir_letterbox(self, siempre: bool = False):
+        """
+        Anuncia al servidor de video el imgsz del modelo para recibir los
+        frames de análisis ya en letterbox (la respuesta llega como ACK o
+        ERROR en recibir_frames; si se rechaza, siguen llegando sin preparar).
+
+        Args:
+            siempre: Enviar también sin letterbox, para volver al perfil de
+                     análisis sin preparar (recarga de la configuración)
+        """
+        if not self.letterbox and not siempre:
+            return
+        datos = {'perfil': 'analisis'}
+        if self.letterbox:
+            datos['letterbox'] = self.letterbox
+        with self.socket_video_lock:
+            Protocolo.enviar_mensaje(self.socket_video, TipoMensaje.SUBSCRIBE_UPDATES, datos)
+
+    def aplicar_config(self, nueva: Dict) -> Dict:
+        """
+        Aplica en caliente una configuración recargada.
+
+        Cambian sin cortar la conexión con video ni con los vigilantes: los
+        umbrales e imgsz del detector (o los parámetros del simulado), el
+        plazo y los frames por cámara del planificador, las cámaras y la
+        ventana de créditos, los límites del controlador de tasa y el
+        letterbox pedido a video. Host, puertos, transporte, tipo de detector
+        y modelo requieren reiniciar.
+
+        Args:
+            nueva: Configuración completa leída de config.json
+
+        Returns:
+            Cambios aplicados (secciones de servidor_testeo y cámaras)
+
+        Raises:
+            ValueError: Configuración sin la sección servidor_testeo o con
+                        un detector inválido
+        """
+        config = nueva.get('servidor_testeo')
+        if not config:
+            raise ValueError("Configuración sin la sección servidor_testeo")
+        tipo_detector = config.get('detector', {}).get('tipo', 'yolo')
+        if tipo_detector != self.config.get('detector', {}).get('tipo', 'yolo'):
+            raise ValueError("Cambiar el tipo de detector requiere reiniciar el servidor de testeo")
+
+        cambios = {}
+        claves = ('confidence_threshold', 'iou_threshold', 'imgsz', 'letterbox', 'detector',
+                  'max_edad_frame_ms', 'frames_por_camara', 'control_flujo', 'control_tasa',
+                  'detecciones_path')
+        for clave in claves:
+            if clave in config and config[clave] != self.config.get(clave):
+                cambios[clave] = config[clave]
+
+        camaras_antes = ConfigLoader.obtener_camaras(self.config_general)
+        camaras = ConfigLoader.obtener_camaras(nueva)
+        if camaras != camaras_antes:
+            cambios['camaras'] = [cam['id'] for cam in camaras]
+
+        if isinstance(self.detector, DetectorSimulado):
+            self.detector.configurar(config.get('detector', {}))
+        else:
+            self.detector.configurar(config)
+
+        # Los procesadores leen self.config: se actualiza en su lugar
+        for clave in claves:
+            if clave in config:
+                self.config[clave] = config[clave]
+        self.config_general['camaras'] = nueva.get('camaras', {})
+
+        ids = [cam['id'] for cam in camaras]
+        self.planificador.configurar(self.config.get('max_edad_frame_ms', 1000),
+                                     self.config.get('frames_por_camara', 2),
+                                     self.config_general['camaras'].get('lista', []), ids)
+        if self.creditos:
+            config_flujo = self.config.get('control_flujo', {})
+            self.creditos.actualizar(ids, config_flujo.get('ventana', self.config.get('frames_por_camara', 2)))
+        if self.controlador:
+            self.controlador.configurar(self.config.get('control_tasa', {}))
+            self.controlador.actualizar_camaras(camaras)
+
+        letterbox = self.config.get('imgsz', 640) if self.config.get('letterbox', False) else 0
+        if letterbox != self.letterbox:
+            self.letterbox = letterbox
+            if self.socket_video:
+                self._pedir_letterbox(siempre=True)
+        return cambios
+
+    def _conectar_memoria_compartida(self) -> bool:
+        """
+        Intenta el transporte por memoria compartida (mismo host).
+
+        Se elige automáticamente cuando el servidor de video es local y expone
+        su socket Unix de control; ante cualquier fallo se vuelve a TCP.
+
+        Returns:
+            True si quedó conectado por memoria compartida
+        """
+        if self.transporte != 'auto' or not self.video_socket_shm:
+            return False
+        if not hasattr(socket, 'AF_UNIX') or not HostUtils.es_host_local(self.video_host):
+            return False
+        if not os.path.exists(self.video_socket_shm):
+            return False
+
+        sock = None
+        try:
+            sock = Transporte.conectar(ruta_unix=self.video_socket_shm, timeout=5,
+                                       opciones=self.opciones_socket)
+            sock.settimeout(5)
+
+            mensaje = Protocolo.recibir_mensaje(sock)
+            if not mensaje or mensaje.get('tipo') != TipoMensaje.SHM_INIT:
+                raise ConnectionError("El servidor de video no anunció el anillo")
+
+            self.anillo = AnilloFrames.abrir(mensaje['datos']['nombre'])
+            sock.settimeout(None)
+            self.socket_video = sock
+
+            log.info("Conectado al servidor de video por memoria compartida (%s, %d slots)",
+                     self.video_socket_shm, self.anillo.num_slots)
+            return True
+
+        except Exception as e:
+            log.info("Memoria compartida no disponible (%s), usando TCP", e)
+            if sock:
+                sock.close()
+            return False
+
     def iniciar_procesadores(self):
         """Inicia los hilos procesadores de frames"""
-        print(f"\nIniciando {self.num_procesadores} procesadores...")
+        log.info("Iniciando %d procesadores...", self.num_procesadores)
 
         for i in range(self.num_procesadores):
             procesador = ProcesadorFrames(
-                self.frame_queue,
+                self.planificador,
                 self.detector,
                 self.log_manager,
                 self.config,
-                self._notificar_deteccion
+                self._notificar_deteccion,
+                self.trazas,
+                self.metricas,
+                self._solicitar_clip
             )
             procesador.start()
             self.procesadores.append(procesador)
 
-        print(f"Procesadores iniciados: {len(self.procesadores)}")
+        log.info("Procesadores iniciados: %d", len(self.procesadores))
+
+    def iniciar_controlador(self):
+        """Inicia el controlador adaptativo de tasa si está habilitado"""
+        config_control = self.config.get('control_tasa', {})
+        if not config_control.get('habilitado', True):
+            return
+
+        self.controlador = ControladorTasa(
+            self.planificador,
+            ConfigLoader.obtener_camaras(self.config_general),
+            config_control,
+            lambda: [p.tiempo_inferencia for p in self.procesadores],
+            self._enviar_control_tasa
+        )
+        self.controlador.start()
+
+    def iniciar_volcado_trazas(self):
+        """Vuelca periódicamente las latencias por etapa al archivo configurado"""
+        if self.trazas_path:
+            threading.Thread(target=self._volcar_trazas, daemon=True).start()
+
+    def _volcar_trazas(self):
+        """Hilo de volcado de latencias"""
+        ultimo = time.monotonic()
+        while self.running:
+            time.sleep(0.5)
+            if time.monotonic() - ultimo >= self.trazas_periodo:
+                self.trazas.volcar(self.trazas_path)
+                ultimo = time.monotonic()
+
+    def iniciar_control_flujo(self):
+        """Otorga la ventana inicial de créditos y arranca su devolución"""
+        if not self.creditos:
+            return
+
+        creditos, reiniciar = self.creditos.inicial()
+        self._enviar_creditos(creditos, reiniciar)
+        threading.Thread(target=self._devolver_creditos, daemon=True).start()
+
+    def _devolver_creditos(self):
+        """Devuelve al servidor de video los créditos de frames ya procesados"""
+        while self.running and self.socket_video:
+            creditos, reiniciar = self.creditos.esperar(timeout=1)
+            if creditos and not self._enviar_creditos(creditos, reiniciar):
+                break
+
+    def _enviar_creditos(self, creditos: Dict[int, int], reiniciar: List[int]) -> bool:
+        """
+        Envía un mensaje FRAME_CREDIT al servidor de video.
+
+        Args:
+            creditos: {camera_id: créditos}
+            reiniciar: Cámaras cuyo saldo se reemplaza en lugar de sumarse
+
+        Returns:
+            True si se envió correctamente
+        """
+        if not self.socket_video:
+            return False
+
+        mensaje = MensajeFactory.crear_frame_credit(creditos, reiniciar)
+        with self.socket_video_lock:
+            try:
+                self.socket_video.sendall(
+                    Protocolo.serializar_para(self.socket_video, mensaje)
+                )
+                return True
+            except OSError as e:
+                if self.running:
+                    log_receptor.error("Error enviando créditos: %s", e)
+                return False
+
+    def _enviar_control_tasa(self, ajustes: Dict[int, Dict[str, float]]) -> bool:
+        """
+        Envía al servidor de video los nuevos fps/escala por cámara.
+
+        Args:
+            ajustes: {camera_id: {'fps': float, 'escala': float}}
+
+        Returns:
+            True si se envió correctamente
+        """
+        if not self.socket_video:
+            return False
+
+        with self.socket_video_lock:
+            return Protocolo.enviar_mensaje(self.socket_video, TipoMensaje.RATE_CONTROL, {
+                'camaras': {str(cid): ajuste for cid, ajuste in ajustes.items()}
+            })
+
+    def _solicitar_clip(self, camera_id: int, capture_ts: float) -> Optional[str]:
+        """
+        Pide al servidor de video el clip de un evento (CLIP_EVENT).
+
+        Video decide si la cámara graba clips, si el evento extiende el clip
+        en curso y la ruta del archivo, y la devuelve en su respuesta (la
+        recibe recibir_frames). Solo se anota en la detección esa ruta: sin
+        respuesta a tiempo, con ERROR o si la cámara no graba, no hay clip.
+
+        Args:
+            camera_id: ID de la cámara
+            capture_ts: Instante de captura del frame del evento
+
+        Returns:
+            Ruta del clip en el servidor de video, o None si no hay clip
+        """
+        if not self.socket_video:
+            return None
+
+        with self.clips_lock:
+            self.clip_siguiente_id += 1
+            id_evento = self.clip_siguiente_id
+            pendiente = self.clips_pendientes[id_evento] = [threading.Event(), None]
+
+        try:
+            with self.socket_video_lock:
+                enviado = Protocolo.enviar_mensaje(self.socket_video, TipoMensaje.CLIP_EVENT, {
+                    'id': id_evento, 'camera_id': camera_id, 'capture_ts': capture_ts
+                })
+            if enviado and not pendiente[0].wait(self.ESPERA_CLIP_S):
+                log.warning("Sin respuesta de video al CLIP_EVENT %d", id_evento, extra={'camara': camera_id})
+            return pendiente[1]
+        finally:
+            with self.clips_lock:
+                self.clips_pendientes.pop(id_evento, None)
+
+    def _resolver_clip(self, id_evento: Optional[int], ruta: Optional[str]):
+        """Entrega la respuesta de video a un CLIP_EVENT en espera"""
+        with self.clips_lock:
+            pendiente = self.clips_pendientes.get(id_evento)
+        if pendiente:
+            pendiente[1] = ruta
+            pendiente[0].set()
 
     def _notificar_deteccion(self, deteccion: Dict):
         """
@@ -369,21 +883,37 @@ class ServidorTesteo:
         Args:
             deteccion: Diccionario con la detección
         """
+        # clientes_lock solo para copiar la lista; cada detección se encola en
+        # el emisor del vigilante, así un historial en curso o un cliente lento
+        # no frena a los demás ni a las conexiones nuevas
         with self.clientes_lock:
-            clientes_desconectados = []
+            destinos = [(cliente, self.multiplexores.get(cliente)) for cliente in self.clientes_vigilantes]
 
-            for cliente in self.clientes_vigilantes:
-                try:
-                    print(f"[Notificador] Enviando detección a cliente {cliente.getpeername()}...")
-                    Protocolo.enviar_mensaje(cliente, TipoMensaje.DETECTION, deteccion)
-                    print(f"[Notificador] Enviado OK")
-                except Exception as e:
-                    print(f"[Notificador] Error enviando a cliente: {e}")
+        clientes_desconectados = []
+        for cliente, multiplexor in destinos:
+            if multiplexor:
+                # Se encola: no espera a que termine un historial en curso
+                if not multiplexor.activo:
                     clientes_desconectados.append(cliente)
+                else:
+                    multiplexor.enviar(Canal.DETECCIONES, TipoMensaje.DETECTION, deteccion)
+                continue
+
+            with Protocolo.lock_envio(cliente):
+                enviado = Protocolo.enviar_mensaje(cliente, TipoMensaje.DETECTION, deteccion)
+            if enviado:
+                log_vigilantes.debug("Detección enviada a %s", cliente)
+            else:
+                clientes_desconectados.append(cliente)
 
-            # Eliminar clientes desconectados
+        # Eliminar clientes desconectados
+        with self.clientes_lock:
             for cliente in clientes_desconectados:
-                self.clientes_vigilantes.remove(cliente)
+                if cliente in self.clientes_vigilantes:
+                    self.clientes_vigilantes.remove(cliente)
+                multiplexor = self.multiplexores.pop(cliente, None)
+                if multiplexor:
+                    multiplexor.cerrar()
                 try:
                     cliente.close()
                 except:
@@ -391,7 +921,7 @@ class ServidorTesteo:
 
     def recibir_frames(self):
         """Recibe frames del servidor de video"""
-        print("\n[Receptor] Iniciando recepción de frames...")
+        log_receptor.info("Iniciando recepción de frames...")
 
         while self.running:
             try:
@@ -399,65 +929,126 @@ class ServidorTesteo:
                 mensaje = Protocolo.recibir_mensaje(self.socket_video)
 
                 if not mensaje:
-                    print("[Receptor] Servidor de video desconectado")
+                    log_receptor.warning("Servidor de video desconectado")
                     break
 
                 tipo = mensaje.get('tipo')
 
-                if tipo == TipoMensaje.FRAME:
+                if tipo == TipoMensaje.HELLO:
+                    codificacion = Protocolo.aceptar_hello(self.socket_video, mensaje['datos'])
+                    log_receptor.info("Codificación negociada con video: %s", codificacion)
+
+                elif tipo == TipoMensaje.FRAME:
                     datos = mensaje['datos']
-                    camera_id = datos['camera_id']
-                    frame_base64 = datos['frame_data']
-                    timestamp = datos['timestamp']
+                    traza = Traza.desde_dict(datos.get('traza'), datos.get('capture_ts'))
+                    traza.marcar('recepcion')
+
+                    # Se encola sin decodificar; el planificador descarta los
+                    # frames vencidos y se queda con el más nuevo por cámara
+                    traza.marcar('encolado')
+                    self.m_frames_recibidos.etiquetar(datos['camera_id'], 'tcp').inc()
+                    self.planificador.agregar({
+                        'camera_id': datos['camera_id'],
+                        'frame_data': datos['frame_data'],
+                        'timestamp': datos['timestamp'],
+                        'capture_ts': datos.get('capture_ts'),
+                        'recibido_ts': time.time(),
+                        'traza': traza,
+                        'letterbox': datos.get('letterbox')
+                    })
 
-                    # Decodificar frame
-                    frame = ImageUtils.base64_a_frame(frame_base64)
+                elif tipo == TipoMensaje.FRAME_SHM and self.anillo:
+                    datos = mensaje['datos']
+                    traza = Traza.desde_dict(datos.get('traza'), datos.get('capture_ts'))
+                    traza.marcar('recepcion')
+
+                    # Solo se encola la referencia al slot; la copia se hace
+                    # en el procesador si el frame sigue vigente
+                    traza.marcar('encolado')
+                    self.m_frames_recibidos.etiquetar(datos['camera_id'], 'shm').inc()
+                    self.planificador.agregar({
+                        'camera_id': datos['camera_id'],
+                        'anillo': self.anillo,
+                        'slot': datos['slot'],
+                        'seq': datos['seq'],
+                        'timestamp': datos['timestamp'],
+                        'capture_ts': datos.get('capture_ts'),
+                        'recibido_ts': time.time(),
+                        'traza': traza,
+                        'letterbox': datos.get('letterbox')
+                    })
 
-                    if frame is not None:
-                        # Agregar a la cola de procesamiento
-                        try:
-                            self.frame_queue.put({
-                                'camera_id': camera_id,
-                                'frame': frame,
-                                'timestamp': timestamp
-                            }, block=False)
-                        except queue.Full:
-                            # Cola llena, descartar frame
-                            pass
+                elif tipo == TipoMensaje.VIDEO_STATUS:
+                    self._actualizar_estado_video(mensaje['datos'].get('camaras', {}))
+
+                elif tipo == TipoMensaje.ACK and 'clip_event' in mensaje['datos']:
+                    self._resolver_clip(mensaje['datos']['clip_event'], mensaje['datos'].get('ruta'))
+
+                elif tipo == TipoMensaje.ACK and 'perfil' in mensaje['datos']:
+                    log_receptor.info("Perfil de video: %s", mensaje['datos']['perfil'])
+
+                elif tipo == TipoMensaje.ERROR:
+                    log_receptor.warning("Servidor de video: %s", mensaje['datos'].get('error'))
+                    if 'clip_event' in mensaje['datos']:
+                        self._resolver_clip(mensaje['datos']['clip_event'], None)
 
             except Exception as e:
                 if self.running:
-                    print(f"[Receptor] Error: {e}")
+                    log_receptor.exception("Error: %s", e)
                     time.sleep(1)
 
-        print("[Receptor] Detenido")
+        log_receptor.info("Detenido")
+
+    def _actualizar_estado_video(self, camaras: Dict[str, Dict]):
+        """
+        Aplica un VIDEO_STATUS: registra los cambios de estado de las cámaras
+        y, a la que vuelve a estar activa, le reinicia en el momento la
+        ventana de créditos en lugar de esperar reintento_s.
+        """
+        for camera_id, salud in camaras.items():
+            anterior = self.estado_video.get(camera_id, {}).get('estado')
+            estado = salud.get('estado')
+            if estado == anterior:
+                continue
+
+            contexto = {'camara': camera_id}
+            if estado == 'activa':
+                log_receptor.info("Cámara activa en video", extra=contexto)
+                if anterior and self.creditos:
+                    self.creditos.reanudar(int(camera_id))
+            else:
+                log_receptor.warning("Cámara %s en video (%s s sin frames, %d reconexiones)", estado,
+                                     salud.get('segundos_sin_frame'), salud.get('reconexiones', 0),
+                                     extra=contexto)
+        self.estado_video = camaras
 
     def iniciar_servidor_vigilantes(self):
         """Inicia servidor para aceptar clientes vigilantes"""
-        print(f"\nIniciando servidor para clientes vigilantes en puerto {self.puerto}...")
+        log.info("Iniciando servidor para clientes vigilantes en puerto %s...", self.puerto)
 
-        # Crear socket TCP
-        self.socket_servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket_servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.socket_servidor.bind((self.host, self.puerto))
-        self.socket_servidor.listen(5)
+        # Crear sockets de escucha (TCP y/o Unix según configuración)
+        self.sockets_servidor = Transporte.escuchar(self.config, 5, self.opciones_socket)
 
-        print(f"Servidor escuchando en puerto {self.puerto}")
+        for sock in self.sockets_servidor:
+            log.info("Servidor escuchando en %s", Transporte.describir(sock))
 
-        # Hilo para aceptar clientes
-        threading.Thread(target=self._aceptar_vigilantes, daemon=True).start()
+        # Un hilo de aceptación por socket de escucha
+        for sock in self.sockets_servidor:
+            threading.Thread(target=self._aceptar_vigilantes, args=(sock,), daemon=True).start()
 
-    def _aceptar_vigilantes(self):
-        """Acepta conexiones de clientes vigilantes"""
-        print("[Vigilante] Hilo de aceptación iniciado", flush=True)
+    def _aceptar_vigilantes(self, socket_servidor: socket.socket):
+        """Acepta conexiones de clientes vigilantes en un socket de escucha"""
+        log_vigilantes.debug("Hilo de aceptación iniciado")
         while self.running:
             try:
-                # print("[Vigilante] Esperando conexión...") # Comentado para no saturar
-                cliente_socket, cliente_addr = self.socket_servidor.accept()
-                print(f"[Vigilante] Nueva conexión aceptada: {cliente_addr}", flush=True)
+                cliente_socket, cliente_addr = socket_servidor.accept()
+                Transporte.configurar_socket(cliente_socket, self.opciones_socket)
+                cliente_addr = cliente_addr or Transporte.describir(socket_servidor)
+                log_vigilantes.info("Nueva conexión aceptada", extra={'vigilante': cliente_addr})
 
                 with self.clientes_lock:
                     self.clientes_vigilantes.append(cliente_socket)
+                    self.multiplexores[cliente_socket] = Multiplexor(cliente_socket, etiquetado=False)
 
                 # Manejar solicitudes del cliente en un hilo
                 t = threading.Thread(
@@ -466,118 +1057,255 @@ class ServidorTesteo:
                     daemon=True
                 )
                 t.start()
-                print(f"[Vigilante] Hilo iniciado para {cliente_addr}", flush=True)
 
             except Exception as e:
                 if self.running:
-                    print(f"[Vigilante] Error aceptando cliente: {e}")
+                    log_vigilantes.error("Error aceptando cliente: %s", e)
+
+    def _responder(self, cliente_socket: socket.socket, canal: int, tipo: str,
+                   datos: Dict, id_solicitud: int = 0) -> bool:
+        """
+        Responde a una solicitud de un vigilante.
+
+        En una conexión multiplexada la respuesta se encola en su canal con el
+        id de la solicitud; si no, se envía directamente con el lock de envío
+        del socket.
+        """
+        with self.clientes_lock:
+            multiplexor = self.multiplexores.get(cliente_socket)
+        if not multiplexor:
+            with Protocolo.lock_envio(cliente_socket):
+                return Protocolo.enviar_mensaje(cliente_socket, tipo, datos)
+        return multiplexor.enviar(canal, tipo, datos, id_solicitud)
+
+    def _obtener_miniatura(self, datos: Dict) -> Optional[Dict]:
+        """
+        Genera la miniatura de la imagen de una detección.
+
+        Solo se sirven imágenes dentro de la carpeta de detecciones.
+        """
+        imagen_path = datos.get('imagen_path') or ''
+        base = os.path.realpath(self.config.get('detecciones_path', 'detecciones'))
+        ruta = os.path.realpath(imagen_path)
+        if not ruta.startswith(base + os.sep):
+            return None
+
+        miniatura = ImageUtils.miniatura(ruta, int(datos.get('max_lado', 400)))
+        if miniatura:
+            miniatura['imagen_path'] = imagen_path
+        return miniatura
 
     def _manejar_vigilante(self, cliente_socket: socket.socket, cliente_addr):
         """Maneja solicitudes de un cliente vigilante"""
+        contexto = {'vigilante': cliente_addr}
         try:
             while self.running:
                 mensaje = Protocolo.recibir_mensaje(cliente_socket)
 
                 if not mensaje:
-                    print(f"[Vigilante {cliente_addr}] Conexión cerrada por cliente o error")
+                    log_vigilantes.debug("Conexión cerrada por el cliente", extra=contexto)
                     break
 
                 tipo = mensaje.get('tipo')
                 datos = mensaje.get('datos', {})
-                print(f"[Vigilante {cliente_addr}] Mensaje recibido: {tipo}")
+                id_solicitud = mensaje.get('id', 0)  # Solo en conexiones multiplexadas
+                log_vigilantes.debug("Mensaje recibido: %s", tipo, extra=contexto)
+
+                with self.clientes_lock:
+                    multiplexor = self.multiplexores.get(cliente_socket)
 
                 if tipo == TipoMensaje.GET_DETECTIONS:
                     # Enviar historial de detecciones
                     limite = datos.get('limite', 100)
                     detecciones = self.log_manager.obtener_detecciones(limite)
 
-                    Protocolo.enviar_mensaje(cliente_socket, TipoMensaje.ACK, {
-                        'detecciones': detecciones,
-                        'total': len(detecciones)
-                    })
+                    if multiplexor:
+                        # Lo envía su hilo emisor: multiplexado, por fragmentos en su
+                        # canal intercalado con las notificaciones; si no, entero y en
+                        # orden (comprimido por fragmentos si se negoció compresión)
+                        multiplexor.enviar_stream(Canal.HISTORIAL, TipoMensaje.ACK,
+                                                  {'total': len(detecciones)},
+                                                  'detecciones', detecciones, id_solicitud)
+                    else:
+                        # El lock del socket evita que una notificación se intercale
+                        with Protocolo.lock_envio(cliente_socket):
+                            Protocolo.enviar_stream(cliente_socket, TipoMensaje.ACK,
+                                                    {'total': len(detecciones)},
+                                                    'detecciones', detecciones)
 
                 elif tipo == TipoMensaje.SUBSCRIBE_UPDATES:
                     # Cliente ya está suscrito automáticamente
-                    Protocolo.enviar_ack(cliente_socket)
+                    self._responder(cliente_socket, Canal.CONTROL, TipoMensaje.ACK,
+                                    {'status': 'ok'}, id_solicitud)
+
+                elif tipo == TipoMensaje.GET_THUMBNAIL:
+                    miniatura = self._obtener_miniatura(datos)
+                    if miniatura:
+                        self._responder(cliente_socket, Canal.MINIATURAS, TipoMensaje.THUMBNAIL,
+                                        miniatura, id_solicitud)
+                    else:
+                        self._responder(cliente_socket, Canal.CONTROL, TipoMensaje.ERROR,
+                                        {'error': 'Imagen no disponible',
+                                         'imagen_path': datos.get('imagen_path')},
+                                        id_solicitud)
+
+                elif tipo == TipoMensaje.HELLO:
+                    # Con el lock de envío: el emisor no envía a medio cambiar la
+                    # sesión; si se negoció multiplexado pasa a uno etiquetado
+                    with Protocolo.lock_envio(cliente_socket):
+                        compresion = self.config_general.get('red', {}).get('compresion')
+                        codificacion = Protocolo.responder_hello(cliente_socket, datos, compresion,
+                                                                 multiplexado=True)
+                        with self.clientes_lock:
+                            anterior = self.multiplexores.get(cliente_socket)
+                            if Protocolo.multiplexado(cliente_socket) and not (anterior and anterior.etiquetado):
+                                if anterior:
+                                    anterior.cerrar()
+                                self.multiplexores[cliente_socket] = Multiplexor(cliente_socket)
+                    log_vigilantes.info("Codificación negociada: %s, compresión: %s, multiplexado: %s",
+                                        codificacion, Protocolo.compresion(cliente_socket) or 'ninguna',
+                                        'sí' if Protocolo.multiplexado(cliente_socket) else 'no',
+                                        extra=contexto)
+
+                elif tipo == TipoMensaje.TESTEO_STATUS:
+                    # Métricas del planificador por cámara
+                    self._responder(cliente_socket, Canal.METRICAS, TipoMensaje.TESTEO_STATUS, {
+                        'camaras': {
+                            str(cid): stats
+                            for cid, stats in self.planificador.obtener_estadisticas().items()
+                        },
+                        'pendientes': self.planificador.pendientes(),
+                        'latencias': self.trazas.resumen(),
+                        'video': self.estado_video
+                    }, id_solicitud)
+
+                elif tipo == TipoMensaje.PROFILE:
+                    try:
+                        self._responder(cliente_socket, Canal.CONTROL, TipoMensaje.PROFILE,
+                                        self.perfilador.manejar(datos), id_solicitud)
+                    except ValueError as e:
+                        self._responder(cliente_socket, Canal.CONTROL, TipoMensaje.ERROR,
+                                        {'error': str(e)}, id_solicitud)
+
+                elif tipo == TipoMensaje.CONFIG_RELOAD:
+                    try:
+                        cambios = self.recarga.recargar()
+                    except Exception as e:
+                        # Un valor mal tipado en config.json (KeyError, TypeError...)
+                        # se informa al cliente sin cortar su conexión
+                        log_vigilantes.warning("Recarga de configuración fallida: %s", e, extra=contexto)
+                        self._responder(cliente_socket, Canal.CONTROL, TipoMensaje.ERROR,
+                                        {'error': str(e) or type(e).__name__}, id_solicitud)
+                        continue
+                    self._responder(cliente_socket, Canal.CONTROL, TipoMensaje.ACK,
+                                    {'status': 'ok', 'cambios': cambios}, id_solicitud)
+                    log_vigilantes.info("Configuración recargada", extra=contexto)
 
         except Exception as e:
-            print(f"[Vigilante {cliente_addr}] Error: {e}")
+            log_vigilantes.warning("Error: %s", e, extra=contexto)
 
         finally:
             with self.clientes_lock:
                 if cliente_socket in self.clientes_vigilantes:
                     self.clientes_vigilantes.remove(cliente_socket)
+                multiplexor = self.multiplexores.pop(cliente_socket, None)
+                if multiplexor:
+                    multiplexor.cerrar()
 
             cliente_socket.close()
-            print(f"[Vigilante {cliente_addr}] Desconectado")
+            log_vigilantes.info("Desconectado", extra=contexto)
 
     def ejecutar(self):
         """Ejecuta el servidor"""
         try:
-            print("=" * 60)
-            print("SERVIDOR DE TESTEO/DETECCIÓN")
-            print("=" * 60)
+            log.info("SERVIDOR DE TESTEO/DETECCIÓN")
 
             # Cargar modelo
             if not self.cargar_modelo():
-                print("\nERROR: No se pudo cargar el modelo")
+                log.error("No se pudo cargar el modelo")
                 return
 
             self.running = True
 
             # Iniciar procesadores
             self.iniciar_procesadores()
+            self.iniciar_volcado_trazas()
+            if self.servidor_metricas:
+                self.servidor_metricas.iniciar()
 
             # Iniciar servidor para clientes vigilantes
             self.iniciar_servidor_vigilantes()
+            self.recarga.iniciar()
 
             # Conectar al servidor de video
             if not self.conectar_servidor_video():
-                print("\nADVERTENCIA: No se pudo conectar al servidor de video")
-                print("  El sistema funcionará solo en modo histórico (sin nuevas detecciones)")
+                log.warning("No se pudo conectar al servidor de video: el sistema funcionará "
+                            "solo en modo histórico (sin nuevas detecciones)")
                 # No retornamos, permitimos que siga ejecutándose
 
             # Iniciar recepción de frames
             if self.socket_video:
+                self.iniciar_control_flujo()
+                self.iniciar_controlador()
                 self.recibir_frames()
             else:
-                print("[Servidor] Ejecutando en modo espera (solo clientes)...")
+                log.info("Ejecutando en modo espera (solo clientes)...")
                 while self.running:
                     time.sleep(1)
 
         except KeyboardInterrupt:
-            print("\n[Servidor] Interrupción detectada")
+            log.info("Interrupción detectada")
         finally:
             self.detener()
 
     def detener(self):
         """Detiene el servidor"""
-        print("\n[Servidor] Deteniendo servidor...")
+        log.info("Deteniendo servidor...")
         self.running = False
+        self.recarga.detener()
 
         # Detener procesadores
         for procesador in self.procesadores:
             procesador.stop()
 
+        if self.controlador:
+            self.controlador.stop()
+
+        if self.servidor_metricas:
+            self.servidor_metricas.detener()
+
+        self.perfilador.detener()
+
+        if self.trazas_path and self.trazas.resumen():
+            self.trazas.volcar(self.trazas_path)
+            log.info("Latencias por etapa guardadas en %s", self.trazas_path)
+
         # Cerrar sockets
         if self.socket_video:
             self.socket_video.close()
 
-        if self.socket_servidor:
-            self.socket_servidor.close()
+        if self.anillo:
+            self.anillo.cerrar()
+
+        for sock in self.sockets_servidor:
+            sock.close()
 
-        print("[Servidor] Servidor detenido")
+        ruta_unix = self.config.get('socket_unix')
+        if ruta_unix and os.path.exists(ruta_unix):
+            os.unlink(ruta_unix)
+
+        log.info("Servidor detenido")
 
 
 def main():
     """Función principal"""
+    Registro.configurar(ConfigLoader.cargar_config("config/config.json"), 'testeo')
+
     try:
         servidor = ServidorTesteo()
         servidor.ejecutar()
     except Exception as e:
-        print(f"Error fatal: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error fatal: %s", e)
 
 
 if __name__ == "__main__":
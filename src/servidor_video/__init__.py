@@ -3,5 +3,13 @@ Servidor de Video para captura multi-cámara RTSP
 """
 
 from .servidor_video import ServidorVideo, CapturaCamera, FrameQueue
+from .fuentes import FuenteVideo, FuenteRTSP, FuenteArchivo, FuenteSintetica
+from .grabador import GrabadorClips
+from .grabacion import GrabacionContinua
+from .perfiles import PerfilSalida
+from .procesos import SupervisorCapturas
+from .salud import MonitorSalud
 
-__all__ = ['ServidorVideo', 'CapturaCamera', 'FrameQueue']
+__all__ = ['ServidorVideo', 'CapturaCamera', 'FrameQueue',
+           'FuenteVideo', 'FuenteRTSP', 'FuenteArchivo', 'FuenteSintetica', 'GrabadorClips',
+           'GrabacionContinua', 'PerfilSalida', 'SupervisorCapturas', 'MonitorSalud']
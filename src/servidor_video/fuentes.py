@@ -0,0 +1,308 @@
+"""
+Fuentes de video para las cámaras del servidor de video.
+
+Cada cámara de config.json puede indicar su fuente en "fuente"; sin ella se
+usa "rtsp_url" como hasta ahora:
+
+    {"id": 1, "rtsp_url": "rtsp://192.168.1.100:554/stream1"}
+    {"id": 2, "fuente": {"tipo": "archivo", "ruta": "videos/entrada.mp4"}}
+    {"id": 3, "fuente": {"tipo": "archivo", "ruta": "dataset/images/val"}}
+    {"id": 4, "fuente": {"tipo": "sintetica", "ancho": 1280, "alto": 720, "objetos": 4}}
+
+- rtsp: cualquier URL que abra OpenCV (también un índice de webcam "0" o
+  la ruta de un video, sin marcar el ritmo).
+- archivo: un video o un directorio de imágenes reproducido en bucle a los
+  fps de la cámara (o "fps" de la fuente).
+- sintetica: figuras en movimiento generadas en memoria a la resolución
+  indicada, sin leer disco ni red.
+
+Las fuentes locales marcan su propio ritmo (leer() espera al siguiente
+frame), de modo que con "camaras.simuladas" se pueden levantar decenas de
+cámaras virtuales en una sola máquina para pruebas de capacidad.
+"""
+
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+EXTENSIONES_IMAGEN = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class Ritmo:
+    """Espera entre frames para sostener una tasa fija sin acumular deriva"""
+
+    def __init__(self, fps: float):
+        self.periodo = 1.0 / max(0.1, fps)
+        self.siguiente = 0.0
+
+    def esperar(self):
+        """Duerme hasta el instante del próximo frame"""
+        ahora = time.monotonic()
+        if self.siguiente > ahora:
+            time.sleep(self.siguiente - ahora)
+            self.siguiente += self.periodo
+        else:
+            # Atrasado (o primer frame): no se recupera con ráfagas
+            self.siguiente = ahora + self.periodo
+
+
+class FuenteVideo:
+    """Interfaz común de las fuentes de frames de una cámara"""
+
+    # True si leer() ya espera al siguiente frame según los fps configurados
+    marca_ritmo = False
+
+    def abrir(self) -> bool:
+        """Abre (o reabre) la fuente. Returns: True si se pudo abrir"""
+        raise NotImplementedError
+
+    def leer(self) -> Tuple[bool, Optional['np.ndarray']]:
+        """Lee el siguiente frame BGR. Returns: (ok, frame)"""
+        raise NotImplementedError
+
+    def cerrar(self):
+        """Libera los recursos de la fuente"""
+
+    def describir(self) -> str:
+        """Descripción corta para los logs"""
+        return self.__class__.__name__
+
+    @staticmethod
+    def crear(camera_config: Dict[str, Any]) -> 'FuenteVideo':
+        """
+        Crea la fuente de una cámara según su configuración.
+
+        Args:
+            camera_config: Configuración de la cámara
+
+        Returns:
+            Fuente de video
+
+        Raises:
+            ValueError: Si la fuente no está configurada o el tipo es desconocido
+        """
+        fuente = camera_config.get('fuente') or {'tipo': 'rtsp'}
+        tipo = fuente.get('tipo', 'rtsp')
+        fps = fuente.get('fps', camera_config.get('fps', 30))
+
+        if tipo == 'rtsp':
+            url = fuente.get('url', camera_config.get('rtsp_url', ''))
+            if not url or "(COLOCAR_AQUI" in url:
+                raise ValueError("URL RTSP no configurada: editar config/config.json "
+                                 "(formato rtsp://usuario:password@IP:puerto/stream)")
+            return FuenteRTSP(url)
+
+        if tipo == 'archivo':
+            ruta = fuente.get('ruta')
+            if not ruta:
+                raise ValueError("Fuente 'archivo' sin 'ruta'")
+            return FuenteArchivo(ruta, fps, fuente.get('bucle', True))
+
+        if tipo == 'sintetica':
+            return FuenteSintetica(fuente.get('ancho', 1280), fuente.get('alto', 720), fps,
+                                   fuente.get('objetos', 3), camera_config.get('id', 0))
+
+        raise ValueError(f"Tipo de fuente desconocido: {tipo}")
+
+
+class FuenteRTSP(FuenteVideo):
+    """Stream RTSP (o webcam/archivo) leído con cv2.VideoCapture"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.capture = None
+
+    def abrir(self) -> bool:
+        import cv2
+
+        self.cerrar()
+        # "0", "1"... son índices de webcam
+        self.capture = cv2.VideoCapture(int(self.url) if self.url.isdigit() else self.url)
+        return self.capture.isOpened()
+
+    def leer(self):
+        if self.capture is None:
+            return False, None
+        return self.capture.read()
+
+    def cerrar(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+    def describir(self) -> str:
+        return self.url
+
+
+class FuenteArchivo(FuenteVideo):
+    """Video o directorio de imágenes reproducido a fps fijos"""
+
+    marca_ritmo = True
+
+    def __init__(self, ruta: str, fps: float, bucle: bool = True):
+        """
+        Args:
+            ruta: Archivo de video o directorio con imágenes
+            fps: Frames por segundo de la reproducción
+            bucle: Volver al inicio al terminar
+        """
+        self.ruta = ruta
+        self.bucle = bucle
+        self.ritmo = Ritmo(fps)
+        self.capture = None
+        self.imagenes: List[str] = []
+        self.indice = 0
+
+    def abrir(self) -> bool:
+        import cv2
+
+        self.cerrar()
+        if os.path.isdir(self.ruta):
+            self.imagenes = sorted(
+                os.path.join(self.ruta, nombre) for nombre in os.listdir(self.ruta)
+                if nombre.lower().endswith(EXTENSIONES_IMAGEN)
+            )
+            self.indice = 0
+            return bool(self.imagenes)
+
+        self.capture = cv2.VideoCapture(self.ruta)
+        return self.capture.isOpened()
+
+    def leer(self):
+        import cv2
+
+        self.ritmo.esperar()
+
+        if self.imagenes:
+            if self.indice >= len(self.imagenes):
+                if not self.bucle:
+                    return False, None
+                self.indice = 0
+            frame = cv2.imread(self.imagenes[self.indice])
+            self.indice += 1
+            return frame is not None, frame
+
+        if self.capture is None:
+            return False, None
+        ok, frame = self.capture.read()
+        if not ok and self.bucle:
+            # Fin del video: volver al primer frame
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+        return ok, frame
+
+    def cerrar(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+        self.imagenes = []
+
+    def describir(self) -> str:
+        return f"archivo:{self.ruta}"
+
+
+class FuenteSintetica(FuenteVideo):
+    """Figuras que rebotan sobre un fondo fijo, generadas en memoria"""
+
+    marca_ritmo = True
+
+    # Fondos por resolución, compartidos (solo lectura) entre todas las cámaras
+    _fondos: Dict[Tuple[int, int], 'np.ndarray'] = {}
+    _fondos_lock = threading.Lock()
+
+    def __init__(self, ancho: int, alto: int, fps: float, objetos: int = 3, semilla: int = 0):
+        """
+        Args:
+            ancho: Ancho del frame
+            alto: Alto del frame
+            fps: Frames por segundo generados
+            objetos: Cantidad de figuras en movimiento
+            semilla: Semilla (distinta por cámara para que no sean idénticas)
+        """
+        self.ancho = ancho
+        self.alto = alto
+        self.objetos = objetos
+        self.semilla = semilla
+        self.ritmo = Ritmo(fps)
+        self.fondo = None
+        self.figuras = []
+        self.numero = 0
+
+    def abrir(self) -> bool:
+        import numpy as np
+
+        rng = np.random.default_rng(self.semilla)
+        self.fondo = FuenteSintetica._fondo(self.ancho, self.alto)
+
+        lado = max(8, min(self.ancho, self.alto) // 8)
+        self.figuras = []
+        for i in range(self.objetos):
+            self.figuras.append({
+                'circulo': i % 2 == 1,
+                'lado': int(lado * rng.uniform(0.6, 1.4)),
+                'x': float(rng.uniform(0, self.ancho - lado)),
+                'y': float(rng.uniform(0, self.alto - lado)),
+                'vx': float(rng.uniform(-1, 1) * self.ancho / 60),
+                'vy': float(rng.uniform(-1, 1) * self.alto / 60),
+                'color': tuple(int(c) for c in rng.integers(60, 256, 3))
+            })
+        self.numero = 0
+        return True
+
+    def leer(self):
+        import cv2
+
+        if self.fondo is None:
+            return False, None
+
+        self.ritmo.esperar()
+
+        frame = self.fondo.copy()
+        for figura in self.figuras:
+            self._mover(figura)
+            x, y, lado = int(figura['x']), int(figura['y']), figura['lado']
+            if figura['circulo']:
+                cv2.circle(frame, (x + lado // 2, y + lado // 2), lado // 2, figura['color'], -1)
+            else:
+                cv2.rectangle(frame, (x, y), (x + lado, y + lado), figura['color'], -1)
+
+        self.numero += 1
+        cv2.putText(frame, f"#{self.numero}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.8, (255, 255, 255), 2)
+        return True, frame
+
+    @staticmethod
+    def _fondo(ancho: int, alto: int) -> 'np.ndarray':
+        """Degradé con algo de ruido (para que el JPEG no sea trivial), uno por resolución"""
+        import numpy as np
+
+        with FuenteSintetica._fondos_lock:
+            fondo = FuenteSintetica._fondos.get((ancho, alto))
+            if fondo is None:
+                rng = np.random.default_rng(0)
+                degrade = np.linspace(30, 110, ancho).astype(np.int16)
+                ruido = rng.integers(-8, 9, (alto, ancho), dtype=np.int16)
+                gris = np.clip(degrade[np.newaxis, :] + ruido, 0, 255).astype(np.uint8)
+                fondo = np.repeat(gris[:, :, np.newaxis], 3, axis=2)
+                fondo.flags.writeable = False
+                FuenteSintetica._fondos[(ancho, alto)] = fondo
+            return fondo
+
+    def _mover(self, figura: Dict[str, Any]):
+        """Avanza una figura rebotando en los bordes"""
+        for eje, velocidad, limite in (('x', 'vx', self.ancho), ('y', 'vy', self.alto)):
+            figura[eje] += figura[velocidad]
+            maximo = limite - figura['lado']
+            if figura[eje] < 0 or figura[eje] > maximo:
+                figura[velocidad] = -figura[velocidad]
+                figura[eje] = min(max(figura[eje], 0), maximo)
+
+    def cerrar(self):
+        self.fondo = None
+
+    def describir(self) -> str:
+        return f"sintetica:{self.ancho}x{self.alto}"
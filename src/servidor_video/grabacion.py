@@ -0,0 +1,457 @@
+"""
+Grabación continua por segmentos con índice para buscar por instante.
+
+Las cámaras listadas en "grabacion.camaras" se graban 24/7 en segmentos de
+duración fija. Cada frame se codifica una sola vez a JPEG en el hilo de
+captura y se escribe tal cual (MJPEG concatenado): ni al rotar segmentos ni
+al servir una consulta se vuelve a codificar.
+
+Por cámara, en directorio/camara_N/:
+
+    <inicio_ms>.mjpeg   JPEG concatenados del segmento
+    <inicio_ms>.idx     un registro fijo por frame: capture_ts (float64),
+                        offset (uint64) y tamaño (uint32) en el .mjpeg
+
+Buscar un instante es O(log n): bisección sobre los inicios de segmento
+(en memoria) y luego sobre los registros del .idx (leídos con pread, sin
+cargar el índice). La retención borra los segmentos más antiguos de todas
+las cámaras cuando el total supera max_gb.
+
+Mensaje GET_RECORDING (cualquier cliente del servidor de video):
+    {'camera_id', 'instante'}          -> RECORDING con el frame más cercano
+                                          anterior (o posterior, a menos de
+                                          tolerancia_s)
+    {'camera_id', 'desde', 'hasta'}    -> RECORDING con los JPEG del rango
+                                          concatenados (MJPEG, hasta max_clip_s)
+"""
+
+import base64
+import bisect
+import os
+import queue
+import struct
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+from src.common.registro import Registro
+from src.common.utils import ImageUtils
+
+if TYPE_CHECKING:
+    import numpy as np
+
+log = Registro.obtener('video.grabacion')
+
+REGISTRO = struct.Struct('<dQI')  # capture_ts, offset, tamaño
+
+
+class VistaIndice:
+    """Timestamps de un .idx como secuencia indexable (para bisect), leídos a demanda"""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.cantidad = os.fstat(fd).st_size // REGISTRO.size
+
+    def __len__(self) -> int:
+        return self.cantidad
+
+    def registro(self, i: int) -> Tuple[float, int, int]:
+        """(capture_ts, offset, tamaño) del frame i"""
+        return REGISTRO.unpack(os.pread(self.fd, REGISTRO.size, i * REGISTRO.size))
+
+    def __getitem__(self, i: int) -> float:
+        return self.registro(i)[0]
+
+
+class Segmento:
+    """Segmento en escritura de una cámara"""
+
+    def __init__(self, directorio: str, inicio: float):
+        self.inicio_ms = int(inicio * 1000)
+        base = os.path.join(directorio, str(self.inicio_ms))
+        self.datos = open(base + '.mjpeg', 'ab')
+        self.indice = open(base + '.idx', 'ab')
+        self.offset = self.datos.tell()
+        self.bytes = self.offset + self.indice.tell()
+
+    def escribir(self, capture_ts: float, jpeg: bytes):
+        """Agrega un frame (datos antes que índice: un lector nunca ve un registro sin datos)"""
+        self.datos.write(jpeg)
+        self.datos.flush()
+        self.indice.write(REGISTRO.pack(capture_ts, self.offset, len(jpeg)))
+        self.indice.flush()
+        self.offset += len(jpeg)
+        self.bytes += len(jpeg) + REGISTRO.size
+
+    def cerrar(self):
+        self.datos.close()
+        self.indice.close()
+
+
+class GrabacionContinua(threading.Thread):
+    """Grabación por segmentos, retención por espacio y consultas por instante"""
+
+    def __init__(self, config: Dict[str, Any], camaras: List[Dict[str, Any]],
+                 ancho: int, alto: int):
+        """
+        Args:
+            config: Sección 'grabacion' de servidor_video
+            camaras: Cámaras configuradas
+            ancho: Ancho por defecto de los frames grabados
+            alto: Alto por defecto de los frames grabados
+        """
+        super().__init__(daemon=True)
+        self.directorio = config.get('directorio', 'grabaciones')
+        self.segmento_s = config.get('segmento_s', 60)
+        self.calidad = config.get('calidad', 80)
+        self.ancho = config.get('ancho', ancho)
+        self.alto = config.get('alto', alto)
+        self.max_bytes = int(config.get('max_gb', 20) * 1024 ** 3)
+        self.max_clip_s = config.get('max_clip_s', 30)
+        self.tolerancia_s = config.get('tolerancia_s', 2.0)
+
+        self.fps_grabacion = config.get('fps', 15)
+        self.filtro = config.get('camaras') or []  # Vacío: todas las cámaras
+
+        # Por cámara grabada: fps y próximo capture_ts a codificar. Se
+        # reemplazan enteros al recargar (actualizar_camaras)
+        self.fps: Dict[int, float] = {}
+        self.siguiente: Dict[int, float] = {}
+
+        # El hilo de captura solo codifica; el disco se escribe en este hilo
+        self.cola = queue.Queue(maxsize=config.get('cola', 64))
+
+        # Catálogo en disco: {camera_id: [inicio_ms, ...]} ordenado y bytes por segmento
+        self.segmentos: Dict[int, List[int]] = {}
+        self.tamanos: Dict[Tuple[int, int], int] = {}
+        self.bytes_total = 0
+        self.activos: Dict[int, Segmento] = {}
+        self.lock = threading.Lock()
+
+        self.running = False
+        self.frames_escritos: Dict[int, int] = {}
+        self.frames_descartados = 0  # Cola llena (el disco no da abasto)
+        self.segmentos_borrados = 0
+
+        self.actualizar_camaras(camaras)
+        self._cargar_catalogo()
+
+    def actualizar_camaras(self, camaras: List[Dict[str, Any]]) -> List[int]:
+        """
+        Cámaras grabadas (al iniciar o al recargar la configuración).
+
+        Las nuevas que pasan el filtro empiezan a grabarse; las quitadas
+        dejan de hacerlo y el hilo escritor cierra su segmento en curso. Lo
+        ya grabado de cualquier cámara se sigue pudiendo consultar.
+
+        Returns:
+            Ids de las cámaras grabadas
+        """
+        grabadas = set(self.filtro or [c['id'] for c in camaras])
+        fps = {c['id']: min(self.fps_grabacion, c.get('fps', self.fps_grabacion))
+               for c in camaras if c['id'] in grabadas}
+        siguiente = {camera_id: self.siguiente.get(camera_id, 0.0) for camera_id in fps}
+        for camera_id in fps:
+            self.frames_escritos.setdefault(camera_id, 0)
+        self.fps, self.siguiente = fps, siguiente
+        return sorted(fps)
+
+    def _directorio_camara(self, camera_id: int) -> str:
+        return os.path.join(self.directorio, f"camara_{camera_id}")
+
+    def _cargar_catalogo(self):
+        """Reconstruye el catálogo con los segmentos que ya están en disco"""
+        if not os.path.isdir(self.directorio):
+            return
+
+        for nombre in os.listdir(self.directorio):
+            if not nombre.startswith('camara_'):
+                continue
+            try:
+                camera_id = int(nombre[len('camara_'):])
+            except ValueError:
+                continue
+
+            inicios = []
+            directorio = os.path.join(self.directorio, nombre)
+            for archivo in os.listdir(directorio):
+                base, extension = os.path.splitext(archivo)
+                if extension != '.mjpeg' or not base.isdigit():
+                    continue
+                inicio_ms = int(base)
+                inicios.append(inicio_ms)
+                tamano = sum(os.path.getsize(os.path.join(directorio, base + ext))
+                             for ext in ('.mjpeg', '.idx') if os.path.exists(os.path.join(directorio, base + ext)))
+                self.tamanos[(camera_id, inicio_ms)] = tamano
+                self.bytes_total += tamano
+            self.segmentos[camera_id] = sorted(inicios)
+
+        log.info("Grabaciones existentes: %d segmentos, %.1f MB",
+                 len(self.tamanos), self.bytes_total / 1024 ** 2)
+
+    def agregar(self, camera_id: int, frame: 'np.ndarray', capture_ts: float):
+        """Codifica un frame capturado y lo encola para escribirlo (hilo de captura)"""
+        fps = self.fps.get(camera_id)
+        if fps is None:
+            return
+
+        # Medio período de tolerancia para que el jitter no salte frames
+        periodo = 1.0 / fps
+        siguiente = self.siguiente.get(camera_id, 0.0)
+        if capture_ts < siguiente - periodo / 2:
+            return
+        self.siguiente[camera_id] = siguiente + periodo if capture_ts - siguiente < periodo \
+            else capture_ts + periodo
+
+        import cv2
+
+        if frame.shape[1] != self.ancho or frame.shape[0] != self.alto:
+            frame = ImageUtils.redimensionar_frame(frame, self.ancho, self.alto)
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.calidad])
+        if not ok:
+            return
+
+        try:
+            self.cola.put_nowait((camera_id, capture_ts, jpeg.tobytes()))
+        except queue.Full:
+            self.frames_descartados += 1
+
+    def run(self):
+        """Escribe los frames encolados, rota segmentos y aplica la retención"""
+        self.running = True
+        while self.running or not self.cola.empty():
+            # Cámaras quitadas al recargar: se cierra su segmento en curso
+            for camera_id in [c for c in self.activos if c not in self.fps]:
+                self._cerrar_segmento(camera_id)
+
+            try:
+                camera_id, capture_ts, jpeg = self.cola.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if camera_id not in self.fps:
+                continue
+
+            try:
+                self._escribir(camera_id, capture_ts, jpeg)
+            except OSError as e:
+                log.error("Error escribiendo grabación: %s", e, extra={'camara': camera_id})
+                self.frames_descartados += 1
+
+        with self.lock:
+            for segmento in self.activos.values():
+                segmento.cerrar()
+            self.activos.clear()
+
+    def _escribir(self, camera_id: int, capture_ts: float, jpeg: bytes):
+        """Agrega un frame al segmento en curso de la cámara, rotándolo si venció"""
+        segmento = self.activos.get(camera_id)
+        if segmento and capture_ts * 1000 >= segmento.inicio_ms + self.segmento_s * 1000:
+            self._cerrar_segmento(camera_id)
+            segmento = None
+
+        if segmento is None:
+            directorio = self._directorio_camara(camera_id)
+            os.makedirs(directorio, exist_ok=True)
+            segmento = Segmento(directorio, capture_ts)
+            with self.lock:
+                self.activos[camera_id] = segmento
+                inicios = self.segmentos.setdefault(camera_id, [])
+                if not inicios or inicios[-1] != segmento.inicio_ms:
+                    bisect.insort(inicios, segmento.inicio_ms)
+
+        antes = segmento.bytes
+        segmento.escribir(capture_ts, jpeg)
+        with self.lock:
+            clave = (camera_id, segmento.inicio_ms)
+            self.tamanos[clave] = self.tamanos.get(clave, 0) + segmento.bytes - antes
+            self.bytes_total += segmento.bytes - antes
+        self.frames_escritos[camera_id] = self.frames_escritos.get(camera_id, 0) + 1
+
+    def _cerrar_segmento(self, camera_id: int):
+        """Cierra el segmento en curso y libera espacio si se superó el presupuesto"""
+        with self.lock:
+            segmento = self.activos.pop(camera_id, None)
+        if segmento:
+            segmento.cerrar()
+        self._aplicar_retencion()
+
+    def _aplicar_retencion(self):
+        """Borra los segmentos cerrados más antiguos (de cualquier cámara) hasta entrar en max_gb"""
+        while True:
+            with self.lock:
+                if self.bytes_total <= self.max_bytes:
+                    return
+
+                activos = {(cid, s.inicio_ms) for cid, s in self.activos.items()}
+                candidatos = [(inicios[0], cid) for cid, inicios in self.segmentos.items()
+                              if inicios and (cid, inicios[0]) not in activos]
+                if not candidatos:
+                    return
+                inicio_ms, camera_id = min(candidatos)
+                self.segmentos[camera_id].pop(0)
+                self.bytes_total -= self.tamanos.pop((camera_id, inicio_ms), 0)
+                self.segmentos_borrados += 1
+
+            base = os.path.join(self._directorio_camara(camera_id), str(inicio_ms))
+            for extension in ('.mjpeg', '.idx'):
+                try:
+                    os.unlink(base + extension)
+                except OSError:
+                    pass
+            log.debug("Segmento borrado por retención: %s", base, extra={'camara': camera_id})
+
+    # ------------------------------------------------------------------
+    # Consultas (GET_RECORDING)
+    # ------------------------------------------------------------------
+
+    def obtener(self, datos: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Atiende un GET_RECORDING.
+
+        Args:
+            datos: {'camera_id', 'instante'} o {'camera_id', 'desde', 'hasta'}
+                   (instantes epoch de captura)
+
+        Returns:
+            Datos del mensaje RECORDING
+
+        Raises:
+            ValueError: Solicitud inválida o sin grabación en ese instante
+        """
+        try:
+            camera_id = int(datos['camera_id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("GET_RECORDING requiere camera_id")
+
+        try:
+            if 'instante' in datos:
+                instante = float(datos['instante'])
+            else:
+                desde, hasta = float(datos['desde']), float(datos['hasta'])
+        except KeyError:
+            raise ValueError("GET_RECORDING requiere 'instante' o 'desde' y 'hasta'")
+        except TypeError:
+            raise ValueError("GET_RECORDING: los instantes deben ser números")
+
+        if 'instante' in datos:
+            capture_ts, jpeg = self.obtener_frame(camera_id, instante)
+            return {'camera_id': camera_id, 'timestamp': capture_ts, 'formato': 'jpeg',
+                    'frames': 1, 'datos': base64.b64encode(jpeg).decode('ascii')}
+
+        if hasta <= desde or hasta - desde > self.max_clip_s:
+            raise ValueError(f"Rango inválido: como máximo {self.max_clip_s} s")
+
+        primero, ultimo, frames, mjpeg = self.obtener_clip(camera_id, desde, hasta)
+        return {'camera_id': camera_id, 'desde': primero, 'hasta': ultimo, 'formato': 'mjpeg',
+                'frames': frames, 'datos': base64.b64encode(mjpeg).decode('ascii')}
+
+    def _candidatos(self, camera_id: int, instante: float) -> List[int]:
+        """Inicios (ms) del segmento que contiene el instante y sus vecinos"""
+        with self.lock:
+            inicios = self.segmentos.get(camera_id, [])
+            i = bisect.bisect_right(inicios, instante * 1000) - 1
+            return inicios[max(0, i):i + 2] if i >= 0 else inicios[:1]
+
+    def obtener_frame(self, camera_id: int, instante: float) -> Tuple[float, bytes]:
+        """
+        Frame grabado más cercano al instante (preferentemente el anterior).
+
+        Returns:
+            (capture_ts, jpeg)
+
+        Raises:
+            ValueError: Sin grabación a menos de tolerancia_s del instante (o el
+                        segmento se borró por retención al leerlo)
+        """
+        mejor = None  # (distancia, capture_ts, base, offset, tamaño)
+        for inicio_ms in self._candidatos(camera_id, instante):
+            base = os.path.join(self._directorio_camara(camera_id), str(inicio_ms))
+            try:
+                fd = os.open(base + '.idx', os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                vista = VistaIndice(fd)
+                i = bisect.bisect_right(vista, instante)
+                for j in (i - 1, i):
+                    if 0 <= j < len(vista):
+                        capture_ts, offset, tamano = vista.registro(j)
+                        # El anterior gana ante la misma distancia
+                        distancia = abs(instante - capture_ts) + (0 if capture_ts <= instante else 1e-6)
+                        if mejor is None or distancia < mejor[0]:
+                            mejor = (distancia, capture_ts, base, offset, tamano)
+            finally:
+                os.close(fd)
+
+        if mejor is None or mejor[0] > self.tolerancia_s:
+            raise ValueError("Sin grabación en ese instante")
+
+        _, capture_ts, base, offset, tamano = mejor
+        try:
+            with open(base + '.mjpeg', 'rb') as f:
+                return capture_ts, os.pread(f.fileno(), tamano, offset)
+        except OSError:
+            # Borrado por retención entre la búsqueda y la lectura
+            raise ValueError("Sin grabación en ese instante")
+
+    def obtener_clip(self, camera_id: int, desde: float, hasta: float) -> Tuple[float, float, int, bytes]:
+        """
+        Frames grabados entre dos instantes, como MJPEG.
+
+        Los frames de un segmento son contiguos en el .mjpeg: se lee un solo
+        bloque por segmento.
+
+        Returns:
+            (primer capture_ts, último capture_ts, frames, mjpeg)
+
+        Raises:
+            ValueError: Sin grabación en el rango
+        """
+        with self.lock:
+            inicios = self.segmentos.get(camera_id, [])
+            i = max(0, bisect.bisect_right(inicios, desde * 1000) - 1)
+            seleccion = [s for s in inicios[i:] if s <= hasta * 1000]
+
+        partes, frames, primero, ultimo = [], 0, None, None
+        for inicio_ms in seleccion:
+            base = os.path.join(self._directorio_camara(camera_id), str(inicio_ms))
+            try:
+                fd = os.open(base + '.idx', os.O_RDONLY)
+            except OSError:
+                continue  # Borrado por retención mientras tanto
+            try:
+                vista = VistaIndice(fd)
+                a = bisect.bisect_left(vista, desde)
+                b = bisect.bisect_right(vista, hasta)
+                if a >= b:
+                    continue
+                ts_a, offset_a, _ = vista.registro(a)
+                ts_b, offset_b, tamano_b = vista.registro(b - 1)
+            finally:
+                os.close(fd)
+
+            try:
+                with open(base + '.mjpeg', 'rb') as f:
+                    partes.append(os.pread(f.fileno(), offset_b + tamano_b - offset_a, offset_a))
+            except OSError:
+                continue  # Borrado por retención entre el índice y los datos
+            frames += b - a
+            primero = ts_a if primero is None else primero
+            ultimo = ts_b
+
+        if not frames:
+            raise ValueError("Sin grabación en ese rango")
+        return primero, ultimo, frames, b''.join(partes)
+
+    def uso_disco(self) -> Dict[int, int]:
+        """Bytes grabados por cámara"""
+        with self.lock:
+            uso = {}
+            for (camera_id, _), tamano in self.tamanos.items():
+                uso[camera_id] = uso.get(camera_id, 0) + tamano
+            return uso
+
+    def detener(self):
+        """Escribe lo encolado, cierra los segmentos y detiene el hilo"""
+        self.running = False
+        if self.is_alive():
+            self.join(timeout=5)
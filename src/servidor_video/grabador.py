@@ -0,0 +1,377 @@
+"""
+Clips de video alrededor de cada evento de detección.
+
+Cada cámara habilitada mantiene en memoria un anillo acotado de frames ya
+codificados en JPEG (a los fps y la resolución de "clips", no a los del
+envío a testeo). Cuando el servidor de testeo guarda una detección envía
+CLIP_EVENT con la cámara y el instante de captura del frame; un hilo en
+segundo plano escribe los pre_s segundos anteriores que están en el anillo
+y sigue agregando frames en vivo hasta post_s segundos después del evento.
+Un nuevo evento dentro del clip en curso de la cámara lo extiende (hasta
+max_s en total). La ruta la arma este servidor bajo "directorio" con la
+cámara y el instante del evento, y la devuelve en la respuesta (ACK con
+'ruta', o ERROR): testeo guarda en la detección solo la ruta que recibió.
+
+Configuración en la sección servidor_video de config.json:
+
+    "clips": {
+        "habilitado": true,
+        "directorio": "clips",
+        "formato": "mp4",
+        "pre_s": 5, "post_s": 10, "max_s": 60,
+        "fps": 10, "calidad": 80, "ancho": 640, "alto": 480,
+        "max_mb_por_camara": 16,
+        "camaras": []
+    }
+
+- formato: "mp4" decodifica y recodifica con cv2.VideoWriter (mp4v);
+  "mjpeg" concatena los JPEG del anillo sin recodificar (ffplay/VLC lo
+  abren como MJPEG)
+- max_mb_por_camara: tope de memoria del anillo; si se alcanza se
+  descartan los frames más antiguos aunque sigan dentro de pre_s
+- camaras: ids que graban (vacío = todas)
+"""
+
+import collections
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional, Tuple
+
+from src.common.registro import Registro
+from src.common.utils import ImageUtils, PathUtils
+
+if TYPE_CHECKING:
+    import numpy as np
+
+log = Registro.obtener('video.clips')
+
+FORMATOS = ('mp4', 'mjpeg')  # También es la extensión del archivo
+
+
+class AnilloClip:
+    """Frames JPEG recientes de una cámara, acotados por antigüedad y memoria"""
+
+    def __init__(self, max_segundos: float, max_bytes: int):
+        """
+        Args:
+            max_segundos: Antigüedad máxima de los frames retenidos
+            max_bytes: Memoria máxima de los JPEG retenidos
+        """
+        self.max_segundos = max_segundos
+        self.max_bytes = max_bytes
+        self.frames: Deque[Tuple[float, bytes]] = collections.deque()  # (capture_ts, jpeg)
+        self.bytes = 0
+        self.descartados_memoria = 0  # Expulsados por tope de memoria antes de tiempo
+        self.lock = threading.Lock()
+
+    def agregar(self, capture_ts: float, jpeg: bytes):
+        """Agrega un frame y expulsa los que exceden la antigüedad o la memoria"""
+        with self.lock:
+            self.frames.append((capture_ts, jpeg))
+            self.bytes += len(jpeg)
+
+            limite = capture_ts - self.max_segundos
+            while self.frames and self.frames[0][0] < limite:
+                self.bytes -= len(self.frames.popleft()[1])
+            while self.bytes > self.max_bytes and len(self.frames) > 1:
+                self.bytes -= len(self.frames.popleft()[1])
+                self.descartados_memoria += 1
+
+    def entre(self, desde: float, hasta: float) -> List[Tuple[float, bytes]]:
+        """Frames con desde < capture_ts <= hasta, en orden"""
+        with self.lock:
+            return [(ts, jpeg) for ts, jpeg in self.frames if desde < ts <= hasta]
+
+
+class Clip:
+    """Un clip en escritura"""
+
+    def __init__(self, camera_id: int, ruta: str, evento_ts: float, pre_s: float,
+                 post_s: float, max_s: float):
+        self.camera_id = camera_id
+        self.ruta = ruta
+        self.inicio = evento_ts - pre_s
+        self.max_fin = self.inicio + max_s
+        self.fin = min(evento_ts + post_s, self.max_fin)
+        self.ultimo_ts = self.inicio  # capture_ts del último frame escrito
+        self.frames = 0
+        self.escritor = None          # cv2.VideoWriter o archivo binario
+
+    def extender(self, evento_ts: float, post_s: float):
+        """Un nuevo evento dentro del clip lo prolonga (hasta max_s)"""
+        self.fin = max(self.fin, min(evento_ts + post_s, self.max_fin))
+
+
+class GrabadorClips(threading.Thread):
+    """Anillos por cámara y escritura de clips en segundo plano"""
+
+    PERIODO_S = 0.2   # Cada cuánto el escritor toma frames nuevos del anillo
+    GRACIA_S = 1.0    # Espera por frames atrasados antes de cerrar un clip
+
+    def __init__(self, config: Dict[str, Any], camaras: List[Dict[str, Any]],
+                 ancho: int, alto: int):
+        """
+        Args:
+            config: Sección 'clips' de servidor_video
+            camaras: Cámaras configuradas
+            ancho: Ancho por defecto de los frames del anillo
+            alto: Alto por defecto de los frames del anillo
+        """
+        super().__init__(daemon=True)
+        self.directorio = config.get('directorio', 'clips')
+        self.formato = config.get('formato', 'mp4')
+        if self.formato not in FORMATOS:
+            raise ValueError(f"Formato de clip desconocido: {self.formato}")
+        self.pre_s = config.get('pre_s', 5.0)
+        self.post_s = config.get('post_s', 10.0)
+        self.max_s = max(config.get('max_s', 60.0), self.pre_s + self.post_s)
+        self.calidad = config.get('calidad', 80)
+        self.ancho = config.get('ancho', ancho)
+        self.alto = config.get('alto', alto)
+
+        self.fps_clips = config.get('fps', 10)
+        self.filtro = config.get('camaras') or []  # Vacío: todas las cámaras
+        self.max_bytes = int(config.get('max_mb_por_camara', 16) * 1024 * 1024)
+
+        # Por cámara habilitada: fps del anillo, anillo y próximo capture_ts a
+        # codificar. Se reemplazan enteros al recargar (actualizar_camaras)
+        self.fps: Dict[int, float] = {}
+        self.anillos: Dict[int, AnilloClip] = {}
+        self.siguiente: Dict[int, float] = {}
+
+        self.clips: Dict[str, Clip] = {}   # {ruta: Clip} en escritura
+        self.ultimos: Dict[int, Clip] = {}  # Último clip de cada cámara (en escritura o ya cerrado)
+        self.lock = threading.Lock()
+        self.evento = threading.Event()
+        self.running = False
+        self.clips_escritos = 0
+        self.clips_fallidos = 0
+        self.actualizar_camaras(camaras)
+
+    def actualizar_camaras(self, camaras: List[Dict[str, Any]]) -> List[int]:
+        """
+        Anillos de las cámaras que graban clips (al iniciar o al recargar).
+
+        Las cámaras nuevas que pasan el filtro reciben su anillo; las que ya
+        no están lo pierden y su clip en curso se cierra con lo escrito. Las
+        que siguen conservan su anillo con los fps actualizados.
+
+        Returns:
+            Ids de las cámaras que graban clips
+        """
+        # fps del anillo por cámara: nunca más que los de la cámara
+        habilitadas = set(self.filtro or [c['id'] for c in camaras])
+        fps = {c['id']: min(self.fps_clips, c.get('fps', self.fps_clips))
+               for c in camaras if c['id'] in habilitadas}
+
+        # El anillo guarda pre_s más un margen para que el escritor alcance
+        # a tomar los frames en vivo antes de que se expulsen
+        anillos = {camera_id: self.anillos.get(camera_id) or AnilloClip(self.pre_s + 2.0, self.max_bytes)
+                   for camera_id in fps}
+        siguiente = {camera_id: self.siguiente.get(camera_id, 0.0) for camera_id in fps}
+
+        with self.lock:
+            self.fps, self.siguiente, self.anillos = fps, siguiente, anillos
+            for camera_id in [c for c in self.ultimos if c not in anillos]:
+                del self.ultimos[camera_id]
+        self.evento.set()
+        return sorted(anillos)
+
+    def habilitada(self, camera_id: int) -> bool:
+        """Indica si la cámara graba clips"""
+        return camera_id in self.anillos
+
+    def agregar(self, camera_id: int, frame: 'np.ndarray', capture_ts: float):
+        """
+        Agrega un frame capturado al anillo de la cámara (hilo de captura).
+
+        Solo se codifica a los fps del anillo; el resto se ignora sin costo.
+        """
+        anillo = self.anillos.get(camera_id)
+        fps = self.fps.get(camera_id)
+        if anillo is None or fps is None:
+            return
+
+        # Medio período de tolerancia: con la cámara a los mismos fps del
+        # anillo, el jitter de captura no descarta frames alternados
+        periodo = 1.0 / fps
+        siguiente = self.siguiente.get(camera_id, 0.0)
+        if capture_ts < siguiente - periodo / 2:
+            return
+        self.siguiente[camera_id] = siguiente + periodo if capture_ts - siguiente < periodo \
+            else capture_ts + periodo
+
+        import cv2
+
+        if frame.shape[1] != self.ancho or frame.shape[0] != self.alto:
+            frame = ImageUtils.redimensionar_frame(frame, self.ancho, self.alto)
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.calidad])
+        if ok:
+            anillo.agregar(capture_ts, jpeg.tobytes())
+
+    def evento_deteccion(self, datos: Dict[str, Any]) -> Optional[str]:
+        """
+        Registra un evento (mensaje CLIP_EVENT): inicia el clip o lo extiende.
+
+        Args:
+            datos: {'camera_id', 'capture_ts'}
+
+        Returns:
+            Ruta del clip que contiene el evento, o None si la cámara no graba clips
+
+        Raises:
+            ValueError: capture_ts que no es un instante reciente de este
+                        servidor, o sin frames en el anillo para el clip
+        """
+        camera_id = int(datos['camera_id'])
+        anillo = self.anillos.get(camera_id)
+        if anillo is None:
+            return None
+
+        # capture_ts lo puso la captura de este servidor: uno lejano (o NaN)
+        # no tiene frames en el anillo y solo crearía archivos vacíos
+        evento_ts = float(datos['capture_ts'])
+        if not abs(time.time() - evento_ts) <= self.max_s:
+            raise ValueError(f"capture_ts fuera de rango: {evento_ts}")
+
+        with self.lock:
+            clip = self.ultimos.get(camera_id)
+            if clip and evento_ts <= clip.fin:
+                # Dentro del último clip: se extiende si sigue en escritura;
+                # si ya se cerró, el evento quedó dentro del archivo escrito
+                if clip.ruta in self.clips:
+                    clip.extender(evento_ts, self.post_s)
+                    self.evento.set()
+                elif not clip.frames:
+                    raise ValueError("El clip del evento se cerró sin frames")
+                return clip.ruta
+
+            ruta = PathUtils.crear_ruta_clip(camera_id, evento_ts, self.directorio, self.formato)
+            if os.path.exists(ruta):
+                return ruta  # Evento repetido de un clip ya escrito: no sobrescribirlo
+            if not anillo.entre(evento_ts - self.pre_s, evento_ts):
+                raise ValueError(f"Sin frames de la cámara {camera_id} para el clip")
+
+            clip = self.clips[ruta] = self.ultimos[camera_id] = Clip(
+                camera_id, ruta, evento_ts, self.pre_s, self.post_s, self.max_s)
+            log.info("Clip iniciado: %s", ruta, extra={'camara': camera_id})
+        self.evento.set()
+        return ruta
+
+    def memoria(self) -> Dict[int, int]:
+        """Bytes retenidos en el anillo de cada cámara"""
+        return {camera_id: anillo.bytes for camera_id, anillo in self.anillos.items()}
+
+    def clips_activos(self) -> int:
+        """Clips en escritura"""
+        with self.lock:
+            return len(self.clips)
+
+    def run(self):
+        """Escribe los frames nuevos de cada clip y cierra los terminados"""
+        self.running = True
+        while self.running:
+            self.evento.wait(self.PERIODO_S)
+            self.evento.clear()
+
+            with self.lock:
+                clips = list(self.clips.values())
+
+            ahora = time.time()
+            for clip in clips:
+                self._escribir(clip)
+                if ahora > clip.fin + self.GRACIA_S:
+                    self._cerrar(clip)
+
+        # Al detener se cierran los clips con lo que haya llegado
+        with self.lock:
+            clips = list(self.clips.values())
+        for clip in clips:
+            self._escribir(clip)
+            self._cerrar(clip)
+
+    def _escribir(self, clip: Clip):
+        """Agrega al clip los frames del anillo posteriores al último escrito"""
+        anillo = self.anillos.get(clip.camera_id)
+        if anillo is None:
+            # Cámara quitada al recargar: el clip queda con lo ya escrito
+            self._cerrar(clip)
+            return
+        frames = anillo.entre(clip.ultimo_ts, clip.fin)
+        if not frames:
+            return
+
+        try:
+            if clip.escritor is None and not self._abrir(clip):
+                self._cerrar(clip, fallido=True)
+                return
+
+            if self.formato == 'mjpeg':
+                for _, jpeg in frames:
+                    clip.escritor.write(jpeg)
+            else:
+                import cv2
+                import numpy as np
+
+                for _, jpeg in frames:
+                    frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                    if frame is not None:
+                        clip.escritor.write(frame)
+
+            clip.frames += len(frames)
+            clip.ultimo_ts = frames[-1][0]
+
+        except Exception as e:
+            log.error("Error escribiendo clip %s: %s", clip.ruta, e, extra={'camara': clip.camera_id})
+            self._cerrar(clip, fallido=True)
+
+    def _abrir(self, clip: Clip) -> bool:
+        """Crea el archivo del clip"""
+        directorio = os.path.dirname(clip.ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+        if self.formato == 'mjpeg':
+            clip.escritor = open(clip.ruta, 'wb')
+            return True
+
+        import cv2
+
+        escritor = cv2.VideoWriter(clip.ruta, cv2.VideoWriter_fourcc(*'mp4v'),
+                                   self.fps.get(clip.camera_id, self.fps_clips), (self.ancho, self.alto))
+        if not escritor.isOpened():
+            log.error("No se pudo crear %s (códec mp4v no disponible)", clip.ruta,
+                      extra={'camara': clip.camera_id})
+            return False
+        clip.escritor = escritor
+        return True
+
+    def _cerrar(self, clip: Clip, fallido: bool = False):
+        """Cierra el clip y lo quita de los activos"""
+        with self.lock:
+            if self.clips.pop(clip.ruta, None) is None:
+                return
+
+        if clip.escritor is not None:
+            if self.formato == 'mjpeg':
+                clip.escritor.close()
+            else:
+                clip.escritor.release()
+
+        if fallido or not clip.frames:
+            self.clips_fallidos += 1
+            if not fallido:
+                log.warning("Clip sin frames: %s", clip.ruta, extra={'camara': clip.camera_id})
+            return
+
+        self.clips_escritos += 1
+        log.info("Clip guardado: %s (%d frames, %.1f s)", clip.ruta, clip.frames,
+                 clip.ultimo_ts - clip.inicio, extra={'camara': clip.camera_id})
+
+    def detener(self):
+        """Cierra los clips en curso y detiene el hilo"""
+        self.running = False
+        self.evento.set()
+        if self.is_alive():
+            self.join(timeout=5)
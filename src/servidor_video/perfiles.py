@@ -0,0 +1,101 @@
+"""
+Perfiles de salida por cámara (resolución, calidad JPEG y fps).
+
+Cada frame se lee y decodifica una sola vez; la captura produce a partir de
+él un frame por cada perfil que algún cliente está recibiendo. El perfil
+"analisis" es el que consume el servidor de testeo (y al que se aplican los
+ajustes de RATE_CONTROL); los demás, p. ej. "visualizacion", sirven a
+operadores que quieren más calidad a menos fps.
+
+En la sección servidor_video de config.json (sin "perfiles", el de análisis
+sale de resize_width/resize_height/frame_quality como antes):
+
+    "perfiles": {
+        "analisis": {"ancho": 640, "alto": 480, "calidad": 90, "fps": 0},
+        "visualizacion": {"ancho": 1280, "alto": 720, "calidad": 95, "fps": 5}
+    }
+
+Una cámara puede redefinir campos de un perfil y declarar un sub-stream
+RTSP de menor resolución para el análisis (se abre con un segundo lector y
+el stream principal queda para los demás perfiles):
+
+    {"id": 1, "rtsp_url": "rtsp://.../stream1",
+     "rtsp_url_analisis": "rtsp://.../stream2",
+     "perfiles": {"visualizacion": {"ancho": 1920, "alto": 1080}}}
+
+Un cliente elige su perfil con SUBSCRIBE_UPDATES {'perfil': nombre}; sin
+él recibe "analisis". fps = 0 significa sin límite propio.
+
+El servidor de testeo puede pedir además {'letterbox': imgsz}: recibe una
+variante del perfil ("analisis@640") con los frames ya escalados y
+rellenados al cuadrado de entrada del modelo, más los metadatos para volver
+las cajas a coordenadas del frame original (ver ImageUtils.letterbox). La
+variante se crea al primer pedido y comparte con su base los fps y los
+ajustes de RATE_CONTROL (salvo la escala: el lado es el del modelo).
+"""
+
+from typing import Any, Dict, Optional
+
+PERFIL_ANALISIS = 'analisis'
+
+
+class PerfilSalida:
+    """Resolución, calidad y fps de un flujo de salida de una cámara"""
+
+    def __init__(self, nombre: str, ancho: int, alto: int, calidad: int, fps: float = 0,
+                 letterbox: bool = False, base: Optional[str] = None):
+        self.nombre = nombre
+        self.ancho = ancho
+        self.alto = alto
+        self.calidad = calidad
+        self.fps = fps
+        self.letterbox = letterbox  # Frames cuadrados ancho x ancho con relleno
+        self.base = base or nombre  # Perfil configurado del que deriva
+
+    @property
+    def es_analisis(self) -> bool:
+        """El perfil de análisis o una variante suya"""
+        return self.base == PERFIL_ANALISIS
+
+    def con_letterbox(self, lado: int) -> 'PerfilSalida':
+        """Variante del perfil con frames letterbox de lado x lado"""
+        return PerfilSalida(f"{self.base}@{lado}", lado, lado, self.calidad, self.fps,
+                            letterbox=True, base=self.base)
+
+    def bytes_frame(self) -> int:
+        """Tamaño de un frame BGR crudo del perfil"""
+        return self.ancho * self.alto * 3
+
+    def a_dict(self) -> Dict[str, Any]:
+        datos = {'ancho': self.ancho, 'alto': self.alto, 'calidad': self.calidad, 'fps': self.fps}
+        if self.letterbox:
+            datos['letterbox'] = True
+        return datos
+
+    @staticmethod
+    def cargar(config_video: Dict[str, Any], camera_config: Dict[str, Any]) -> Dict[str, 'PerfilSalida']:
+        """
+        Perfiles de una cámara: los globales más los campos que redefine.
+
+        Args:
+            config_video: Sección servidor_video de la configuración
+            camera_config: Configuración de la cámara
+
+        Returns:
+            {nombre: PerfilSalida}, siempre con el perfil de análisis
+        """
+        globales = dict(config_video.get('perfiles') or {})
+        globales.setdefault(PERFIL_ANALISIS, {})
+        propios = camera_config.get('perfiles') or {}
+
+        perfiles = {}
+        for nombre in list(globales) + [n for n in propios if n not in globales]:
+            campos = dict(globales.get(nombre, {}), **propios.get(nombre, {}))
+            perfiles[nombre] = PerfilSalida(
+                nombre,
+                campos.get('ancho', config_video.get('resize_width', 640)),
+                campos.get('alto', config_video.get('resize_height', 480)),
+                campos.get('calidad', config_video.get('frame_quality', 90)),
+                campos.get('fps', 0)
+            )
+        return perfiles
@@ -0,0 +1,488 @@
+"""
+Captura de cámaras en procesos separados, vigilados por un supervisor.
+
+Con la captura en hilos, un cv2.VideoCapture colgado en un stream RTSP
+defectuoso o un decodificador que pierde memoria afecta a todas las cámaras,
+y lo que no corre dentro de OpenCV se serializa en el GIL del servidor. En
+este modo cada proceso de captura lee y decodifica K cámaras (CapturaCamera
+sin perfiles) y copia cada frame a un anillo de memoria compartida
+(AnilloFrames) creado por el servidor; por un Pipe solo viaja
+(fuente, slot, seq, capture_ts), y en sentido contrario el pedido de
+detenerse (un multiprocessing.Event quedaría inconsistente si se mata al
+proceso mientras lo espera). En el servidor, un hilo receptor por proceso
+toma el frame del anillo y lo entrega a CapturaCamera.procesar (grabadores,
+perfiles y cola de envío), igual que si lo hubiera leído el hilo de captura.
+
+El supervisor reinicia con backoff exponencial los procesos que terminan o
+que dejan de producir frames de alguna de sus fuentes, y expone la CPU y la
+memoria residente de cada proceso (por cámara con camaras_por_proceso = 1).
+Las cámaras agregadas o quitadas al recargar la configuración arrancan en
+procesos nuevos o detienen el suyo (ver agregar() y quitar()).
+
+Configuración en la sección servidor_video de config.json:
+
+    "procesos_captura": {
+        "habilitado": false,
+        "camaras_por_proceso": 1,
+        "slots_por_fuente": 4,
+        "max_ancho": 1920, "max_alto": 1080,
+        "arranque_s": 30, "estancado_s": 10,
+        "backoff_inicial_s": 1, "backoff_max_s": 60, "estable_s": 60
+    }
+
+- max_ancho/max_alto: tamaño de los slots; un frame mayor se reduce (sin
+  deformarlo) en el proceso de captura antes de publicarse
+- arranque_s: plazo para el primer frame de una fuente desde que se conecta
+- estancado_s: una fuente conectada sin frames durante más que esto reinicia
+  su proceso. Una fuente desconectada no cuenta: la reconecta la propia
+  captura con su backoff, sin cortar las demás cámaras del proceso
+- estable_s: un proceso que vivió más que esto vuelve al backoff inicial
+"""
+
+import multiprocessing
+import signal
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from src.common.memoria_compartida import AnilloFrames
+from src.common.registro import Registro
+from src.common.utils import ImageUtils, ProcesoUtils
+
+if TYPE_CHECKING:
+    import numpy as np
+    from src.servidor_video.servidor_video import CapturaCamera
+
+log = Registro.obtener('video.procesos')
+
+PERIODO_ESTADO_S = 1.0  # Cada cuánto el proceso informa el estado de sus fuentes
+BITS_GENERACION = 40    # La secuencia del anillo incluye el número de arranque
+
+
+class PublicadorAnillo:
+    """
+    Destino de los frames leídos en un proceso de captura.
+
+    Se registra como grabador de la CapturaCamera del proceso (recibe todos
+    los frames leídos), los copia al anillo y avisa al servidor por el Pipe.
+    """
+
+    def __init__(self, indice: int, anillo: AnilloFrames, conexion, lock: threading.Lock,
+                 servidor_perdido: threading.Event):
+        """
+        Args:
+            indice: Posición de la fuente en el proceso
+            anillo: Anillo compartido del proceso
+            conexion: Extremo del Pipe hacia el servidor
+            lock: Serializa los envíos de las fuentes del proceso
+            servidor_perdido: Se activa si el servidor ya no recibe
+        """
+        self.indice = indice
+        self.anillo = anillo
+        self.conexion = conexion
+        self.lock = lock
+        self.servidor_perdido = servidor_perdido
+        self.reducidos = 0
+
+    def agregar(self, camera_id: int, frame: 'np.ndarray', capture_ts: float):
+        """Publica un frame leído"""
+        if frame.nbytes > self.anillo.slot_bytes:
+            frame = self._reducir(camera_id, frame)
+
+        publicado = self.anillo.escribir(self.indice, frame, capture_ts)
+        if publicado is None:
+            return
+
+        try:
+            with self.lock:
+                self.conexion.send(('frame', self.indice, publicado[0], publicado[1], capture_ts))
+        except (OSError, EOFError):
+            self.servidor_perdido.set()
+
+    def _reducir(self, camera_id: int, frame: 'np.ndarray') -> 'np.ndarray':
+        """Reduce un frame que no cabe en un slot, manteniendo la proporción"""
+        alto, ancho = frame.shape[:2]
+        escala = (self.anillo.slot_bytes / frame.nbytes) ** 0.5
+        if not self.reducidos:
+            log.warning("Frames de %dx%d no caben en los slots: se reducen a %.0f%% "
+                        "(subir max_ancho/max_alto)", ancho, alto, escala * 100, extra={'camara': camera_id})
+        self.reducidos += 1
+        return ImageUtils.redimensionar_frame(frame, max(2, int(ancho * escala)), max(2, int(alto * escala)))
+
+
+def ejecutar_proceso(nombre: str, fuentes: List[Dict[str, Any]], nombre_anillo: str, seq_inicial: int,
+                     conexion, config: Dict[str, Any]):
+    """
+    Punto de entrada de un proceso de captura.
+
+    Termina con código 0 si el servidor pidió detenerlo y 1 si todas sus
+    fuentes fallaron o el servidor cerró el Pipe.
+
+    Args:
+        nombre: Nombre del proceso (también el de su archivo de log)
+        fuentes: Configuración de cada cámara o sub-stream que lee
+        nombre_anillo: Anillo de memoria compartida creado por el servidor
+        seq_inicial: Primera secuencia a publicar
+        conexion: Extremo del Pipe hacia el servidor
+        config: Configuración completa (para el logging)
+    """
+    # Ctrl+C llega a todo el grupo de procesos: lo maneja el servidor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Registro.configurar(config, nombre)
+
+    from src.servidor_video.servidor_video import CapturaCamera
+
+    anillo = AnilloFrames.abrir(nombre_anillo)
+    anillo.siguiente_seq = seq_inicial
+    lock = threading.Lock()
+    servidor_perdido = threading.Event()
+
+    capturas = []
+    for indice, camera_config in enumerate(fuentes):
+        publicador = PublicadorAnillo(indice, anillo, conexion, lock, servidor_perdido)
+        captura = CapturaCamera(camera_config, None, {}, grabadores=[publicador],
+                                salud=config.get('servidor_video', {}).get('salud'))
+        captura.start()
+        capturas.append(captura)
+
+    # Estado ya informado por fuente: (errores, reconexiones, conectada, congelada)
+    informados = [(0, 0, False, False)] * len(capturas)
+    detenido = False
+    while not detenido and not servidor_perdido.is_set() and any(c.is_alive() for c in capturas):
+        try:
+            if conexion.poll(PERIODO_ESTADO_S):
+                detenido = conexion.recv() == 'detener'
+        except (OSError, EOFError):
+            servidor_perdido.set()
+
+        # Errores y reconexiones como incrementos; conexión y congelamiento, tal cual
+        cambios = {}
+        for i, captura in enumerate(capturas):
+            actual = (captura.errores_lectura, captura.reconexiones, captura.conectada, captura.congelada)
+            if actual != informados[i]:
+                cambios[i] = {'errores': actual[0] - informados[i][0],
+                              'reconexiones': actual[1] - informados[i][1],
+                              'conectada': actual[2], 'congelada': actual[3]}
+                informados[i] = actual
+        if cambios:
+            try:
+                with lock:
+                    conexion.send(('estado', cambios))
+            except (OSError, EOFError):
+                servidor_perdido.set()
+
+    for captura in capturas:
+        captura.stop()
+    for captura in capturas:
+        captura.join(timeout=2)
+    anillo.cerrar()
+
+    sys.exit(0 if detenido else 1)
+
+
+class ProcesoCaptura:
+    """Un proceso de captura: sus fuentes, su anillo y su estado de supervisión"""
+
+    def __init__(self, numero: int, capturas: List['CapturaCamera'], slots_por_fuente: int, slot_bytes: int):
+        """
+        Args:
+            numero: Número del proceso
+            capturas: Capturas del servidor cuyos frames lee este proceso
+            slots_por_fuente: Slots del anillo por fuente
+            slot_bytes: Bytes por slot
+        """
+        self.nombre = f"video-captura-{numero}"
+        self.capturas = capturas
+        self.anillo = AnilloFrames.crear(slots_por_fuente * len(capturas), slot_bytes)
+        camaras = []
+        for captura in capturas:
+            if captura.camera_id not in camaras:
+                camaras.append(captura.camera_id)
+        self.etiqueta = ','.join(str(camera_id) for camera_id in camaras)
+
+        self.proceso = None
+        self.conexion = None
+        self.generacion = 0                      # Arranques del proceso
+        self.iniciado = 0.0                      # time.monotonic() del último arranque
+        self.ultimo_frame = [0.0] * len(capturas)  # time.monotonic() del último aviso por fuente
+        self.conectada_desde = [0.0] * len(capturas)  # time.monotonic() de la última conexión por fuente
+        self.proximo_arranque = 0.0
+        self.backoff = 0.0
+        self.reinicios = 0
+        self.frames_reemplazados = 0  # Avisos cuyo slot ya se había reutilizado
+        self.cpu_previa = 0.0         # CPU de los procesos anteriores al último reinicio
+        self.uso = None               # Último ProcesoUtils.uso() del proceso vivo
+
+    def cpu_s(self) -> float:
+        """CPU acumulada por todos los arranques del proceso"""
+        return self.cpu_previa + (self.uso['cpu_s'] if self.uso else 0.0)
+
+
+class SupervisorCapturas(threading.Thread):
+    """Arranca, vigila y reinicia los procesos de captura"""
+
+    PERIODO_S = 1.0
+
+    def __init__(self, capturas: List['CapturaCamera'], config: Dict[str, Any], config_general: Dict[str, Any]):
+        """
+        Args:
+            capturas: Capturas del servidor (sin iniciar), agrupadas por cámara
+                      en procesos de camaras_por_proceso cámaras
+            config: Sección 'procesos_captura' de servidor_video
+            config_general: Configuración completa (se pasa a los procesos)
+        """
+        super().__init__(daemon=True)
+        self.config_general = config_general
+        self.arranque_s = config.get('arranque_s', 30.0)
+        self.estancado_s = config.get('estancado_s', 10.0)
+        self.backoff_inicial_s = config.get('backoff_inicial_s', 1.0)
+        self.backoff_max_s = config.get('backoff_max_s', 60.0)
+        self.estable_s = config.get('estable_s', 60.0)
+
+        # spawn: el servidor tiene hilos y sockets abiertos que un fork heredaría
+        self.contexto = multiprocessing.get_context('spawn')
+
+        self.camaras_por_proceso = max(1, config.get('camaras_por_proceso', 1))
+        self.slots_por_fuente = config.get('slots_por_fuente', 4)
+        self.slot_bytes = config.get('max_ancho', 1920) * config.get('max_alto', 1080) * 3
+
+        # La lista de procesos cambia al agregar o quitar cámaras en caliente;
+        # el lazo de vigilancia la recorre con el lock tomado
+        self.lock = threading.RLock()
+        self.procesos: List[ProcesoCaptura] = []
+        self.numero = 0
+        self._crear_procesos(capturas)
+
+        self.running = False
+        self.evento = threading.Event()
+
+    def _crear_procesos(self, capturas: List['CapturaCamera']) -> List[ProcesoCaptura]:
+        """Agrupa las capturas en procesos nuevos (sin arrancar) de camaras_por_proceso cámaras"""
+        # Las fuentes de una cámara (principal y sub-stream) van al mismo proceso
+        por_camara: Dict[int, List['CapturaCamera']] = {}
+        for captura in capturas:
+            por_camara.setdefault(captura.camera_id, []).append(captura)
+        grupos = list(por_camara.values())
+        k = self.camaras_por_proceso
+
+        nuevos = []
+        for i in range(0, len(grupos), k):
+            nuevos.append(ProcesoCaptura(self.numero, [c for grupo in grupos[i:i + k] for c in grupo],
+                                         self.slots_por_fuente, self.slot_bytes))
+            self.numero += 1
+        self.procesos.extend(nuevos)
+        return nuevos
+
+    def run(self):
+        """Arranca los procesos y los vigila hasta detener()"""
+        self.running = True
+        with self.lock:
+            for proceso in self.procesos:
+                self._arrancar(proceso)
+
+        while self.running:
+            self.evento.wait(self.PERIODO_S)
+            if not self.running:
+                break
+
+            with self.lock:
+                ahora = time.monotonic()
+                for proceso in self.procesos:
+                    if proceso.proceso is None:
+                        if ahora >= proceso.proximo_arranque:
+                            self._arrancar(proceso)
+                        continue
+
+                    motivo = self._falla(proceso, ahora)
+                    if motivo:
+                        self._reiniciar(proceso, motivo, ahora)
+                    else:
+                        proceso.uso = ProcesoUtils.uso(proceso.proceso.pid)
+
+    def _arrancar(self, proceso: ProcesoCaptura):
+        """Inicia el proceso y su hilo receptor"""
+        proceso.generacion += 1
+        conexion, conexion_hija = self.contexto.Pipe()
+        proceso.proceso = self.contexto.Process(
+            target=ejecutar_proceso,
+            args=(proceso.nombre, [c.camera_config for c in proceso.capturas], proceso.anillo.nombre,
+                  (proceso.generacion << BITS_GENERACION) + 1, conexion_hija, self.config_general),
+            name=proceso.nombre,
+            daemon=True
+        )
+        proceso.proceso.start()
+        conexion_hija.close()
+        proceso.conexion = conexion
+
+        proceso.iniciado = time.monotonic()
+        proceso.ultimo_frame = [0.0] * len(proceso.capturas)
+        proceso.conectada_desde = [0.0] * len(proceso.capturas)
+        proceso.uso = None
+        for captura in proceso.capturas:
+            captura.conectada = captura.congelada = False
+
+        threading.Thread(target=self._recibir, args=(proceso, conexion, proceso.generacion),
+                         daemon=True).start()
+        log.info("%s iniciado (pid %d, cámaras %s)", proceso.nombre, proceso.proceso.pid, proceso.etiqueta)
+
+    def _falla(self, proceso: ProcesoCaptura, ahora: float) -> Optional[str]:
+        """
+        Motivo para reiniciar el proceso, o None si está sano.
+
+        Se reinicia si el proceso murió o si una fuente que informa estar
+        conectada dejó de producir frames (lectura colgada). Las fuentes
+        desconectadas se ignoran: su captura ya reintenta con backoff y un
+        reinicio cortaría también a las cámaras sanas del proceso.
+        """
+        if not proceso.proceso.is_alive():
+            return f"terminó con código {proceso.proceso.exitcode}"
+
+        for indice, captura in enumerate(proceso.capturas):
+            if not captura.conectada:
+                continue
+            ultimo = max(proceso.ultimo_frame[indice], proceso.conectada_desde[indice])
+            limite = self.estancado_s if proceso.ultimo_frame[indice] else self.arranque_s
+            inactivo = ahora - ultimo
+            if inactivo > limite:
+                return f"cámara {captura.camera_id} conectada y sin frames hace {inactivo:.0f} s"
+        return None
+
+    def _reiniciar(self, proceso: ProcesoCaptura, motivo: str, ahora: float):
+        """Detiene el proceso y programa su arranque con backoff exponencial"""
+        self._terminar(proceso)
+        proceso.reinicios += 1
+
+        if not proceso.backoff or ahora - proceso.iniciado >= self.estable_s:
+            proceso.backoff = self.backoff_inicial_s
+        else:
+            proceso.backoff = min(self.backoff_max_s, proceso.backoff * 2)
+        proceso.proximo_arranque = ahora + proceso.backoff
+
+        log.warning("%s (cámaras %s) %s: reinicio %d en %.0f s", proceso.nombre, proceso.etiqueta, motivo,
+                    proceso.reinicios, proceso.backoff)
+
+    def _terminar(self, proceso: ProcesoCaptura):
+        """Pide al proceso que termine y lo fuerza si no responde"""
+        if proceso.proceso is None:
+            return
+
+        # La CPU del proceso se conserva en el acumulado
+        uso = ProcesoUtils.uso(proceso.proceso.pid) or proceso.uso
+        proceso.cpu_previa += uso['cpu_s'] if uso else 0.0
+        proceso.uso = None
+
+        try:
+            proceso.conexion.send('detener')
+        except (OSError, ValueError):
+            pass  # El proceso ya cerró el Pipe
+        proceso.proceso.join(timeout=3)
+        if proceso.proceso.is_alive():
+            proceso.proceso.terminate()
+            proceso.proceso.join(timeout=2)
+        if proceso.proceso.is_alive():
+            proceso.proceso.kill()
+            proceso.proceso.join()
+        proceso.proceso = None
+
+    def _recibir(self, proceso: ProcesoCaptura, conexion, generacion: int):
+        """
+        Entrega a cada captura los frames que publica el proceso.
+
+        Termina cuando el proceso cierra el Pipe (al salir o al morir); los
+        avisos de un arranque anterior que queden en el Pipe se descartan.
+        """
+        while True:
+            try:
+                mensaje = conexion.recv()
+            except (EOFError, OSError):
+                break
+            if generacion != proceso.generacion:
+                continue
+
+            if mensaje[0] == 'frame':
+                _, indice, slot, seq, capture_ts = mensaje
+                proceso.ultimo_frame[indice] = time.monotonic()
+                # Un frame confirma la conexión antes del próximo 'estado'
+                self._marcar_conectada(proceso, indice, True)
+                try:
+                    leido = proceso.anillo.leer(slot, seq)
+                    if leido is None:
+                        proceso.frames_reemplazados += 1
+                        continue
+                    proceso.capturas[indice].procesar(leido[0], capture_ts)
+                except Exception as e:
+                    log.exception("Error procesando frame de %s: %s", proceso.nombre, e,
+                                  extra={'camara': proceso.capturas[indice].camera_id})
+
+            elif mensaje[0] == 'estado':
+                for indice, estado in mensaje[1].items():
+                    captura = proceso.capturas[indice]
+                    captura.errores_lectura += estado['errores']
+                    captura.reconexiones += estado['reconexiones']
+                    self._marcar_conectada(proceso, indice, estado['conectada'])
+                    captura.congelada = estado['congelada']
+
+        conexion.close()
+
+    @staticmethod
+    def _marcar_conectada(proceso: ProcesoCaptura, indice: int, conectada: bool):
+        """Actualiza la conexión de una fuente y registra cuándo se conectó"""
+        captura = proceso.capturas[indice]
+        if conectada and not captura.conectada:
+            proceso.conectada_desde[indice] = time.monotonic()
+        captura.conectada = conectada
+
+    def agregar(self, capturas: List['CapturaCamera']):
+        """
+        Agrega capturas de cámaras nuevas en procesos propios (recarga de
+        la configuración); arrancan en la próxima vuelta del supervisor.
+        """
+        with self.lock:
+            for proceso in self._crear_procesos(capturas):
+                log.info("%s agregado (cámaras %s)", proceso.nombre, proceso.etiqueta)
+
+    def quitar(self, camera_id: int):
+        """
+        Detiene la captura de una cámara quitada de la configuración.
+
+        El proceso que la leía termina; si leía además otras cámaras, estas
+        siguen en un proceso nuevo que arranca en la próxima vuelta.
+        """
+        with self.lock:
+            for proceso in [p for p in self.procesos
+                            if any(c.camera_id == camera_id for c in p.capturas)]:
+                self._terminar(proceso)
+                proceso.generacion += 1  # El receptor descarta lo que quede en el Pipe
+                proceso.anillo.cerrar()
+                self.procesos.remove(proceso)
+                log.info("%s detenido (cámara %d quitada)", proceso.nombre, camera_id)
+
+                restantes = [c for c in proceso.capturas if c.camera_id != camera_id]
+                if restantes:
+                    self._crear_procesos(restantes)
+
+    def estado(self) -> List[Dict[str, Any]]:
+        """Estado de cada proceso: cámaras, pid, reinicios, CPU y memoria"""
+        with self.lock:
+            procesos = list(self.procesos)
+        return [{
+            'proceso': p.nombre,
+            'camaras': p.etiqueta,
+            'pid': p.proceso.pid if p.proceso else None,
+            'reinicios': p.reinicios,
+            'cpu_s': p.cpu_s(),
+            'rss_mb': p.uso['rss_mb'] if p.uso else 0.0,
+            'frames_reemplazados': p.frames_reemplazados
+        } for p in procesos]
+
+    def detener(self):
+        """Detiene los procesos y libera sus anillos"""
+        self.running = False
+        self.evento.set()
+        if self.is_alive():
+            self.join(timeout=5)
+        with self.lock:
+            for proceso in self.procesos:
+                self._terminar(proceso)
+                proceso.anillo.cerrar()
@@ -0,0 +1,195 @@
+"""
+Salud de las cámaras del servidor de video.
+
+Cada captura reconecta sola su fuente (backoff exponencial, ver
+CapturaCamera._abrir) y cuenta frames buenos, errores de lectura y
+reconexiones. El monitor los muestrea cada segundo y calcula, por fuente y
+sobre una ventana reciente:
+
+- segundos desde el último frame bueno
+- fps medidos frente a los configurados
+- tasa de errores de lectura/decodificación (errores / intentos)
+- reconexiones acumuladas y si el stream está congelado
+
+y un estado: "conectando" (aún sin frames), "activa", "degradada" (fps por
+debajo de fps_min_relativo de los configurados o tasa de errores mayor que
+tasa_errores_max), "congelada" (repite el mismo frame), "estancada" (sin
+frames durante estancado_s) o "desconectada" (esperando para reconectar).
+
+Difunde VIDEO_STATUS a todos los clientes cuando cambia el estado de alguna
+cámara y cada periodo_s:
+
+    {"camaras": {"1": {"estado": "activa", "segundos_sin_frame": 0.1,
+                       "fps_medido": 14.8, "fps_configurado": 15,
+                       "tasa_errores": 0.0, "reconexiones": 0,
+                       "congelada": false}}}
+
+Con sub-stream de análisis, la cámara lleva además "sub_stream" con los
+mismos campos, y su estado es el peor de los dos.
+
+En la sección servidor_video de config.json:
+
+    "salud": {
+        "periodo_s": 5, "ventana_s": 5, "estancado_s": 10, "congelado_s": 10,
+        "max_errores": 10, "backoff_inicial_s": 1, "backoff_max_s": 30,
+        "estable_s": 60, "tasa_errores_max": 0.2, "fps_min_relativo": 0.5
+    }
+"""
+
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
+
+from src.common.registro import Registro
+
+if TYPE_CHECKING:
+    from src.servidor_video.servidor_video import CapturaCamera
+
+log = Registro.obtener('video.salud')
+
+# De mejor a peor: el estado de una cámara con sub-stream es el peor de los dos
+ESTADOS = ('activa', 'conectando', 'degradada', 'congelada', 'desconectada', 'estancada')
+
+
+class MonitorSalud(threading.Thread):
+    """Muestrea las capturas, calcula su salud y difunde VIDEO_STATUS"""
+
+    MUESTREO_S = 1.0
+
+    def __init__(self, capturas: Callable[[], List['CapturaCamera']], config: Dict[str, Any],
+                 difundir: Callable[[Dict[str, Any]], None]):
+        """
+        Args:
+            capturas: Devuelve las capturas vigentes (cambian al recargar la
+                      configuración)
+            config: Sección servidor_video.salud
+            difundir: Envía los datos de un VIDEO_STATUS a todos los clientes
+        """
+        super().__init__(daemon=True)
+        self.capturas = capturas
+        self.difundir = difundir
+        self.periodo_s = config.get('periodo_s', 5.0)
+        self.ventana_s = config.get('ventana_s', 5.0)
+        self.estancado_s = config.get('estancado_s', 10.0)
+        self.tasa_errores_max = config.get('tasa_errores_max', 0.2)
+        self.fps_min_relativo = config.get('fps_min_relativo', 0.5)
+
+        # {captura: deque([(monotonic, frames_leidos, errores_lectura), ...])}
+        self.muestras: Dict['CapturaCamera', deque] = {}
+        self.ultimo_estado: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+        self._detener = threading.Event()
+
+    def run(self):
+        """Evalúa cada segundo y difunde al cambiar algún estado o cada periodo_s"""
+        ultima_difusion = 0.0
+        while not self._detener.wait(self.MUESTREO_S):
+            try:
+                anterior = self.estados()
+                estado = self.evaluar()
+                ahora = time.monotonic()
+
+                cambios = {cid: datos['estado'] for cid, datos in estado.items()
+                           if anterior.get(cid) != datos['estado']}
+                for camera_id, nuevo in cambios.items():
+                    nivel = log.info if nuevo in ('activa', 'conectando') else log.warning
+                    nivel("Cámara %s", nuevo, extra={'camara': camera_id})
+
+                if cambios or ahora - ultima_difusion >= self.periodo_s:
+                    self.difundir({'camaras': estado})
+                    ultima_difusion = ahora
+            except Exception as e:
+                log.exception("Error evaluando la salud de las cámaras: %s", e)
+
+    def evaluar(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Calcula la salud de todas las fuentes.
+
+        Returns:
+            {camera_id (str): salud}, con 'sub_stream' si la cámara lo tiene
+        """
+        ahora = time.monotonic()
+        capturas = list(self.capturas())
+        estado: Dict[str, Dict[str, Any]] = {}
+
+        for captura in capturas:
+            salud = self._salud(captura, ahora)
+            clave = str(captura.camera_id)
+            if captura.analisis:
+                camara = estado.setdefault(clave, {})
+                camara['sub_stream'] = salud
+            else:
+                estado[clave] = dict(salud, **estado.get(clave, {}))
+
+        for camara in estado.values():
+            sub_stream = camara.get('sub_stream')
+            if sub_stream and 'estado' in camara:
+                camara['estado'] = max(camara['estado'], sub_stream['estado'], key=ESTADOS.index)
+
+        # Olvidar las capturas detenidas (cámaras quitadas o reiniciadas)
+        vigentes = set(capturas)
+        for captura in [c for c in self.muestras if c not in vigentes]:
+            del self.muestras[captura]
+
+        with self.lock:
+            self.ultimo_estado = estado
+        return estado
+
+    def _salud(self, captura: 'CapturaCamera', ahora: float) -> Dict[str, Any]:
+        """Salud de una fuente sobre la ventana reciente"""
+        muestras = self.muestras.setdefault(captura, deque())
+        muestras.append((ahora, captura.frames_leidos, captura.errores_lectura))
+        while len(muestras) > 2 and ahora - muestras[1][0] >= self.ventana_s:
+            muestras.popleft()
+
+        inicio, frames_inicio, errores_inicio = muestras[0]
+        duracion = ahora - inicio
+        frames = captura.frames_leidos - frames_inicio
+        errores = captura.errores_lectura - errores_inicio
+        fps_medido = frames / duracion if duracion > 0 else 0.0
+        tasa_errores = errores / (frames + errores) if frames + errores else 0.0
+        sin_frame = ahora - captura.ultimo_frame if captura.ultimo_frame else None
+
+        if captura.congelada:
+            estado = 'congelada'
+        elif sin_frame is None:
+            estado = 'desconectada' if captura.reconexiones else 'conectando'
+        elif not captura.conectada:
+            estado = 'desconectada'
+        elif sin_frame > self.estancado_s:
+            estado = 'estancada'
+        elif duracion >= self.ventana_s / 2 and (
+                fps_medido < captura.fps * self.fps_min_relativo or tasa_errores > self.tasa_errores_max):
+            estado = 'degradada'
+        else:
+            estado = 'activa'
+
+        if estado in ('conectando', 'desconectada'):
+            # Los fps se miden desde que vuelve a haber frames
+            muestras.clear()
+            muestras.append((ahora, captura.frames_leidos, captura.errores_lectura))
+
+        return {
+            'estado': estado,
+            'segundos_sin_frame': round(sin_frame, 2) if sin_frame is not None else None,
+            'fps_medido': round(fps_medido, 2),
+            'fps_configurado': captura.fps,
+            'tasa_errores': round(tasa_errores, 3),
+            'reconexiones': captura.reconexiones,
+            'congelada': captura.congelada
+        }
+
+    def estados(self) -> Dict[str, str]:
+        """Último estado calculado de cada cámara {camera_id (str): estado}"""
+        with self.lock:
+            return {cid: datos.get('estado') for cid, datos in self.ultimo_estado.items()}
+
+    def ultimo(self) -> Dict[str, Dict[str, Any]]:
+        """Última salud calculada (para métricas y nuevos clientes)"""
+        with self.lock:
+            return self.ultimo_estado
+
+    def detener(self):
+        """Detiene el monitor"""
+        self._detener.set()
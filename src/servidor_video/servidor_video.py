@@ -1,128 +1,340 @@
 """
 Servidor de Video - Sistema Distribuido de Reconocimiento de Objetos
 
-Este servidor captura video desde múltiples cámaras IP (RTSP) y transmite
-los frames al servidor de testeo mediante sockets puros TCP.
+Este servidor captura video desde múltiples cámaras IP (RTSP), archivos de
+video o cámaras sintéticas (ver fuentes.py) y transmite los frames al
+servidor de testeo mediante sockets puros TCP.
 
 Características:
 - Captura simultánea de C cámaras usando hilos
 - Transmisión via sockets puros (sin frameworks)
 - Protocolo custom definido en common/protocolo.py
+- Clips antes/después de cada detección (ver grabador.py)
+- Grabación continua por segmentos con búsqueda por instante (ver grabacion.py)
+- Captura opcional en procesos separados con supervisor (ver procesos.py)
+- Cámaras y perfiles recargados en caliente desde config.json (ver common/recarga.py)
+- Reconexión automática y salud por cámara difundida con VIDEO_STATUS (ver salud.py)
 """
 
-import cv2
 import socket
 import threading
 import time
 import sys
 import os
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
 
 # Agregar ruta del proyecto al PYTHONPATH
 sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
 
 from src.common.protocolo import Protocolo, TipoMensaje, MensajeFactory
 from src.common.utils import ConfigLoader, ImageUtils, ThreadSafeCounter
+from src.common.memoria_compartida import AnilloFrames
+from src.common.transporte import Transporte
+from src.common.flujo import CreditosProductor
+from src.common.trazas import Traza
+from src.common.metricas import RegistroMetricas, ServidorMetricas
+from src.common.registro import Registro
+from src.common.perfilador import Perfilador
+from src.common.recarga import RecargaConfig
+from src.servidor_video.fuentes import FuenteVideo, Ritmo
+from src.servidor_video.grabador import GrabadorClips
+from src.servidor_video.grabacion import GrabacionContinua
+from src.servidor_video.perfiles import PERFIL_ANALISIS, PerfilSalida
+from src.servidor_video.procesos import SupervisorCapturas
+from src.servidor_video.salud import MonitorSalud
+
+if TYPE_CHECKING:
+    import numpy as np
+
+log = Registro.obtener('video')
+log_captura = Registro.obtener('video.captura')
 
 
 class CapturaCamera(threading.Thread):
     """Hilo que captura frames de una cámara específica"""
 
     def __init__(self, camera_config: Dict, frame_queue: 'FrameQueue',
-                 resize_width: int, resize_height: int, quality: int):
+                 perfiles: Dict[str, PerfilSalida],
+                 ajustes: Optional[Dict[int, Dict[str, float]]] = None,
+                 demanda: Optional[Callable[[int, str], bool]] = None,
+                 grabadores: Optional[List] = None,
+                 analisis: Optional[bool] = None,
+                 salud: Optional[Dict] = None):
         """
         Inicializa el capturador de cámara.
 
         Args:
             camera_config: Configuración de la cámara
             frame_queue: Cola thread-safe para almacenar frames
-            resize_width: Ancho para redimensionar frames
-            resize_height: Alto para redimensionar frames
-            quality: Calidad de compresión JPEG (0-100)
+            perfiles: Perfiles de salida de la cámara (compartido con el
+                      servidor, que agrega las variantes letterbox)
+            ajustes: Ajustes de tasa compartidos {camera_id: {'fps', 'escala'}}
+                     que actualiza el servidor al recibir RATE_CONTROL (solo
+                     afectan al perfil de análisis)
+            demanda: Indica si algún cliente de un perfil aceptaría ahora un
+                     frame de la cámara (control de flujo por créditos)
+            grabadores: Destinos de todos los frames leídos, con o sin
+                        demanda (anillo de clips, grabación continua)
+            analisis: True produce solo los perfiles de análisis (sub-stream),
+                      False todos menos esos, None todos
+            salud: Sección servidor_video.salud (reconexión y congelamiento)
         """
         super().__init__(daemon=True)
         self.camera_id = camera_config['id']
         self.camera_name = camera_config['nombre']
-        self.rtsp_url = camera_config['rtsp_url']
+        self.camera_config = camera_config
+        self.fuente = None
         self.fps = camera_config.get('fps', 30)
         self.frame_queue = frame_queue
-        self.resize_width = resize_width
-        self.resize_height = resize_height
-        self.quality = quality
+        self.perfiles = perfiles
+        self.ajustes = ajustes if ajustes is not None else {}
+        self.demanda = demanda
+        self.grabadores = grabadores or []
+        self.analisis = analisis
+
+        # Reconexión con backoff exponencial y detección de stream congelado
+        salud = salud or {}
+        self.max_errores = salud.get('max_errores', 10)
+        self.congelado_s = salud.get('congelado_s', 10.0)
+        self.backoff_inicial_s = salud.get('backoff_inicial_s', 1.0)
+        self.backoff_max_s = salud.get('backoff_max_s', 30.0)
+        self.estable_s = salud.get('estable_s', 60.0)
 
         self.running = False
-        self.capture = None
+        self.detenida = threading.Event()  # También interrumpe las esperas de reconexión
         self.frames_capturados = 0
-        self.errores = 0
+        self.frames_omitidos = 0  # Sin créditos de ningún cliente
+        self.errores = 0          # Errores de lectura consecutivos
+        self.errores_lectura = 0  # Errores de lectura desde el inicio
+
+        # Salud de la fuente (la lee MonitorSalud; con captura en procesos,
+        # conectada/congelada/reconexiones las informa el proceso)
+        self.frames_leidos = 0
+        self.ultimo_frame = 0.0   # time.monotonic() del último frame bueno
+        self.conectada = False
+        self.congelada = False    # El stream repite el mismo frame
+        self.aperturas = 0        # Intentos de abrir la fuente
+        self.reconexiones = 0     # Intentos de reabrirla (todos salvo el primero)
+        self.backoff = 0.0
+        self.conectada_desde = 0.0
+        self.huella = None        # Huella del último frame distinto
+        self.ultimo_cambio = 0.0
+
+        # Instante del último frame encolado por perfil (para los fps de cada uno)
+        self.ultimo_encolado = {}
 
     def run(self):
         """Ejecuta el hilo de captura"""
-        print(f"[Cámara {self.camera_id}] Iniciando captura: {self.camera_name}")
+        contexto = {'camara': self.camera_id}
+        log_captura.info("Iniciando captura: %s", self.camera_name, extra=contexto)
 
-        # Validar URL RTSP
-        if "(COLOCAR_AQUI" in self.rtsp_url:
-            print(f"[Cámara {self.camera_id}] ERROR: URL RTSP no configurada")
-            print(f"  Por favor editar config/config.json y colocar URL RTSP válida")
-            print(f"  Formato: rtsp://usuario:password@IP:puerto/stream")
+        # Fuente RTSP, archivo o sintética según la configuración
+        try:
+            self.fuente = FuenteVideo.crear(self.camera_config)
+        except ValueError as e:
+            log_captura.error("%s", e, extra=contexto)
             return
 
-        # Intentar conectar a la cámara
-        self.capture = cv2.VideoCapture(self.rtsp_url)
+        self.running = not self.detenida.is_set()
 
-        if not self.capture.isOpened():
-            print(f"[Cámara {self.camera_id}] ERROR: No se pudo conectar a {self.rtsp_url}")
-            return
-
-        print(f"[Cámara {self.camera_id}] Conexión exitosa")
-        self.running = True
-
-        # Calcular delay entre frames según FPS
-        frame_delay = 1.0 / self.fps
+        # Sin pasar de los fps configurados (las fuentes locales ya esperan
+        # dentro de leer(); en RTSP la lectura misma ya consume el período)
+        ritmo = None if self.fuente.marca_ritmo else Ritmo(self.fps)
 
         while self.running:
             try:
-                ret, frame = self.capture.read()
+                # Sin conexión (inicial o tras una falla): reintentar con
+                # backoff exponencial en lugar de terminar el hilo
+                if not self.conectada and not self._abrir(contexto):
+                    continue
+
+                ret, frame = self.fuente.leer()
 
                 if not ret:
-                    print(f"[Cámara {self.camera_id}] Error leyendo frame")
+                    log_captura.warning("Error leyendo frame", extra=contexto)
                     self.errores += 1
+                    self.errores_lectura += 1
 
-                    # Si hay muchos errores consecutivos, intentar reconectar
-                    if self.errores > 10:
-                        print(f"[Cámara {self.camera_id}] Demasiados errores, intentando reconectar...")
-                        self.capture.release()
-                        time.sleep(2)
-                        self.capture = cv2.VideoCapture(self.rtsp_url)
-                        self.errores = 0
-
-                    time.sleep(0.5)
+                    # Si hay muchos errores consecutivos, reconectar
+                    if self.errores > self.max_errores:
+                        self._desconectar(f"{self.errores} errores de lectura seguidos", contexto)
+                    else:
+                        self.detenida.wait(0.5)
                     continue
 
                 # Resetear contador de errores
                 self.errores = 0
 
-                # Redimensionar frame
-                frame = ImageUtils.redimensionar_frame(frame, self.resize_width, self.resize_height)
+                if self._congelado(frame):
+                    self._desconectar(f"stream congelado hace {self.congelado_s:.0f} s", contexto)
+                    continue
 
-                # Agregar frame a la cola
-                self.frame_queue.agregar_frame(self.camera_id, frame)
-                self.frames_capturados += 1
+                self.procesar(frame, time.time())
 
                 # Controlar FPS
-                time.sleep(frame_delay)
+                if ritmo:
+                    ritmo.esperar()
 
             except Exception as e:
-                print(f"[Cámara {self.camera_id}] Excepción: {e}")
+                log_captura.exception("Excepción en la captura: %s", e, extra=contexto)
                 time.sleep(1)
 
         # Liberar recursos
-        if self.capture:
-            self.capture.release()
-        print(f"[Cámara {self.camera_id}] Captura detenida")
+        if self.fuente:
+            self.fuente.cerrar()
+        log_captura.info("Captura detenida", extra=contexto)
+
+    def procesar(self, frame: 'np.ndarray', capture_ts: float):
+        """
+        Entrega un frame leído a los grabadores y a los perfiles con demanda.
+
+        Lo llama el propio hilo tras cada lectura o, con captura en procesos
+        separados, el receptor del supervisor con el frame tomado de la
+        memoria compartida.
+        """
+        if self.detenida.is_set():
+            return  # Cámara quitada: no dejar frames en la cola tras eliminarla
+
+        self.frames_leidos += 1
+        self.ultimo_frame = time.monotonic()
+        traza = Traza.iniciar(capture_ts)
+
+        # Clips y grabación guardan el video aunque nadie lo pida
+        for grabador in self.grabadores:
+            grabador.agregar(self.camera_id, frame, capture_ts)
+
+        # El frame leído (una sola decodificación) alimenta a todos
+        # los perfiles; perfiles con el mismo tamaño comparten el
+        # frame redimensionado
+        redimensionados = {}
+        con_demanda = False
+        for perfil in list(self.perfiles.values()):
+            if self.analisis is not None and perfil.es_analisis != self.analisis:
+                continue
+
+            # Control de flujo: si ningún cliente del perfil tiene
+            # créditos para esta cámara, se omite antes de procesarlo
+            if self.demanda and not self.demanda(self.camera_id, perfil.nombre):
+                continue
+            con_demanda = True
+
+            # Tasa: el stream se sigue leyendo al ritmo de la cámara,
+            # pero cada perfil solo encola a sus fps (en el de
+            # análisis, también a los pedidos por testeo). Los demás
+            # frames se descartan antes de redimensionarlos o
+            # codificarlos.
+            fps, escala = self._tasa(perfil)
+            if fps and capture_ts - self.ultimo_encolado.get(perfil.nombre, 0.0) < 1.0 / fps:
+                continue
+            self.ultimo_encolado[perfil.nombre] = capture_ts
+
+            letterbox = None
+            if perfil.letterbox:
+                # Directo del frame leído al cuadrado del modelo,
+                # sin pasar por el tamaño del perfil base
+                clave = ('letterbox', perfil.ancho)
+                if clave not in redimensionados:
+                    redimensionados[clave] = ImageUtils.letterbox(frame, perfil.ancho)
+                salida, letterbox = redimensionados[clave]
+            else:
+                ancho = max(2, int(perfil.ancho * escala))
+                alto = max(2, int(perfil.alto * escala))
+                salida = redimensionados.get((ancho, alto))
+                if salida is None:
+                    salida = redimensionados[(ancho, alto)] = \
+                        ImageUtils.redimensionar_frame(frame, ancho, alto)
+
+            traza_perfil = traza.copiar()
+            traza_perfil.marcar('redimension')
+
+            # Agregar frame a la cola junto con su instante de captura
+            self.frame_queue.agregar_frame(self.camera_id, salida, capture_ts, traza_perfil,
+                                           perfil.nombre, letterbox)
+
+        if redimensionados:
+            self.frames_capturados += 1
+        elif not con_demanda:
+            self.frames_omitidos += 1
+
+    def _abrir(self, contexto: Dict) -> bool:
+        """
+        Abre (o reabre) la fuente. Si falla, espera el backoff, que se
+        duplica en cada intento fallido hasta backoff_max_s.
+
+        Returns:
+            True si quedó conectada
+        """
+        if self.aperturas:
+            self.reconexiones += 1
+        self.aperturas += 1
+
+        if self.fuente.abrir():
+            self.conectada = True
+            self.conectada_desde = self.ultimo_cambio = time.monotonic()
+            log_captura.info("Conexión exitosa (%s)", self.fuente.describir(), extra=contexto)
+            return True
+
+        self.fuente.cerrar()
+        self.backoff = min(self.backoff_max_s, self.backoff * 2) if self.backoff else self.backoff_inicial_s
+        log_captura.error("No se pudo conectar a %s: reintento en %.0f s", self.fuente.describir(),
+                          self.backoff, extra=contexto)
+        self.detenida.wait(self.backoff)
+        return False
+
+    def _desconectar(self, motivo: str, contexto: Dict):
+        """
+        Cierra la fuente para reconectarla tras el backoff. Una conexión que
+        duró estable_s vuelve al backoff inicial; si no, se duplica.
+        """
+        self.fuente.cerrar()
+        self.conectada = False
+        self.errores = 0
+
+        if not self.backoff or time.monotonic() - self.conectada_desde >= self.estable_s:
+            self.backoff = self.backoff_inicial_s
+        else:
+            self.backoff = min(self.backoff_max_s, self.backoff * 2)
+        log_captura.warning("%s: reconexión en %.0f s", motivo, self.backoff, extra=contexto)
+        self.detenida.wait(self.backoff)
+
+    def _congelado(self, frame: 'np.ndarray') -> bool:
+        """
+        Indica si el stream lleva congelado_s devolviendo el mismo frame
+        (decodificador trabado que repite el último). Se compara una muestra
+        de píxeles; no aplica a fuentes locales, que pueden ser una imagen fija.
+        """
+        if not self.congelado_s or self.fuente.marca_ritmo:
+            return False
+
+        huella = hash(frame[::16, ::16].tobytes())
+        ahora = time.monotonic()
+        if huella != self.huella:
+            self.huella = huella
+            self.ultimo_cambio = ahora
+            self.congelada = False
+            return False
+
+        self.congelada = ahora - self.ultimo_cambio > self.congelado_s
+        return self.congelada
+
+    def _tasa(self, perfil: PerfilSalida):
+        """
+        fps (0 = sin límite) y escala de un perfil.
+
+        Al perfil de análisis (y sus variantes) se le aplican además los
+        ajustes de RATE_CONTROL.
+        """
+        if not perfil.es_analisis:
+            return perfil.fps, 1.0
+
+        ajuste = self.ajustes.get(self.camera_id) or {}
+        limites = [fps for fps in (perfil.fps, ajuste.get('fps')) if fps]
+        return (min(limites) if limites else 0), ajuste.get('escala', 1.0)
 
     def stop(self):
         """Detiene el hilo de captura"""
+        self.detenida.set()
         self.running = False
 
 
@@ -140,20 +352,30 @@ class FrameQueue:
         self.lock = threading.Lock()
         self.max_size = max_size
 
-    def agregar_frame(self, camera_id: int, frame):
-        """Agrega un frame a la cola de una cámara"""
+    def agregar_frame(self, camera_id: int, frame, capture_ts: Optional[float] = None,
+                      traza: Optional[Traza] = None, perfil: str = PERFIL_ANALISIS,
+                      letterbox: Optional[Dict] = None):
+        """
+        Agrega un frame de un perfil a la cola de una cámara con su instante de
+        captura, su traza y, en perfiles letterbox, los metadatos del escalado
+        """
+        if capture_ts is None:
+            capture_ts = time.time()
+        if traza is None:
+            traza = Traza.iniciar(capture_ts)
+
         with self.lock:
             if camera_id not in self.frames:
                 self.frames[camera_id] = []
 
-            self.frames[camera_id].append(frame)
+            self.frames[camera_id].append((frame, capture_ts, traza, perfil, letterbox))
 
             # Limitar tamaño de la cola
             if len(self.frames[camera_id]) > self.max_size:
                 self.frames[camera_id].pop(0)
 
     def obtener_frame(self, camera_id: int):
-        """Obtiene el frame más reciente de una cámara"""
+        """Obtiene el frame más antiguo de una cámara como (frame, capture_ts, traza, perfil, letterbox)"""
         with self.lock:
             if camera_id in self.frames and len(self.frames[camera_id]) > 0:
                 return self.frames[camera_id].pop(0)
@@ -164,6 +386,16 @@ class FrameQueue:
         with self.lock:
             return camera_id in self.frames and len(self.frames[camera_id]) > 0
 
+    def tamanos(self) -> Dict[int, int]:
+        """Frames en cola por cámara"""
+        with self.lock:
+            return {camera_id: len(frames) for camera_id, frames in self.frames.items()}
+
+    def eliminar(self, camera_id: int):
+        """Descarta la cola de una cámara quitada de la configuración"""
+        with self.lock:
+            self.frames.pop(camera_id, None)
+
 
 class ServidorVideo:
     """Servidor de Video que gestiona múltiples cámaras y clientes"""
@@ -176,6 +408,7 @@ class ServidorVideo:
             config_path: Ruta al archivo de configuración
         """
         # Cargar configuración
+        self.config_path = config_path
         self.config = ConfigLoader.cargar_config(config_path)
         if not self.config:
             raise Exception("No se pudo cargar la configuración")
@@ -191,76 +424,680 @@ class ServidorVideo:
         self.resize_width = self.config['servidor_video']['resize_width']
         self.resize_height = self.config['servidor_video']['resize_height']
 
-        # Cámaras
+        # Cámaras (la recarga de la configuración reemplaza la lista entera,
+        # nunca la modifica, para que quien la recorre no vea cambios a medias)
         self.camaras = ConfigLoader.obtener_camaras(self.config)
-        print(f"Cámaras configuradas: {len(self.camaras)}")
+        log.info("Cámaras configuradas: %d", len(self.camaras))
+
+        # Perfiles de salida por cámara {camera_id: {nombre: PerfilSalida}},
+        # perfil elegido por cada cliente (SUBSCRIBE_UPDATES; ausente = análisis)
+        # y variantes letterbox pedidas {(perfil, lado)} (se crean también en
+        # las cámaras agregadas en caliente)
+        self.perfiles = {cam['id']: PerfilSalida.cargar(self.config['servidor_video'], cam)
+                         for cam in self.camaras}
+        self.perfil_cliente = {}
+        self.variantes_letterbox = set()
 
         # Cola de frames
         self.frame_queue = FrameQueue(max_size=self.config['concurrencia']['queue_size'])
 
-        # Hilos de captura
+        # Hilos de captura, o procesos vigilados por el supervisor si
+        # procesos_captura está habilitado
         self.capturas = []
+        self.grabadores = []
+        self.config_procesos = self.config['servidor_video'].get('procesos_captura', {})
+        self.supervisor = None
 
-        # Socket servidor
-        self.socket_servidor = None
+        # Reconexión de las fuentes y monitor de salud por cámara (VIDEO_STATUS)
+        self.config_salud = self.config['servidor_video'].get('salud', {})
+        self.monitor_salud = MonitorSalud(lambda: self.capturas, self.config_salud, self._difundir_estado)
+
+        # Sockets de escucha (TCP y/o Unix) y opciones comunes de socket
+        self.sockets_servidor = []
+        self.opciones_socket = Transporte.opciones(self.config)
         self.running = False
 
-        # Clientes conectados
+        # Clientes conectados. clientes_lock protege las listas y los perfiles
+        # de los clientes, no los envíos: cada envío toma el lock de su socket
+        # (Protocolo.lock_envio), así un cliente lento no frena a los demás
         self.clientes = []
         self.clientes_lock = threading.Lock()
 
+        # Destinos por perfil {perfil: ((cliente, anillo o None), ...)}: se
+        # reemplaza entero con clientes_lock tomado y se lee sin lock en cada
+        # frame (capturas y envío)
+        self.destinos = {}
+
+        # Clientes locales por memoria compartida {socket: AnilloFrames}
+        self.socket_shm_path = self.config['servidor_video'].get('socket_shm')
+        self.shm_slots = self.config['servidor_video'].get('shm_slots', 0)
+        self.socket_shm = None
+        self.clientes_shm = {}
+
+        # Lado de los frames letterbox que pedirá el servidor de testeo (los
+        # slots de memoria compartida deben alojarlos)
+        config_testeo = self.config.get('servidor_testeo', {})
+        self.letterbox_shm = config_testeo.get('imgsz', 640) if config_testeo.get('letterbox') else 0
+
+        # Ajustes de tasa por cámara pedidos por el servidor de testeo
+        self.ajustes_camara = {}
+
+        # Créditos de frames por cliente (FRAME_CREDIT)
+        self.creditos = CreditosProductor()
+
+        # Métricas expuestas por HTTP (GET /metrics) si hay metricas_puerto
+        self.metricas = RegistroMetricas()
+        self.servidor_metricas = ServidorMetricas.desde_config(self.metricas, self.config['servidor_video'])
+        self._registrar_metricas()
+        self._registrar_metricas_salud()
+
+        # Perfilado por muestreo bajo demanda (mensaje PROFILE)
+        self.perfilador = Perfilador('video', self.config.get('perfilador'))
+
+        # Recarga en caliente de config.json (archivo vigilado o CONFIG_RELOAD)
+        self.recarga = RecargaConfig(config_path, self.aplicar_config, self.config.get('recarga'))
+
+        # Clips antes/después de cada detección (mensaje CLIP_EVENT)
+        config_clips = self.config['servidor_video'].get('clips', {})
+        self.grabador = None
+        if config_clips.get('habilitado', False):
+            self.grabador = GrabadorClips(config_clips, self.camaras, self.resize_width, self.resize_height)
+            self._registrar_metricas_clips()
+
+        # Grabación continua de las cámaras clave (mensaje GET_RECORDING)
+        config_grabacion = self.config['servidor_video'].get('grabacion', {})
+        self.grabacion = None
+        if config_grabacion.get('habilitado', False):
+            self.grabacion = GrabacionContinua(config_grabacion, self.camaras,
+                                               self.resize_width, self.resize_height)
+            self._registrar_metricas_grabacion()
+
+    def _registrar_metricas(self):
+        """Crea las métricas del servidor; los contadores existentes se leen al exponer"""
+        m = self.metricas
+        m.contador('pc4_video_frames_capturados_total', "Frames leídos y encolados por cámara",
+                   ('camara',), lambda: self._por_camara('frames_capturados'))
+        m.contador('pc4_video_errores_lectura_total', "Errores leyendo el stream de la cámara",
+                   ('camara',), lambda: self._por_camara('errores_lectura'))
+        m.contador('pc4_video_frames_omitidos_total', "Frames omitidos por control de flujo",
+                   ('camara', 'motivo'), self._frames_omitidos)
+        m.medidor('pc4_video_cola_frames', "Frames en cola de envío por cámara",
+                  ('camara',), self.frame_queue.tamanos)
+        m.medidor('pc4_video_clientes', "Clientes conectados por transporte",
+                  ('transporte',), lambda: {'tcp': len(self.clientes), 'shm': len(self.clientes_shm)})
+
+        self.m_frames_enviados = m.contador('pc4_video_frames_enviados_total',
+                                            "Frames enviados a clientes", ('camara', 'transporte'))
+        self.m_bytes_enviados = m.contador('pc4_video_bytes_enviados_total',
+                                           "Bytes de frames enviados", ('transporte',))
+        self.m_codificacion = m.histograma('pc4_video_codificacion_segundos',
+                                           "Duración de la codificación JPEG + base64", ('camara',))
+        self.m_envio = m.histograma('pc4_video_envio_segundos',
+                                    "Duración del envío de un frame a todos los clientes",
+                                    ('transporte',))
+
+    def _registrar_metricas_salud(self):
+        """Métricas de salud por cámara y fuente (principal o sub_stream)"""
+        m = self.metricas
+        m.medidor('pc4_video_camara_segundos_sin_frame', "Segundos desde el último frame bueno",
+                  ('camara', 'fuente'), lambda: self._salud('segundos_sin_frame'))
+        m.medidor('pc4_video_camara_fps_medido', "fps leídos de la fuente (ventana reciente)",
+                  ('camara', 'fuente'), lambda: self._salud('fps_medido'))
+        m.medidor('pc4_video_camara_fps_configurado', "fps configurados de la cámara",
+                  ('camara', 'fuente'), lambda: self._salud('fps_configurado'))
+        m.medidor('pc4_video_camara_tasa_errores', "Fracción de lecturas fallidas (ventana reciente)",
+                  ('camara', 'fuente'), lambda: self._salud('tasa_errores'))
+        m.contador('pc4_video_camara_reconexiones_total', "Intentos de reabrir la fuente de la cámara",
+                   ('camara', 'fuente'), lambda: self._salud('reconexiones'))
+        m.medidor('pc4_video_camara_estado', "1 en el estado actual de cada cámara",
+                  ('camara', 'estado'), lambda: {(cid, salud['estado']): 1
+                                                 for cid, salud in self.monitor_salud.ultimo().items()
+                                                 if 'estado' in salud})
+
+    def _salud(self, clave: str) -> Dict:
+        """{(cámara, fuente): valor} de un campo de la última salud calculada"""
+        valores = {}
+        for camera_id, salud in self.monitor_salud.ultimo().items():
+            for fuente, datos in (('principal', salud), ('sub_stream', salud.get('sub_stream'))):
+                if datos and datos.get(clave) is not None:
+                    valores[(camera_id, fuente)] = datos[clave]
+        return valores
+
+    def _registrar_metricas_clips(self):
+        """Métricas del grabador de clips"""
+        m = self.metricas
+        m.medidor('pc4_video_clips_memoria_bytes', "Memoria del anillo de clips por cámara",
+                  ('camara',), self.grabador.memoria)
+        m.medidor('pc4_video_clips_activos', "Clips en escritura", (), self.grabador.clips_activos)
+        m.contador('pc4_video_clips_total', "Clips terminados por resultado", ('resultado',),
+                   lambda: {'escrito': self.grabador.clips_escritos, 'fallido': self.grabador.clips_fallidos})
+
+    def _registrar_metricas_grabacion(self):
+        """Métricas de la grabación continua"""
+        m = self.metricas
+        m.medidor('pc4_video_grabacion_bytes', "Bytes grabados en disco por cámara",
+                  ('camara',), self.grabacion.uso_disco)
+        m.contador('pc4_video_grabacion_frames_total', "Frames grabados por cámara",
+                   ('camara',), lambda: dict(self.grabacion.frames_escritos))
+        m.contador('pc4_video_grabacion_descartados_total', "Frames no grabados (cola de disco llena)",
+                   (), lambda: self.grabacion.frames_descartados)
+        m.contador('pc4_video_grabacion_segmentos_borrados_total', "Segmentos borrados por retención",
+                   (), lambda: self.grabacion.segmentos_borrados)
+
+    def _registrar_metricas_procesos(self):
+        """Métricas de los procesos de captura (etiqueta: cámaras del proceso)"""
+        m = self.metricas
+        m.contador('pc4_video_captura_reinicios_total', "Reinicios de procesos de captura",
+                   ('camara',), lambda: self._estado_procesos('reinicios'))
+        m.contador('pc4_video_captura_cpu_segundos_total', "CPU consumida por los procesos de captura",
+                   ('camara',), lambda: self._estado_procesos('cpu_s'))
+        m.medidor('pc4_video_captura_memoria_bytes', "Memoria residente de los procesos de captura",
+                  ('camara',), lambda: {camaras: mb * 1024 * 1024
+                                        for camaras, mb in self._estado_procesos('rss_mb').items()})
+        m.contador('pc4_video_captura_reemplazados_total',
+                   "Frames de un proceso de captura sobrescritos antes de tomarlos",
+                   ('camara',), lambda: self._estado_procesos('frames_reemplazados'))
+
+    def _estado_procesos(self, clave: str) -> Dict[str, float]:
+        """{cámaras del proceso: valor} de un campo del estado del supervisor"""
+        return {estado['camaras']: estado[clave] for estado in self.supervisor.estado()}
+
+    def _por_camara(self, atributo: str) -> Dict[int, int]:
+        """Suma un contador de las capturas por cámara (con sub-stream hay dos por cámara)"""
+        totales = {}
+        for captura in self.capturas:
+            totales[captura.camera_id] = totales.get(captura.camera_id, 0) + getattr(captura, atributo)
+        return totales
+
+    def _frames_omitidos(self) -> Dict:
+        """Omitidos en captura (ningún cliente con créditos) y en difusión (cliente sin créditos)"""
+        omitidos = {(camera_id, 'sin_demanda'): cantidad
+                    for camera_id, cantidad in self._por_camara('frames_omitidos').items()}
+        for camera_id, cantidad in self.creditos.obtener_omitidos().items():
+            omitidos[(camera_id, 'sin_credito')] = cantidad
+        return omitidos
+
     def iniciar_capturas(self):
         """Inicia los hilos de captura para todas las cámaras"""
-        print("\n=== Iniciando captura de cámaras ===")
+        log.info("Iniciando captura de cámaras")
+
+        if self.grabador:
+            self.grabador.start()
+        if self.grabacion:
+            self.grabacion.start()
+        self.grabadores = [g for g in (self.grabador, self.grabacion) if g]
 
         for camera_config in self.camaras:
-            captura = CapturaCamera(
-                camera_config,
-                self.frame_queue,
-                self.resize_width,
-                self.resize_height,
-                self.frame_quality
-            )
+            self._iniciar_camara(camera_config)
+
+        if self.config_procesos.get('habilitado', False):
+            # Las capturas no se inician como hilos: leen en procesos aparte
+            # y el supervisor les entrega los frames
+            self.supervisor = SupervisorCapturas(self.capturas, self.config_procesos, self.config)
+            self.supervisor.start()
+            self._registrar_metricas_procesos()
+            log.info("Captura en %d procesos", len(self.supervisor.procesos))
+
+        self.monitor_salud.start()
+
+        log.info("Total de cámaras iniciadas: %d", len(self.capturas))
+
+    def _iniciar_camara(self, camera_config: Dict) -> List[CapturaCamera]:
+        """Crea las capturas de una cámara (una, o dos con sub-stream de análisis)"""
+        perfiles = self.perfiles[camera_config['id']]
+        sub_stream = camera_config.get('rtsp_url_analisis')
+
+        if sub_stream:
+            # El sub-stream de la cámara alimenta solo el análisis; el
+            # principal, los demás perfiles y la grabación
+            analisis = dict(camera_config, rtsp_url=sub_stream, fuente=None)
+            return [self._iniciar_captura(analisis, perfiles, [], analisis=True),
+                    self._iniciar_captura(camera_config, perfiles, self.grabadores, analisis=False)]
+        return [self._iniciar_captura(camera_config, perfiles, self.grabadores)]
+
+    def _iniciar_captura(self, camera_config: Dict, perfiles: Dict[str, PerfilSalida], grabadores: List,
+                         analisis: Optional[bool] = None) -> CapturaCamera:
+        """Inicia un hilo de captura que produce los perfiles indicados"""
+        captura = CapturaCamera(
+            camera_config,
+            self.frame_queue,
+            perfiles,
+            self.ajustes_camara,
+            self._hay_demanda,
+            grabadores,
+            analisis,
+            self.config_salud
+        )
+        if not self.config_procesos.get('habilitado', False):
             captura.start()
-            self.capturas.append(captura)
+        self.capturas.append(captura)
+        return captura
+
+    def _perfiles_camara(self, camera_config: Dict) -> Dict[str, PerfilSalida]:
+        """Perfiles configurados de una cámara más las variantes letterbox ya pedidas"""
+        perfiles = PerfilSalida.cargar(self.config['servidor_video'], camera_config)
+        for nombre, lado in self.variantes_letterbox:
+            if nombre in perfiles:
+                variante = perfiles[nombre].con_letterbox(lado)
+                perfiles[variante.nombre] = variante
+        return perfiles
+
+    def aplicar_config(self, nueva: Dict) -> Dict:
+        """
+        Aplica en caliente una configuración recargada.
+
+        Compara las cámaras por id: las quitadas detienen su captura, las
+        agregadas la inician y las que cambiaron (URL, fps, perfiles propios)
+        la reinician; las demás solo actualizan sus perfiles. También cambia
+        el tamaño de la cola de envío. Los clientes siguen conectados con su
+        perfil y sus créditos. Clips y grabación continua toman las cámaras
+        agregadas y sueltan las quitadas (según su filtro "camaras").
+
+        Host, puertos, sockets, transporte por memoria compartida y el resto
+        de los parámetros de clips y grabación continua (habilitado,
+        directorio, formato, duraciones...) se leen solo al iniciar.
+
+        Args:
+            nueva: Configuración completa leída de config.json
+
+        Returns:
+            Cambios aplicados
+
+        Raises:
+            ValueError: Configuración sin la sección servidor_video
+        """
+        if 'servidor_video' not in nueva:
+            raise ValueError("Configuración sin la sección servidor_video")
+
+        cambios = {}
+        tamano = nueva.get('concurrencia', {}).get('queue_size', self.frame_queue.max_size)
+        if tamano != self.frame_queue.max_size:
+            self.frame_queue.max_size = tamano
+            cambios['queue_size'] = tamano
+
+        self.config['servidor_video']['perfiles'] = nueva['servidor_video'].get('perfiles')
+        for clave in ('frame_quality', 'resize_width', 'resize_height'):
+            if clave in nueva['servidor_video']:
+                self.config['servidor_video'][clave] = nueva['servidor_video'][clave]
+
+        anteriores = {cam['id']: cam for cam in self.camaras}
+        nuevas = {cam['id']: cam for cam in ConfigLoader.obtener_camaras(nueva)}
+        quitadas = [cid for cid in anteriores if cid not in nuevas]
+        agregadas = [cid for cid in nuevas if cid not in anteriores]
+        reiniciadas = [cid for cid in nuevas if cid in anteriores and nuevas[cid] != anteriores[cid]]
+
+        # Primero sale de la lista que recorre el envío, después se detiene
+        self.camaras = list(nuevas.values())
+        for camera_id in quitadas + reiniciadas:
+            self._detener_camara(camera_id)
+
+        nuevas_capturas = []
+        for camera_id in reiniciadas + agregadas:
+            with self.clientes_lock:
+                self.perfiles[camera_id] = self._perfiles_camara(nuevas[camera_id])
+            nuevas_capturas.extend(self._iniciar_camara(nuevas[camera_id]))
+        if self.supervisor and nuevas_capturas:
+            self.supervisor.agregar(nuevas_capturas)
+
+        actualizadas = [cid for cid in nuevas if cid not in reiniciadas + agregadas
+                        and self._actualizar_perfiles(cid, self._perfiles_camara(nuevas[cid]))]
+
+        for clave, valor in (('camaras_agregadas', agregadas), ('camaras_quitadas', quitadas),
+                             ('camaras_reiniciadas', reiniciadas), ('perfiles_actualizados', actualizadas)):
+            if valor:
+                cambios[clave] = valor
+
+        # Cámaras que graban clips / grabación continua, si cambiaron
+        for clave, grabador in (('clips_camaras', self.grabador), ('grabacion_camaras', self.grabacion)):
+            if grabador:
+                antes = sorted(grabador.fps)
+                ahora = grabador.actualizar_camaras(self.camaras)
+                if ahora != antes:
+                    cambios[clave] = ahora
+        return cambios
+
+    def _detener_camara(self, camera_id: int):
+        """Detiene las capturas de una cámara y descarta sus frames en cola"""
+        detenidas = [c for c in self.capturas if c.camera_id == camera_id]
+        self.capturas = [c for c in self.capturas if c.camera_id != camera_id]
+
+        if self.supervisor:
+            self.supervisor.quitar(camera_id)
+        for captura in detenidas:
+            captura.stop()
 
-        print(f"Total de cámaras iniciadas: {len(self.capturas)}\n")
+        self.frame_queue.eliminar(camera_id)
+        with self.clientes_lock:
+            self.perfiles.pop(camera_id, None)
+        self.ajustes_camara.pop(camera_id, None)
+        log.info("Captura detenida por recarga de la configuración", extra={'camara': camera_id})
+
+    def _actualizar_perfiles(self, camera_id: int, nuevos: Dict[str, PerfilSalida]) -> bool:
+        """
+        Actualiza en su lugar los perfiles de una cámara en captura (los
+        objetos los comparte su captura).
+
+        Returns:
+            True si algún perfil cambió, se agregó o se quitó
+        """
+        actuales = self.perfiles[camera_id]
+        cambio = False
+
+        for nombre, perfil in nuevos.items():
+            actual = actuales.get(nombre)
+            if actual is None:
+                actuales[nombre] = perfil
+                cambio = True
+            elif actual.a_dict() != perfil.a_dict():
+                actual.ancho, actual.alto = perfil.ancho, perfil.alto
+                actual.calidad, actual.fps = perfil.calidad, perfil.fps
+                cambio = True
+
+        for nombre in [n for n in actuales if n not in nuevos]:
+            del actuales[nombre]
+            cambio = True
+        return cambio
 
     def iniciar_servidor(self):
         """Inicia el servidor socket para aceptar clientes"""
-        print(f"\n=== Servidor de Video ===")
-        print(f"Iniciando servidor en {self.host}:{self.puerto}")
+        log.info("Iniciando servidor en %s:%s", self.host, self.puerto)
 
-        # Crear socket TCP
-        self.socket_servidor = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket_servidor.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.socket_servidor.bind((self.host, self.puerto))
-        self.socket_servidor.listen(self.max_clientes)
+        # Crear sockets de escucha (TCP y/o Unix según configuración)
+        self.sockets_servidor = Transporte.escuchar(
+            self.config['servidor_video'], self.max_clientes, self.opciones_socket
+        )
 
-        print(f"Servidor escuchando en puerto {self.puerto}")
-        print("Esperando conexiones...\n")
+        for sock in self.sockets_servidor:
+            log.info("Servidor escuchando en %s", Transporte.describir(sock))
+        log.info("Esperando conexiones...")
 
         self.running = True
 
-        # Hilo para aceptar clientes
-        threading.Thread(target=self._aceptar_clientes, daemon=True).start()
+        # Un hilo de aceptación por socket de escucha
+        for sock in self.sockets_servidor:
+            threading.Thread(target=self._aceptar_clientes, args=(sock,), daemon=True).start()
+
+        # Canal de control para clientes locales por memoria compartida
+        self._iniciar_servidor_shm()
+
+        if self.servidor_metricas:
+            self.servidor_metricas.iniciar()
 
         # Hilo para enviar frames a clientes
         threading.Thread(target=self._enviar_frames, daemon=True).start()
 
-    def _aceptar_clientes(self):
-        """Acepta conexiones de clientes"""
+    def _aceptar_clientes(self, socket_servidor: socket.socket):
+        """Acepta conexiones de clientes en un socket de escucha"""
         while self.running:
             try:
-                cliente_socket, cliente_addr = self.socket_servidor.accept()
-                print(f"[Servidor] Nueva conexión: {cliente_addr}")
+                cliente_socket, cliente_addr = socket_servidor.accept()
+                Transporte.configurar_socket(cliente_socket, self.opciones_socket)
+                log.info("Nueva conexión: %s", cliente_addr or Transporte.describir(socket_servidor))
 
                 with self.clientes_lock:
                     self.clientes.append(cliente_socket)
+                    self._actualizar_destinos()
+
+                # Hilo para mensajes de control del cliente (RATE_CONTROL)
+                threading.Thread(
+                    target=self._escuchar_cliente,
+                    args=(cliente_socket, cliente_addr),
+                    daemon=True
+                ).start()
 
             except Exception as e:
                 if self.running:
-                    print(f"[Servidor] Error aceptando cliente: {e}")
+                    log.error("Error aceptando cliente: %s", e)
+
+    def _iniciar_servidor_shm(self):
+        """Escucha en un socket Unix a los clientes del mismo host"""
+        if not self.socket_shm_path or not hasattr(socket, 'AF_UNIX'):
+            return
+
+        try:
+            self.socket_shm = Transporte.escuchar_unix(
+                self.socket_shm_path, self.max_clientes, self.opciones_socket
+            )
+            log.info("Memoria compartida disponible en %s", self.socket_shm_path)
+
+            threading.Thread(target=self._aceptar_clientes_shm, daemon=True).start()
+
+        except OSError as e:
+            log.warning("No se pudo abrir %s: %s", self.socket_shm_path, e)
+            self.socket_shm = None
+
+    def _aceptar_clientes_shm(self):
+        """Acepta clientes locales y les crea un anillo de memoria compartida"""
+        while self.running:
+            try:
+                cliente_socket, _ = self.socket_shm.accept()
+
+                # Un slot debe alojar un frame BGR completo del perfil de
+                # análisis o de su variante letterbox si testeo la pedirá
+                slots = self.shm_slots or max(16, 4 * len(self.camaras))
+                slot_bytes = max([p[PERFIL_ANALISIS].bytes_frame() for p in list(self.perfiles.values())] +
+                                 [self.letterbox_shm ** 2 * 3],
+                                 default=self.resize_width * self.resize_height * 3)
+                anillo = AnilloFrames.crear(slots, slot_bytes)
+
+                Protocolo.enviar_mensaje(cliente_socket, TipoMensaje.SHM_INIT, {
+                    'nombre': anillo.nombre,
+                    'slots': anillo.num_slots,
+                    'slot_bytes': anillo.slot_bytes
+                })
+                log.info("Nuevo cliente local por memoria compartida (%s)", anillo.nombre)
+
+                with self.clientes_lock:
+                    self.clientes_shm[cliente_socket] = anillo
+                    self._actualizar_destinos()
+
+                threading.Thread(
+                    target=self._escuchar_cliente,
+                    args=(cliente_socket, f"shm:{anillo.nombre}"),
+                    daemon=True
+                ).start()
+
+            except Exception as e:
+                if self.running:
+                    log.error("Error aceptando cliente local: %s", e)
+
+    def _eliminar_cliente(self, cliente: socket.socket):
+        """Quita un cliente (TCP o memoria compartida). Llamar con clientes_lock tomado"""
+        if cliente in self.clientes:
+            self.clientes.remove(cliente)
+
+        anillo = self.clientes_shm.pop(cliente, None)
+        if anillo:
+            anillo.cerrar()
+
+        self.creditos.eliminar(cliente)
+        self.perfil_cliente.pop(cliente, None)
+        self._actualizar_destinos()
+
+        # shutdown despierta a un envío bloqueado en otro hilo (cliente lento)
+        try:
+            cliente.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            cliente.close()
+        except:
+            pass
+
+    def _escuchar_cliente(self, cliente_socket: socket.socket, cliente_addr):
+        """Recibe mensajes de control enviados por un cliente"""
+        while self.running:
+            mensaje = Protocolo.recibir_mensaje(cliente_socket)
+            if not mensaje:
+                with self.clientes_lock:
+                    self._eliminar_cliente(cliente_socket)
+                break
+
+            tipo = mensaje.get('tipo')
+            datos = mensaje.get('datos', {})
+
+            if tipo == TipoMensaje.FRAME_CREDIT:
+                self.creditos.otorgar(cliente_socket, datos)
+
+            elif tipo == TipoMensaje.RATE_CONTROL:
+                self._aplicar_control_tasa(datos)
+
+            elif tipo == TipoMensaje.CLIP_EVENT:
+                # La ruta del clip la decide solo este servidor: se responde
+                # con la ruta real (None si la cámara no graba) o con ERROR
+                try:
+                    ruta = self.grabador.evento_deteccion(datos) if self.grabador else None
+                except (KeyError, TypeError, ValueError) as e:
+                    log.warning("CLIP_EVENT rechazado de %s: %s", cliente_addr, e)
+                    self._responder(cliente_socket, TipoMensaje.ERROR,
+                                    {'error': str(e), 'clip_event': datos.get('id')})
+                    continue
+                self._responder(cliente_socket, TipoMensaje.ACK, {'clip_event': datos.get('id'), 'ruta': ruta})
+
+            elif tipo == TipoMensaje.GET_RECORDING:
+                # La lectura del disco y la serialización se hacen antes de
+                # tomar el lock de envío del socket (_responder)
+                try:
+                    if not self.grabacion:
+                        raise ValueError("Grabación continua deshabilitada")
+                    respuesta = self.grabacion.obtener(datos)
+                except ValueError as e:
+                    self._responder(cliente_socket, TipoMensaje.ERROR, {'error': str(e)})
+                    continue
+                self._responder(cliente_socket, TipoMensaje.RECORDING, respuesta)
+
+            elif tipo == TipoMensaje.SUBSCRIBE_UPDATES:
+                try:
+                    with self.clientes_lock:
+                        perfil = self._elegir_perfil(cliente_socket, datos)
+                except ValueError as e:
+                    self._responder(cliente_socket, TipoMensaje.ERROR, {'error': str(e)})
+                    continue
+                self._responder(cliente_socket, TipoMensaje.ACK, {'status': 'ok', 'perfil': perfil})
+                log.info("Cliente %s: perfil %s", cliente_addr, perfil)
+
+            elif tipo == TipoMensaje.PING:
+                self._responder(cliente_socket, TipoMensaje.PONG, {})
+
+            elif tipo == TipoMensaje.HELLO:
+                # Con el lock de envío: ningún mensaje sale a medio cambiar la sesión
+                with Protocolo.lock_envio(cliente_socket):
+                    codificacion = Protocolo.responder_hello(
+                        cliente_socket, datos, self.config.get('red', {}).get('compresion'))
+                log.info("Cliente %s: codificación %s", cliente_addr, codificacion)
+
+            elif tipo == TipoMensaje.PROFILE:
+                try:
+                    estado = self.perfilador.manejar(datos)
+                except ValueError as e:
+                    self._responder(cliente_socket, TipoMensaje.ERROR, {'error': str(e)})
+                    continue
+                self._responder(cliente_socket, TipoMensaje.PROFILE, estado)
+
+            elif tipo == TipoMensaje.CONFIG_RELOAD:
+                try:
+                    cambios = self.recarga.recargar()
+                except Exception as e:
+                    # Un valor mal tipado en config.json (KeyError, TypeError...)
+                    # se informa al cliente sin cortar su conexión
+                    log.warning("Cliente %s: recarga de configuración fallida: %s", cliente_addr, e)
+                    self._responder(cliente_socket, TipoMensaje.ERROR, {'error': str(e) or type(e).__name__})
+                    continue
+                self._responder(cliente_socket, TipoMensaje.ACK, {'status': 'ok', 'cambios': cambios})
+                log.info("Cliente %s: configuración recargada", cliente_addr)
+
+    def _responder(self, cliente_socket: socket.socket, tipo: str, datos: Dict) -> bool:
+        """
+        Envía un mensaje a un cliente. Se serializa sin tomar ningún lock (un
+        RECORDING son decenas de MB en base64) y solo el envío toma el lock
+        de su socket, para no intercalarse con los frames.
+        """
+        mensaje_bytes = Protocolo.serializar_para(cliente_socket, Protocolo.crear_mensaje(tipo, datos))
+        try:
+            with Protocolo.lock_envio(cliente_socket):
+                cliente_socket.sendall(mensaje_bytes)
+            return True
+        except OSError as e:
+            log.warning("Error enviando %s a cliente: %s", tipo, e)
+            return False
+
+    def _elegir_perfil(self, cliente_socket: socket.socket, datos: Dict) -> str:
+        """
+        Asigna al cliente el perfil pedido. Llamar con clientes_lock tomado.
+
+        Con 'letterbox' (imgsz del modelo) el cliente recibe la variante
+        letterbox del perfil, que se crea en todas las cámaras la primera vez.
+
+        Raises:
+            ValueError: Perfil desconocido, lado de letterbox inválido o
+                        perfil que no cabe en la memoria compartida del cliente
+        """
+        nombre = datos.get('perfil', PERFIL_ANALISIS)
+        if not any(nombre in p for p in self.perfiles.values()):
+            raise ValueError(f"Perfil desconocido: {nombre}")
+
+        lado = datos.get('letterbox')
+        if lado:
+            if not isinstance(lado, int) or not 32 <= lado <= 4096 or lado % 32:
+                raise ValueError(f"Lado de letterbox inválido: {lado} (múltiplo de 32 hasta 4096)")
+            for perfiles_camara in self.perfiles.values():
+                if nombre in perfiles_camara:
+                    variante = perfiles_camara[nombre].con_letterbox(lado)
+                    perfiles_camara.setdefault(variante.nombre, variante)
+            self.variantes_letterbox.add((nombre, lado))
+            nombre = variante.nombre
+
+        perfiles = [p[nombre] for p in self.perfiles.values() if nombre in p]
+
+        anillo = self.clientes_shm.get(cliente_socket)
+        if anillo and any(p.bytes_frame() > anillo.slot_bytes for p in perfiles):
+            raise ValueError(f"El perfil {nombre} no cabe en la memoria compartida: usar TCP")
+
+        self.perfil_cliente[cliente_socket] = nombre
+        self._actualizar_destinos()
+        return nombre
+
+    def _actualizar_destinos(self):
+        """Reconstruye los destinos por perfil. Llamar con clientes_lock tomado"""
+        destinos = {}
+        for cliente in self.clientes:
+            perfil = self.perfil_cliente.get(cliente, PERFIL_ANALISIS)
+            destinos.setdefault(perfil, []).append((cliente, None))
+        for cliente, anillo in self.clientes_shm.items():
+            perfil = self.perfil_cliente.get(cliente, PERFIL_ANALISIS)
+            destinos.setdefault(perfil, []).append((cliente, anillo))
+        self.destinos = {perfil: tuple(lista) for perfil, lista in destinos.items()}
+
+    def _hay_demanda(self, camera_id: int, perfil: str = PERFIL_ANALISIS) -> bool:
+        """Indica si algún cliente del perfil aceptaría ahora un frame de la cámara"""
+        clientes = [cliente for cliente, _ in self.destinos.get(perfil, ())]
+        return self.creditos.hay_demanda(camera_id, clientes)
+
+    def _difundir_estado(self, datos: Dict):
+        """Envía VIDEO_STATUS (salud de las cámaras) a todos los clientes"""
+        with self.clientes_lock:
+            clientes = list(self.clientes) + list(self.clientes_shm)
+
+        desconectados = [c for c in clientes if not self._responder(c, TipoMensaje.VIDEO_STATUS, datos)]
+        if desconectados:
+            with self.clientes_lock:
+                for cliente in desconectados:
+                    self._eliminar_cliente(cliente)
+
+    def _aplicar_control_tasa(self, datos: Dict):
+        """
+        Aplica los fps/escala por cámara pedidos por el servidor de testeo.
+
+        Los ajustes son globales por cámara: con varios consumidores, manda el
+        último que envió RATE_CONTROL.
+        """
+        for camera_id, ajuste in datos.get('camaras', {}).items():
+            self.ajustes_camara[int(camera_id)] = {
+                'fps': float(ajuste.get('fps', 0)),
+                'escala': min(1.0, max(0.1, float(ajuste.get('escala', 1.0))))
+            }
+            log.info("Tasa ajustada a %s fps, escala %s", ajuste.get('fps'), ajuste.get('escala', 1.0),
+                     extra={'camara': int(camera_id)})
 
     def _enviar_frames(self):
         """Envía frames a todos los clientes conectados"""
@@ -268,81 +1105,176 @@ class ServidorVideo:
 
         while self.running:
             try:
-                # Por cada cámara, enviar frames disponibles
+                # Por cada cámara, enviar frames disponibles (self.camaras
+                # puede reemplazarse mientras tanto al recargar la configuración)
                 for camera_config in self.camaras:
                     camera_id = camera_config['id']
 
                     if self.frame_queue.tiene_frames(camera_id):
-                        frame = self.frame_queue.obtener_frame(camera_id)
-
-                        if frame is not None:
-                            # Convertir frame a base64
-                            frame_base64 = ImageUtils.frame_a_base64(frame, self.frame_quality)
-
-                            # Crear mensaje
-                            timestamp = datetime.now().isoformat()
-                            mensaje = MensajeFactory.crear_frame(
-                                camera_id,
-                                frame_base64,
-                                timestamp
-                            )
-
-                            # Enviar a todos los clientes
-                            with self.clientes_lock:
-                                clientes_desconectados = []
-
-                                for cliente in self.clientes:
-                                    try:
-                                        mensaje_bytes = Protocolo.serializar(mensaje)
-                                        cliente.sendall(mensaje_bytes)
-
-                                    except Exception as e:
-                                        print(f"[Servidor] Error enviando a cliente: {e}")
-                                        clientes_desconectados.append(cliente)
-
-                                # Eliminar clientes desconectados
-                                for cliente in clientes_desconectados:
-                                    self.clientes.remove(cliente)
-                                    try:
-                                        cliente.close()
-                                    except:
-                                        pass
+                        entrada = self.frame_queue.obtener_frame(camera_id)
+
+                        if entrada is not None:
+                            frame, capture_ts, traza, perfil, letterbox = entrada
+                            self._difundir_frame(camera_id, frame, capture_ts, traza, perfil, letterbox)
 
                             # Estadísticas
                             contador = contador_frames.incrementar()
                             if contador % 100 == 0:
-                                print(f"[Servidor] Frames enviados: {contador} | Clientes conectados: {len(self.clientes)}")
+                                log.info("Frames enviados: %d | Clientes conectados: %d | Omitidos sin créditos: %s",
+                                         contador, len(self.clientes) + len(self.clientes_shm),
+                                         self.creditos.obtener_omitidos())
 
                 # Pequeño delay para no saturar CPU
                 time.sleep(0.01)
 
             except Exception as e:
-                print(f"[Servidor] Error en envío de frames: {e}")
+                log.exception("Error en envío de frames: %s", e)
                 time.sleep(0.1)
 
+    def _difundir_frame(self, camera_id: int, frame, capture_ts: float,
+                        traza: Optional[Traza] = None, perfil: str = PERFIL_ANALISIS,
+                        letterbox: Optional[Dict] = None):
+        """
+        Envía un frame a todos los clientes del perfil.
+
+        Los frames TCP siempre viajan en JSON (compartido por todos los
+        clientes); los avisos FRAME_SHM usan la codificación negociada.
+
+        Solo se envía a los clientes con créditos para la cámara (o sin
+        control de flujo). A los clientes TCP se les envía JPEG en base64,
+        codificado y serializado una sola vez y solo si alguno lo recibirá. A
+        los clientes locales se les copia el frame crudo a su anillo de memoria
+        compartida y solo se anuncia el slot.
+
+        La traza del frame viaja en el mensaje con las etapas 'codificacion'
+        (JPEG + base64, solo TCP) y 'envio' (mensaje listo para enviar), y
+        los metadatos de letterbox si el perfil es una variante letterbox.
+        """
+        # Cámara o perfil quitados al recargar la configuración
+        perfil_salida = self.perfiles.get(camera_id, {}).get(perfil)
+        if perfil_salida is None:
+            return
+
+        timestamp = datetime.now().isoformat()
+        if traza is None:
+            traza = Traza.iniciar(capture_ts)
+        traza.marcar('cola_video')
+
+        destinos = self.destinos.get(perfil, ())
+        destinos_tcp = [c for c, anillo in destinos if anillo is None and self.creditos.consumir(c, camera_id)]
+        destinos_shm = [(c, anillo) for c, anillo in destinos
+                        if anillo is not None and self.creditos.consumir(c, camera_id)]
+
+        mensaje_bytes = None
+        if destinos_tcp:
+            inicio = time.perf_counter()
+            frame_base64 = ImageUtils.frame_a_base64(frame, perfil_salida.calidad)
+            self.m_codificacion.etiquetar(camera_id).observar(time.perf_counter() - inicio)
+            traza_tcp = traza.copiar()
+            traza_tcp.marcar('codificacion')
+            traza_tcp.marcar('envio')
+            mensaje = MensajeFactory.crear_frame(camera_id, frame_base64, timestamp, capture_ts,
+                                                 traza_tcp.a_dict(), letterbox)
+            mensaje_bytes = Protocolo.serializar(mensaje)
+
+        # Envíos sin clientes_lock: solo se espera al lock de cada socket
+        clientes_desconectados = []
+
+        inicio = time.perf_counter()
+        enviados = 0
+        for cliente in destinos_tcp:
+            try:
+                with Protocolo.lock_envio(cliente):
+                    cliente.sendall(mensaje_bytes)
+                enviados += 1
+            except Exception as e:
+                log.warning("Error enviando a cliente: %s", e)
+                clientes_desconectados.append(cliente)
+
+        if enviados:
+            self.m_envio.etiquetar('tcp').observar(time.perf_counter() - inicio)
+            self.m_frames_enviados.etiquetar(camera_id, 'tcp').inc(enviados)
+            self.m_bytes_enviados.etiquetar('tcp').inc(enviados * len(mensaje_bytes))
+
+        inicio = time.perf_counter()
+        enviados = 0
+        for cliente, anillo in destinos_shm:
+            # None también si el anillo se cerró al desconectarse el cliente
+            publicado = anillo.escribir(camera_id, frame, capture_ts)
+            if publicado is None:
+                self.creditos.devolver(cliente, camera_id)
+                continue
+
+            slot, seq = publicado
+            traza_shm = traza.copiar()
+            traza_shm.marcar('envio')
+            aviso = MensajeFactory.crear_frame_shm(camera_id, slot, seq, timestamp, capture_ts,
+                                                   traza_shm.a_dict(), letterbox)
+            try:
+                with Protocolo.lock_envio(cliente):
+                    cliente.sendall(Protocolo.serializar_para(cliente, aviso))
+                enviados += 1
+            except Exception as e:
+                log.warning("Error enviando a cliente local: %s", e)
+                clientes_desconectados.append(cliente)
+
+        if enviados:
+            self.m_envio.etiquetar('shm').observar(time.perf_counter() - inicio)
+            self.m_frames_enviados.etiquetar(camera_id, 'shm').inc(enviados)
+            self.m_bytes_enviados.etiquetar('shm').inc(enviados * frame.nbytes)
+
+        # Eliminar clientes desconectados
+        if clientes_desconectados:
+            with self.clientes_lock:
+                for cliente in clientes_desconectados:
+                    self._eliminar_cliente(cliente)
+
     def detener(self):
         """Detiene el servidor y todas las capturas"""
-        print("\n[Servidor] Deteniendo servidor...")
+        log.info("Deteniendo servidor...")
 
         self.running = False
+        self.recarga.detener()
+        self.monitor_salud.detener()
 
         # Detener capturas
         for captura in self.capturas:
             captura.stop()
+        if self.supervisor:
+            self.supervisor.detener()
 
         # Cerrar clientes
         with self.clientes_lock:
-            for cliente in self.clientes:
-                try:
-                    cliente.close()
-                except:
-                    pass
+            for cliente in list(self.clientes) + list(self.clientes_shm):
+                self._eliminar_cliente(cliente)
+
+        if self.socket_shm:
+            self.socket_shm.close()
+            try:
+                os.unlink(self.socket_shm_path)
+            except OSError:
+                pass
+
+        if self.servidor_metricas:
+            self.servidor_metricas.detener()
+
+        self.perfilador.detener()
+
+        # Cerrar los clips en curso con los frames ya capturados
+        if self.grabador:
+            self.grabador.detener()
+        if self.grabacion:
+            self.grabacion.detener()
+
+        # Cerrar sockets de escucha
+        for sock in self.sockets_servidor:
+            sock.close()
 
-        # Cerrar socket servidor
-        if self.socket_servidor:
-            self.socket_servidor.close()
+        ruta_unix = self.config['servidor_video'].get('socket_unix')
+        if ruta_unix and os.path.exists(ruta_unix):
+            os.unlink(ruta_unix)
 
-        print("[Servidor] Servidor detenido")
+        log.info("Servidor detenido")
 
     def ejecutar(self):
         """Ejecuta el servidor"""
@@ -352,32 +1284,30 @@ class ServidorVideo:
 
             # Iniciar servidor socket
             self.iniciar_servidor()
+            self.recarga.iniciar()
 
             # Mantener el programa corriendo
-            print("Servidor ejecutándose. Presione Ctrl+C para detener.\n")
+            log.info("Servidor ejecutándose. Presione Ctrl+C para detener.")
 
             while True:
                 time.sleep(1)
 
         except KeyboardInterrupt:
-            print("\n[Servidor] Interrupción detectada")
+            log.info("Interrupción detectada")
         finally:
             self.detener()
 
 
 def main():
     """Función principal"""
-    print("=" * 60)
-    print("SERVIDOR DE VIDEO - Sistema Distribuido de Reconocimiento")
-    print("=" * 60)
+    Registro.configurar(ConfigLoader.cargar_config("config/config.json"), 'video')
+    log.info("SERVIDOR DE VIDEO - Sistema Distribuido de Reconocimiento")
 
     try:
         servidor = ServidorVideo()
         servidor.ejecutar()
     except Exception as e:
-        print(f"Error fatal: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error fatal: %s", e)
 
 
 if __name__ == "__main__":
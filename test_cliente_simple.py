@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 """Cliente simple para probar el servidor de testeo"""
-import socket
 import json
+import os
 import struct
 
+from src.common.transporte import Transporte
+from src.common.utils import ConfigLoader
+
 def recibir_mensaje(sock):
     # Recibir header (4 bytes)
     header = sock.recv(4)
@@ -36,8 +39,14 @@ def enviar_mensaje(sock, tipo, datos):
     sock.sendall(header + mensaje_bytes)
 
 def main():
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.connect(('127.0.0.1', 5002))
+    config = ConfigLoader.cargar_config(os.path.join(os.path.dirname(__file__), 'config/config.json'))
+    cliente = config.get('cliente_vigilante', {})
+
+    # Socket Unix si el servidor es local y lo expone, si no TCP
+    sock = Transporte.conectar(cliente.get('servidor_testeo_host', '127.0.0.1'),
+                               cliente.get('servidor_testeo_puerto', 5002),
+                               cliente.get('servidor_testeo_socket_unix'),
+                               timeout=10, opciones=Transporte.opciones(config))
 
     print("✅ Conectado al servidor")
 